@@ -184,12 +184,14 @@ def register_blueprints(app):
     from app.teacher import teacher_bp
     from app.student import student_bp
     from app.api import api_bp
+    from core.enrollment import enrollment_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(teacher_bp)
     app.register_blueprint(student_bp)
     app.register_blueprint(api_bp)
+    app.register_blueprint(enrollment_bp)
     
     # ルートURLのハンドラー
     @app.route('/')
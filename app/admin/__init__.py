@@ -46,6 +46,15 @@ def dashboard():
                           school_count=school_count,
                           teacher_count=teacher_count)
 
+@admin_bp.route('/email_outbox')
+@login_required
+@admin_required
+def email_outbox():
+    """メールの送信キューの状況（送信待ちの件数・失敗率・最近のエラー）"""
+    from app.utils.email_outbox import outbox_stats
+    
+    return render_template('admin/email_outbox.html', stats=outbox_stats())
+
 @admin_bp.route('/users')
 @login_required
 @admin_required
@@ -14,6 +14,11 @@ from app.admin import admin_bp, admin_required
 from app.auth.password_validator import generate_secure_password
 from app.utils.file_security import file_validator
 from app.utils.email_sender import send_confirmation_email
+from app.utils.background_jobs import append_results
+from app.utils.import_jobs import (
+    PASSWORD_RESULTS_MESSAGE, create_import_job, hash_passwords, insert_users, iter_row_chunks, load_existing_users,
+    open_upload
+)
 import logging
 
 # CSVファイルの拡張子チェック用関数
@@ -33,12 +38,156 @@ def generate_random_password(length=16):
     """
     return generate_secure_password(max(12, length))
 
+def _create_users(pending, results):
+    """検証済みのユーザーをまとめて作成し、確認メールを送る"""
+    password_hashes = hash_passwords([entry['password'] for entry in pending])
+    
+    user_ids = insert_users([
+        {
+            'username': entry['username'],
+            'full_name': entry['full_name'] or entry['username'],  # full_nameがない場合はusernameを使用
+            'email': entry['email'],
+            'password': password_hash,
+            'role': entry['role'],
+            'school_id': entry['school_id'],
+            'email_confirmed': True,  # CSV登録ユーザーは確認済み
+            'is_approved': entry['role'] != 'student'  # 学生以外は自動承認
+        }
+        for entry, password_hash in zip(pending, password_hashes)
+    ])
+    
+    for entry in pending:
+        # 確認メール送信を試行
+        try:
+            token = secrets.token_urlsafe(32)
+            send_confirmation_email(
+                entry['email'], 
+                user_ids[entry['username'].lower()], 
+                token, 
+                entry['username']
+            )
+        except Exception as e:
+            logging.warning(f"Failed to send confirmation email to {entry['email']}: {str(e)}")
+        
+        # 自動生成したパスワードは結果ファイルでのみ管理者に渡す
+        if entry['generated']:
+            results['rows'].append({
+                'username': entry['username'],
+                'email': entry['email'],
+                'password': entry['password']
+            })
+    
+    results['created'] += len(pending)
+
+def import_users_from_csv(source, progress=None, write_rows=None):
+    """
+    CSVからユーザーを一括作成する
+    
+    ROW_CHUNK_SIZE 行ごとに、参照されるユーザー名・メールアドレスの既存ユーザーを
+    1回のINクエリで読み込んでメモリ上で照合し、新規ユーザーを一括INSERTする
+    （チャンクごとにコミットして進捗を通知する）。
+    パスワードハッシュはチャンクごとにプロセスプールでまとめて計算する。
+    
+    Args:
+        source: CSVのテキストストリーム（username, full_name, email, password, role, school_id 列）
+        progress: 進捗通知のコールバック progress(処理済み行数)（オプション）
+        write_rows: チャンクのコミット後に、そのチャンクで自動生成したパスワードの行を受け取るコールバック（オプション）
+    
+    Returns:
+        dict: {'created': 作成数, 'errors': [メッセージ], 'rows': [自動生成したパスワード]}
+    """
+    csv_reader = csv.DictReader(source)
+    logging.info(f"CSV fieldnames: {csv_reader.fieldnames}")
+    
+    results = {'created': 0, 'errors': [], 'rows': []}
+    # ファイル内の重複チェック用（大文字小文字を区別しない）
+    seen_usernames = set()
+    seen_emails = set()
+    processed = 0
+    
+    for chunk in iter_row_chunks(csv_reader):  # ヘッダーを飛ばして2行目から
+        rows = []
+        for row_num, row in chunk:
+            # カラム名の正規化（空白除去、小文字化）
+            normalized_row = {}
+            for key, value in row.items():
+                if key:  # Noneキーを除外
+                    normalized_key = key.strip().lower().replace(' ', '_')
+                    normalized_row[normalized_key] = value.strip() if isinstance(value, str) else ''
+            
+            # 正規化されたキーで取得（数値ユーザー名も文字列として扱う）
+            username = str(normalized_row.get('username', '')).strip()
+            email = normalized_row.get('email', '').strip()
+            role = normalized_row.get('role', 'student').strip()
+            
+            # 必須項目の確認
+            if not username or not email or not role:
+                results['errors'].append(f"行: {row_num} - ユーザー名、メールアドレス、ロールは必須です。")
+                continue
+            
+            rows.append((row_num, username, email, role, normalized_row))
+        
+        # 既存ユーザーをまとめて取得
+        existing_users, existing_emails = load_existing_users(
+            {row[1] for row in rows},
+            {row[2] for row in rows}
+        )
+        
+        pending = []
+        for row_num, username, email, role, normalized_row in rows:
+            # 既存ユーザー・ファイル内の重複のチェック
+            if (username.lower() in existing_users or username.lower() in seen_usernames
+                    or email.lower() in existing_emails or email.lower() in seen_emails):
+                results['errors'].append(f"行: {row_num} - ユーザー名またはメールアドレスが既に使用されています: {username}, {email}")
+                continue
+            seen_usernames.add(username.lower())
+            seen_emails.add(email.lower())
+            
+            # 学校IDの処理
+            school_id = normalized_row.get('school_id', '').strip()
+            try:
+                school_id = int(school_id) if school_id else None
+            except ValueError:
+                school_id = None
+            
+            password = normalized_row.get('password', '').strip()
+            pending.append({
+                'username': username,
+                'full_name': normalized_row.get('full_name', '').strip(),
+                'email': email,
+                'password': password or generate_random_password(),
+                'generated': not password,
+                'role': role,
+                'school_id': school_id
+            })
+        
+        written = len(results['rows'])
+        if pending:
+            _create_users(pending, results)
+        
+        db.session.commit()
+        # コミットしたユーザーのパスワードは後のチャンクが失敗しても失われないようにすぐ渡す
+        if write_rows and len(results['rows']) > written:
+            write_rows(results['rows'][written:])
+        processed += len(chunk)
+        if progress:
+            progress(processed)
+    
+    return results
+
+def run_user_import(job, progress):
+    """ユーザーインポートジョブのハンドラ（app/utils/background_jobs.py から呼ばれる）"""
+    with open_upload(job) as source:
+        results = import_users_from_csv(source, progress, write_rows=lambda rows: append_results(job.id, rows))
+    del results['rows']
+    return results
+
 # ユーザー一括インポート
 @admin_bp.route('/import_users', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def import_users():
-    """ユーザー一括インポート"""
+    """ユーザー一括インポート（CSVの処理はバックグラウンドジョブで行う）"""
     if request.method == 'POST':
         if 'csv_file' not in request.files:
             flash('CSVファイルが選択されていません。')
@@ -59,132 +208,19 @@ def import_users():
             flash(f'CSVファイルエラー: {error_message}')
             return redirect(request.url)
         
-        if is_valid:
-            try:
-                # CSVファイルを読み込む
-                stream = io.StringIO(csv_content)
-                csv_reader = csv.DictReader(stream)
-                
-                # ヘッダー情報をログに出力
-                current_app.logger.info(f"CSV fieldnames: {csv_reader.fieldnames}")
-                flash(f"CSVヘッダー: {csv_reader.fieldnames}", 'info')  # デバッグ用
-                
-                # 成功と失敗のカウンター
-                success_count = 0
-                error_count = 0
-                error_messages = []
-                
-                # CSVの各行を処理
-                for row_num, row in enumerate(csv_reader, start=2):  # ヘッダーを飛ばして2行目から
-                    try:
-                        # デバッグ: 元のrow内容を出力
-                        current_app.logger.debug(f"Row {row_num} original: {row}")
-                        
-                        # カラム名の正規化（空白除去、小文字化）
-                        normalized_row = {}
-                        for key, value in row.items():
-                            if key:  # Noneキーを除外
-                                normalized_key = key.strip().lower().replace(' ', '_')
-                                normalized_row[normalized_key] = value.strip() if value else ''
-                        
-                        current_app.logger.debug(f"Row {row_num} normalized: {normalized_row}")
-                        
-                        # 正規化されたキーで取得
-                        username = str(normalized_row.get('username', '')).strip()
-                        full_name = normalized_row.get('full_name', '').strip()
-                        email = normalized_row.get('email', '').strip()
-                        password = normalized_row.get('password', '').strip()
-                        role = normalized_row.get('role', 'student').strip()
-                        school_id = normalized_row.get('school_id', '').strip()
-                        
-                        # 必須項目の確認
-                        if not username or not email or not role:
-                            error_count += 1
-                            error_messages.append(f"行: {row_num} - ユーザー名、メールアドレス、ロールは必須です。")
-                            continue
-                        
-                        # 数値ユーザー名の文字列変換
-                        username = str(username)
-                        
-                        # 既存ユーザーのチェック
-                        existing_user = User.query.filter(
-                            (User.username == username) | (User.email == email)
-                        ).first()
-                        
-                        if existing_user:
-                            error_count += 1
-                            error_messages.append(f"行: {row_num} - ユーザー名またはメールアドレスが既に使用されています: {username}, {email}")
-                            continue
-                        
-                        # 学校IDの処理
-                        try:
-                            school_id = int(school_id) if school_id else None
-                        except ValueError:
-                            school_id = None
-                        
-                        # パスワードの生成または取得
-                        if not password:
-                            password = generate_random_password()
-                        
-                        # ユーザー作成
-                        new_user = User(
-                            username=username,
-                            full_name=full_name or username,  # full_nameがない場合はusernameを使用
-                            email=email,
-                            password=generate_password_hash(password),
-                            role=role,
-                            school_id=school_id,
-                            email_confirmed=True,  # CSV登録ユーザーは確認済み
-                            is_approved=(role != 'student')  # 学生以外は自動承認
-                        )
-                        
-                        db.session.add(new_user)
-                        db.session.flush()  # ユーザーIDを取得するため
-                        
-                        # 確認メール送信を試行
-                        try:
-                            token = secrets.token_urlsafe(32)
-                            send_confirmation_email(
-                                new_user.email, 
-                                new_user.id, 
-                                token, 
-                                new_user.username
-                            )
-                        except Exception as e:
-                            logging.warning(f"Failed to send confirmation email to {new_user.email}: {str(e)}")
-                        
-                        success_count += 1
-                        
-                    except Exception as e:
-                        error_count += 1
-                        error_messages.append(f"行: {row_num} - エラー: {str(e)}")
-                        db.session.rollback()  # エラー時はロールバック
-                
-                # 変更をコミット
-                if success_count > 0:
-                    try:
-                        db.session.commit()
-                        flash(f'{success_count}人のユーザーを正常にインポートしました。', 'success')
-                    except Exception as e:
-                        db.session.rollback()
-                        flash(f'データベースへの保存中にエラーが発生しました: {str(e)}', 'error')
-                        return redirect(url_for('admin_panel.import_users'))
-                
-                if error_count > 0:
-                    flash(f'{error_count}件のエラーが発生しました。', 'warning')
-                    for msg in error_messages[:10]:  # 最初の10件のエラーのみ表示
-                        flash(msg, 'error')
-                    if len(error_messages) > 10:
-                        flash(f'他に{len(error_messages) - 10}件のエラーがあります。', 'warning')
-                
-                return redirect(url_for('admin_panel.users'))
-                
-            except Exception as e:
-                flash(f'CSVファイルの処理中にエラーが発生しました: {str(e)}')
-                return redirect(request.url)
-        else:
-            flash('CSVファイルの形式が正しくありません。')
+        try:
+            job = create_import_job('admin_users', file, current_user.id)
+        except Exception as e:
+            db.session.rollback()
+            flash(f'CSVファイルの処理中にエラーが発生しました: {str(e)}')
             return redirect(request.url)
+        
+        return render_template('background_job.html',
+                             job=job,
+                             title='ユーザー一括インポート',
+                             unit='行',
+                             results_message=PASSWORD_RESULTS_MESSAGE,
+                             back_url=url_for('admin_panel.users'))
     
     # GETリクエスト処理（フォーム表示）
     return render_template('admin/import_users.html')
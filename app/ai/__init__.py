@@ -1,30 +1,17 @@
 # app/ai/__init__.py
-from flask import Blueprint
+from flask import Blueprint, current_app, has_app_context
 import os
 import re
 import json
 import logging
 from datetime import datetime
 
-# OpenAIクライアントの初期化
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-if not OPENAI_API_KEY:
+# OpenAI APIの呼び出しはプロセスで共有するクライアント（gateway）を通す
+from .gateway import AIGatewayError, chat_completion, is_available, stream_chat_completion
+from .context import DEFAULT_TOKEN_BUDGET, pack_turns
+
+if not os.getenv('OPENAI_API_KEY'):
     logging.error("OPENAI_API_KEY not found in environment variables")
-    client = None
-else:
-    try:
-        from openai import OpenAI
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        logging.info("OpenAI client initialized successfully")
-    except ImportError:
-        # 古いバージョンのOpenAI
-        import openai
-        openai.api_key = OPENAI_API_KEY
-        client = None
-        logging.warning("Using legacy OpenAI library")
-    except Exception as e:
-        logging.error(f"Failed to initialize OpenAI client: {e}")
-        client = None
 
 ai_bp = Blueprint('ai', __name__)
 
@@ -44,22 +31,25 @@ except ImportError:
     def generate_system_prompt(*args, **kwargs): return ""
     def call_openai_api(*args, **kwargs): return ""
 
-def generate_student_evaluation(student, theme, goals, activity_logs, curriculum_data, rubric_data):
+# 評価のプロンプトに含める学習記録の件数（新しい順）
+EVALUATION_ACTIVITY_LIMIT = 5
+
+EVALUATION_SYSTEM_PROMPT = "あなたは教師として、探究学習における生徒の評価を行います。"
+
+def build_student_evaluation_prompt(student, theme, goals, activity_logs, rubric_data):
     """
-    OpenAI APIを使用して学生の評価を生成する
+    学生の評価を生成するためのプロンプトを作成する
     
     Args:
         student: 学生のUserオブジェクト
         theme: 選択中の探究テーマ
         goals: 設定された目標のリスト
-        activity_logs: 学習記録のリスト
-        curriculum_data: カリキュラムデータ
+        activity_logs: 学習記録のリスト（新しい順）
         rubric_data: ルーブリックデータ
         
     Returns:
-        生成された評価文字列
+        プロンプト文字列
     """
-    # プロンプトの作成
     prompt = f"以下の情報に基づいて、学生 {student.username} の探究学習の評価を100〜150文字で生成してください。\n\n"
     
     # テーマ情報の追加
@@ -86,8 +76,9 @@ def generate_student_evaluation(student, theme, goals, activity_logs, curriculum
     # 学習記録の追加
     prompt += "\n【最近の学習記録】\n"
     if activity_logs:
-        for log in activity_logs[:5]:  # 最新5件まで
-            prompt += f"- {log.date.strftime('%Y-%m-%d')} {log.title if log.title else '（タイトルなし）'}\n"
+        for log in activity_logs[:EVALUATION_ACTIVITY_LIMIT]:
+            date_str = log.date.strftime('%Y-%m-%d') if log.date else ''
+            prompt += f"- {date_str} {log.title if log.title else '（タイトルなし）'}\n"
             if log.content:
                 prompt += f"  {log.content[:100]}{'...' if len(log.content) > 100 else ''}\n"
     else:
@@ -109,40 +100,54 @@ def generate_student_evaluation(student, theme, goals, activity_logs, curriculum
     prompt += "4. 今後の改善点や期待\n\n"
     prompt += "評価は100〜150字程度に収め、客観的かつ建設的な内容にしてください。"
     
-    try:
-        # OpenAI APIが利用可能かチェック
-        if not client:
-            logging.warning("OpenAI client not available, returning fallback evaluation")
-            return f"学生 {student_name} の学習への取り組みを評価いたします。システムの制約により、詳細な評価はできませんが、継続的な学習努力を評価しています。"
+    return prompt
+
+def request_student_evaluation(prompt):
+    """
+    評価のプロンプトをOpenAI APIに送る
+    
+    データベースやアプリケーションコンテキストを使わないため、別スレッドからも呼び出せる。
+    
+    Returns:
+        生成された評価文字列
         
-        # OpenAI APIの呼び出し
-        if client:
-            # 新しいAPI
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "あなたは教師として、探究学習における生徒の評価を行います。"},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=200,
-                temperature=0.7
-            )
-            evaluation = response.choices[0].message.content.strip()
-        else:
-            # 古いAPI
-            import openai
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "あなたは教師として、探究学習における生徒の評価を行います。"},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=200,
-                temperature=0.7
-            )
-            evaluation = response.choices[0].message['content'].strip()
+    Raises:
+        AIGatewayError: OpenAI APIが利用できない場合
+        Exception: APIの呼び出しに失敗した場合
+    """
+    return chat_completion(
+        [
+            {"role": "system", "content": EVALUATION_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        model="gpt-3.5-turbo",
+        max_tokens=200,
+        temperature=0.7
+    ).strip()
+
+def generate_student_evaluation(student, theme, goals, activity_logs, curriculum_data, rubric_data):
+    """
+    OpenAI APIを使用して学生の評価を生成する
+    
+    Args:
+        student: 学生のUserオブジェクト
+        theme: 選択中の探究テーマ
+        goals: 設定された目標のリスト
+        activity_logs: 学習記録のリスト
+        curriculum_data: カリキュラムデータ
+        rubric_data: ルーブリックデータ
         
-        return evaluation
+    Returns:
+        生成された評価文字列
+    """
+    # OpenAI APIが利用可能かチェック
+    if not is_available():
+        logging.warning("OpenAI client not available, returning fallback evaluation")
+        return f"学生 {student.username} の学習への取り組みを評価いたします。システムの制約により、詳細な評価はできませんが、継続的な学習努力を評価しています。"
+    
+    try:
+        prompt = build_student_evaluation_prompt(student, theme, goals, activity_logs, rubric_data)
+        return request_student_evaluation(prompt)
         
     except Exception as e:
         logging.error(f"評価生成エラー: {str(e)}")
@@ -206,31 +211,16 @@ def generate_personal_themes_with_ai(main_theme, interest_responses, personality
     """
     
     try:
-        if client:
-            # 新しいAPI
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.9,
-                max_tokens=1500
-            )
-            content = response.choices[0].message.content
-        else:
-            # 古いAPI
-            import openai
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.9,
-                max_tokens=1500
-            )
-            content = response.choices[0].message['content']
+        content = chat_completion(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            model="gpt-4",
+            temperature=0.9,
+            max_tokens=1500,
+            cache_feature='personal_themes'
+        )
         
         # JSON部分を抽出（テキスト中からJSONを見つける）
         json_match = re.search(r'\[\s*{.*}\s*\]', content, re.DOTALL)
@@ -314,29 +304,16 @@ def generate_curriculum_with_ai(data):
     """
     
     try:
-        if client:
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.8,
-                max_tokens=2000
-            )
-            content = response.choices[0].message.content
-        else:
-            import openai
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.8,
-                max_tokens=2000
-            )
-            content = response.choices[0].message['content']
+        content = chat_completion(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            model="gpt-4",
+            temperature=0.8,
+            max_tokens=2000,
+            cache_feature='curriculum'
+        )
         
         # JSON部分を抽出
         json_match = re.search(r'\{.*\}', content, re.DOTALL)
@@ -406,17 +383,20 @@ def format_survey_responses(responses):
     
     return "\n".join(formatted)
 
-def generate_chat_response(message, context=None, subject=None):
+CHAT_ERROR_MESSAGE = "申し訳ございません。現在、応答を生成できません。しばらくしてからもう一度お試しください。"
+
+def build_chat_messages(message, context=None, subject=None, summary=None):
     """
-    チャットメッセージに対するAI応答を生成
+    チャットのAPIに送るメッセージを作成
     
     Args:
         message: ユーザーからのメッセージ
-        context: 会話のコンテキスト（オプション）
+        context: 会話のコンテキスト（オプション、トークン数の予算に入る新しい発言だけを使う）
         subject: Subjectモデルのインスタンス（教科情報）
+        summary: コンテキストより前の会話の要約（オプション）
         
     Returns:
-        AIの応答テキスト
+        list: 会話メッセージのリスト
     """
     # 基本のシステムプロンプト
     system_prompt = """
@@ -435,38 +415,81 @@ def generate_chat_response(message, context=None, subject=None):
     
     messages = [{"role": "system", "content": system_prompt}]
     
+    # 古い会話の要約がある場合は追加
+    if summary:
+        messages.append({"role": "system", "content": f"【これまでの会話の要約】\n{summary}"})
+    
     # コンテキストがある場合は追加
     if context:
-        for ctx in context[-5:]:  # 最新5件のコンテキストのみ使用
+        budget = current_app.config.get('CHAT_CONTEXT_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET) if has_app_context() \
+            else DEFAULT_TOKEN_BUDGET
+        for ctx in pack_turns(context, budget):
             messages.append({
                 "role": "user" if ctx.get('is_user') else "assistant",
                 "content": ctx.get('message', '')
             })
     
     messages.append({"role": "user", "content": message})
+    return messages
+
+def generate_chat_response(message, context=None, subject=None, summary=None):
+    """
+    チャットメッセージに対するAI応答を生成
+    
+    Args:
+        message: ユーザーからのメッセージ
+        context: 会話のコンテキスト（オプション）
+        subject: Subjectモデルのインスタンス（教科情報）
+        summary: コンテキストより前の会話の要約（オプション）
+        
+    Returns:
+        AIの応答テキスト
+    """
+    try:
+        return chat_completion(
+            build_chat_messages(message, context, subject, summary),
+            model="gpt-3.5-turbo",
+            temperature=0.8,
+            max_tokens=500
+        ).strip()
+        
+    except Exception as e:
+        logging.error(f"チャット応答生成エラー: {str(e)}")
+        return CHAT_ERROR_MESSAGE
+
+def stream_chat_response(message, context=None, subject=None, summary=None):
+    """
+    チャットメッセージに対するAI応答を生成された順に返す
     
+    Args:
+        generate_chat_response と同じ
+        
+    Yields:
+        str: 応答テキストの断片（応答を始める前にエラーになった場合はエラーメッセージ）
+        
+    Raises:
+        Exception: 応答の途中でエラーになった場合（返した断片は応答の一部だけ）
+    """
+    started = False
     try:
-        if client:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=0.8,
-                max_tokens=500
-            )
-            return response.choices[0].message.content.strip()
-        else:
-            import openai
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=0.8,
-                max_tokens=500
-            )
-            return response.choices[0].message['content'].strip()
+        for content in stream_chat_completion(
+            build_chat_messages(message, context, subject, summary),
+            model="gpt-3.5-turbo",
+            temperature=0.8,
+            max_tokens=500
+        ):
+            if not started:
+                content = content.lstrip()
+                if not content:
+                    continue
+                started = True
+            yield content
         
     except Exception as e:
         logging.error(f"チャット応答生成エラー: {str(e)}")
-        return "申し訳ございません。現在、応答を生成できません。しばらくしてからもう一度お試しください。"
+        if started:
+            raise
+        yield CHAT_ERROR_MESSAGE
 
 # エクスポート
 __all__ = [
@@ -476,6 +499,7 @@ __all__ = [
     'generate_curriculum_with_ai',
     'format_survey_responses',
     'generate_chat_response',
+    'stream_chat_response',
     'LEARNING_STEPS',
     'TEACHER_FUNCTIONS',
     'generate_system_prompt',
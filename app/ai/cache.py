@@ -0,0 +1,287 @@
+# app/ai/cache.py
+"""
+AI応答のキャッシュ
+
+同じモデル・メッセージ・パラメータでの呼び出しには保存済みの応答を返し、
+APIの待ち時間と利用料金を減らす。キーはこれらの内容のハッシュ（SHA-256）。
+メッセージ中の空白の違い（インデントや改行）は同じ内容として扱う。
+
+- 保存先: Redis（設定 AI_CACHE_REDIS_URL、未設定なら REDIS_URL）に接続できればRedis、
+  できなければローカルのSQLiteファイル（設定 AI_CACHE_PATH）
+- 保存期間は設定 AI_CACHE_TTL、件数の上限は AI_CACHE_MAX_ENTRIES（超えたら最後に使われた時刻が古いものから削除）
+- キャッシュするのは設定 AI_CACHE_FEATURES に含まれる機能だけ（gateway.chat_completion の cache_feature）
+- 機能ごとのヒット・ミスの件数を記録し、get_cache_stats で取得できる
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing
+
+from flask import current_app, has_app_context
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# 設定がない場合の値
+# 生徒が作り直すたびに別の候補を出す個人テーマ（'personal_themes'）は設定で有効にした場合だけ
+DEFAULT_FEATURES = ('curriculum', 'daily_summary')
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 10000
+SQLITE_FILENAME = 'ai_cache.sqlite3'
+REDIS_KEY_PREFIX = 'quested:ai_cache:'
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _config(name, default=None):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return os.getenv(name, default)
+
+
+def make_cache_key(params):
+    """
+    呼び出しの内容からキャッシュのキーを作成する
+
+    Args:
+        params: model, messages, temperature, max_tokens などのdict
+
+    Returns:
+        str: SHA-256の16進文字列
+    """
+    normalized = dict(params)
+    normalized['messages'] = [
+        {'role': message.get('role'), 'content': ' '.join(str(message.get('content', '')).split())}
+        for message in params.get('messages', [])
+    ]
+    encoded = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class RedisCacheBackend:
+    """Redisに保存する（期限はRedisのTTL、件数の上限は最終利用時刻のソート済みセットで管理）"""
+
+    name = 'redis'
+
+    def __init__(self, client, ttl, max_entries):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lru_key = f'{REDIS_KEY_PREFIX}lru'
+        self.stats_key = f'{REDIS_KEY_PREFIX}stats'
+
+    def get(self, key):
+        value = self.client.get(f'{REDIS_KEY_PREFIX}{key}')
+        if value is None:
+            return None
+        self.client.zadd(self.lru_key, {key: time.time()})
+        return value.decode('utf-8')
+
+    def set(self, key, value):
+        pipe = self.client.pipeline()
+        pipe.setex(f'{REDIS_KEY_PREFIX}{key}', self.ttl, value)
+        pipe.zadd(self.lru_key, {key: time.time()})
+        pipe.zcard(self.lru_key)
+        size = pipe.execute()[-1]
+
+        if size > self.max_entries:
+            evicted = [member for member, _ in self.client.zpopmin(self.lru_key, size - self.max_entries)]
+            if evicted:
+                self.client.delete(*[f'{REDIS_KEY_PREFIX}{member.decode("utf-8")}' for member in evicted])
+
+    def record(self, feature, hit):
+        self.client.hincrby(self.stats_key, f'{feature}:{"hits" if hit else "misses"}', 1)
+
+    def stats(self):
+        counts = {}
+        for field, value in self.client.hgetall(self.stats_key).items():
+            feature, kind = field.decode('utf-8').rsplit(':', 1)
+            counts.setdefault(feature, {'hits': 0, 'misses': 0})[kind] = int(value)
+        return counts
+
+
+class SqliteCacheBackend:
+    """ローカルのSQLiteファイルに保存する（Redisが使えない場合）"""
+
+    name = 'sqlite'
+
+    def __init__(self, path, ttl, max_entries):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS ai_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_ai_cache_accessed_at ON ai_cache (accessed_at)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS ai_cache_stats ('
+                'feature TEXT PRIMARY KEY, hits INTEGER NOT NULL DEFAULT 0, misses INTEGER NOT NULL DEFAULT 0)'
+            )
+
+    def _connect(self):
+        # 呼び出しごとに接続する（スレッド・プロセス間で接続を共有しない）
+        return closing(sqlite3.connect(self.path, timeout=5, isolation_level=None))
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute(
+                'SELECT value, created_at FROM ai_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                connection.execute('DELETE FROM ai_cache WHERE key = ?', (key,))
+                return None
+            connection.execute('UPDATE ai_cache SET accessed_at = ? WHERE key = ?', (now, key))
+            return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO ai_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, value, now, now)
+            )
+            connection.execute('DELETE FROM ai_cache WHERE created_at < ?', (now - self.ttl,))
+            connection.execute(
+                'DELETE FROM ai_cache WHERE key IN ('
+                'SELECT key FROM ai_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def record(self, feature, hit):
+        column = 'hits' if hit else 'misses'
+        with self._connect() as connection:
+            connection.execute(
+                f'INSERT INTO ai_cache_stats (feature, {column}) VALUES (?, 1) '
+                f'ON CONFLICT(feature) DO UPDATE SET {column} = {column} + 1',
+                (feature,)
+            )
+
+    def stats(self):
+        with self._connect() as connection:
+            rows = connection.execute('SELECT feature, hits, misses FROM ai_cache_stats').fetchall()
+        return {feature: {'hits': hits, 'misses': misses} for feature, hits, misses in rows}
+
+
+class ResponseCache:
+    """AI応答のキャッシュ（保存先の違いを吸収し、保存先のエラーでAI呼び出しを止めない）"""
+
+    def __init__(self, backend, features):
+        self.backend = backend
+        self.features = set(features)
+
+    def enabled_for(self, feature):
+        return feature in self.features
+
+    def get(self, feature, params):
+        key = make_cache_key(params)
+        try:
+            value = self.backend.get(key)
+            self.backend.record(feature, value is not None)
+            return value
+        except Exception as e:
+            logging.warning(f"AI応答キャッシュの読み込みに失敗しました: {e}")
+            return None
+
+    def set(self, params, value):
+        try:
+            self.backend.set(make_cache_key(params), value)
+        except Exception as e:
+            logging.warning(f"AI応答キャッシュの保存に失敗しました: {e}")
+
+    def stats(self):
+        counts = self.backend.stats()
+        for values in counts.values():
+            total = values['hits'] + values['misses']
+            values['hit_rate'] = round(values['hits'] / total, 3) if total else 0.0
+        return counts
+
+
+def _features():
+    features = _config('AI_CACHE_FEATURES', None)
+    if features is None:
+        return DEFAULT_FEATURES
+    if isinstance(features, str):
+        return [feature.strip() for feature in features.split(',') if feature.strip()]
+    return features
+
+
+def _create_backend():
+    ttl = int(_config('AI_CACHE_TTL', None) or DEFAULT_TTL)
+    max_entries = int(_config('AI_CACHE_MAX_ENTRIES', None) or DEFAULT_MAX_ENTRIES)
+
+    redis_url = _config('AI_CACHE_REDIS_URL', None) or os.getenv('REDIS_URL')
+    if REDIS_AVAILABLE and redis_url:
+        try:
+            client = redis.Redis.from_url(redis_url, socket_connect_timeout=1, socket_timeout=1)
+            client.ping()
+            return RedisCacheBackend(client, ttl, max_entries)
+        except Exception as e:
+            logging.warning(f"AI応答キャッシュにRedisを使えないためSQLiteを使います: {e}")
+
+    path = _config('AI_CACHE_PATH', None)
+    if not path:
+        directory = current_app.instance_path if has_app_context() else tempfile.gettempdir()
+        path = os.path.join(directory, SQLITE_FILENAME)
+    return SqliteCacheBackend(path, ttl, max_entries)
+
+
+def get_response_cache():
+    """
+    プロセスで共有するキャッシュ
+
+    Returns:
+        ResponseCache: キャッシュ。設定 AI_CACHE_ENABLED が無効の場合や保存先を用意できない場合はNone
+    """
+    global _cache
+    if _cache is not None:
+        return _cache
+
+    enabled = _config('AI_CACHE_ENABLED', True)
+    if isinstance(enabled, str):
+        enabled = enabled.lower() in ('true', '1', 'yes', 'on')
+    if not enabled:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ResponseCache(_create_backend(), _features())
+            except Exception as e:
+                logging.warning(f"AI応答キャッシュを初期化できませんでした: {e}")
+                return None
+    return _cache
+
+
+def reset_response_cache():
+    """共有キャッシュを作り直す（設定を変更した場合やテスト用）"""
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def get_cache_stats():
+    """機能ごとのヒット・ミスの件数とヒット率"""
+    cache = get_response_cache()
+    if cache is None:
+        return {}
+    try:
+        return cache.stats()
+    except Exception as e:
+        logging.warning(f"AI応答キャッシュの統計を取得できませんでした: {e}")
+        return {}
@@ -0,0 +1,294 @@
+# app/ai/context.py
+"""
+チャットの会話コンテキストの組み立て
+
+AIに送る会話履歴をトークン数の予算（設定 CHAT_CONTEXT_TOKEN_BUDGET）に収める。
+- トークン数は tiktoken（インストールされている場合）で数え、ない場合は文字数から見積もる
+- 新しい発言から順に予算に入るだけ含める（長いAIの回答があっても送る量は変わらない）
+- 予算から外れた古い発言は（ユーザー, クラス）ごとの要約（ChatSummary）にまとめ、
+  要約をシステムメッセージとして送る。要約の更新はバックグラウンドのスレッドで行う
+- 要約の更新では、要約済みの発言の次から古い順に SUMMARY_INPUT_TOKENS まで読み込む
+  （要約に入っていない発言がたまっていても読み飛ばさない）
+"""
+import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from app.models import ChatHistory, ChatSummary
+from .gateway import chat_completion
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# 設定がない場合の値
+DEFAULT_TOKEN_BUDGET = 1500  # 会話履歴に使うトークン数
+DEFAULT_SUMMARY_MAX_TOKENS = 300  # 要約の長さ
+DEFAULT_HISTORY_LIMIT = 50  # 予算に詰める候補として読み込む発言の数
+
+# 1メッセージあたりの書式のトークン数（role など）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 要約に入っていない発言がこの数以上たまったら要約を更新する
+SUMMARY_MIN_MESSAGES = 4
+
+# 1回の要約の更新で読み込む発言のトークン数の上限（残りは次回の更新で要約する）
+SUMMARY_INPUT_TOKENS = 3000
+
+SUMMARY_PROMPT = """以下はユーザーとAIアシスタントの会話の要約と、その後の会話です。
+会話の続きで参照できるよう、ユーザーの目的・取り組んでいる内容・決まったこと・未解決の質問を
+{max_chars}文字以内の日本語で要約してください。要約だけを出力してください。
+
+【これまでの要約】
+{summary}
+
+【その後の会話】
+{turns}"""
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+@lru_cache(maxsize=8)
+def _encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """
+    テキストのトークン数
+
+    tiktoken がない場合は、ASCII文字は4文字で1トークン、日本語などそれ以外の文字は1文字1トークンとして見積もる。
+    """
+    if not text:
+        return 0
+    if TIKTOKEN_AVAILABLE:
+        return len(_encoding(model).encode(text))
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return math.ceil(ascii_chars / 4) + (len(text) - ascii_chars)
+
+
+def pack_turns(turns, budget, model="gpt-3.5-turbo"):
+    """
+    新しい発言から順に、トークン数の予算に入るだけ選ぶ
+
+    Args:
+        turns: 発言のリスト（古い順、{'is_user': bool, 'message': str} の形）
+        budget: トークン数の予算
+
+    Returns:
+        list: 選んだ発言（古い順）
+    """
+    packed = []
+    used = 0
+    for turn in reversed(turns):
+        tokens = count_tokens(turn.get('message', ''), model) + MESSAGE_OVERHEAD_TOKENS
+        if used + tokens > budget:
+            break
+        packed.append(turn)
+        used += tokens
+    packed.reverse()
+    return packed
+
+
+def _setting(name, default):
+    return current_app.config.get(name, default)
+
+
+def _find_summary(user_id, class_id):
+    return ChatSummary.query.filter_by(user_id=user_id, class_key=ChatSummary.key_for(class_id)).first()
+
+
+def _history_query(user_id, class_id, after_id=None, before_id=None):
+    query = ChatHistory.query.filter_by(user_id=user_id, class_id=class_id)
+    if after_id:
+        query = query.filter(ChatHistory.id > after_id)
+    if before_id:
+        query = query.filter(ChatHistory.id < before_id)
+    return query
+
+
+def _recent_history(user_id, class_id, after_id=None, limit=None):
+    rows = _history_query(user_id, class_id, after_id).order_by(ChatHistory.id.desc()).limit(
+        limit or _setting('CHAT_HISTORY_LIMIT', DEFAULT_HISTORY_LIMIT)
+    ).all()
+    rows.reverse()
+    return rows
+
+
+def _summary_input(user_id, class_id, after_id, before_id, model):
+    """
+    要約に入っていない発言を古い順に読み、SUMMARY_INPUT_TOKENS に入るだけ選ぶ
+
+    CHAT_HISTORY_LIMIT 件ずつ発言IDの順に読み進める（発言が多くても1回に読み込む量は変わらない）。
+
+    Args:
+        after_id: 要約済みの最後の発言ID（ない場合はNone）
+        before_id: 予算に入る最も古い発言ID（これより前が要約の対象、ない場合はNone）
+
+    Returns:
+        list: 選んだ発言（ChatHistory、古い順）
+    """
+    page_size = _setting('CHAT_HISTORY_LIMIT', DEFAULT_HISTORY_LIMIT)
+    selected = []
+    used = 0
+    while True:
+        page = _history_query(user_id, class_id, after_id, before_id).order_by(ChatHistory.id).limit(page_size).all()
+        for row in page:
+            tokens = count_tokens(row.message, model)
+            # 長い場合は古い発言から入るだけまとめる（残りは次回の更新で要約する）
+            if selected and used + tokens > SUMMARY_INPUT_TOKENS:
+                return selected
+            selected.append(row)
+            used += tokens
+        if len(page) < page_size:
+            return selected
+        after_id = page[-1].id
+
+
+def _split_history(rows, summary, model):
+    """
+    履歴を、予算に入る新しい発言と要約に入っていない古い発言に分ける
+
+    Returns:
+        tuple: (予算に入る発言のリスト, 要約に入っていない予算外の発言（ChatHistory）のリスト)
+    """
+    budget = _setting('CHAT_CONTEXT_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET)
+    if summary and summary.summary:
+        budget -= count_tokens(summary.summary, model) + MESSAGE_OVERHEAD_TOKENS
+
+    turns = [{'id': row.id, 'is_user': row.is_user, 'message': row.message} for row in rows]
+    packed = pack_turns(turns, max(budget, 0), model)
+    packed_ids = {turn['id'] for turn in packed}
+
+    summarized_until = summary.last_message_id if summary else 0
+    unsummarized = [row for row in rows if row.id not in packed_ids and row.id > (summarized_until or 0)]
+    return packed, unsummarized
+
+
+def build_chat_context(user_id, class_id, model="gpt-3.5-turbo"):
+    """
+    AIに送る会話履歴と要約を用意する
+
+    予算から外れた発言が要約に入っていない場合は、バックグラウンドで要約を更新する。
+
+    Args:
+        user_id: ユーザーID
+        class_id: クラスID（クラスを選んでいない場合はNone）
+
+    Returns:
+        tuple: (会話のコンテキスト（古い順、{'is_user', 'message'} のリスト）, 要約（ない場合はNone）)
+    """
+    summary = _find_summary(user_id, class_id)
+    rows = _recent_history(user_id, class_id, after_id=summary.last_message_id if summary else None)
+    packed, unsummarized = _split_history(rows, summary, model)
+
+    if len(unsummarized) >= SUMMARY_MIN_MESSAGES:
+        schedule_summary_refresh(user_id, class_id)
+
+    context = [{'is_user': turn['is_user'], 'message': turn['message']} for turn in packed]
+    return context, (summary.summary if summary and summary.summary else None)
+
+
+def _format_turns(rows):
+    return "\n".join(f"{'ユーザー' if row.is_user else 'AI'}: {row.message}" for row in rows)
+
+
+def refresh_chat_summary(user_id, class_id, model="gpt-3.5-turbo"):
+    """
+    予算から外れた発言をこれまでの要約にまとめ直す
+
+    Returns:
+        bool: 要約を更新した場合はTrue
+    """
+    summary = _find_summary(user_id, class_id)
+    after_id = summary.last_message_id if summary else None
+    packed, _ = _split_history(_recent_history(user_id, class_id, after_id=after_id), summary, model)
+
+    # 予算に入る発言より前で、要約に入っていない発言が対象
+    before_id = packed[0]['id'] if packed else None
+    if _history_query(user_id, class_id, after_id, before_id).count() < SUMMARY_MIN_MESSAGES:
+        return False
+    selected = _summary_input(user_id, class_id, after_id, before_id, model)
+
+    max_tokens = _setting('CHAT_SUMMARY_MAX_TOKENS', DEFAULT_SUMMARY_MAX_TOKENS)
+    prompt = SUMMARY_PROMPT.format(
+        max_chars=max_tokens,
+        summary=summary.summary if summary and summary.summary else 'なし',
+        turns=_format_turns(selected)
+    )
+    text = chat_completion(
+        [{"role": "user", "content": prompt}],
+        model=model,
+        temperature=0.3,
+        max_tokens=max_tokens
+    ).strip()
+    if not text:
+        return False
+
+    if summary is None:
+        summary = ChatSummary(user_id=user_id, class_id=class_id, class_key=ChatSummary.key_for(class_id))
+        db.session.add(summary)
+    summary.summary = text
+    summary.last_message_id = selected[-1].id
+    summary.updated_at = datetime.utcnow()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 別のプロセスが同じユーザー・クラスの要約を先に作成した場合はそちらを残す
+        db.session.rollback()
+        return False
+    return True
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chat-summary')
+    return _executor
+
+
+def _refresh_in_app_context(app, key):
+    try:
+        with app.app_context():
+            refresh_chat_summary(*key)
+    except Exception as e:
+        logging.error(f"チャットの要約の更新エラー: {e}")
+    finally:
+        with _executor_lock:
+            _pending.discard(key)
+
+
+def schedule_summary_refresh(user_id, class_id):
+    """
+    要約の更新をバックグラウンドで実行する（同じユーザー・クラスの更新は重ねて登録しない）
+
+    Returns:
+        bool: 登録した場合はTrue（設定 CHAT_SUMMARY_ENABLED が無効の場合や更新中の場合はFalse）
+    """
+    if not _setting('CHAT_SUMMARY_ENABLED', True):
+        return False
+
+    key = (user_id, class_id)
+    with _executor_lock:
+        if key in _pending:
+            return False
+        _pending.add(key)
+
+    app = current_app._get_current_object()
+    _get_executor().submit(_refresh_in_app_context, app, key)
+    return True
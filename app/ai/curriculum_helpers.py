@@ -4,6 +4,8 @@ import json
 import csv
 import io
 
+from .gateway import chat_completion
+
 def generate_curriculum_with_ai(class_details, curriculum_settings):
     """
     AIを使用してカリキュラムを生成する
@@ -78,46 +80,17 @@ def generate_curriculum_with_ai(class_details, curriculum_settings):
     """
     
     try:
-        # APIキーの取得
-        api_key = os.getenv('OPENAI_API_KEY')
-        
-        # 新しいAPIスタイルを試す
-        try:
-            from openai import OpenAI
-            client = OpenAI(api_key=api_key)
-            
-            # OpenAI APIを呼び出す
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=3000
-            )
-            
-            # APIレスポンスからカリキュラム内容を抽出
-            content = response.choices[0].message.content
-            
-        except (ImportError, AttributeError):
-            # 古いAPIスタイルにフォールバック
-            import openai
-            openai.api_key = api_key
-            
-            # OpenAI APIを呼び出す
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=3000
-            )
-            
-            # APIレスポンスからカリキュラム内容を抽出
-            content = response.choices[0].message['content']
+        # OpenAI APIを呼び出す（共有クライアント）
+        content = chat_completion(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            model="gpt-4",
+            temperature=0.7,
+            max_tokens=3000,
+            cache_feature='curriculum'
+        )
         
         # JSONとして解析
         try:
@@ -0,0 +1,314 @@
+# app/ai/gateway.py
+"""
+OpenAI APIの呼び出し窓口
+
+AI機能からのAPI呼び出しはすべて chat_completion を通す。
+- openai>=1.0: プロセス全体で1つの OpenAI クライアントを共有し、
+  httpx のコネクションプールでHTTP接続（keep-alive）を再利用する
+- openai<1.0（旧API）: ライブラリがスレッドごとに requests のセッションを再利用する
+タイムアウト・再試行は設定（OPENAI_TIMEOUT など）で変更できる。
+再試行の間隔は指数バックオフにジッター（ランダムな揺らぎ）を加え、同時に失敗した呼び出しが
+同じタイミングで再試行しないようにする。
+cache_feature を指定した呼び出しは、その機能がキャッシュの対象なら app/ai/cache.py のキャッシュを使う。
+stream_chat_completion は応答を生成された順に少しずつ返す（チャットのSSE配信用）。
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+from flask import current_app, has_app_context
+
+from .cache import get_response_cache
+
+try:
+    import openai
+    OPENAI_AVAILABLE = True
+except ImportError:
+    openai = None
+    OPENAI_AVAILABLE = False
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+# 設定がない場合の値
+DEFAULT_SETTINGS = {
+    'OPENAI_TIMEOUT': 30.0,  # 応答を待つ時間（秒）
+    'OPENAI_CONNECT_TIMEOUT': 5.0,  # 接続を待つ時間（秒）
+    'OPENAI_MAX_RETRIES': 2,  # 一時的なエラーの再試行回数
+    'OPENAI_RETRY_BASE_DELAY': 1.0,  # 最初の再試行までの待ち時間の上限（秒、再試行ごとに倍にする）
+    'OPENAI_RETRY_MAX_DELAY': 20.0,  # 再試行までの待ち時間の上限（秒）
+    'OPENAI_MAX_CONNECTIONS': 20,  # コネクションプールの接続数
+}
+
+# 再試行する一時的なエラー（レート制限・タイムアウト・接続エラー・サーバーエラー）
+_RETRYABLE_ERROR_NAMES = (
+    'APITimeoutError', 'APIConnectionError', 'RateLimitError', 'InternalServerError',
+)
+_LEGACY_RETRYABLE_ERROR_NAMES = (
+    'Timeout', 'APIConnectionError', 'RateLimitError', 'ServiceUnavailableError', 'TryAgain',
+)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class AIGatewayError(Exception):
+    """OpenAI APIを呼び出せない場合のエラー"""
+
+
+def _setting(name):
+    """設定値（アプリケーションコンテキストの外では環境変数）"""
+    default = DEFAULT_SETTINGS[name]
+    if has_app_context() and name in current_app.config:
+        value = current_app.config[name]
+    else:
+        value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return type(default)(value)
+
+
+def _retryable_errors():
+    if not OPENAI_AVAILABLE:
+        return ()
+
+    errors = [getattr(openai, name) for name in _RETRYABLE_ERROR_NAMES if hasattr(openai, name)]
+    legacy_errors = getattr(openai, 'error', None)
+    if legacy_errors is not None:
+        errors += [getattr(legacy_errors, name) for name in _LEGACY_RETRYABLE_ERROR_NAMES
+                   if hasattr(legacy_errors, name)]
+    return tuple(errors)
+
+
+RETRYABLE_ERRORS = _retryable_errors()
+
+
+def is_legacy_api():
+    """openai<1.0（OpenAI クライアントクラスがない旧API）かどうか"""
+    return OPENAI_AVAILABLE and not hasattr(openai, 'OpenAI')
+
+
+def is_available():
+    """APIキーとopenaiライブラリがあり、APIを呼び出せるかどうか"""
+    return OPENAI_AVAILABLE and bool(os.getenv('OPENAI_API_KEY'))
+
+
+def get_client(api_key=None):
+    """
+    プロセス全体で共有する OpenAI クライアント（openai>=1.0）
+
+    Args:
+        api_key: 環境変数にAPIキーがない場合に使うキー
+
+    Returns:
+        OpenAI: クライアント。旧APIの場合やAPIキーがない場合はNone
+    """
+    global _client
+    if _client is not None or not OPENAI_AVAILABLE or is_legacy_api():
+        return _client
+
+    api_key = os.getenv('OPENAI_API_KEY') or api_key
+    if not api_key:
+        return None
+
+    with _client_lock:
+        if _client is None:
+            options = {
+                'api_key': api_key,
+                # 再試行はジッター付きで chat_completion が行う
+                'max_retries': 0,
+            }
+            if HTTPX_AVAILABLE:
+                options['timeout'] = httpx.Timeout(_setting('OPENAI_TIMEOUT'),
+                                                   connect=_setting('OPENAI_CONNECT_TIMEOUT'))
+                max_connections = _setting('OPENAI_MAX_CONNECTIONS')
+                options['http_client'] = httpx.Client(
+                    limits=httpx.Limits(max_connections=max_connections,
+                                        max_keepalive_connections=max_connections),
+                    timeout=options['timeout']
+                )
+            else:
+                options['timeout'] = _setting('OPENAI_TIMEOUT')
+            _client = openai.OpenAI(**options)
+            logging.info("OpenAI client initialized successfully")
+    return _client
+
+
+def reset_client():
+    """共有クライアントを閉じる（APIキーを変更した場合やテスト用）"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            try:
+                _client.close()
+            except Exception:
+                pass
+        _client = None
+
+
+def retry_delay(attempt):
+    """
+    再試行までの待ち時間（フルジッター付き指数バックオフ）
+
+    Args:
+        attempt: 何回目の再試行か（0から）
+    """
+    ceiling = min(_setting('OPENAI_RETRY_MAX_DELAY'), _setting('OPENAI_RETRY_BASE_DELAY') * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def _client_for(api_key=None, timeout=None):
+    """呼び出しに使うクライアント（APIキーやタイムアウトが共有クライアントと違う場合だけ設定を変える）"""
+    client = get_client(api_key)
+    options = {}
+    if api_key and api_key != client.api_key:
+        options['api_key'] = api_key
+    if timeout and timeout != _setting('OPENAI_TIMEOUT'):
+        options['timeout'] = timeout
+    if options:
+        # with_options は同じコネクションプールを使う
+        client = client.with_options(**options)
+    return client
+
+
+def _create(params, api_key=None, timeout=None):
+    """1回分のAPI呼び出し"""
+    if is_legacy_api():
+        response = openai.ChatCompletion.create(
+            api_key=api_key or os.getenv('OPENAI_API_KEY'),
+            request_timeout=timeout or _setting('OPENAI_TIMEOUT'),
+            **params
+        )
+        return response.choices[0].message['content']
+
+    response = _client_for(api_key, timeout).chat.completions.create(**params)
+    return response.choices[0].message.content
+
+
+def _create_stream(params, api_key=None, timeout=None):
+    """1回分のAPI呼び出し（ストリーミング、応答のテキストの断片を返すイテレータ）"""
+    if is_legacy_api():
+        chunks = openai.ChatCompletion.create(
+            api_key=api_key or os.getenv('OPENAI_API_KEY'),
+            request_timeout=timeout or _setting('OPENAI_TIMEOUT'),
+            stream=True,
+            **params
+        )
+        return (chunk.choices[0].delta.get('content') for chunk in chunks if chunk.choices)
+
+    chunks = _client_for(api_key, timeout).chat.completions.create(stream=True, **params)
+    return (chunk.choices[0].delta.content for chunk in chunks if chunk.choices)
+
+
+def chat_completion(messages, model="gpt-3.5-turbo", temperature=0.7, max_tokens=None,
+                    timeout=None, api_key=None, max_retries=None, cache_feature=None):
+    """
+    チャット補完APIを呼び出し、応答のテキストを返す
+
+    Args:
+        messages: 会話メッセージのリスト
+        model: 使用するモデル名
+        temperature: 応答の多様性
+        max_tokens: 最大トークン数（Noneの場合は指定しない）
+        timeout: この呼び出しのタイムアウト（秒、省略時は設定 OPENAI_TIMEOUT）
+        api_key: 環境変数とは別のAPIキーを使う場合に指定
+        max_retries: 再試行回数（省略時は設定 OPENAI_MAX_RETRIES）
+        cache_feature: 応答をキャッシュする機能名（'curriculum' など）。Noneの場合はキャッシュしない
+
+    Returns:
+        str: AIからの応答テキスト
+
+    Raises:
+        AIGatewayError: openaiライブラリかAPIキーがない場合
+        Exception: 再試行しても失敗した場合はopenaiライブラリの例外
+    """
+    if not OPENAI_AVAILABLE:
+        raise AIGatewayError("openaiライブラリがインストールされていません")
+    if not (api_key or os.getenv('OPENAI_API_KEY')):
+        raise AIGatewayError("APIキーが設定されていません")
+
+    params = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+    }
+    if max_tokens is not None:
+        params["max_tokens"] = max_tokens
+
+    cache = get_response_cache() if cache_feature else None
+    if cache is not None and cache.enabled_for(cache_feature):
+        cached = cache.get(cache_feature, params)
+        if cached is not None:
+            return cached
+    else:
+        cache = None
+
+    if max_retries is None:
+        max_retries = _setting('OPENAI_MAX_RETRIES')
+
+    for attempt in range(max_retries + 1):
+        try:
+            content = _create(params, api_key=api_key, timeout=timeout) or ''
+            if cache is not None and content:
+                cache.set(params, content)
+            return content
+        except RETRYABLE_ERRORS as e:
+            if attempt >= max_retries:
+                raise
+            delay = retry_delay(attempt)
+            logging.warning(f"OpenAI APIの一時的なエラーのため{delay:.1f}秒後に再試行します: {e}")
+            time.sleep(delay)
+
+
+def stream_chat_completion(messages, model="gpt-3.5-turbo", temperature=0.7, max_tokens=None,
+                           timeout=None, api_key=None, max_retries=None):
+    """
+    チャット補完APIをストリーミングで呼び出し、応答のテキストを生成された順に返す
+
+    一時的なエラーは最初の断片を受け取る前だけ再試行する（途中から再試行すると応答が重複するため）。
+
+    Args:
+        chat_completion と同じ（キャッシュは使わない）
+
+    Yields:
+        str: 応答テキストの断片
+
+    Raises:
+        AIGatewayError: openaiライブラリかAPIキーがない場合
+        Exception: 再試行しても失敗した場合や途中で接続が切れた場合はopenaiライブラリの例外
+    """
+    if not OPENAI_AVAILABLE:
+        raise AIGatewayError("openaiライブラリがインストールされていません")
+    if not (api_key or os.getenv('OPENAI_API_KEY')):
+        raise AIGatewayError("APIキーが設定されていません")
+
+    params = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+    }
+    if max_tokens is not None:
+        params["max_tokens"] = max_tokens
+
+    if max_retries is None:
+        max_retries = _setting('OPENAI_MAX_RETRIES')
+
+    for attempt in range(max_retries + 1):
+        started = False
+        try:
+            for content in _create_stream(params, api_key=api_key, timeout=timeout):
+                if content:
+                    started = True
+                    yield content
+            return
+        except RETRYABLE_ERRORS as e:
+            if started or attempt >= max_retries:
+                raise
+            delay = retry_delay(attempt)
+            logging.warning(f"OpenAI APIの一時的なエラーのため{delay:.1f}秒後に再試行します: {e}")
+            time.sleep(delay)
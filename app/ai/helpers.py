@@ -1,6 +1,8 @@
 # ai_helpers.py
 import os
 
+from .gateway import chat_completion
+
 # モジュールレベルで変数を定義して、エクスポートできるようにする
 LEARNING_STEPS = [
     {'id': 'theme', 'name': 'テーマ設定・問い立て'},
@@ -166,7 +168,7 @@ def generate_system_prompt(user, step_id=None, function_id=None, context=None):
 def call_openai_api(messages, api_key=None, model="gpt-4", temperature=0.7, max_tokens=None, timeout=30):
     """
     OpenAI APIを呼び出し、応答を取得する関数
-    両方のAPIバージョンをサポート
+    app/ai/gateway.py の共有クライアントを使う（両方のAPIバージョンをサポート）
     
     Args:
         messages (list): 会話メッセージのリスト
@@ -188,50 +190,15 @@ def call_openai_api(messages, api_key=None, model="gpt-4", temperature=0.7, max_
         if not api_key:
             return "APIキーが設定されていません。管理者に連絡してください。"
         
-        # 新しいAPIスタイルを試す
-        try:
-            from openai import OpenAI
-            # クライアントの初期化
-            client = OpenAI(api_key=api_key, timeout=timeout)
-            
-            # パラメータの準備
-            params = {
-                "model": model,
-                "messages": messages,
-                "temperature": temperature
-            }
-            
-            # max_tokensが指定されている場合のみ追加
-            if max_tokens is not None:
-                params["max_tokens"] = max_tokens
-            
-            # APIリクエスト送信
-            response = client.chat.completions.create(**params)
-            
-            # 応答の取得
-            return response.choices[0].message.content
-            
-        except (ImportError, AttributeError):
-            # 古いAPIスタイルにフォールバック
-            import openai
-            openai.api_key = api_key
-            
-            # パラメータの準備
-            params = {
-                "model": model,
-                "messages": messages,
-                "temperature": temperature
-            }
-            
-            # max_tokensが指定されている場合のみ追加
-            if max_tokens is not None:
-                params["max_tokens"] = max_tokens
-            
-            # APIリクエスト送信
-            response = openai.ChatCompletion.create(**params)
-            
-            # 応答の取得
-            return response.choices[0].message['content']
+        # 共有クライアントで呼び出す（接続の再利用・再試行は gateway が行う）
+        return chat_completion(
+            messages,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            api_key=api_key
+        )
     
     except Exception as e:
         # エラーをログに記録
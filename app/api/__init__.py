@@ -1,15 +1,88 @@
 # app/api/__init__.py
-from flask import Blueprint, jsonify, request, session
+from flask import Blueprint, Response, jsonify, request, session, url_for, send_file, stream_with_context
 from flask_login import login_required, current_user
 import json
 import logging
+import os
 
-from app.models import db, ChatHistory, InquiryTheme, Class, StudentEvaluation, User, Subject
-from app.ai import generate_chat_response
+from app.models import db, ChatHistory, InquiryTheme, Class, StudentEvaluation, User, Subject, BackgroundJob
+from app.ai import generate_chat_response, stream_chat_response
+from app.ai.context import build_chat_context
 from app.utils.rate_limiting import smart_ai_limit, api_limit
+from app.utils.csv_export import csv_response, stream_query
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+def _parse_chat_request():
+    """チャットのリクエストからメッセージとクラスIDを取得"""
+    if request.is_json:
+        data = request.get_json()
+        return data.get('message', ''), data.get('class_id')
+    # フォームデータの場合
+    return request.form.get('message', ''), request.form.get('class_id', type=int)
+
+def _prepare_chat(message, class_id):
+    """
+    AIに送るメッセージと会話のコンテキストを準備
+    
+    Returns:
+        tuple: (教科, 会話のコンテキスト, 古い会話の要約, テーマ情報を加えたメッセージ)
+    """
+    # クラスと教科情報を取得
+    class_obj = None
+    subject = None
+    if class_id:
+        class_obj = Class.query.get(class_id)
+        if class_obj and class_obj.subject_id:
+            subject = Subject.query.get(class_obj.subject_id)
+    
+    # コンテキストの準備（トークン数の予算に入る新しい発言と、それより前の会話の要約）
+    context_data, summary = build_chat_context(current_user.id, class_id or None)
+    
+    # 選択中のテーマを取得（学生の場合）
+    theme_context = None
+    if current_user.role == 'student':
+        if class_id:
+            theme = InquiryTheme.query.filter_by(
+                student_id=current_user.id,
+                class_id=class_id,
+                is_selected=True
+            ).first()
+        else:
+            theme = InquiryTheme.query.filter_by(
+                student_id=current_user.id, 
+                is_selected=True
+            ).first()
+        if theme:
+            theme_context = f"現在の探究テーマ: {theme.title}"
+            if theme.question:
+                theme_context += f"\n探究の問い: {theme.question}"
+    
+    # メッセージにテーマ情報を追加
+    full_message = message
+    if theme_context:
+        full_message = f"{theme_context}\n\nユーザーの質問: {message}"
+    
+    return subject, context_data, summary, full_message
+
+def _save_chat(user_id, class_id, subject_id, message, ai_response):
+    """ユーザーのメッセージとAIの返答をチャット履歴に保存"""
+    db.session.add(ChatHistory(
+        user_id=user_id,
+        class_id=class_id,
+        subject_id=subject_id,
+        message=message, 
+        is_user=True
+    ))
+    db.session.add(ChatHistory(
+        user_id=user_id,
+        class_id=class_id,
+        subject_id=subject_id,
+        message=ai_response, 
+        is_user=False
+    ))
+    db.session.commit()
+
 @api_bp.route('/chat', methods=['GET', 'POST'])
 @login_required
 @smart_ai_limit()
@@ -20,108 +93,19 @@ def chat():
         return jsonify({"error": "このエンドポイントはPOSTメソッドのみ対応しています"}), 405
     
     try:
-        # リクエストデータを取得
-        if request.is_json:
-            data = request.get_json()
-            message = data.get('message', '')
-            step_id = data.get('step', '')
-            function_id = data.get('function', '')
-            class_id = data.get('class_id')
-        else:
-            # フォームデータの場合
-            message = request.form.get('message', '')
-            step_id = request.form.get('step', '')
-            function_id = request.form.get('function', '')
-            class_id = request.form.get('class_id', type=int)
-        
-        # 教師ロールの場合は常に teacher_free ステップを使用
-        if current_user.role == 'teacher':
-            step_id = 'teacher_free'
-            function_id = ''
+        message, class_id = _parse_chat_request()
         
         # メッセージが空でないことを確認
         if not message:
             return jsonify({"error": "メッセージが空です"}), 400
         
-        # クラスと教科情報を取得
-        class_obj = None
-        subject = None
-        if class_id:
-            class_obj = Class.query.get(class_id)
-            if class_obj and class_obj.subject_id:
-                subject = Subject.query.get(class_obj.subject_id)
-        
-        # コンテキストの準備
-        context_data = []
-        
-        # チャット履歴の取得（新しい順に10件）
-        if class_id:
-            chat_history = ChatHistory.query.filter_by(
-                user_id=current_user.id,
-                class_id=class_id
-            ).order_by(ChatHistory.timestamp.desc()).limit(10).all()
-        else:
-            chat_history = ChatHistory.query.filter_by(
-                user_id=current_user.id,
-                class_id=None
-            ).order_by(ChatHistory.timestamp.desc()).limit(10).all()
-        
-        # 古い順に並べ直してコンテキストに追加
-        for chat in reversed(chat_history):
-            context_data.append({
-                'is_user': chat.is_user,
-                'message': chat.message
-            })
-        
-        # 選択中のテーマを取得（学生の場合）
-        theme_context = None
-        if current_user.role == 'student':
-            if class_id:
-                theme = InquiryTheme.query.filter_by(
-                    student_id=current_user.id,
-                    class_id=class_id,
-                    is_selected=True
-                ).first()
-            else:
-                theme = InquiryTheme.query.filter_by(
-                    student_id=current_user.id, 
-                    is_selected=True
-                ).first()
-            if theme:
-                theme_context = f"現在の探究テーマ: {theme.title}"
-                if theme.question:
-                    theme_context += f"\n探究の問い: {theme.question}"
-        
-        # メッセージにテーマ情報を追加
-        full_message = message
-        if theme_context:
-            full_message = f"{theme_context}\n\nユーザーの質問: {message}"
+        subject, context_data, summary, full_message = _prepare_chat(message, class_id)
         
         # AI応答を生成（教科別プロンプト対応）
-        ai_response = generate_chat_response(full_message, context_data, subject=subject)
+        ai_response = generate_chat_response(full_message, context_data, subject=subject, summary=summary)
         
         # チャット履歴を保存
-        # ユーザーのメッセージを保存
-        user_chat = ChatHistory(
-            user_id=current_user.id,
-            class_id=class_id,
-            subject_id=subject.id if subject else None,
-            message=message, 
-            is_user=True
-        )
-        db.session.add(user_chat)
-        
-        # AIの返答を保存
-        ai_chat = ChatHistory(
-            user_id=current_user.id,
-            class_id=class_id,
-            subject_id=subject.id if subject else None,
-            message=ai_response, 
-            is_user=False
-        )
-        db.session.add(ai_chat)
-        
-        db.session.commit()
+        _save_chat(current_user.id, class_id, subject.id if subject else None, message, ai_response)
         
         return jsonify({
             "message": ai_response,
@@ -136,6 +120,84 @@ def chat():
             "status": "error"
         }), 500
 
+def _sse(data, event=None):
+    """Server-Sent Events の1件分"""
+    payload = json.dumps(data, ensure_ascii=False)
+    if event:
+        return f"event: {event}\ndata: {payload}\n\n"
+    return f"data: {payload}\n\n"
+
+@api_bp.route('/chat/stream', methods=['POST'])
+@login_required
+@smart_ai_limit()
+def chat_stream():
+    """
+    チャットAPIエンドポイント（ストリーミング） - AIの応答を Server-Sent Events で少しずつ返す
+    
+    イベント:
+        data: {"delta": 応答の断片}（応答が終わるまで繰り返す）
+        event: done / data: {"message": 応答全体}（履歴に保存した後）
+        event: error / data: {"error": エラーメッセージ}
+    
+    履歴には最後まで受け取った応答だけを保存する（AIの応答が途中で失敗した場合や、
+    ブラウザが途中で切断した場合は、途中までの応答を保存しない）。
+    
+    配信中は接続ごとにワーカーのスレッドを1つ使う（Dockerfile の gthread ワーカー）。
+    """
+    try:
+        message, class_id = _parse_chat_request()
+        if not message:
+            return jsonify({"error": "メッセージが空です"}), 400
+        
+        subject, context_data, summary, full_message = _prepare_chat(message, class_id)
+        user_id = current_user.id
+        subject_id = subject.id if subject else None
+        chunks = stream_chat_response(full_message, context_data, subject=subject, summary=summary)
+    except Exception as e:
+        logging.error(f"チャットAPIエラー: {str(e)}")
+        db.session.rollback()
+        return jsonify({
+            "error": "エラーが発生しました。もう一度お試しください。",
+            "status": "error"
+        }), 500
+    
+    # 配信中はDB接続をプールに返しておく（応答を待つ間、接続を占有しない）
+    db.session.close()
+    
+    def generate():
+        parts = []
+        completed = False
+        try:
+            for content in chunks:
+                parts.append(content)
+                yield _sse({"delta": content})
+            completed = True
+        except Exception as e:
+            # AIの応答が途中で止まった場合は、途中までの応答を通常の返答として保存しない
+            logging.error(f"チャット応答の配信エラー: {str(e)}")
+        
+        # 最後まで受け取った応答だけを履歴に保存する
+        # （ブラウザが途中で切断した場合はここまで進まず、途中までの応答は保存しない）
+        ai_response = ''.join(parts).strip() if completed else None
+        if ai_response:
+            try:
+                _save_chat(user_id, class_id, subject_id, message, ai_response)
+            except Exception as e:
+                logging.error(f"チャット履歴の保存エラー: {str(e)}")
+                db.session.rollback()
+                ai_response = None
+        
+        if ai_response:
+            yield _sse({"message": ai_response}, event='done')
+        else:
+            yield _sse({"error": "エラーが発生しました。もう一度お試しください。"}, event='error')
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # nginx のバッファリングを無効にして、断片をすぐにブラウザへ送る
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_bp.route('/teacher/first_class', methods=['GET'])
 @login_required
 def teacher_first_class():
@@ -153,13 +215,43 @@ def teacher_first_class():
     else:
         return jsonify({'class_id': None})
 
-@api_bp.route('/export/evaluations', methods=['POST'])
+@api_bp.route('/export/evaluations', methods=['GET', 'POST'])
 @login_required
 def export_evaluations():
-    """評価データのエクスポート"""
+    """評価データのエクスポート（format=csv の場合はCSVファイルとしてダウンロード）"""
     if current_user.role != 'teacher':
         return jsonify({'error': '教師のみアクセス可能です'}), 403
     
+    if request.values.get('format') == 'csv':
+        class_id = request.values.get('class_id', type=int) or session.get('class_id')
+        class_obj = Class.query.get(class_id) if class_id else None
+        if not class_obj or class_obj.teacher_id != current_user.id:
+            return jsonify({'error': 'エクスポートするクラスが見つかりません'}), 404
+        
+        # 保存済みの評価をサーバーサイドカーソルで読みながら送る
+        rows = stream_query(db.session.query(
+            User.username,
+            User.full_name,
+            StudentEvaluation.evaluation_text,
+            StudentEvaluation.updated_at
+        ).join(
+            User, User.id == StudentEvaluation.student_id
+        ).filter(
+            StudentEvaluation.class_id == class_obj.id
+        ).order_by(User.username))
+        
+        return csv_response(
+            f'{class_obj.name}_評価.csv',
+            ['ユーザー名', '氏名', '評価', '更新日時'],
+            (
+                (
+                    username, full_name or username, evaluation_text,
+                    updated_at.strftime('%Y-%m-%d %H:%M') if updated_at else ''
+                )
+                for username, full_name, evaluation_text, updated_at in rows
+            )
+        )
+    
     try:
         # セッションから評価データを取得
         evaluations_json = session.get('evaluations')
@@ -169,16 +261,14 @@ def export_evaluations():
         if not evaluations_json:
             # セッションにデータがない場合は、class_idから取得を試みる
             if class_id:
-                evaluations = []
-                db_evaluations = StudentEvaluation.query.filter_by(class_id=class_id).all()
-                
-                for eval_obj in db_evaluations:
-                    student = User.query.get(eval_obj.student_id)
-                    if student:
-                        evaluations.append({
-                            'student_name': student.username,
-                            'evaluation': eval_obj.evaluation_text
-                        })
+                evaluations = [
+                    {'student_name': username, 'evaluation': evaluation_text}
+                    for username, evaluation_text in db.session.query(
+                        User.username, StudentEvaluation.evaluation_text
+                    ).join(
+                        User, User.id == StudentEvaluation.student_id
+                    ).filter(StudentEvaluation.class_id == class_id).all()
+                ]
             else:
                 return jsonify({'error': 'エクスポートするデータがありません'}), 400
         else:
@@ -373,4 +463,53 @@ def get_stats():
             ).count()
         }
     
-    return jsonify(stats)
\ No newline at end of file
+    return jsonify(stats)
+
+@api_bp.route('/ai_cache/stats', methods=['GET'])
+@login_required
+def ai_cache_stats():
+    """AI応答キャッシュの機能ごとのヒット率（管理者のみ）"""
+    if current_user.role != 'admin':
+        return jsonify({'error': '権限がありません'}), 403
+    
+    from app.ai.cache import get_cache_stats, get_response_cache
+    
+    cache = get_response_cache()
+    return jsonify({
+        'enabled': cache is not None,
+        'backend': cache.backend.name if cache else None,
+        'features': get_cache_stats()
+    })
+
+@api_bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    """バックグラウンドジョブの進捗を取得（実行ユーザー本人のみ）"""
+    job = BackgroundJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify({'error': 'ジョブが見つかりません'}), 404
+    
+    status = job.to_dict()
+    status['results_url'] = url_for('api.job_results', job_id=job.id) if job.has_results_file else None
+    return jsonify(status)
+
+@api_bp.route('/jobs/<job_id>/results', methods=['GET'])
+@login_required
+def job_results(job_id):
+    """ジョブの結果ファイル（生成したパスワードを含むCSV、活動報告PDFのZIPなど）をダウンロード"""
+    from app.utils.background_jobs import RESULTS_FILENAME, results_path
+    
+    job = BackgroundJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job or not job.has_results_file:
+        return jsonify({'error': '結果ファイルが見つかりません'}), 404
+    
+    filename = (job.result or {}).get('results_file') or RESULTS_FILENAME
+    path = results_path(job.id, filename)
+    if not os.path.exists(path):
+        return jsonify({'error': '結果ファイルの保存期間が過ぎています'}), 410
+    
+    return send_file(
+        os.path.abspath(path),
+        as_attachment=True,
+        download_name=f'{job.kind}_{job.id[:8]}{os.path.splitext(filename)[1]}'
+    )
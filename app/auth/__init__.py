@@ -125,14 +125,14 @@ def register():
             )
             
             db.session.add(new_user)
-            db.session.commit()
+            db.session.flush()  # IDを取得するためにフラッシュ
             
             # オプションとしてメール送信を試み、失敗してもユーザー作成は続行
             try:
                 # 確認用トークンを生成（念のため）
                 token = secrets.token_urlsafe(32)
                 
-                # メール送信試行（送信エラーでも続行）
+                # メール送信試行（送信キューへの登録はユーザーと同じトランザクションでコミット）
                 send_confirmation_email(email, new_user.id, token, username)
                 
                 flash('登録が完了しました。ログインしてください。')
@@ -141,6 +141,8 @@ def register():
                 logging.error(f"メール送信エラー: {e}")
                 flash('登録は完了しましたが、確認メールの送信に失敗しました。ログインしてください。')
             
+            db.session.commit()
+            
             # 学生の場合は承認待ち、それ以外はログインページへ
             if role == 'student' and not new_user.is_approved:
                 return redirect(url_for('auth.awaiting_approval'))
@@ -179,10 +181,10 @@ def resend_verification(user_id):
         token = secrets.token_urlsafe(32)
         user.email_token = token
         user.token_created_at = datetime.utcnow()
-        db.session.commit()
         
-        # メール送信
+        # メール送信（トークンと同じトランザクションで送信キューに登録）
         send_confirmation_email(user.email, user.id, token, user.username)
+        db.session.commit()
         
         flash('確認メールを再送信しました。メールボックスをご確認ください。')
     except Exception as e:
@@ -248,15 +250,15 @@ def forgot_password():
             token = secrets.token_urlsafe(32)
             user.reset_token = token
             user.reset_token_created_at = datetime.utcnow()
-            db.session.commit()
             
             try:
-                # パスワードリセットメールを送信
+                # パスワードリセットメールを送信（トークンと同じトランザクションで送信キューに登録）
                 send_reset_password_email(user.email, user.id, token, user.username)
                 flash('パスワードリセット用のメールを送信しました。メールボックスをご確認ください。')
             except Exception as e:
                 logging.error(f"パスワードリセットメール送信エラー: {e}")
                 flash('メールの送信に失敗しました。後でもう一度お試しください。')
+            db.session.commit()
         else:
             # セキュリティのため、ユーザーが存在しない場合も同じメッセージを表示
             flash('パスワードリセット用のメールを送信しました。メールボックスをご確認ください。')
@@ -236,6 +236,16 @@ def secure_register():
             )
             
             db.session.add(new_user)
+            db.session.flush()  # IDを取得するためにフラッシュ
+            
+            # 確認メール送信（送信キューへの登録はユーザーと同じトランザクションでコミット）
+            try:
+                send_confirmation_email(email, new_user.id, email_token, username)
+                flash('登録が完了しました。メールに送信された確認リンクをクリックしてアカウントを有効化してください。')
+            except Exception as e:
+                logging.error(f"確認メール送信エラー: {e}")
+                flash('登録は完了しましたが、確認メールの送信に失敗しました。管理者にお問い合わせください。')
+            
             db.session.commit()
             
             # 成功ログ
@@ -246,14 +256,6 @@ def secure_register():
                 'user_id': new_user.id
             })
             
-            # 確認メール送信
-            try:
-                send_confirmation_email(email, new_user.id, email_token, username)
-                flash('登録が完了しました。メールに送信された確認リンクをクリックしてアカウントを有効化してください。')
-            except Exception as e:
-                logging.error(f"確認メール送信エラー: {e}")
-                flash('登録は完了しましたが、確認メールの送信に失敗しました。管理者にお問い合わせください。')
-            
             return redirect(url_for('secure_auth.verify_email', user_id=new_user.id))
             
         except Exception as e:
@@ -68,6 +68,7 @@ class School(db.Model):
     address = db.Column(db.Text)
     contact_email = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    review_scheduler = db.Column(db.String(20), nullable=True)  # 基礎学力の復習スケジューラ（ladder/sm2、未設定は既定値）
     
     # リレーションシップの定義
     years = db.relationship('SchoolYear', backref='school', lazy=True)
@@ -339,6 +340,25 @@ class ChatHistory(db.Model):
     user = db.relationship('User', back_populates='chat_histories')
     class_obj = db.relationship('Class', backref=db.backref('chat_histories', lazy=True))
 
+class ChatSummary(db.Model):
+    """チャットの古い発言の要約（ユーザー・クラスごと、app/ai/context.py）"""
+    __tablename__ = 'chat_summaries'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    class_id = db.Column(db.Integer, db.ForeignKey('classes.id', ondelete='CASCADE'), nullable=True)
+    # 一意制約用のクラスのキー（class_id、クラスなしは0）。NULLを含む一意制約は重複を防げないため
+    class_key = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    summary = db.Column(db.Text)
+    last_message_id = db.Column(db.Integer)  # 要約に含めた最後の ChatHistory.id
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'class_key', name='uq_chat_summaries_user_class_key'),)
+    
+    @staticmethod
+    def key_for(class_id):
+        """class_id に対応する class_key"""
+        return class_id or 0
+
 class Milestone(db.Model):
     __tablename__ = 'milestones'
     id = db.Column(db.Integer, primary_key=True)
@@ -351,6 +371,97 @@ class Milestone(db.Model):
     # クラスとの関連付け
     class_obj = db.relationship('Class', backref=db.backref('milestones', lazy=True))
 
+class BackgroundJob(db.Model):
+    """バックグラウンドジョブ（CSVインポート、活動報告PDFの一括作成など）"""
+    __tablename__ = 'background_jobs'
+    id = db.Column(db.String(36), primary_key=True)  # UUID
+    kind = db.Column(db.String(50), nullable=False)  # app/utils/background_jobs.py の JOB_HANDLERS のキー
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending/running/completed/failed
+    filename = db.Column(db.String(255))
+    params = db.Column(db.JSON)
+    total = db.Column(db.Integer, default=0)  # 処理する件数（CSVのデータ行数など）
+    processed = db.Column(db.Integer, default=0)
+    result = db.Column(db.JSON)  # 件数とエラー（パスワードは含めない）
+    has_results_file = db.Column(db.Boolean, default=False)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        """進捗APIで返す辞書形式に変換"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'filename': self.filename,
+            'total': self.total or 0,
+            'processed': self.processed or 0,
+            'result': self.result,
+            'has_results_file': bool(self.has_results_file),
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+class DailyReportDelivery(db.Model):
+    """日次レポートの送信記録（同じ日のレポートを同じ宛先に二重に送らないための記録）"""
+    __tablename__ = 'daily_report_deliveries'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    report_date = db.Column(db.Date, nullable=False)
+    report_key = db.Column(db.String(50), nullable=False)  # 'student' または 'class:<クラスID>'
+    status = db.Column(db.String(20), nullable=False, default='sending')  # sending/sent/failed
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'report_date', 'report_key', name='uq_daily_report_deliveries'),
+    )
+
+class DailyReportRun(db.Model):
+    """日次レポートの実行結果（件数と処理速度）"""
+    __tablename__ = 'daily_report_runs'
+    id = db.Column(db.Integer, primary_key=True)
+    report_date = db.Column(db.Date, nullable=False, index=True)
+    chunks = db.Column(db.Integer, default=0)
+    sent = db.Column(db.Integer, default=0)
+    skipped = db.Column(db.Integer, default=0)  # 送信済みなどで送らなかった件数
+    failed = db.Column(db.Integer, default=0)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    @property
+    def throughput(self):
+        """1分あたりの送信件数"""
+        if not self.started_at or not self.finished_at:
+            return None
+        seconds = (self.finished_at - self.started_at).total_seconds()
+        return round(self.sent * 60 / seconds, 1) if seconds > 0 else None
+
+class EmailOutbox(db.Model):
+    """送信待ちのメール（app/utils/email_outbox.py のワーカーがまとめて送信する）"""
+    __tablename__ = 'email_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    category = db.Column(db.String(50))  # 'confirmation', 'reset_password', 'invitation' など
+    recipients = db.Column(db.Text, nullable=False)  # カンマ区切りのメールアドレス
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    subtype = db.Column(db.String(10), nullable=False, default='html')  # html/plain
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending/sending/sent/failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
 # Import Subject model
 from app.models.subject import Subject
 
@@ -360,5 +471,6 @@ __all__ = [
     'Class', 'ClassEnrollment', 'MainTheme', 'InquiryTheme', 'InterestSurvey',
     'PersonalitySurvey', 'ActivityLog', 'Todo', 'Goal', 'StudentEvaluation',
     'Curriculum', 'RubricTemplate', 'Group', 'GroupMembership', 'ChatHistory',
-    'Milestone', 'Subject'
+    'ChatSummary', 'Milestone', 'BackgroundJob', 'DailyReportDelivery', 'DailyReportRun',
+    'EmailOutbox', 'Subject'
 ]
\ No newline at end of file
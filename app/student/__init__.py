@@ -35,6 +35,7 @@ from app.models import (
 from app.ai import generate_personal_themes_with_ai
 from app.utils.rate_limiting import upload_limit, api_limit
 from app.utils.file_security import file_validator
+from app.utils.csv_export import csv_response, stream_query
 
 student_bp = Blueprint('student', __name__)
 
@@ -1197,9 +1198,11 @@ def export_activities(format):
     query = ActivityLog.query.filter_by(student_id=current_user.id)
     if class_id:
         query = query.filter_by(class_id=class_id)
-    activities = query.order_by(ActivityLog.date.desc()).all()
+    query = query.order_by(ActivityLog.date.desc())
     
     if format == 'pdf':
+        activities = query.all()
+        
         # PDFエクスポート処理
         if not REPORTLAB_AVAILABLE:
             flash('PDF機能は現在利用できません。')
@@ -1229,37 +1232,25 @@ def export_activities(format):
                              now=datetime.now())
     
     elif format == 'csv':
-        # StringIOを使用する方法に変更
-        si = io.StringIO()
-        
-        # UTF-8 BOMを書き込む
-        si.write('\ufeff')
-        
-        writer = csv.writer(si)
-        
-        # ヘッダー
-        writer.writerow(['日付', 'タイトル', '活動内容', '振り返り', 'タグ'])
-        
-        # データ
-        for activity in activities:
-            writer.writerow([
-                activity.date.strftime('%Y-%m-%d') if activity.date else '',
-                activity.title or '',
-                activity.content or '',
-                activity.reflection or '',
-                activity.tags or ''
-            ])
-        
-        # BytesIOに変換
-        output = io.BytesIO()
-        output.write(si.getvalue().encode('utf-8-sig'))
-        output.seek(0)
-        
-        return send_file(
-            output,
-            mimetype='text/csv; charset=utf-8',
-            as_attachment=True,
-            download_name='活動記録.csv'
+        # 必要な列だけをサーバーサイドカーソルで読みながら送る
+        rows = stream_query(query.with_entities(
+            ActivityLog.date,
+            ActivityLog.title,
+            ActivityLog.content,
+            ActivityLog.reflection,
+            ActivityLog.tags
+        ))
+        
+        return csv_response(
+            '活動記録.csv',
+            ['日付', 'タイトル', '活動内容', '振り返り', 'タグ'],
+            (
+                (
+                    activity_date.strftime('%Y-%m-%d') if activity_date else '',
+                    title, content, reflection, tags
+                )
+                for activity_date, title, content, reflection, tags in rows
+            )
         )
 
 # To Do管理
@@ -0,0 +1,25 @@
+"""
+バックグラウンドジョブ
+app/utils/background_jobs.py で登録したジョブをCeleryワーカーで実行する
+"""
+from flask import has_app_context
+
+try:
+    from app.tasks import celery, CELERY_AVAILABLE
+except ImportError:
+    CELERY_AVAILABLE = False
+    celery = None
+
+
+if CELERY_AVAILABLE and celery:
+    @celery.task(ignore_result=True)
+    def run_background_job_task(job_id):
+        """バックグラウンドジョブのCeleryタスク"""
+        from app.utils.background_jobs import run_job
+
+        if has_app_context():
+            return run_job(job_id)
+
+        from app import create_app
+        with create_app().app_context():
+            return run_job(job_id)
@@ -2,35 +2,138 @@
 """
 日次レポート機能
 学生と教師向けの自動レポート生成とメール送信
+
+データの収集は生徒・クラスごとにクエリを発行せず、対象日の範囲をまとめて集計する
+（質問は生徒・教科別、活動記録と完了したTODOは生徒別、クラスの質問数はクラス・生徒別）。
+
+Celeryでは generate_daily_reports（計画タスク）が送信対象を DAILY_REPORT_CHUNK_SIZE 件ずつに分け、
+チャンクごとのタスクを並列に実行する。全チャンクの完了後に summarize_daily_reports が
+件数と処理速度を DailyReportRun に記録する。
+送信ごとに（宛先, 対象日, レポートの種類）の送信記録（DailyReportDelivery）を残し、
+タスクを再試行しても送信済みのレポートは送らない。
+
+質問のAI要約は複数の生徒・教科分を1回のAPI呼び出しにまとめ（JSONで1エントリずつ返させる）、
+質問が少ない教科はAIを使わずに定型文で要約する。
 """
+import json
 import os
+import re
 import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
-from flask import render_template_string
+from flask import current_app, has_app_context, render_template_string
 from markupsafe import escape
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
 import logging
 
 # Celeryタスクとしての実装
 try:
     from app.tasks import celery, CELERY_AVAILABLE
     if CELERY_AVAILABLE:
+        from celery import chord, group
         from app import create_app
-        from app.models import db, User, ChatHistory, Class, Subject, ActivityLog, Goal, Todo
+        from app.models import (
+            db, User, ChatHistory, Class, ClassEnrollment, Subject, ActivityLog, Goal, Todo,
+            DailyReportDelivery, DailyReportRun
+        )
         from app.utils.email_sender import EmailSender
-        from app.ai import generate_chat_response
+        from app.ai.gateway import chat_completion
 except ImportError:
     # 必要なモジュールが利用できない場合
     CELERY_AVAILABLE = False
     celery = None
 
+# AI要約に使う教科ごとの質問の数
+MAX_SUMMARY_QUESTIONS = 5
+
+# AI要約のAPI呼び出し1回あたりの出力トークン数（エントリ1件あたりと上限）
+SUMMARY_TOKENS_PER_ENTRY = 300
+SUMMARY_MAX_TOKENS = 4000
+
+BATCH_SUMMARY_PROMPT = """以下は生徒が今日行った質問を、生徒・教科ごとのエントリにまとめたものです。
+エントリごとに質問を分析して、次の内容を150字程度の日本語でまとめてください。
+【学習のポイント】主な学習トピック（3つまで）、理解できている点、さらに深めると良い点
+【明日への提案】発展的な学習の方向性
+
+出力は次の形式のJSONだけにしてください（すべてのエントリについて、idはエントリのidをそのまま使う）:
+{{"summaries": [{{"id": "1", "summary": "要約"}}]}}
+
+エントリ:
+{entries}"""
+
+# 送信中のまま残った送信記録を、ワーカーが止まったとみなしてやり直すまでの時間（秒）
+DELIVERY_CLAIM_TIMEOUT = 15 * 60
+
+def _shorten(text, length=30):
+    """長い文を length 文字で切る"""
+    text = ' '.join(str(text).split())
+    return text if len(text) <= length else text[:length] + '…'
+
+
+def _chunks(ids, size):
+    """リストを size 件ずつに分ける"""
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+
+def claim_delivery(user_id, report_date, report_key):
+    """
+    レポートを送信する権利を取得する（同じ日のレポートを二重に送らないため）
+    
+    Args:
+        user_id: 宛先のユーザーID
+        report_date: レポートの対象日
+        report_key: レポートの種類（'student' または 'class:<クラスID>'）
+        
+    Returns:
+        DailyReportDelivery: 送信記録（送信済み・他のワーカーが送信中・再試行の上限に達した場合はNone）
+    """
+    now = datetime.utcnow()
+    delivery = DailyReportDelivery.query.filter_by(
+        user_id=user_id, report_date=report_date, report_key=report_key
+    ).first()
+    
+    if delivery is None:
+        delivery = DailyReportDelivery(user_id=user_id, report_date=report_date, report_key=report_key,
+                                       status='sending', attempts=1, updated_at=now)
+        db.session.add(delivery)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # 他のワーカーが同時に取得した
+            db.session.rollback()
+            return None
+        return delivery
+    
+    if delivery.status == 'sent':
+        return None
+    if delivery.status == 'sending' and delivery.updated_at and \
+            now - delivery.updated_at < timedelta(seconds=DELIVERY_CLAIM_TIMEOUT):
+        return None
+    if (delivery.attempts or 0) >= current_app.config.get('DAILY_REPORT_MAX_ATTEMPTS', 3):
+        return None
+    
+    # 失敗した送信と、ワーカーが止まって送信中のまま残った送信はやり直す
+    claimed = db.session.execute(
+        update(DailyReportDelivery)
+        .where(DailyReportDelivery.id == delivery.id,
+               DailyReportDelivery.status == delivery.status,
+               DailyReportDelivery.updated_at == delivery.updated_at)
+        .values(status='sending', attempts=DailyReportDelivery.attempts + 1, updated_at=now)
+    ).rowcount
+    db.session.commit()
+    return delivery if claimed else None
+
+
 class DailyReportService:
-    def __init__(self, app=None):
+    def __init__(self, app=None, report_date=None):
         self.app = app
-        self.today = date.today()
+        self.today = report_date or date.today()
         self.email_sender = EmailSender()
         
     def generate_all_reports(self):
-        """全体のレポート生成処理"""
+        """全体のレポート生成処理（1つのプロセスで順に処理する。Celeryでは generate_daily_reports がチャンクに分けて並列に処理する）"""
         if not self.app:
             self.app = create_app()
             
@@ -47,183 +150,401 @@ class DailyReportService:
             except Exception as e:
                 logging.error(f"Error in daily report generation: {str(e)}")
                 return False, str(e)
+    
+    def student_ids(self):
+        """レポートを送る生徒のID"""
+        return list(db.session.scalars(
+            select(User.id).where(User.role == 'student', User.is_approved == True).order_by(User.id)
+        ))
+    
+    def class_ids(self):
+        """レポートを送るクラスのID（承認済みの教師のクラス）"""
+        return list(db.session.scalars(
+            select(Class.id).join(User, User.id == Class.teacher_id)
+            .where(User.role == 'teacher', User.is_approved == True).order_by(Class.id)
+        ))
         
     def generate_student_reports(self):
         """生徒・保護者向けレポート"""
-        students = User.query.filter_by(
-            role='student',
-            is_approved=True
-        ).all()
-        
         sent_count = 0
-        for student in students:
-            try:
-                report_data = self._collect_student_data(student)
-                if report_data['total_questions'] > 0 or report_data['total_activities'] > 0:
-                    success = self._send_student_report(student, report_data)
-                    if success:
-                        sent_count += 1
-                        logging.info(f"Student report sent to {student.username}")
-                    else:
-                        logging.warning(f"Failed to send report to {student.username}")
-            except Exception as e:
-                logging.error(f"Error generating report for student {student.id}: {e}")
-                
+        for chunk in _chunks(self.student_ids(), current_app.config.get('DAILY_REPORT_CHUNK_SIZE', 100)):
+            sent_count += self.send_student_reports(chunk)['sent']
         return sent_count
     
     def generate_teacher_reports(self):
         """教師向けクラス別レポート"""
-        teachers = User.query.filter_by(
-            role='teacher',
-            is_approved=True
-        ).all()
-        
         sent_count = 0
-        for teacher in teachers:
-            try:
-                for class_obj in teacher.classes_teaching:
-                    report_data = self._collect_class_data(class_obj)
-                    if report_data['active_students'] > 0:
-                        success = self._send_teacher_report(teacher, class_obj, report_data)
-                        if success:
-                            sent_count += 1
-                            logging.info(f"Teacher report sent to {teacher.username} for class {class_obj.name}")
-            except Exception as e:
-                logging.error(f"Error generating report for teacher {teacher.id}: {e}")
-                
+        for chunk in _chunks(self.class_ids(), current_app.config.get('DAILY_REPORT_CHUNK_SIZE', 100)):
+            sent_count += self.send_class_reports(chunk)['sent']
         return sent_count
     
+    def _deliver(self, user_id, report_key, send):
+        """
+        送信記録を確認してレポートを送信する
+        
+        Returns:
+            str: 'sent' / 'failed' / 'skipped'（送信済みなどで送らなかった場合）
+        """
+        delivery = claim_delivery(user_id, self.today, report_key)
+        if delivery is None:
+            return 'skipped'
+        
+        try:
+            success = send()
+            error = None if success else 'メールを送信できませんでした'
+        except Exception as e:
+            success, error = False, str(e)
+        
+        delivery.status = 'sent' if success else 'failed'
+        delivery.error = error
+        delivery.updated_at = datetime.utcnow()
+        db.session.commit()
+        return delivery.status
+    
+    def send_student_reports(self, student_ids):
+        """
+        生徒・保護者向けレポートを送信（1チャンク分）
+        
+        Args:
+            student_ids: 生徒IDのリスト
+            
+        Returns:
+            dict: 送信した件数・送らなかった件数・失敗した件数
+        """
+        counts = {'sent': 0, 'skipped': 0, 'failed': 0}
+        students = User.query.filter(User.id.in_(student_ids)).order_by(User.id).all()
+        
+        # チャンク内の生徒のデータを数回の集計クエリでまとめて取得する
+        reports = self._collect_all_student_data(students, select(User.id).where(User.id.in_(student_ids)))
+        targets = [
+            student for student in students
+            if reports[student.id]['total_questions'] > 0 or reports[student.id]['total_activities'] > 0
+        ]
+        
+        # 送信済みの生徒を除いて、要約をまとめて作成する
+        sent_ids = set(db.session.scalars(
+            select(DailyReportDelivery.user_id).where(
+                DailyReportDelivery.user_id.in_([student.id for student in targets]),
+                DailyReportDelivery.report_date == self.today,
+                DailyReportDelivery.report_key == 'student',
+                DailyReportDelivery.status == 'sent'
+            )
+        )) if targets else set()
+        self._add_ai_summaries([reports[student.id] for student in targets if student.id not in sent_ids])
+        
+        for student in targets:
+            report_data = reports[student.id]
+            status = self._deliver(student.id, 'student',
+                                   lambda: self._send_student_report(student, report_data))
+            counts[status] += 1
+            if status == 'sent':
+                logging.info(f"Student report sent to {student.username}")
+            elif status == 'failed':
+                logging.warning(f"Failed to send report to {student.username}")
+                
+        return counts
+    
+    def send_class_reports(self, class_ids):
+        """
+        教師向けクラス別レポートを送信（1チャンク分）
+        
+        Args:
+            class_ids: クラスIDのリスト
+            
+        Returns:
+            dict: 送信した件数・送らなかった件数・失敗した件数
+        """
+        counts = {'sent': 0, 'skipped': 0, 'failed': 0}
+        classes = Class.query.filter(Class.id.in_(class_ids)).order_by(Class.id).all()
+        teachers = {teacher.id: teacher for teacher in User.query.filter(
+            User.id.in_({class_obj.teacher_id for class_obj in classes})
+        )}
+        reports = self._collect_all_class_data(classes)
+        
+        for class_obj in classes:
+            teacher = teachers.get(class_obj.teacher_id)
+            report_data = reports[class_obj.id]
+            if teacher is None or report_data['active_students'] == 0:
+                continue
+            
+            status = self._deliver(
+                teacher.id, f'class:{class_obj.id}',
+                lambda: self._send_teacher_report(teacher, class_obj, report_data)
+            )
+            counts[status] += 1
+            if status == 'sent':
+                logging.info(f"Teacher report sent to {teacher.username} for class {class_obj.name}")
+            elif status == 'failed':
+                logging.warning(f"Failed to send report to {teacher.username} for class {class_obj.name}")
+                
+        return counts
+    
+    def _day_range(self):
+        """レポート対象日の開始・終了時刻"""
+        return (datetime.combine(self.today, datetime.min.time()),
+                datetime.combine(self.today, datetime.max.time()))
+    
     def _collect_student_data(self, student):
-        """生徒の学習データ収集"""
-        start_time = datetime.combine(self.today, datetime.min.time())
-        end_time = datetime.combine(self.today, datetime.max.time())
+        """生徒の学習データ収集（1人分、AI要約を含む）"""
+        report_data = self._collect_all_student_data(
+            [student], select(User.id).where(User.id == student.id)
+        )[student.id]
+        self._add_ai_summaries([report_data])
+        return report_data
+    
+    def _collect_all_student_data(self, students, student_ids):
+        """
+        生徒の学習データをまとめて収集（生徒ごとにクエリを発行しない）
+        
+        Args:
+            students: レポートを作成する生徒のリスト
+            student_ids: 生徒IDを返すSELECT文（各クエリの絞り込みに使う）
+            
+        Returns:
+            dict: {生徒ID: レポートのデータ}（AI要約は _add_ai_summaries で追加する）
+        """
+        start_time, end_time = self._day_range()
         
-        # チャット履歴
-        chats = ChatHistory.query.filter(
-            ChatHistory.user_id == student.id,
+        # チャット履歴（ユーザーからの質問のみ）: 生徒・教科ごとの件数と、要約に使う最初の数件
+        partition = (ChatHistory.user_id, ChatHistory.subject_id)
+        ranked = select(
+            ChatHistory.user_id,
+            ChatHistory.subject_id,
+            ChatHistory.message,
+            ChatHistory.timestamp,
+            func.row_number().over(
+                partition_by=partition,
+                order_by=(ChatHistory.timestamp, ChatHistory.id)
+            ).label('position'),
+            func.count().over(partition_by=partition).label('total')
+        ).where(
+            ChatHistory.user_id.in_(student_ids),
             ChatHistory.timestamp.between(start_time, end_time),
-            ChatHistory.is_user == True  # ユーザーからの質問のみ
-        ).order_by(ChatHistory.subject_id).all()
+            ChatHistory.is_user == True
+        ).subquery()
+        chat_rows = db.session.execute(
+            select(ranked).where(ranked.c.position <= MAX_SUMMARY_QUESTIONS)
+            .order_by(ranked.c.user_id, ranked.c.subject_id, ranked.c.position)
+        ).all()
+        
+        subject_ids = {row.subject_id for row in chat_rows if row.subject_id}
+        subjects = {}
+        if subject_ids:
+            subjects = {subject.id: subject for subject in Subject.query.filter(Subject.id.in_(subject_ids))}
+        
+        # 教科別にグループ化
+        subject_data = defaultdict(dict)
+        for row in chat_rows:
+            subject_id = row.subject_id or 0  # None の場合は0
+            data = subject_data[row.user_id].setdefault(subject_id, {
+                'subject': subjects.get(row.subject_id),
+                'questions': [],
+                'count': row.total
+            })
+            data['questions'].append({
+                'question': row.message,
+                'timestamp': row.timestamp
+            })
         
         # 活動記録
-        activities = ActivityLog.query.filter(
-            ActivityLog.student_id == student.id,
+        activities = defaultdict(list)
+        for activity in ActivityLog.query.filter(
+            ActivityLog.student_id.in_(student_ids),
             ActivityLog.date == self.today
-        ).all()
-        
-        # 目標進捗
-        goals = Goal.query.filter_by(
-            student_id=student.id,
-            is_completed=False
-        ).all()
+        ).order_by(ActivityLog.id):
+            activities[activity.student_id].append(activity)
         
         # TODO完了
-        completed_todos = Todo.query.filter(
-            Todo.student_id == student.id,
+        completed_todos = defaultdict(list)
+        for todo in Todo.query.filter(
+            Todo.student_id.in_(student_ids),
             Todo.is_completed == True,
             Todo.updated_at.between(start_time, end_time)
-        ).all()
+        ).order_by(Todo.id):
+            completed_todos[todo.student_id].append(todo)
         
-        # 教科別にグループ化
-        subject_data = {}
-        for chat in chats:
-            subject_id = chat.subject_id or 0  # None の場合は0
-            if subject_id not in subject_data:
-                subject_data[subject_id] = {
-                    'subject': chat.subject if chat.subject else None,
-                    'questions': [],
-                    'topics': set()
-                }
-            subject_data[subject_id]['questions'].append({
-                'question': chat.message,
-                'timestamp': chat.timestamp
-            })
-            
-        # AI要約生成
-        for subject_id, data in subject_data.items():
-            if data['questions']:
-                data['summary'] = self._generate_ai_summary(
-                    data['subject'].name if data['subject'] else '一般',
-                    data['questions']
-                )
-                # HTMLエスケープして安全性を確保
-                if 'summary' in data:
-                    data['summary'] = escape(data['summary'])
+        # 目標進捗（レポートを送る生徒の分だけ）
+        reporting_ids = set(subject_data) | set(activities)
+        goals = defaultdict(list)
+        if reporting_ids:
+            for goal in Goal.query.filter(
+                Goal.student_id.in_(reporting_ids),
+                Goal.is_completed == False
+            ).order_by(Goal.id):
+                goals[goal.student_id].append(goal)
         
         return {
-            'student': student,
-            'date': self.today,
-            'subject_data': subject_data,
-            'total_questions': len(chats),
-            'activities': activities,
-            'total_activities': len(activities),
-            'goals': goals,
-            'completed_todos': completed_todos
+            student.id: {
+                'student': student,
+                'date': self.today,
+                'subject_data': subject_data.get(student.id, {}),
+                'total_questions': sum(data['count'] for data in subject_data.get(student.id, {}).values()),
+                'activities': activities.get(student.id, []),
+                'total_activities': len(activities.get(student.id, [])),
+                'goals': goals.get(student.id, []),
+                'completed_todos': completed_todos.get(student.id, [])
+            }
+            for student in students
         }
     
-    def _collect_class_data(self, class_obj):
-        """クラスの学習データ収集"""
-        start_time = datetime.combine(self.today, datetime.min.time())
-        end_time = datetime.combine(self.today, datetime.max.time())
+    def _add_ai_summaries(self, reports):
+        """
+        教科ごとの質問の要約を追加
         
-        # クラスの生徒一覧
-        students = [enrollment.student for enrollment in class_obj.enrollments if enrollment.is_active]
-        
-        # 今日アクティブだった生徒
-        active_students = set()
-        total_questions = 0
-        
-        for student in students:
-            daily_chats = ChatHistory.query.filter(
-                ChatHistory.user_id == student.id,
-                ChatHistory.class_id == class_obj.id,
-                ChatHistory.timestamp.between(start_time, end_time),
-                ChatHistory.is_user == True
-            ).count()
-            
-            if daily_chats > 0:
-                active_students.add(student)
-                total_questions += daily_chats
+        質問が DAILY_REPORT_SUMMARY_MIN_QUESTIONS 件未満の教科はAIを使わずに定型文で要約する。
+        それ以外は DAILY_REPORT_SUMMARY_BATCH_SIZE 件ずつ1回のAPI呼び出しにまとめ、
+        最大 DAILY_REPORT_SUMMARY_CONCURRENCY 件を並列に呼び出す。
         
-        return {
-            'class': class_obj,
-            'date': self.today,
-            'total_students': len(students),
-            'active_students': len(active_students),
-            'total_questions': total_questions,
-            'active_student_list': list(active_students)
-        }
+        Args:
+            reports: レポートのデータのリスト
+        """
+        config = current_app.config
+        min_questions = config.get('DAILY_REPORT_SUMMARY_MIN_QUESTIONS', 3)
+        
+        pending = []
+        for report_data in reports:
+            for data in report_data['subject_data'].values():
+                if not data['questions']:
+                    continue
+                subject_name = data['subject'].name if data['subject'] else '一般'
+                if data['count'] < min_questions:
+                    # HTMLエスケープして安全性を確保
+                    data['summary'] = escape(self._template_summary(subject_name, data['questions'], data['count']))
+                else:
+                    pending.append((subject_name, data))
+        if not pending:
+            return
+        
+        batches = _chunks(pending, config.get('DAILY_REPORT_SUMMARY_BATCH_SIZE', 12))
+        app = current_app._get_current_object()
+        
+        def summarize(batch):
+            with app.app_context():
+                return self._summarize_batch(
+                    [(str(number), subject_name, data) for number, (subject_name, data) in enumerate(batch, 1)]
+                )
+        
+        workers = min(config.get('DAILY_REPORT_SUMMARY_CONCURRENCY', 4), len(batches))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report-summary') as executor:
+                results = list(executor.map(summarize, batches))
+        else:
+            results = [summarize(batch) for batch in batches]
+        
+        for batch, summaries in zip(batches, results):
+            for number, (subject_name, data) in enumerate(batch, 1):
+                summary = summaries.get(str(number)) or self._fallback_summary(subject_name, data['count'])
+                # HTMLエスケープして安全性を確保
+                data['summary'] = escape(summary)
     
-    def _generate_ai_summary(self, subject_name, questions):
-        """GPT-4による学習内容の要約"""
-        if not questions:
-            return "今日は質問がありませんでした。"
-            
-        question_texts = "\n".join([f"- {q['question']}" for q in questions[:5]])  # 最大5問
+    def _collect_class_data(self, class_obj):
+        """クラスの学習データ収集（1クラス分）"""
+        return self._collect_all_class_data([class_obj])[class_obj.id]
+    
+    def _collect_all_class_data(self, classes):
+        """
+        クラスの学習データをまとめて収集（生徒ごとの件数はクラス・生徒別の集計クエリ1回で取得）
         
-        prompt = f"""
-        {subject_name}の学習で今日生徒が行った質問を分析して、以下の形式でまとめてください：
+        Returns:
+            dict: {クラスID: レポートのデータ}
+        """
+        if not classes:
+            return {}
+        start_time, end_time = self._day_range()
+        class_ids = [class_obj.id for class_obj in classes]
         
-        今日の質問（{len(questions)}件）:
-        {question_texts}
+        # クラスの生徒一覧
+        students = defaultdict(list)
+        for class_id, student in db.session.execute(
+            select(ClassEnrollment.class_id, User)
+            .join(User, User.id == ClassEnrollment.student_id)
+            .where(ClassEnrollment.class_id.in_(class_ids), ClassEnrollment.is_active == True)
+            .order_by(ClassEnrollment.class_id, ClassEnrollment.id)
+        ):
+            students[class_id].append(student)
         
-        【学習のポイント】
-        - 主な学習トピック（3つまで）
-        - 理解できている点
-        - さらに深めると良い点
+        # 今日の質問数（クラス・生徒別）
+        question_counts = {
+            (class_id, user_id): count
+            for class_id, user_id, count in db.session.execute(
+                select(ChatHistory.class_id, ChatHistory.user_id, func.count())
+                .where(
+                    ChatHistory.class_id.in_(class_ids),
+                    ChatHistory.timestamp.between(start_time, end_time),
+                    ChatHistory.is_user == True
+                )
+                .group_by(ChatHistory.class_id, ChatHistory.user_id)
+            )
+        }
         
-        【明日への提案】
-        - 発展的な学習の方向性
+        reports = {}
+        for class_obj in classes:
+            # 今日アクティブだった生徒
+            active_students = [student for student in students[class_obj.id]
+                               if question_counts.get((class_obj.id, student.id))]
+            reports[class_obj.id] = {
+                'class': class_obj,
+                'date': self.today,
+                'total_students': len(students[class_obj.id]),
+                'active_students': len(active_students),
+                'total_questions': sum(question_counts[(class_obj.id, student.id)] for student in active_students),
+                'active_student_list': active_students
+            }
+        return reports
+    
+    def _template_summary(self, subject_name, questions, count):
+        """質問が少ない場合のAIを使わない要約"""
+        examples = "".join(f"「{_shorten(q['question'])}」" for q in questions[:2])
+        return f"{subject_name}で{count}件の質問がありました（{examples}）。疑問を大切にして学習を進めましょう。"
+    
+    def _fallback_summary(self, subject_name, count):
+        """AI要約を作成できなかった場合の要約"""
+        return f"{subject_name}で{count}件の質問がありました。継続的な学習への取り組みが見られます。"
+    
+    def _summarize_batch(self, entries):
+        """
+        複数の生徒・教科の質問を1回のAPI呼び出しでまとめて要約
         
-        150字程度でまとめてください。
+        Args:
+            entries: (エントリID, 教科名, 質問データ) のリスト
+            
+        Returns:
+            dict: {エントリID: 要約}（作成できなかったエントリは含まない）
         """
+        payload = [
+            {
+                'id': entry_id,
+                'subject': subject_name,
+                'question_count': data['count'],
+                'questions': [q['question'] for q in data['questions'][:MAX_SUMMARY_QUESTIONS]]
+            }
+            for entry_id, subject_name, data in entries
+        ]
+        prompt = BATCH_SUMMARY_PROMPT.format(entries=json.dumps(payload, ensure_ascii=False, indent=1))
         
         try:
-            ai_response = generate_chat_response(prompt)
-            return ai_response
+            content = chat_completion(
+                [
+                    {"role": "system", "content": "あなたは教育支援AIアシスタントです。"},
+                    {"role": "user", "content": prompt}
+                ],
+                model="gpt-3.5-turbo",
+                temperature=0.8,
+                max_tokens=min(SUMMARY_MAX_TOKENS, SUMMARY_TOKENS_PER_ENTRY * len(entries)),
+                cache_feature='daily_summary'
+            )
+            
+            # JSON部分を抽出
+            json_match = re.search(r'\{.*\}', content, re.DOTALL)
+            summaries = json.loads(json_match.group(0) if json_match else content).get('summaries', [])
+            return {
+                str(item['id']): str(item['summary']).strip()
+                for item in summaries
+                if isinstance(item, dict) and item.get('id') is not None and item.get('summary')
+            }
         except Exception as e:
-            logging.error(f"AI summary generation failed: {e}")
-            return f"{subject_name}で{len(questions)}件の質問がありました。継続的な学習への取り組みが見られます。"
+            logging.error(f"AI summary generation failed for {len(entries)} entries: {e}")
+            return {}
     
     def _send_student_report(self, student, report_data):
         """生徒・保護者へのメール送信"""
@@ -295,7 +616,7 @@ class DailyReportService:
                     {% for subject_id, subject_info in data.subject_data.items() %}
                     <div class="subject-section">
                         <h3>📖 {{ subject_info.subject.name if subject_info.subject else '一般的な質問' }}</h3>
-                        <p><strong>質問数:</strong> {{ subject_info.questions|length }}件</p>
+                        <p><strong>質問数:</strong> {{ subject_info.count }}件</p>
                         {% if subject_info.summary %}
                         <div style="background-color: #fff; padding: 10px; border-radius: 5px; margin-top: 10px;">
                             {{ subject_info.summary }}
@@ -438,14 +759,96 @@ class DailyReportService:
         
         return render_template_string(template, data=data)
 
+def _run_in_app(func, *args):
+    """アプリケーションコンテキストの中で実行する"""
+    if has_app_context():
+        return func(*args)
+    with create_app().app_context():
+        return func(*args)
+
+
+def _plan_daily_reports(report_date):
+    """送信対象をチャンクに分け、チャンクごとのタスクと集計タスクを登録する"""
+    service = DailyReportService(report_date=date.fromisoformat(report_date))
+    size = current_app.config.get('DAILY_REPORT_CHUNK_SIZE', 100)
+    header = [send_student_report_chunk.s(chunk, report_date)
+              for chunk in _chunks(service.student_ids(), size)]
+    header += [send_class_report_chunk.s(chunk, report_date)
+               for chunk in _chunks(service.class_ids(), size)]
+    
+    run = DailyReportRun(report_date=service.today, chunks=len(header), started_at=datetime.utcnow())
+    db.session.add(run)
+    db.session.commit()
+    
+    if header:
+        chord(group(header))(summarize_daily_reports.s(run.id))
+    else:
+        _record_summary([], run.id)
+    
+    logging.info(f"Daily reports planned: {len(header)} chunks for {report_date}")
+    return {'success': True, 'message': f"Planned {len(header)} report chunks for {report_date}",
+            'run_id': run.id, 'chunks': len(header)}
+
+
+def _send_chunk(kind, ids, report_date):
+    service = DailyReportService(report_date=date.fromisoformat(report_date))
+    if kind == 'student':
+        return service.send_student_reports(ids)
+    return service.send_class_reports(ids)
+
+
+def _run_chunk(task, kind, ids, report_date):
+    """
+    1チャンク分のレポートを送信する
+    
+    チャンク全体が失敗した場合（DB接続エラーなど）は再試行する。送信済みのレポートは送信記録で飛ばす。
+    再試行の上限に達した場合は集計タスクが実行されるよう、失敗件数を返す。
+    """
+    try:
+        return _run_in_app(_send_chunk, kind, ids, report_date)
+    except Exception as e:
+        if task.request.retries < task.max_retries:
+            raise task.retry(exc=e, countdown=60 * (task.request.retries + 1))
+        logging.error(f"Daily report chunk failed ({kind}, {len(ids)} items): {e}")
+        return {'sent': 0, 'skipped': 0, 'failed': len(ids)}
+
+
+def _record_summary(results, run_id):
+    """チャンクの結果を合計し、実行結果（件数と処理速度）を記録する"""
+    run = db.session.get(DailyReportRun, run_id)
+    for key in ('sent', 'skipped', 'failed'):
+        setattr(run, key, sum(result.get(key, 0) for result in results if result))
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
+    
+    logging.info(
+        f"Daily reports finished for {run.report_date}: {run.sent} sent, {run.skipped} skipped, "
+        f"{run.failed} failed in {run.chunks} chunks ({run.throughput or 0} reports/min)"
+    )
+    return {'sent': run.sent, 'skipped': run.skipped, 'failed': run.failed, 'throughput': run.throughput}
+
+
 # Celeryタスクの定義
 if CELERY_AVAILABLE and celery:
     @celery.task
-    def generate_daily_reports():
-        """日次レポート生成のCeleryタスク"""
-        service = DailyReportService()
-        success, message = service.generate_all_reports()
-        return {'success': success, 'message': message}
+    def generate_daily_reports(report_date=None):
+        """日次レポートの計画タスク（送信はチャンクごとのタスクで並列に行う）"""
+        return _run_in_app(_plan_daily_reports, report_date or date.today().isoformat())
+    
+    @celery.task(bind=True, acks_late=True, max_retries=3)
+    def send_student_report_chunk(self, student_ids, report_date):
+        """生徒レポート1チャンク分の送信タスク"""
+        return _run_chunk(self, 'student', student_ids, report_date)
+    
+    @celery.task(bind=True, acks_late=True, max_retries=3)
+    def send_class_report_chunk(self, class_ids, report_date):
+        """教師向けクラス別レポート1チャンク分の送信タスク"""
+        return _run_chunk(self, 'class', class_ids, report_date)
+    
+    @celery.task
+    def summarize_daily_reports(results, run_id):
+        """全チャンクの完了後に件数と処理速度を記録するタスク"""
+        return _run_in_app(_record_summary, results, run_id)
     
     @celery.task
     def send_test_report(user_id):
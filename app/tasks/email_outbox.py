@@ -0,0 +1,26 @@
+"""
+メールの送信キュー
+app/utils/email_outbox.py に登録したメールをCeleryワーカーで送信する
+（登録時のほか、再試行待ちのメールを送るためにCelery beatで定期実行する）
+"""
+from flask import has_app_context
+
+try:
+    from app.tasks import celery, CELERY_AVAILABLE
+except ImportError:
+    CELERY_AVAILABLE = False
+    celery = None
+
+
+if CELERY_AVAILABLE and celery:
+    @celery.task(ignore_result=True)
+    def drain_email_outbox():
+        """送信キューのメールを送信するCeleryタスク"""
+        from app.utils.email_outbox import drain_outbox
+
+        if has_app_context():
+            return drain_outbox()
+
+        from app import create_app
+        with create_app().app_context():
+            return drain_outbox()
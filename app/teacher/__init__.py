@@ -2,6 +2,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, Response, jsonify, session, current_app
 from flask_login import login_required, current_user
 from werkzeug.security import generate_password_hash
+from sqlalchemy import insert
 from datetime import datetime
 import json
 import csv
@@ -15,22 +16,16 @@ from app.models import (
     Group, GroupMembership, School, InterestSurvey, PersonalitySurvey,
     ActivityLog, Goal, Todo, Subject
 )
-from app.ai import generate_student_evaluation, generate_curriculum_with_ai
+from app.ai import generate_curriculum_with_ai
+from app.utils.csv_export import csv_response, stream_query
+from app.utils.background_jobs import append_results, create_job
+from app.utils.import_jobs import (
+    PASSWORD_RESULTS_MESSAGE, create_import_job, hash_passwords, insert_users, iter_row_chunks, load_existing_users,
+    open_upload
+)
 
-# Conditional import to avoid circular imports
-try:
-    from app.ai.helpers import generate_activity_summary
-except ImportError:
-    def generate_activity_summary(*args, **kwargs):
-        return "活動概要の生成に失敗しました。"
 from app.models import ChatHistory
-
-# Conditional import for PDF generator
-try:
-    from .pdf_generator import generate_student_report_pdf
-except ImportError:
-    def generate_student_report_pdf(*args, **kwargs):
-        return None
+from .reports import get_student_report_pdf
 
 teacher_bp = Blueprint('teacher', __name__)
 
@@ -685,7 +680,8 @@ def generate_evaluations(class_id):
     rubric = RubricTemplate.query.filter_by(class_id=class_id).first()
     
     if request.method == 'POST':
-        selected_student_ids = request.form.getlist('student_ids')
+        selected_student_ids = [int(student_id) for student_id in request.form.getlist('student_ids')
+                                if student_id.isdigit()]
         
         if not selected_student_ids:
             flash('評価する生徒を選択してください。')
@@ -695,79 +691,47 @@ def generate_evaluations(class_id):
                                  curriculum=curriculum,
                                  rubric=rubric)
         
-        evaluations = []
-        
-        for student_id in selected_student_ids:
-            student = User.query.get(int(student_id))
-            if not student:
-                continue
-            
-            # 生徒の探究テーマを取得
-            theme = InquiryTheme.query.filter_by(
-                student_id=student.id,
-                is_selected=True
-            ).first()
-            
-            # 生徒の目標を取得
-            goals = Goal.query.filter_by(student_id=student.id).all()
-            
-            # 生徒の活動記録を取得
-            activity_logs = ActivityLog.query.filter_by(student_id=student.id).all()
-            
-            # カリキュラムとルーブリックのデータを準備
-            curriculum_data = json.loads(curriculum.content) if curriculum and curriculum.content else None
-            rubric_data = json.loads(rubric.content) if rubric and rubric.content else None
-            
-            # AI評価を生成
-            evaluation_text = generate_student_evaluation(
-                student, theme, goals, activity_logs, curriculum_data, rubric_data
-            )
-            
-            # 評価を保存
-            existing_eval = StudentEvaluation.query.filter_by(
-                student_id=student.id,
-                class_id=class_id
-            ).first()
-            
-            if existing_eval:
-                existing_eval.evaluation_text = evaluation_text
-                existing_eval.updated_at = datetime.utcnow()
-            else:
-                new_eval = StudentEvaluation(
-                    student_id=student.id,
-                    class_id=class_id,
-                    evaluation_text=evaluation_text
-                )
-                db.session.add(new_eval)
-            
-            evaluations.append({
-                'student': student,
-                'evaluation': evaluation_text
-            })
-        
-        db.session.commit()
+        # AI評価はバックグラウンドで並列に作成し、できた生徒から保存する
+        try:
+            job = create_job('class_evaluations', current_user.id,
+                             {'class_id': class_id, 'student_ids': selected_student_ids},
+                             total=len(selected_student_ids),
+                             filename=f'{class_obj.name} 評価生成')
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"評価生成ジョブの登録エラー: {e}")
+            flash('評価生成の開始中にエラーが発生しました。')
+            return redirect(url_for('teacher.generate_evaluations', class_id=class_id))
         
-        # 評価をセッションに保存（エクスポート用）
-        import json
-        session['evaluations'] = json.dumps([
-            {
-                'student_name': eval['student'].username,
-                'evaluation': eval['evaluation']
-            } for eval in evaluations
-        ])
+        # エクスポートは保存済みの評価から作成する
+        session.pop('evaluations', None)
         session['class_name'] = class_obj.name
         session['class_id'] = class_id
         
-        flash(f'{len(evaluations)}名の評価を生成しました。')
-        return render_template('evaluation_results.html', 
-                             evaluations=evaluations,
-                             class_obj=class_obj)
+        return render_template('background_job.html',
+                             job=job,
+                             title=f'{class_obj.name} - AI評価の生成',
+                             unit='人',
+                             back_url=url_for('teacher.generate_evaluations', class_id=class_id))
+    
+    # 保存済みの評価
+    evaluations = [
+        {'student_name': username, 'evaluation': evaluation_text}
+        for username, evaluation_text in db.session.query(
+            User.username, StudentEvaluation.evaluation_text
+        ).join(
+            User, User.id == StudentEvaluation.student_id
+        ).filter(
+            StudentEvaluation.class_id == class_id
+        ).order_by(User.username)
+    ]
     
     return render_template('evaluate_students.html', 
                          class_obj=class_obj, 
                          students=students,
                          curriculum=curriculum,
-                         rubric=rubric)
+                         rubric=rubric,
+                         evaluations=evaluations)
 
 # カリキュラム管理
 @teacher_bp.route('/class/<int:class_id>/curriculums')
@@ -908,97 +872,194 @@ def create_group(class_id):
     
     return render_template('create_group.html', class_obj=class_obj)
 
+@teacher_bp.route('/class/<int:class_id>/activities/export')
+@login_required
+@teacher_required
+def export_class_activities(class_id):
+    """クラスの全生徒の活動記録をCSVでエクスポート"""
+    class_obj = Class.query.get_or_404(class_id)
+    
+    # 権限チェック
+    if class_obj.teacher_id != current_user.id:
+        flash('このクラスの活動記録をエクスポートする権限がありません。')
+        return redirect(url_for('teacher.classes'))
+    
+    # 必要な列だけをサーバーサイドカーソルで読みながら送る
+    rows = stream_query(db.session.query(
+        User.username,
+        User.full_name,
+        ActivityLog.date,
+        ActivityLog.title,
+        ActivityLog.content,
+        ActivityLog.reflection,
+        ActivityLog.tags
+    ).join(
+        User, User.id == ActivityLog.student_id
+    ).filter(
+        ActivityLog.class_id == class_id
+    ).order_by(
+        User.username, ActivityLog.date, ActivityLog.id
+    ))
+    
+    return csv_response(
+        f'{class_obj.name}_活動記録.csv',
+        ['ユーザー名', '氏名', '日付', 'タイトル', '活動内容', '振り返り', 'タグ'],
+        (
+            (
+                username, full_name or username,
+                activity_date.strftime('%Y-%m-%d') if activity_date else '',
+                title, content, reflection, tags
+            )
+            for username, full_name, activity_date, title, content, reflection, tags in rows
+        )
+    )
+
 # 生徒インポート
-def process_student_csv(file, class_id, current_user):
-    """CSVファイルから生徒情報を処理"""
-    stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-    csv_reader = csv.DictReader(stream)
+def process_student_csv(source, class_id, school_id, progress=None, write_rows=None):
+    """
+    CSVから生徒を作成・クラスに登録する
+    
+    ROW_CHUNK_SIZE 行ごとに、参照されるユーザー名・メールアドレスの既存ユーザーと
+    そのクラス登録をそれぞれ1回のINクエリで読み込んでメモリ上で照合し、
+    新規生徒とクラス登録を一括INSERTする（チャンクごとにコミットして進捗を通知する）。
+    新規生徒のパスワードハッシュはチャンクごとにプロセスプールでまとめて計算する。
+    
+    Args:
+        source: CSVのテキストストリーム（username, email, student_number 列）
+        class_id: 登録先のクラスID
+        school_id: 教師の学校ID（既存生徒は同じ学校の場合のみ登録する）
+        progress: 進捗通知のコールバック progress(処理済み行数)（オプション）
+        write_rows: チャンクのコミット後に、そのチャンクで作成した生徒の
+                    [{'username', 'password'}] を受け取るコールバック（オプション）
+    
+    Returns:
+        dict: {'created': [{'username', 'password'}], 'enrolled': [ユーザー名], 'errors': [メッセージ]}
+    """
+    import secrets
+    import string
     
     results = {
         'created': [],
         'enrolled': [],
         'errors': []
     }
+    # ファイル内の重複チェック用（大文字小文字を区別しない）
+    seen_usernames = set()
+    seen_emails = set()
+    alphabet = string.ascii_letters + string.digits
+    processed = 0
     
-    for row_num, row in enumerate(csv_reader, 2):
-        try:
-            # 必須フィールドの確認
-            username = row.get('username', '').strip()
-            email = row.get('email', '').strip()
-            student_number = row.get('student_number', '').strip()
+    for chunk in iter_row_chunks(csv.DictReader(source)):
+        # 必須フィールドの確認
+        rows = []
+        for row_num, row in chunk:
+            username = (row.get('username') or '').strip()
+            email = (row.get('email') or '').strip()
             
             if not username or not email:
                 results['errors'].append(f"行 {row_num}: ユーザー名とメールアドレスは必須です")
                 continue
             
-            # 既存ユーザーチェック
-            existing_user = User.query.filter_by(username=username).first()
+            if username.lower() in seen_usernames:
+                results['errors'].append(f"行 {row_num}: {username} がファイル内で重複しています")
+                continue
+            seen_usernames.add(username.lower())
+            rows.append((row_num, username, email))
+        
+        # 既存ユーザーとそのクラス登録をまとめて取得
+        existing_users, existing_emails = load_existing_users(
+            {username for _, username, _ in rows},
+            {email for _, _, email in rows}
+        )
+        existing_ids = [user.id for user in existing_users.values()]
+        enrolled_ids = {row[0] for row in db.session.query(ClassEnrollment.student_id).filter(
+            ClassEnrollment.class_id == class_id,
+            ClassEnrollment.student_id.in_(existing_ids)
+        ).all()} if existing_ids else set()
+        
+        enroll_ids = []
+        new_students = []
+        created = []
+        for row_num, username, email in rows:
+            existing_user = existing_users.get(username.lower())
             if existing_user:
                 # 既存ユーザーをクラスに登録
-                if existing_user.role == 'student' and existing_user.school_id == current_user.school_id:
-                    existing_enrollment = ClassEnrollment.query.filter_by(
-                        class_id=class_id,
-                        student_id=existing_user.id
-                    ).first()
-                    
-                    if not existing_enrollment:
-                        enrollment = ClassEnrollment(
-                            class_id=class_id,
-                            student_id=existing_user.id
-                        )
-                        db.session.add(enrollment)
-                        results['enrolled'].append(username)
-                    else:
-                        results['errors'].append(f"行 {row_num}: {username} は既にクラスに登録されています")
-                else:
+                if existing_user.role != 'student' or existing_user.school_id != school_id:
                     results['errors'].append(f"行 {row_num}: {username} は生徒ではないか、異なる学校に所属しています")
+                elif existing_user.id in enrolled_ids:
+                    results['errors'].append(f"行 {row_num}: {username} は既にクラスに登録されています")
+                else:
+                    enroll_ids.append(existing_user.id)
+                    enrolled_ids.add(existing_user.id)
+                    results['enrolled'].append(username)
+            elif email.lower() in existing_emails or email.lower() in seen_emails:
+                results['errors'].append(f"行 {row_num}: メール {email} は既に使用されています")
             else:
-                # 新規ユーザー作成
-                existing_email = User.query.filter_by(email=email).first()
-                if existing_email:
-                    results['errors'].append(f"行 {row_num}: メール {email} は既に使用されています")
-                    continue
-                
-                # パスワード生成
-                import random
-                import string
-                password = ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(10))
-                
-                new_user = User(
-                    username=username,
-                    email=email,
-                    password=generate_password_hash(password),
-                    role='student',
-                    school_id=current_user.school_id,
-                    email_confirmed=True,
-                    is_approved=True
-                )
-                
-                db.session.add(new_user)
-                db.session.flush()  # IDを取得
-                
-                # クラスに登録
-                enrollment = ClassEnrollment(
-                    class_id=class_id,
-                    student_id=new_user.id
-                )
-                db.session.add(enrollment)
-                
-                results['created'].append({
+                # 新規ユーザー（パスワードハッシュはチャンクごとにまとめて計算）
+                seen_emails.add(email.lower())
+                new_students.append({
                     'username': username,
-                    'password': password
+                    'email': email,
+                    'password': ''.join(secrets.choice(alphabet) for _ in range(10))
                 })
-                
-        except Exception as e:
-            results['errors'].append(f"行 {row_num}: エラー - {str(e)}")
+        
+        if new_students:
+            password_hashes = hash_passwords([student['password'] for student in new_students])
+            user_ids = insert_users([
+                {
+                    'username': student['username'],
+                    'email': student['email'],
+                    'password': password_hash,
+                    'role': 'student',
+                    'school_id': school_id,
+                    'email_confirmed': True,
+                    'is_approved': True
+                }
+                for student, password_hash in zip(new_students, password_hashes)
+            ])
+            enroll_ids.extend(user_ids[student['username'].lower()] for student in new_students)
+            created = [
+                {'username': student['username'], 'password': student['password']}
+                for student in new_students
+            ]
+            results['created'].extend(created)
+        
+        if enroll_ids:
+            db.session.execute(insert(ClassEnrollment), [
+                {'class_id': class_id, 'student_id': student_id}
+                for student_id in enroll_ids
+            ])
+        
+        db.session.commit()
+        # コミットした生徒のパスワードは後のチャンクが失敗しても失われないようにすぐ渡す
+        if write_rows and created:
+            write_rows(created)
+        processed += len(chunk)
+        if progress:
+            progress(processed)
     
     return results
 
+def run_student_import(job, progress):
+    """生徒インポートジョブのハンドラ（app/utils/background_jobs.py から呼ばれる）"""
+    teacher = db.session.get(User, job.user_id)
+    with open_upload(job) as source:
+        results = process_student_csv(
+            source, job.params['class_id'], teacher.school_id, progress,
+            write_rows=lambda rows: append_results(job.id, rows)
+        )
+    
+    return {
+        'created': len(results['created']),
+        'enrolled': len(results['enrolled']),
+        'errors': results['errors']
+    }
+
 @teacher_bp.route('/class/<int:class_id>/students/import', methods=['GET', 'POST'])
 @login_required
 @teacher_required
 def import_students(class_id):
-    """生徒一括インポート"""
+    """生徒一括インポート（CSVの処理はバックグラウンドジョブで行う）"""
     class_obj = Class.query.get_or_404(class_id)
     
     # 権限チェック
@@ -1007,12 +1068,8 @@ def import_students(class_id):
         return redirect(url_for('teacher.classes'))
     
     if request.method == 'POST':
-        if 'file' not in request.files:
-            flash('ファイルが選択されていません。')
-            return redirect(request.url)
-        
-        file = request.files['file']
-        if file.filename == '':
+        file = request.files.get('csv_file') or request.files.get('file')
+        if not file or file.filename == '':
             flash('ファイルが選択されていません。')
             return redirect(request.url)
         
@@ -1021,34 +1078,22 @@ def import_students(class_id):
             return redirect(request.url)
         
         try:
-            results = process_student_csv(file, class_id, current_user)
-            
-            # コミット
-            db.session.commit()
-            
-            # 結果メッセージ
-            if results['created']:
-                flash(f"{len(results['created'])}名の新規生徒を作成しました。")
-            if results['enrolled']:
-                flash(f"{len(results['enrolled'])}名の既存生徒をクラスに追加しました。")
-            if results['errors']:
-                for error in results['errors'][:5]:  # 最初の5件のエラーを表示
-                    flash(error, 'error')
-                if len(results['errors']) > 5:
-                    flash(f"... 他 {len(results['errors']) - 5} 件のエラー", 'error')
-            
-            # 作成されたアカウント情報を表示
-            if results['created']:
-                return render_template('import_results.html', 
-                                     created_accounts=results['created'],
-                                     class_obj=class_obj)
-            
+            job = create_import_job('teacher_students', file, current_user.id, {'class_id': class_id})
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(request.url)
         except Exception as e:
             db.session.rollback()
             logging.error(f"生徒インポートエラー: {e}")
             flash(f'インポート中にエラーが発生しました: {str(e)}', 'error')
+            return redirect(url_for('teacher.class_details', class_id=class_id))
         
-        return redirect(url_for('teacher.class_details', class_id=class_id))
+        return render_template('background_job.html',
+                             job=job,
+                             title=f'{class_obj.name} - 生徒一括登録',
+                             unit='行',
+                             results_message=PASSWORD_RESULTS_MESSAGE,
+                             back_url=url_for('teacher.class_details', class_id=class_id))
     
     return render_template('teacher_import_students.html', class_obj=class_obj)
 
@@ -1124,38 +1169,12 @@ def generate_student_report(class_id, student_id):
         return redirect(url_for('teacher.class_details', class_id=class_id))
     
     try:
-        # 探究テーマを取得
-        theme = InquiryTheme.query.filter_by(
-            student_id=student_id,
-            class_id=class_id,
-            is_selected=True
-        ).first()
-        
-        # 活動記録を取得（最新50件）
-        activities = ActivityLog.query.filter_by(
-            student_id=student_id,
-            class_id=class_id
-        ).order_by(ActivityLog.timestamp.desc()).limit(50).all()
-        
-        # チャット履歴を取得（最新100件）
-        chat_histories = ChatHistory.query.filter_by(
-            user_id=student_id,
-            class_id=class_id
-        ).order_by(ChatHistory.timestamp.desc()).limit(100).all()
-        
-        # AI要約を生成
-        activity_texts = [a.content for a in activities if a.content]
-        chat_texts = [c.message for c in chat_histories if c.is_user and c.message]
-        ai_summary = generate_activity_summary(activity_texts, chat_texts)
+        # PDF生成（活動記録などが前回から変わっていなければキャッシュを使う）
+        pdf = get_student_report_pdf(student, class_obj)
         
-        # PDF生成
-        pdf_buffer = generate_student_report_pdf(
-            student, class_obj, activities, chat_histories, theme, ai_summary
-        )
-        
-        # レスポンス作成（メモリから直接送信、保存しない）
+        # レスポンス作成
         from flask import make_response
-        response = make_response(pdf_buffer.getvalue())
+        response = make_response(pdf)
         response.headers['Content-Type'] = 'application/pdf'
         response.headers['Content-Disposition'] = f'attachment; filename=report_{student.username}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
         
@@ -1169,6 +1188,37 @@ def generate_student_report(class_id, student_id):
         flash('PDF生成中にエラーが発生しました。')
         return redirect(url_for('teacher.class_details', class_id=class_id))
 
+@teacher_bp.route('/class/<int:class_id>/reports/generate', methods=['POST'])
+@login_required
+@teacher_required
+def generate_class_reports(class_id):
+    """クラス全員分の活動報告PDFをバックグラウンドで作成してZIPにまとめる"""
+    class_obj = Class.query.get_or_404(class_id)
+    if class_obj.teacher_id != current_user.id:
+        flash('このクラスにアクセスする権限がありません。')
+        return redirect(url_for('teacher.dashboard'))
+    
+    student_count = ClassEnrollment.query.filter_by(class_id=class_id, is_active=True).count()
+    if student_count == 0:
+        flash('このクラスには生徒が登録されていません。')
+        return redirect(url_for('teacher.class_details', class_id=class_id))
+    
+    try:
+        job = create_job('class_reports', current_user.id, {'class_id': class_id},
+                         total=student_count, filename=f'{class_obj.name} 活動報告PDF')
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"活動報告PDFジョブの登録エラー: {e}")
+        flash('PDF作成の開始中にエラーが発生しました。')
+        return redirect(url_for('teacher.class_details', class_id=class_id))
+    
+    return render_template('background_job.html',
+                         job=job,
+                         title=f'{class_obj.name} - 活動報告PDFの一括作成',
+                         unit='人',
+                         results_message='クラス全員分の活動報告PDFをZIPにまとめました。ファイルは一定期間後に削除されます。',
+                         back_url=url_for('teacher.class_details', class_id=class_id))
+
 # カリキュラム関連の追加ルート
 @teacher_bp.route('/class/<int:class_id>/curriculum/import', methods=['GET', 'POST'])
 @login_required
@@ -1331,37 +1381,25 @@ def export_curriculum(curriculum_id):
         return redirect(url_for('teacher.dashboard'))
     
     # カリキュラム内容をCSV形式でエクスポート
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # ヘッダー行
-    writer.writerow(['週', '時限', 'テーマ', '活動内容', '評価方法'])
-    
-    # カリキュラム内容を解析
     try:
         content = json.loads(curriculum.content) if curriculum.content else []
-        for item in content:
-            writer.writerow([
+    except (TypeError, ValueError):
+        content = []
+    
+    return csv_response(
+        f'curriculum_{curriculum.id}.csv',
+        ['週', '時限', 'テーマ', '活動内容', '評価方法'],
+        (
+            [
                 item.get('week', ''),
                 item.get('hour', ''),
                 item.get('theme', ''),
                 item.get('activity', ''),
                 item.get('evaluation', '')
-            ])
-    except:
-        pass
-    
-    # レスポンスを作成
-    output.seek(0)
-    response = Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={
-            'Content-Disposition': f'attachment; filename=curriculum_{curriculum.id}.csv'
-        }
+            ]
+            for item in content if isinstance(item, dict)
+        )
     )
-    
-    return response
 
 @teacher_bp.route('/curriculum/download_template')
 @login_required
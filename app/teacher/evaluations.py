@@ -0,0 +1,207 @@
+# app/teacher/evaluations.py
+"""
+AIによる生徒評価の一括作成
+
+評価はバックグラウンドジョブ（app/utils/background_jobs.py の 'class_evaluations'）で作成する。
+- 対象の生徒の探究テーマ・目標・学習記録はまとめて数回のクエリで取得し、
+  ルーブリックのJSONは1回だけ読み込む。
+- OpenAI APIの呼び出しはスレッドプールで並列に行う。同時実行数は設定 EVALUATION_AI_CONCURRENCY、
+  1分あたりの呼び出し回数は設定 EVALUATION_AI_RATE_LIMIT で制限する。
+- 評価は作成できた生徒から順に保存し、進捗をジョブに記録する。
+- OpenAI APIが利用できない場合は、生徒ごとに呼び出さずにジョブを失敗として記録する。
+"""
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from extensions import db
+from app.models import (
+    ActivityLog, Class, ClassEnrollment, Goal, InquiryTheme,
+    RubricTemplate, StudentEvaluation, User
+)
+from app.ai import (
+    EVALUATION_ACTIVITY_LIMIT, AIGatewayError, build_student_evaluation_prompt, is_available,
+    request_student_evaluation
+)
+
+
+class RateLimiter:
+    """1分あたりの呼び出し回数を制限する（スレッド間で共有する）"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0
+        self._lock = threading.Lock()
+        self._next_time = time.monotonic()
+
+    def wait(self):
+        """次に呼び出してよい時刻まで待つ"""
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _load_json(content):
+    """ルーブリックのJSON（読めない場合はNone）"""
+    if not content:
+        return None
+    try:
+        return json.loads(content)
+    except (TypeError, ValueError):
+        return None
+
+
+def load_evaluation_inputs(class_id, student_ids):
+    """
+    評価する生徒と、評価に使うデータをまとめて取得する
+
+    Args:
+        class_id: クラスID（このクラスに所属していない生徒は除く）
+        student_ids: 評価する生徒のIDのリスト
+
+    Returns:
+        tuple: (生徒のリスト, {生徒ID: 探究テーマ}, {生徒ID: [目標]}, {生徒ID: [学習記録（新しい順）]})
+    """
+    students = User.query.join(
+        ClassEnrollment, ClassEnrollment.student_id == User.id
+    ).filter(
+        ClassEnrollment.class_id == class_id,
+        User.id.in_(student_ids)
+    ).order_by(User.username).all()
+    ids = [student.id for student in students]
+    if not ids:
+        return [], {}, {}, {}
+
+    themes = {}
+    for theme in InquiryTheme.query.filter(
+        InquiryTheme.student_id.in_(ids),
+        InquiryTheme.is_selected == True
+    ).order_by(InquiryTheme.id):
+        themes.setdefault(theme.student_id, theme)
+
+    goals = defaultdict(list)
+    for goal in Goal.query.filter(Goal.student_id.in_(ids)).order_by(Goal.id):
+        goals[goal.student_id].append(goal)
+
+    # 生徒ごとに新しい順で EVALUATION_ACTIVITY_LIMIT 件まで
+    ranked = select(
+        ActivityLog.id,
+        func.row_number().over(
+            partition_by=ActivityLog.student_id,
+            order_by=(ActivityLog.date.desc(), ActivityLog.id.desc())
+        ).label('position')
+    ).where(ActivityLog.student_id.in_(ids)).subquery()
+
+    activity_logs = defaultdict(list)
+    for log in ActivityLog.query.join(
+        ranked, ranked.c.id == ActivityLog.id
+    ).filter(
+        ranked.c.position <= EVALUATION_ACTIVITY_LIMIT
+    ).order_by(ranked.c.position):
+        activity_logs[log.student_id].append(log)
+
+    return students, themes, goals, activity_logs
+
+
+def _request(limiter, prompt):
+    """レート制限を守ってAPIを呼び出す（一時的なエラーの再試行は app/ai/gateway.py が行う）"""
+    limiter.wait()
+    return request_student_evaluation(prompt)
+
+
+def _save_evaluation(existing, student_id, class_id, evaluation_text):
+    evaluation = existing.get(student_id)
+    if evaluation:
+        evaluation.evaluation_text = evaluation_text
+    else:
+        evaluation = StudentEvaluation(
+            student_id=student_id,
+            class_id=class_id,
+            evaluation_text=evaluation_text
+        )
+        db.session.add(evaluation)
+        existing[student_id] = evaluation
+    db.session.commit()
+
+
+def run_evaluation_job(job, progress):
+    """
+    選択した生徒のAI評価を作成する（ジョブ 'class_evaluations' のハンドラ）
+
+    Args:
+        job: BackgroundJob（job.params に class_id と student_ids）
+        progress: 評価が終わった人数を通知するコールバック
+
+    Returns:
+        dict: 評価を保存した人数とエラー
+
+    Raises:
+        AIGatewayError: OpenAI APIが利用できない場合（生徒ごとのエラーにせず、ジョブを失敗にする）
+    """
+    class_id = job.params.get('class_id')
+    class_obj = db.session.get(Class, class_id) if class_id else None
+    if class_obj is None or class_obj.teacher_id != job.user_id:
+        raise ValueError('対象のクラスが見つかりません')
+
+    if not is_available():
+        raise AIGatewayError('OpenAI APIが利用できないため評価を作成できません。APIキーの設定を確認してください')
+
+    rubric = RubricTemplate.query.filter_by(class_id=class_id).first()
+    rubric_data = _load_json(rubric.content if rubric else None)
+
+    students, themes, goals, activity_logs = load_evaluation_inputs(class_id, job.params.get('student_ids') or [])
+
+    # プロンプトはDBのオブジェクトを使うのでジョブのスレッドで作成し、APIの呼び出しだけを並列にする
+    prompts = {
+        student.id: build_student_evaluation_prompt(
+            student, themes.get(student.id), goals[student.id], activity_logs[student.id], rubric_data
+        )
+        for student in students
+    }
+    names = {student.id: student.username for student in students}
+    existing = {
+        evaluation.student_id: evaluation
+        for evaluation in StudentEvaluation.query.filter(
+            StudentEvaluation.class_id == class_id,
+            StudentEvaluation.student_id.in_(list(prompts))
+        )
+    }
+
+    if not prompts:
+        return {'evaluated': 0}
+
+    limiter = RateLimiter(current_app.config.get('EVALUATION_AI_RATE_LIMIT', 60))
+    workers = max(1, current_app.config.get('EVALUATION_AI_CONCURRENCY', 4))
+
+    evaluated = 0
+    errors = []
+    with ThreadPoolExecutor(max_workers=min(workers, len(prompts)), thread_name_prefix='evaluation') as executor:
+        futures = {
+            executor.submit(_request, limiter, prompt): student_id
+            for student_id, prompt in prompts.items()
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            student_id = futures[future]
+            try:
+                evaluation_text = future.result()
+            except Exception as e:
+                logging.error(f"生徒 {student_id} の評価生成エラー: {e}")
+                errors.append(f"{names[student_id]}: 評価を生成できませんでした（{e}）")
+            else:
+                _save_evaluation(existing, student_id, class_id, evaluation_text)
+                evaluated += 1
+            progress(done)
+
+    return {'evaluated': evaluated, 'errors': errors}
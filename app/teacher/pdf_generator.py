@@ -1,4 +1,4 @@
-from flask import make_response
+from functools import lru_cache
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
@@ -7,27 +7,33 @@ from reportlab.lib.units import inch
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.cidfonts import UnicodeCIDFont
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from xml.sax.saxutils import escape
 import io
 from datetime import datetime
-import os
-
-# 日本語フォントの設定（CIDフォントを使用）
-pdfmetrics.registerFont(UnicodeCIDFont('HeiseiMin-W3'))
-pdfmetrics.registerFont(UnicodeCIDFont('HeiseiKakuGo-W5'))
 
 FONT_NAME = 'HeiseiMin-W3'  # 明朝体
 FONT_NAME_BOLD = 'HeiseiKakuGo-W5'  # ゴシック体
 
-def generate_student_report_pdf(student, class_obj, activities, chat_histories, theme, ai_summary):
-    """学生の活動報告PDFを生成"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*inch, bottomMargin=1*inch)
-    story = []
-    
-    # スタイルの設定
+# レポートに載せる件数
+MAX_REPORT_ACTIVITIES = 20
+MAX_REPORT_CHATS = 15
+MAX_AI_MESSAGE_LENGTH = 200
+
+def register_japanese_fonts():
+    """日本語フォント（CIDフォント）を登録（プロセスごとに1回だけ）"""
+    registered = pdfmetrics.getRegisteredFontNames()
+    for font_name in (FONT_NAME, FONT_NAME_BOLD):
+        if font_name not in registered:
+            pdfmetrics.registerFont(UnicodeCIDFont(font_name))
+
+register_japanese_fonts()
+
+@lru_cache(maxsize=None)
+def get_report_styles():
+    """日本語フォントを使用するスタイル（プロセスごとに1回だけ作成）"""
+    register_japanese_fonts()
     styles = getSampleStyleSheet()
     
-    # 日本語フォントを使用するスタイル
     title_style = ParagraphStyle(
         'CustomTitle',
         parent=styles['Heading1'],
@@ -56,67 +62,124 @@ def generate_student_report_pdf(student, class_obj, activities, chat_histories,
         leading=14
     )
     
+    info_table_style = TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), FONT_NAME),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('PADDING', (0, 0), (-1, -1), 6),
+    ])
+    
+    return {
+        'title': title_style,
+        'heading': heading_style,
+        'normal': normal_style,
+        'info_table': info_table_style,
+    }
+
+def build_report_data(student, class_obj, activities, chat_histories, theme, ai_summary=None):
+    """
+    PDFに載せる内容をモデルから取り出す
+    
+    ワーカープロセスに渡せるよう、文字列・数値・リスト・dictだけにする。
+    
+    Args:
+        activities: 活動記録（新しい順）
+        chat_histories: チャット履歴（新しい順）
+    
+    Returns:
+        dict: render_report_pdf に渡すデータ
+    """
+    return {
+        'student_name': student.username,
+        'class_name': class_obj.name,
+        'theme_title': theme.title if theme else '未設定',
+        'created_date': datetime.now().strftime('%Y年%m月%d日'),
+        'ai_summary': ai_summary,
+        'activities': [
+            {
+                'date': activity.timestamp.strftime('%Y/%m/%d %H:%M') if activity.timestamp else '',
+                'content': activity.content,
+                'reflection': activity.reflection,
+            }
+            for activity in activities[:MAX_REPORT_ACTIVITIES]
+        ],
+        'chats': [
+            {'is_user': bool(chat.is_user), 'message': chat.message or ''}
+            for chat in chat_histories[:MAX_REPORT_CHATS]
+        ],
+    }
+
+def render_report_pdf(data):
+    """
+    build_report_data のデータから活動報告PDFを生成
+    
+    モデルやアプリケーションコンテキストを使わないため、ワーカープロセスでも実行できる。
+    
+    Returns:
+        bytes: PDFの内容
+    """
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*inch, bottomMargin=1*inch)
+    story = []
+    
+    styles = get_report_styles()
+    title_style = styles['title']
+    heading_style = styles['heading']
+    normal_style = styles['normal']
+    
     # タイトル
     story.append(Paragraph("探究活動報告書", title_style))
     story.append(Spacer(1, 0.3*inch))
     
     # 基本情報テーブル
     info_data = [
-        ['生徒名:', student.username],
-        ['クラス:', class_obj.name],
-        ['探究テーマ:', theme.title if theme else '未設定'],
-        ['作成日:', datetime.now().strftime('%Y年%m月%d日')]
+        ['生徒名:', data['student_name']],
+        ['クラス:', data['class_name']],
+        ['探究テーマ:', data['theme_title']],
+        ['作成日:', data['created_date']]
     ]
     
     info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), FONT_NAME),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('PADDING', (0, 0), (-1, -1), 6),
-    ]))
+    info_table.setStyle(styles['info_table'])
     story.append(info_table)
     story.append(Spacer(1, 0.5*inch))
     
     # AI要約セクション
     story.append(Paragraph("1. 活動の要約（AI分析）", heading_style))
-    story.append(Paragraph(ai_summary or "要約を生成中にエラーが発生しました。", normal_style))
+    story.append(Paragraph(escape(data['ai_summary'] or "要約を生成中にエラーが発生しました。"), normal_style))
     story.append(Spacer(1, 0.3*inch))
     
     # 活動記録セクション
     story.append(Paragraph("2. 活動記録", heading_style))
-    if activities:
-        for i, activity in enumerate(activities[:20]):  # 最新20件
-            date_str = activity.timestamp.strftime('%Y/%m/%d %H:%M')
-            story.append(Paragraph(f"【{i+1}. {date_str}】", normal_style))
-            story.append(Paragraph(activity.content or "内容なし", normal_style))
-            if activity.reflection:
-                story.append(Paragraph(f"振り返り: {activity.reflection}", normal_style))
+    if data['activities']:
+        for i, activity in enumerate(data['activities']):
+            story.append(Paragraph(f"【{i+1}. {activity['date']}】", normal_style))
+            story.append(Paragraph(escape(activity['content'] or "内容なし"), normal_style))
+            if activity['reflection']:
+                story.append(Paragraph(f"振り返り: {escape(activity['reflection'])}", normal_style))
             story.append(Spacer(1, 0.2*inch))
     else:
         story.append(Paragraph("活動記録がありません。", normal_style))
     
     # 新しいページ
-    if chat_histories:
+    if data['chats']:
         story.append(PageBreak())
         
-        # チャット履歴セクション
+        # チャット履歴セクション（1ページに収まる量に制限）
         story.append(Paragraph("3. AIチャットでの学習履歴（抜粋）", heading_style))
-        chat_count = 0
-        for chat in chat_histories[:30]:  # 最新30件
-            if chat.is_user:
-                story.append(Paragraph(f"生徒: {chat.message}", normal_style))
+        for chat in data['chats']:
+            if chat['is_user']:
+                story.append(Paragraph(f"生徒: {escape(chat['message'])}", normal_style))
             else:
                 # AI応答は200文字まで
-                message = chat.message[:200] + "..." if len(chat.message) > 200 else chat.message
-                story.append(Paragraph(f"AI: {message}", normal_style))
+                message = chat['message']
+                if len(message) > MAX_AI_MESSAGE_LENGTH:
+                    message = message[:MAX_AI_MESSAGE_LENGTH] + "..."
+                story.append(Paragraph(f"AI: {escape(message)}", normal_style))
             story.append(Spacer(1, 0.1*inch))
-            chat_count += 1
-            if chat_count >= 15:  # 1ページに収まる量に制限
-                break
     
     # フッター情報
     story.append(Spacer(1, 0.5*inch))
@@ -124,5 +187,9 @@ def generate_student_report_pdf(student, class_obj, activities, chat_histories,
     
     # PDFを生成
     doc.build(story)
-    buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return buffer.getvalue()
+
+def generate_student_report_pdf(student, class_obj, activities, chat_histories, theme, ai_summary):
+    """学生の活動報告PDFを生成"""
+    data = build_report_data(student, class_obj, activities, chat_histories, theme, ai_summary)
+    return io.BytesIO(render_report_pdf(data))
\ No newline at end of file
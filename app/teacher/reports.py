@@ -0,0 +1,298 @@
+# app/teacher/reports.py
+"""
+活動報告PDFの作成
+
+- PDFの入力（活動記録・チャット履歴・探究テーマ）の内容ハッシュをキーに、作成したPDFを
+  SECURE_UPLOAD_FOLDER/report_cache/ にキャッシュする。同じ日に入力が変わっていなければ
+  AI要約の呼び出しもPDFの生成も行わない（保存期間は設定 REPORT_CACHE_TTL）。
+- クラス全員分のPDFはバックグラウンドジョブ（app/utils/background_jobs.py の 'class_reports'）で作成する。
+  AI要約はスレッドプール（同時実行数は設定 REPORT_AI_CONCURRENCY）で並列に作成し、できた生徒から
+  ジョブごとに1つ作るプロセスプール（設定 REPORT_PDF_WORKERS）でPDFを生成してZIPにまとめる。
+  gevent のワーカーから子プロセスを起動しないよう、このジョブはCeleryワーカーで実行する。
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+
+from extensions import db
+from app.models import ActivityLog, ChatHistory, Class, ClassEnrollment, InquiryTheme, User
+from app.utils.background_jobs import gevent_patched, results_path
+
+try:
+    from .pdf_generator import build_report_data, render_report_pdf
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+try:
+    from app.ai.helpers import generate_activity_summary
+except ImportError:
+    def generate_activity_summary(*args, **kwargs):
+        return "活動概要の生成に失敗しました。"
+
+# PDFのレイアウトを変えたら上げる（古いキャッシュを使わないようにする）
+REPORT_LAYOUT_VERSION = 1
+
+REPORT_CACHE_DIR_NAME = 'report_cache'
+REPORTS_ZIP_FILENAME = 'reports.zip'
+
+# レポートの作成に使う件数（新しい順）
+REPORT_ACTIVITY_LIMIT = 50
+REPORT_CHAT_LIMIT = 100
+
+
+def _require_reportlab():
+    if not REPORTLAB_AVAILABLE:
+        raise RuntimeError('PDF生成には reportlab が必要です')
+
+
+def collect_report_inputs(student, class_obj):
+    """
+    生徒の活動報告PDFの入力を取得する
+
+    Returns:
+        tuple: (build_report_data のデータ（AI要約なし）, AI要約に使う活動内容, AI要約に使うチャットの質問)
+    """
+    theme = InquiryTheme.query.filter_by(
+        student_id=student.id,
+        class_id=class_obj.id,
+        is_selected=True
+    ).first()
+
+    activities = ActivityLog.query.filter_by(
+        student_id=student.id,
+        class_id=class_obj.id
+    ).order_by(ActivityLog.timestamp.desc()).limit(REPORT_ACTIVITY_LIMIT).all()
+
+    chat_histories = ChatHistory.query.filter_by(
+        user_id=student.id,
+        class_id=class_obj.id
+    ).order_by(ChatHistory.timestamp.desc()).limit(REPORT_CHAT_LIMIT).all()
+
+    data = build_report_data(student, class_obj, activities, chat_histories, theme)
+    activity_texts = [a.content for a in activities if a.content]
+    chat_texts = [c.message for c in chat_histories if c.is_user and c.message]
+    return data, activity_texts, chat_texts
+
+
+def report_cache_key(data, activity_texts, chat_texts):
+    """
+    PDFの入力の内容ハッシュ
+
+    作成日はPDFに印字されるのでキーに含める（キャッシュは同じ日に作成したPDFだけに使う）。
+    AI要約は入力から決まる値なのでキーに含めない。
+    """
+    payload = {key: value for key, value in data.items() if key != 'ai_summary'}
+    payload['summary_sources'] = [activity_texts, chat_texts]
+    payload['layout_version'] = REPORT_LAYOUT_VERSION
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def _cache_dir():
+    upload_folder = current_app.config.get('SECURE_UPLOAD_FOLDER', current_app.config['UPLOAD_FOLDER'])
+    return os.path.join(upload_folder, REPORT_CACHE_DIR_NAME)
+
+
+def get_cached_pdf(key):
+    """キャッシュしたPDF（ない場合・保存期間を過ぎた場合はNone）"""
+    path = os.path.join(_cache_dir(), f'{key}.pdf')
+    try:
+        if time.time() - os.path.getmtime(path) > current_app.config.get('REPORT_CACHE_TTL', 7 * 24 * 3600):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def store_cached_pdf(key, pdf):
+    """PDFをキャッシュに保存する（書き込み途中のファイルを読まれないよう置き換えで保存）"""
+    directory = _cache_dir()
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    path = os.path.join(directory, f'{key}.pdf')
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(pdf)
+    os.replace(temp_path, path)
+
+
+def purge_report_cache(max_age=None):
+    """保存期間を過ぎたキャッシュを削除する"""
+    if max_age is None:
+        max_age = current_app.config.get('REPORT_CACHE_TTL', 7 * 24 * 3600)
+
+    directory = _cache_dir()
+    if not os.path.isdir(directory):
+        return
+
+    expires = time.time() - max_age
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.stat().st_mtime < expires:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def _pdf_executor(workers=None):
+    """
+    PDFを生成するエグゼキューター（ジョブごとに1つ作り、すべての生徒のPDFを渡す）
+
+    1プロセスの場合やプロセスを起動できない環境（Celeryワーカーなどデーモンプロセス内、
+    gevent のパッチを適用したプロセス内）では、1つのスレッドで順番に生成する。
+
+    Args:
+        workers: プロセス数（省略時は設定 REPORT_PDF_WORKERS、未設定ならCPU数）
+
+    Returns:
+        Executor: ProcessPoolExecutor または ThreadPoolExecutor
+    """
+    if workers is None:
+        workers = current_app.config.get('REPORT_PDF_WORKERS') or os.cpu_count() or 1
+
+    if workers > 1 and not multiprocessing.current_process().daemon and not gevent_patched():
+        try:
+            return ProcessPoolExecutor(max_workers=workers)
+        except OSError as e:
+            logging.warning(f"PDF生成のプロセスプールを作成できないため順番に生成します: {e}")
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix='report-pdf')
+
+
+def _submit_pdf(executor, data):
+    """PDFの生成を始める（プロセスプールが使えなくなった場合はこのスレッドで生成する）"""
+    try:
+        return executor.submit(render_report_pdf, data)
+    except BrokenProcessPool as e:
+        logging.warning(f"PDFの並列生成に失敗したため順番に生成します: {e}")
+        future = Future()
+        future.set_result(render_report_pdf(data))
+        return future
+
+
+def _pdf_result(future, data):
+    """生成したPDF（プロセスプールが使えなくなった場合はこのスレッドで生成する）"""
+    try:
+        return future.result()
+    except BrokenProcessPool as e:
+        logging.warning(f"PDFの並列生成に失敗したため順番に生成します: {e}")
+        return render_report_pdf(data)
+
+
+def render_reports(datas, workers=None):
+    """
+    複数のPDFを並列に生成する
+
+    Args:
+        datas: build_report_data のデータ（AI要約を含む）のリスト
+        workers: プロセス数（省略時は設定 REPORT_PDF_WORKERS、未設定ならCPU数）
+
+    Returns:
+        list: datas と同じ順序のPDF（bytes）
+    """
+    _require_reportlab()
+    datas = list(datas)
+    with _pdf_executor(min(workers, len(datas)) if workers else None) as executor:
+        futures = [_submit_pdf(executor, data) for data in datas]
+        return [_pdf_result(future, data) for future, data in zip(futures, datas)]
+
+
+def get_student_report_pdf(student, class_obj):
+    """
+    生徒の活動報告PDF（入力が変わっていなければキャッシュから返す）
+
+    Returns:
+        bytes: PDFの内容
+    """
+    _require_reportlab()
+    data, activity_texts, chat_texts = collect_report_inputs(student, class_obj)
+    key = report_cache_key(data, activity_texts, chat_texts)
+
+    pdf = get_cached_pdf(key)
+    if pdf is None:
+        data['ai_summary'] = generate_activity_summary(activity_texts, chat_texts)
+        pdf = render_report_pdf(data)
+        store_cached_pdf(key, pdf)
+    return pdf
+
+
+def _archive_name(student):
+    """ZIP内のファイル名"""
+    return re.sub(r'[\\/:*?"<>|\s]', '_', student.username) + '.pdf'
+
+
+def run_class_report_job(job, progress):
+    """
+    クラス全員分の活動報告PDFを作成してZIPにまとめる（ジョブ 'class_reports' のハンドラ）
+
+    Args:
+        job: BackgroundJob（job.params['class_id'] に対象クラス）
+        progress: 処理済み人数を通知するコールバック
+
+    Returns:
+        dict: 新しく作成した件数・キャッシュを使った件数とZIPのファイル名
+    """
+    _require_reportlab()
+    class_id = job.params.get('class_id')
+    class_obj = db.session.get(Class, class_id) if class_id else None
+    if class_obj is None or class_obj.teacher_id != job.user_id:
+        raise ValueError('対象のクラスが見つかりません')
+
+    if gevent_patched():
+        # CPUを使うPDF生成でイベントループを止めず、パッチ済みのプロセスから fork しない
+        raise RuntimeError('活動報告PDFの一括作成はCeleryワーカーで実行してください（BACKGROUND_JOB_BACKEND=celery）')
+
+    purge_report_cache()
+
+    students = User.query.join(
+        ClassEnrollment, ClassEnrollment.student_id == User.id
+    ).filter(
+        ClassEnrollment.class_id == class_obj.id,
+        ClassEnrollment.is_active == True
+    ).order_by(User.username).all()
+
+    summary_workers = max(1, current_app.config.get('REPORT_AI_CONCURRENCY', 4))
+    generated = 0
+    cached = 0
+    with zipfile.ZipFile(results_path(job.id, REPORTS_ZIP_FILENAME), 'w', zipfile.ZIP_DEFLATED) as archive, \
+            ThreadPoolExecutor(max_workers=summary_workers, thread_name_prefix='report-summary') as summarizer, \
+            _pdf_executor() as renderer:
+        # キャッシュがない生徒だけAI要約を作成する（入力はDBを使うのでジョブのスレッドで取得する）
+        summaries = {}
+        for student in students:
+            data, activity_texts, chat_texts = collect_report_inputs(student, class_obj)
+            key = report_cache_key(data, activity_texts, chat_texts)
+            pdf = get_cached_pdf(key)
+            if pdf is not None:
+                archive.writestr(_archive_name(student), pdf)
+                cached += 1
+                progress(cached)
+                continue
+            summaries[summarizer.submit(generate_activity_summary, activity_texts, chat_texts)] = (student, key, data)
+
+        # 要約ができた生徒から順にPDFの生成を始める
+        pdfs = {}
+        for future in as_completed(summaries):
+            student, key, data = summaries[future]
+            data['ai_summary'] = future.result()
+            pdfs[_submit_pdf(renderer, data)] = (student, key, data)
+
+        for future in as_completed(pdfs):
+            student, key, data = pdfs[future]
+            pdf = _pdf_result(future, data)
+            store_cached_pdf(key, pdf)
+            archive.writestr(_archive_name(student), pdf)
+            generated += 1
+            progress(cached + generated)
+
+    logging.info(f"クラス {class_obj.id} の活動報告PDFを作成しました: 新規{generated}件、キャッシュ{cached}件")
+    return {'generated': generated, 'cached': cached, 'results_file': REPORTS_ZIP_FILENAME}
@@ -0,0 +1,326 @@
+# app/utils/background_jobs.py
+"""
+バックグラウンドジョブ（CSVインポート、活動報告PDFの一括作成、AI評価の生成、大量削除など）
+
+ジョブは BackgroundJob としてDBに登録し、リクエストの外で処理する。処理方法は設定 BACKGROUND_JOB_BACKEND で選ぶ。
+- celery: Celeryタスク（app/tasks/background_jobs.py）。Celeryが使えない場合は thread にフォールバック
+- thread: Webプロセス内のスレッドプール
+- sync: その場で処理する（開発・テスト用）
+gevent ワーカー（Dockerfile.production）のWebプロセスでは thread / sync で実行せず、ジョブを失敗として記録する
+（CPUを使う処理がイベントループを止め、プロセスプールがパッチ済みのプロセスから fork するため）。
+ジョブのファイルは SECURE_UPLOAD_FOLDER/background_jobs/<ジョブID>/ に置く。
+celery の場合、ワーカーにもWebと同じアップロードフォルダをマウントする（docker-compose*.yml）。
+
+進捗は BackgroundJob.processed に記録し、/api/jobs/<ジョブID> からJSONで取得できる（画面は background_job.html）。
+生成したパスワードなど実行ユーザーにだけ渡す結果はDBに保存せず結果ファイルに書き出し、
+/api/jobs/<ジョブID>/results からダウンロードする（BACKGROUND_JOB_RESULTS_TTL 秒後に削除）。
+
+処理（ハンドラ）は JOB_HANDLERS に 'モジュール:関数' の形で登録する。
+ハンドラは handler(job, progress) の形で呼ばれ、
+  - job: BackgroundJob（job.params に画面から渡した値、job.user_id に実行ユーザー）
+  - progress: 処理済み件数を通知するコールバック progress(処理済み件数)
+結果のdictを返す。'errors' はエラーメッセージのリスト、
+'rows' は results.csv に追記する行（dictのリスト）、'results_file' はハンドラが
+ジョブのディレクトリに書き出した結果ファイルの名前として扱い、それ以外の値は件数として保存する。
+CSVをアップロードするジョブは app/utils/import_jobs.py の create_import_job で登録する。
+"""
+import csv
+import logging
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from importlib import import_module
+
+from flask import current_app
+from sqlalchemy import update
+
+from extensions import db
+from app.models import BackgroundJob
+
+try:
+    from gevent import monkey as gevent_monkey
+    GEVENT_AVAILABLE = True
+except ImportError:
+    GEVENT_AVAILABLE = False
+
+# ジョブの種類とハンドラ
+JOB_HANDLERS = {
+    'teacher_students': 'app.teacher:run_student_import',
+    'admin_users': 'app.admin.user_management:run_user_import',
+    'enrollment_students': 'core.enrollment:run_enrollment_import',
+    'basebuilder_text': 'basebuilder.importers:run_text_import',
+    'basebuilder_problems': 'basebuilder.importers:run_problem_import',
+    'class_reports': 'app.teacher.reports:run_class_report_job',
+    'class_evaluations': 'app.teacher.evaluations:run_evaluation_job',
+    'basebuilder_delete_text_sets': 'basebuilder.deletion:run_text_sets_deletion',
+    'basebuilder_delete_category': 'basebuilder.deletion:run_category_deletion',
+}
+
+JOB_DIR_NAME = 'background_jobs'
+RESULTS_FILENAME = 'results.csv'
+
+# ジョブに保存するエラーメッセージの上限
+MAX_REPORTED_ERRORS = 100
+
+_executor = None
+
+
+def gevent_patched():
+    """
+    gevent の monkey patch が適用されたプロセス（gunicorn の gevent ワーカーなど）かどうか
+
+    このプロセスではスレッドがグリーンレットになり、CPUを使う処理がイベントループを止める。
+    また、fork した子プロセスにパッチ済みのインタープリターがそのまま引き継がれる。
+    """
+    return GEVENT_AVAILABLE and (gevent_monkey.is_module_patched('threading')
+                                 or gevent_monkey.is_module_patched('os'))
+
+
+def job_dir(job_id):
+    """ジョブのファイルを置くディレクトリ"""
+    upload_folder = current_app.config.get('SECURE_UPLOAD_FOLDER', current_app.config['UPLOAD_FOLDER'])
+    return os.path.join(upload_folder, JOB_DIR_NAME, job_id)
+
+
+def results_path(job_id, filename=RESULTS_FILENAME):
+    """ジョブの結果ファイルのパス"""
+    return os.path.join(job_dir(job_id), filename)
+
+
+def get_job_handler(kind):
+    """ジョブの種類からハンドラ関数を返す"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"不明なジョブの種類です: {kind}")
+
+    module_name, function_name = JOB_HANDLERS[kind].split(':')
+    return getattr(import_module(module_name), function_name)
+
+
+def purge_expired_results(max_age=None):
+    """
+    保存期間を過ぎたジョブのファイル（結果ファイルを含む）を削除する
+
+    Args:
+        max_age: 保存期間（秒）。省略時は設定 BACKGROUND_JOB_RESULTS_TTL
+    """
+    if max_age is None:
+        max_age = current_app.config.get('BACKGROUND_JOB_RESULTS_TTL', 24 * 3600)
+
+    base_dir = os.path.dirname(job_dir('_'))
+    if not os.path.isdir(base_dir):
+        return
+
+    expires = time.time() - max_age
+    for entry in os.scandir(base_dir):
+        if entry.is_dir() and entry.stat().st_mtime < expires:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def new_job(kind, user_id, params=None, total=0, filename=None):
+    """
+    ジョブを作成し、ファイルを置くディレクトリを用意する（登録は submit_job で行う）
+
+    Args:
+        kind: ジョブの種類（JOB_HANDLERS のキー）
+        user_id: 実行ユーザーのID
+        params: ハンドラに渡す値（JSONに変換できるdict）
+        total: 処理する件数（進捗の分母）
+        filename: 画面に表示する名前
+
+    Returns:
+        BackgroundJob: 未登録のジョブ
+
+    Raises:
+        ValueError: 種類が不明な場合
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"不明なジョブの種類です: {kind}")
+
+    purge_expired_results()
+
+    job = BackgroundJob(
+        id=str(uuid.uuid4()),
+        kind=kind,
+        user_id=user_id,
+        status='pending',
+        filename=filename,
+        params=params or {},
+        total=total
+    )
+    os.makedirs(job_dir(job.id), mode=0o700, exist_ok=True)
+    return job
+
+
+def submit_job(job):
+    """ジョブを登録して実行する"""
+    db.session.add(job)
+    db.session.commit()
+
+    dispatch_job(job.id)
+    return job
+
+
+def create_job(kind, user_id, params=None, total=0, filename=None):
+    """
+    ジョブを登録して実行する
+
+    Args:
+        kind: ジョブの種類（JOB_HANDLERS のキー）
+        user_id: 実行ユーザーのID
+        params: ハンドラに渡す値（JSONに変換できるdict）
+        total: 処理する件数（進捗の分母）
+        filename: 画面に表示する名前
+
+    Returns:
+        BackgroundJob: 登録したジョブ
+    """
+    return submit_job(new_job(kind, user_id, params, total=total, filename=filename))
+
+
+def _get_executor(app):
+    """スレッドでジョブを処理する場合のスレッドプール"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=app.config.get('BACKGROUND_JOB_THREADS', 2),
+            thread_name_prefix='background-job'
+        )
+    return _executor
+
+
+def _run_in_app_context(app, job_id):
+    with app.app_context():
+        run_job(job_id)
+
+
+def dispatch_job(job_id):
+    """
+    ジョブを設定 BACKGROUND_JOB_BACKEND に従って実行する
+
+    Returns:
+        str: 実際に使った実行方法（'celery' / 'thread' / 'sync'）。実行しなかった場合は 'refused'
+    """
+    app = current_app._get_current_object()
+    backend = app.config.get('BACKGROUND_JOB_BACKEND', 'celery')
+
+    if backend != 'celery' and gevent_patched():
+        _refuse_job(job_id)
+        return 'refused'
+
+    if backend == 'sync':
+        run_job(job_id)
+        return 'sync'
+
+    if backend == 'celery':
+        try:
+            from app.tasks.background_jobs import run_background_job_task
+            run_background_job_task.apply_async(args=[job_id], retry=False)
+            return 'celery'
+        except ImportError:
+            pass
+        except Exception as e:
+            # ブローカーに接続できない場合はスレッドで処理する
+            logging.warning(f"ジョブをCeleryに登録できませんでした: {e}")
+
+        if gevent_patched():
+            _refuse_job(job_id)
+            return 'refused'
+
+    _get_executor(app).submit(_run_in_app_context, app, job_id)
+    return 'thread'
+
+
+def _refuse_job(job_id):
+    """gevent ワーカーのWebプロセスでは実行できないジョブを失敗として記録する"""
+    logging.error(f"ジョブ {job_id} をCeleryに登録できず、gevent ワーカーでは実行できません")
+    job = db.session.get(BackgroundJob, job_id)
+    job.status = 'failed'
+    job.error = 'バックグラウンド処理を開始できませんでした。Celeryワーカーが起動しているか確認してください'
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def _save_progress(job_id, processed):
+    """
+    進捗を記録する
+
+    ハンドラのトランザクションとは別の接続でコミットし、
+    処理の途中でも進捗APIから読めるようにする。
+    """
+    table = BackgroundJob.__table__
+    with db.engine.begin() as connection:
+        connection.execute(update(table).where(table.c.id == job_id).values(processed=processed))
+
+
+def append_results(job_id, rows):
+    """
+    結果の行を results.csv に追記する（Excelで開けるようBOM付き、最初の書き込みでヘッダーを付ける）
+
+    Args:
+        job_id: BackgroundJob のID
+        rows: 書き出す行（同じキーを持つdictのリスト）
+    """
+    if not rows:
+        return
+    path = results_path(job_id)
+    is_new = not os.path.exists(path)
+    # 追記モードではファイルの途中にBOMは書き込まれない
+    with open(path, 'a', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        if is_new:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+def run_job(job_id):
+    """
+    ジョブを実行する
+
+    Args:
+        job_id: BackgroundJob のID
+
+    Returns:
+        dict: 実行後のジョブの状態（BackgroundJob.to_dict）。実行対象でない場合はNone
+    """
+    job = db.session.get(BackgroundJob, job_id)
+    if job is None or job.status != 'pending':
+        return None
+
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+
+    try:
+        handler = get_job_handler(job.kind)
+        result = handler(job, lambda processed: _save_progress(job_id, processed)) or {}
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.exception(f"ジョブ {job_id} の処理中にエラーが発生しました")
+        job = db.session.get(BackgroundJob, job_id)
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        # 失敗する前に書き出した結果（作成済みユーザーのパスワードなど）はダウンロードできるようにする
+        job.has_results_file = os.path.exists(results_path(job_id))
+        db.session.commit()
+        return job.to_dict()
+
+    append_results(job_id, result.pop('rows', None))
+    job.has_results_file = bool(result.get('results_file')) or os.path.exists(results_path(job_id))
+
+    errors = list(result.get('errors') or [])
+    result.setdefault('error_count', len(errors))
+    result['errors'] = errors[:MAX_REPORTED_ERRORS]
+
+    job.result = result
+    job.status = 'completed'
+    job.processed = job.total
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+    logging.info(f"ジョブ {job_id}（{job.kind}）が完了しました: {result.get('error_count')}件のエラー")
+    return job.to_dict()
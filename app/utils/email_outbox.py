@@ -0,0 +1,333 @@
+# app/utils/email_outbox.py
+"""
+メールの送信キュー（email_outbox テーブル）
+
+リクエストの処理中にはメールを送信せず、enqueue_email で EmailOutbox に登録するだけにする
+（SMTPサーバーが遅くても画面の応答を待たせない）。登録は呼び出し元のトランザクションで行い
+（コミットは呼び出し元が行う）、コミット後に送信を1回だけ依頼する。登録したメールは drain_outbox が
+EMAIL_OUTBOX_BATCH_SIZE 件ずつ取り出し、共有のSMTP接続（app/utils/mail_transport.py）で続けて送信する。
+
+送信に失敗したメールは指数バックオフ（EMAIL_OUTBOX_RETRY_BASE_DELAY 秒から再試行ごとに倍、
+EMAIL_OUTBOX_RETRY_MAX_DELAY 秒まで）で再試行し、EMAIL_OUTBOX_MAX_ATTEMPTS 回失敗したら failed にする。
+取り出しは送信記録の状態を条件にした UPDATE で行い、複数のワーカーが同じメールを送らないようにする。
+
+登録後の送信方法は設定 EMAIL_OUTBOX_BACKEND で選ぶ。
+- celery: Celeryタスク（app/tasks/email_outbox.py）。Celeryが使えない場合は thread にフォールバック
+- thread: Webプロセス内のスレッド
+- sync: コミットした処理の中で送信を待つ（開発用）
+- none: 登録だけ行う（scripts/email_outbox_worker.py などのワーカーが別に送信する場合やテスト用）
+どの方法でも、再試行待ちのメールは定期実行（Celery beat または scripts/email_outbox_worker.py）で送信する。
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, event, func, or_, select, update
+
+from app.models import db, EmailOutbox
+
+# 設定がない場合の値
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BASE_DELAY = 60  # 秒
+DEFAULT_RETRY_MAX_DELAY = 3600  # 秒
+
+# 送信中のまま残ったメール（ワーカーが止まった場合）を取り出し直すまでの時間（秒）
+CLAIM_TIMEOUT = 15 * 60
+
+# 管理画面で失敗率を集計する期間
+STATS_WINDOW = timedelta(hours=24)
+
+# コミット後の送信の依頼を登録済みかどうか（Session.info のキー）
+_DISPATCH_PENDING = 'email_outbox_dispatch_pending'
+
+_executor = None
+_executor_lock = threading.Lock()
+_scheduled = False
+
+
+def _setting(name, default):
+    return current_app.config.get(name, default)
+
+
+def enqueue_email(recipients, subject, body, subtype='html', category=None):
+    """
+    メールを送信キューに登録する（コミットはしない）
+
+    呼び出し元のトランザクションがコミットされたら、設定 EMAIL_OUTBOX_BACKEND に従って送信を依頼する。
+    ロールバックされた場合はメールも登録されない。
+
+    Args:
+        recipients: 宛先のメールアドレスのリスト（文字列の場合は1件）
+        subject: 件名
+        body: 本文
+        subtype: 本文の形式（'html' または 'plain'）
+        category: メールの種類（管理画面の表示用）
+
+    Returns:
+        EmailOutbox: 登録したメール
+    """
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    email = EmailOutbox(
+        category=category,
+        recipients=','.join(recipients),
+        subject=subject,
+        body=body,
+        subtype=subtype,
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.session.add(email)
+    db.session.flush()
+
+    _dispatch_after_commit()
+    return email
+
+
+def _dispatch_after_commit():
+    """
+    現在のトランザクションのコミット後に送信を依頼する
+
+    同じトランザクションで何通登録しても依頼は1回にまとめる
+    （取り出しきれなかったメールは定期実行で送信される）。
+    """
+    session = db.session()
+    if session.info.get(_DISPATCH_PENDING):
+        return
+    session.info[_DISPATCH_PENDING] = True
+    app = current_app._get_current_object()
+
+    def dispatch(session):
+        session.info.pop(_DISPATCH_PENDING, None)
+        try:
+            with app.app_context():
+                dispatch_outbox()
+        except Exception as e:
+            # 送信の依頼に失敗してもメールは登録済みのため、定期実行で送信される
+            logging.error(f"メールの送信の依頼エラー: {e}")
+
+    event.listen(session, 'after_commit', dispatch, once=True)
+
+
+def retry_delay(attempts):
+    """
+    再試行までの待ち時間（秒）
+
+    Args:
+        attempts: これまでに送信を試みた回数（1から）
+    """
+    base = _setting('EMAIL_OUTBOX_RETRY_BASE_DELAY', DEFAULT_RETRY_BASE_DELAY)
+    return min(_setting('EMAIL_OUTBOX_RETRY_MAX_DELAY', DEFAULT_RETRY_MAX_DELAY), base * (2 ** (attempts - 1)))
+
+
+def claim_batch(limit=None):
+    """
+    送信するメールを取り出し、送信中にする
+
+    送信待ちで再試行の時刻を過ぎたメールと、CLAIM_TIMEOUT 秒以上送信中のまま残ったメールを古い順に取り出す。
+
+    Returns:
+        list: 取り出した EmailOutbox のリスト
+    """
+    limit = limit or _setting('EMAIL_OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    now = datetime.utcnow()
+    candidates = db.session.execute(
+        select(EmailOutbox.id, EmailOutbox.status, EmailOutbox.updated_at)
+        .where(or_(
+            and_(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now),
+            and_(EmailOutbox.status == 'sending',
+                 EmailOutbox.updated_at < now - timedelta(seconds=CLAIM_TIMEOUT)),
+        ))
+        .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+        .limit(limit)
+    ).all()
+
+    claimed = []
+    for email_id, status, updated_at in candidates:
+        # 他のワーカーが先に取り出したメールは更新されない
+        if db.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id == email_id, EmailOutbox.status == status,
+                   EmailOutbox.updated_at == updated_at)
+            .values(status='sending', attempts=EmailOutbox.attempts + 1, updated_at=now)
+        ).rowcount:
+            claimed.append(email_id)
+    db.session.commit()
+
+    if not claimed:
+        return []
+    return EmailOutbox.query.filter(EmailOutbox.id.in_(claimed)).order_by(EmailOutbox.id).all()
+
+
+def _record_result(email, success, error):
+    now = datetime.utcnow()
+    email.updated_at = now
+    if success:
+        email.status = 'sent'
+        email.sent_at = now
+        email.last_error = None
+        # 本文には招待メールの初期パスワードなどが含まれるため、送信後は残さない
+        email.body = ''
+        return
+
+    email.last_error = error
+    if (email.attempts or 0) >= _setting('EMAIL_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS):
+        email.status = 'failed'
+        # 送信を中止したメールの本文も残さない
+        email.body = ''
+        logging.error(f"メールの送信を中止しました（ID: {email.id}, {email.attempts}回失敗）: {error}")
+    else:
+        email.status = 'pending'
+        email.next_attempt_at = now + timedelta(seconds=retry_delay(email.attempts))
+
+
+def send_batch(emails):
+    """
+    取り出したメールを1つの接続で続けて送信し、結果を記録する
+
+    Returns:
+        dict: 'sent' と 'failed'（再試行待ちを含む）の件数
+    """
+    from app.utils.email_sender import EmailSender
+
+    results = EmailSender().send_many([
+        {'recipients': email.recipients.split(','), 'subject': email.subject,
+         'html_body': email.body, 'subtype': email.subtype}
+        for email in emails
+    ])
+
+    counts = {'sent': 0, 'failed': 0}
+    for email, (success, message) in zip(emails, results):
+        _record_result(email, success, None if success else message)
+        counts['sent' if success else 'failed'] += 1
+    db.session.commit()
+    return counts
+
+
+def drain_outbox(max_batches=None):
+    """
+    送信できるメールがなくなるまで（または max_batches 回）取り出して送信する
+
+    Returns:
+        dict: 'sent' と 'failed' の件数
+    """
+    counts = {'sent': 0, 'failed': 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        emails = claim_batch()
+        if not emails:
+            break
+        for key, value in send_batch(emails).items():
+            counts[key] += value
+        batches += 1
+    return counts
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='email-outbox')
+    return _executor
+
+
+def _drain_in_app_context(app):
+    global _scheduled
+    with _executor_lock:
+        # 送信を始めた後に登録されたメールは次の実行で送る
+        _scheduled = False
+    try:
+        with app.app_context():
+            drain_outbox()
+    except Exception as e:
+        logging.error(f"メールの送信キューの処理エラー: {e}")
+
+
+def dispatch_outbox():
+    """
+    送信キューの処理を設定 EMAIL_OUTBOX_BACKEND に従って依頼する
+
+    Returns:
+        str: 実際に使った方法（'celery' / 'thread' / 'sync' / 'none'）
+    """
+    global _scheduled
+    app = current_app._get_current_object()
+    backend = app.config.get('EMAIL_OUTBOX_BACKEND', 'celery')
+
+    if backend == 'none':
+        return 'none'
+
+    if backend == 'sync':
+        # コミット直後のセッションではSQLを実行できないため、別のセッション（スレッド）で送信して待つ
+        worker = threading.Thread(target=_drain_in_app_context, args=(app,))
+        worker.start()
+        worker.join()
+        return 'sync'
+
+    if backend == 'celery':
+        try:
+            from app.tasks.email_outbox import drain_email_outbox
+            drain_email_outbox.apply_async(retry=False)
+            return 'celery'
+        except ImportError:
+            pass
+        except Exception as e:
+            # ブローカーに接続できない場合はスレッドで処理する
+            logging.warning(f"メールの送信をCeleryに登録できませんでした: {e}")
+
+    with _executor_lock:
+        if _scheduled:
+            return 'thread'
+        _scheduled = True
+    _get_executor().submit(_drain_in_app_context, app)
+    return 'thread'
+
+
+def outbox_stats():
+    """
+    管理画面に表示する送信キューの状況
+
+    Returns:
+        dict: 状態ごとの件数、送信待ちの最も古いメールの待ち時間（秒）、
+              直近24時間の送信数・失敗数・失敗率、最近失敗したメール
+    """
+    now = datetime.utcnow()
+    counts = dict(db.session.execute(
+        select(EmailOutbox.status, func.count()).group_by(EmailOutbox.status)
+    ).all())
+
+    oldest = db.session.execute(
+        select(func.min(EmailOutbox.created_at)).where(EmailOutbox.status.in_(['pending', 'sending']))
+    ).scalar()
+
+    since = now - STATS_WINDOW
+    recent = dict(db.session.execute(
+        select(EmailOutbox.status, func.count())
+        .where(EmailOutbox.status.in_(['sent', 'failed']), EmailOutbox.updated_at >= since)
+        .group_by(EmailOutbox.status)
+    ).all())
+    sent = recent.get('sent', 0)
+    failed = recent.get('failed', 0)
+    # 再試行待ちで失敗が記録されているメール
+    retrying = db.session.execute(
+        select(func.count()).select_from(EmailOutbox)
+        .where(EmailOutbox.status == 'pending', EmailOutbox.attempts > 0)
+    ).scalar()
+
+    recent_failures = EmailOutbox.query.filter(EmailOutbox.last_error.isnot(None)) \
+        .order_by(EmailOutbox.updated_at.desc()).limit(20).all()
+
+    return {
+        'counts': {status: counts.get(status, 0) for status in ('pending', 'sending', 'sent', 'failed')},
+        'queue_depth': counts.get('pending', 0) + counts.get('sending', 0),
+        'retrying': retrying,
+        'oldest_pending_seconds': int((now - oldest).total_seconds()) if oldest else None,
+        'recent_sent': sent,
+        'recent_failed': failed,
+        'failure_rate': round(failed / (sent + failed), 3) if sent + failed else 0.0,
+        'recent_failures': recent_failures,
+    }
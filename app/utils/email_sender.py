@@ -1,11 +1,12 @@
 import os
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 import base64
 
+from app.utils import mail_transport
+
 class EmailSender:
     def __init__(self):
         self.method = os.getenv('EMAIL_METHOD', 'smtp')  # smtp or gmail_api
@@ -17,28 +18,33 @@ class EmailSender:
         else:
             return self._send_via_smtp(recipients, subject, html_body)
     
+    def send_many(self, messages):
+        """
+        複数のメールをまとめて送信する（SMTPでは1つの接続で続けて送る）
+
+        Args:
+            messages: recipients, subject, html_body をキーに持つdictのリスト
+                （subtype に 'plain' を指定するとテキスト形式で送る。Gmail APIではHTMLとして送る）
+
+        Returns:
+            list: メールごとの (成功したかどうか, メッセージ)
+        """
+        if self.method == 'gmail_api':
+            return [self._send_via_gmail_api(m['recipients'], m['subject'], m['html_body']) for m in messages]
+
+        results = mail_transport.get_transport().send_many(
+            mail_transport.build_message(m['recipients'], m['subject'], m['html_body'], m.get('subtype', 'html'))
+            for m in messages
+        )
+        return [(True, "Email sent successfully") if success else (False, f"SMTP Error: {error}")
+                for success, error in results]
+    
     def _send_via_smtp(self, recipients, subject, html_body):
-        """SMTP経由での送信（Gmailアプリパスワード使用）"""
-        smtp_config = {
-            'host': os.getenv('SMTP_SERVER', 'smtp.gmail.com'),
-            'port': int(os.getenv('SMTP_PORT', 587)),
-            'user': os.getenv('SMTP_USER'),
-            'password': os.getenv('SMTP_PASSWORD')  # アプリパスワード
-        }
-        
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = smtp_config['user']
-        msg['To'] = ', '.join(recipients)
-        
-        html_part = MIMEText(html_body, 'html', 'utf-8')
-        msg.attach(html_part)
+        """SMTP経由での送信（Gmailアプリパスワード使用、接続は app/utils/mail_transport.py で使い回す）"""
+        msg = mail_transport.build_message(recipients, subject, html_body)
         
         try:
-            with smtplib.SMTP(smtp_config['host'], smtp_config['port']) as server:
-                server.starttls()
-                server.login(smtp_config['user'], smtp_config['password'])
-                server.send_message(msg)
+            mail_transport.get_transport().send(msg)
             return True, "Email sent successfully"
         except Exception as e:
             return False, f"SMTP Error: {str(e)}"
@@ -100,11 +106,12 @@ def test_email_configuration():
 # 後方互換性のための関数
 from flask import url_for
 
+from app.utils.email_outbox import enqueue_email
+
 def send_confirmation_email(user_email, user_id, token, username):
     """
-    確認メールを送信する関数（後方互換性）
+    確認メールを送信キューに登録する関数（後方互換性）
     """
-    sender = EmailSender()
     
     # 確認URLを構築
     confirm_url = url_for(
@@ -139,22 +146,14 @@ def send_confirmation_email(user_email, user_id, token, username):
     </html>
     """
     
-    success, message = sender.send(
-        recipients=[user_email],
-        subject="QuestEd - メールアドレスの確認",
-        html_body=html_body
-    )
-    
-    if not success:
-        print(f"メール送信エラー: {message}")
-    
-    return success
+    # 送信キューに登録し、リクエストの外で送信する（app/utils/email_outbox.py）
+    enqueue_email([user_email], "QuestEd - メールアドレスの確認", html_body, category='confirmation')
+    return True
 
 def send_reset_password_email(user_email, user_id, token, username):
     """
-    パスワードリセットメールを送信する関数（後方互換性）
+    パスワードリセットメールを送信キューに登録する関数（後方互換性）
     """
-    sender = EmailSender()
     
     # リセットURLを構築
     reset_url = url_for(
@@ -190,13 +189,6 @@ def send_reset_password_email(user_email, user_id, token, username):
     </html>
     """
     
-    success, message = sender.send(
-        recipients=[user_email],
-        subject="QuestEd - パスワードリセット",
-        html_body=html_body
-    )
-    
-    if not success:
-        print(f"メール送信エラー: {message}")
-    
-    return success
\ No newline at end of file
+    # 送信キューに登録し、リクエストの外で送信する（app/utils/email_outbox.py）
+    enqueue_email([user_email], "QuestEd - パスワードリセット", html_body, category='reset_password')
+    return True
\ No newline at end of file
@@ -0,0 +1,216 @@
+# app/utils/import_jobs.py
+"""
+CSV一括インポート
+
+アップロードされたCSVをジョブのディレクトリ（app/utils/background_jobs.py）に保存し、
+バックグラウンドジョブとして処理する。インポートのハンドラは他のジョブと同じく
+JOB_HANDLERS に登録し、open_upload でアップロードされたCSVを読む。
+ワーカーからアップロードされたファイルが見つからない場合、ジョブは失敗として記録する。
+
+チャンクごとにコミットするハンドラは、コミットのたびに append_results で結果の行を追記する
+（途中で失敗しても、作成済みのユーザーのパスワードは結果ファイルからダウンロードできる）。
+"""
+import csv
+import logging
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from flask import current_app, has_app_context
+from sqlalchemy import insert, or_
+from werkzeug.security import generate_password_hash
+from werkzeug.utils import secure_filename
+
+from extensions import db
+from app.models import User
+from app.utils.background_jobs import gevent_patched, job_dir, new_job, submit_job
+
+UPLOAD_FILENAME = 'upload.csv'
+
+# アカウントを作成するインポートの結果ファイルの説明（background_job.html に表示する）
+PASSWORD_RESULTS_MESSAGE = '作成したアカウントの初期パスワードは結果ファイルでのみ確認できます。ファイルは一定期間後に削除されます。'
+
+# これより少ない件数のパスワードは並列にせず順番に計算する
+PARALLEL_HASH_MIN = 8
+
+# ハンドラが既存ユーザーの照合・一括INSERTをまとめて行う行数
+ROW_CHUNK_SIZE = 500
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    パスワードハッシュをプロセスプールでまとめて計算する
+
+    子プロセスを起動できないデーモンプロセス（Celeryのpreforkワーカーなど）や、
+    gevent のパッチを適用したプロセス（fork するとパッチ済みの状態が引き継がれる）ではスレッドプールを使う
+    （hashlib のハッシュ計算はGILを解放するため、スレッドでも並列に計算できる）。
+    少数の場合やプロセスを起動できない環境では順番に計算する。
+
+    Args:
+        passwords: 平文パスワードのリスト
+        workers: プロセス数（省略時は設定 PASSWORD_HASH_WORKERS、未設定ならCPU数）
+
+    Returns:
+        list: passwords と同じ順序のハッシュ値
+    """
+    passwords = list(passwords)
+    if workers is None:
+        workers = (current_app.config.get('PASSWORD_HASH_WORKERS') if has_app_context() else None) or os.cpu_count() or 1
+    workers = min(workers, len(passwords))
+
+    if len(passwords) < PARALLEL_HASH_MIN or workers <= 1:
+        return [generate_password_hash(password) for password in passwords]
+
+    # デーモンプロセスは子プロセスを持てない
+    use_threads = multiprocessing.current_process().daemon or gevent_patched()
+    pool_class = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+    try:
+        with pool_class(max_workers=workers) as executor:
+            chunksize = max(1, len(passwords) // (workers * 4))
+            return list(executor.map(generate_password_hash, passwords, chunksize=chunksize))
+    except (OSError, BrokenProcessPool) as e:
+        logging.warning(f"パスワードハッシュの並列計算に失敗したため順番に計算します: {e}")
+        return [generate_password_hash(password) for password in passwords]
+
+
+def iter_row_chunks(reader, chunk_size=ROW_CHUNK_SIZE, start=2):
+    """
+    CSVの行を chunk_size 行ずつまとめて返す
+
+    Args:
+        reader: csv.DictReader など行を返すイテレータ
+        chunk_size: 1チャンクの行数
+        start: 最初の行の行番号（ヘッダー行の次の行）
+
+    Yields:
+        list: [(行番号, 行), ...]
+    """
+    chunk = []
+    for row_num, row in enumerate(reader, start):
+        chunk.append((row_num, row))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def load_existing_users(usernames, emails):
+    """
+    ユーザー名かメールアドレスが一致する既存ユーザーを1回のINクエリで取得する
+
+    MySQLの照合順序に合わせ、大文字小文字を区別せずに照合できるよう小文字のキーで返す。
+
+    Args:
+        usernames: ユーザー名の集合
+        emails: メールアドレスの集合
+
+    Returns:
+        tuple: ({小文字のユーザー名: (id, username, email, role, school_id)}, {小文字のメールアドレス})
+    """
+    if not usernames and not emails:
+        return {}, set()
+
+    rows = db.session.query(
+        User.id, User.username, User.email, User.role, User.school_id
+    ).filter(
+        or_(User.username.in_(list(usernames)), User.email.in_(list(emails)))
+    ).all()
+
+    return {row.username.lower(): row for row in rows}, {row.email.lower() for row in rows}
+
+
+def insert_users(mappings):
+    """
+    ユーザーを一括INSERTする
+
+    Args:
+        mappings: User の列名と値のdictのリスト（ユーザー名は既存ユーザーと重複しないこと）
+
+    Returns:
+        dict: {小文字のユーザー名: ユーザーID}
+    """
+    if not mappings:
+        return {}
+
+    db.session.execute(insert(User), mappings)
+    rows = db.session.query(User.username, User.id).filter(
+        User.username.in_([mapping['username'] for mapping in mappings])
+    ).all()
+    return {username.lower(): user_id for username, user_id in rows}
+
+
+def count_csv_rows(path):
+    """
+    CSVファイルのデータ行数（ヘッダー行を除く）
+
+    Raises:
+        ValueError: UTF-8として読めない場合
+    """
+    try:
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            return max(0, sum(1 for _ in csv.reader(f)) - 1)
+    except UnicodeDecodeError:
+        raise ValueError('ファイルエンコーディングが無効です（UTF-8を使用してください）')
+
+
+def create_import_job(kind, file, user_id, params=None):
+    """
+    アップロードされたCSVを保存してインポートジョブを登録する
+
+    Args:
+        kind: インポートの種類（JOB_HANDLERS のキー）
+        file: アップロードされたファイル（werkzeug の FileStorage）
+        user_id: 実行ユーザーのID
+        params: ハンドラに渡すフォームの値（JSONに変換できるdict）
+
+    Returns:
+        BackgroundJob: 登録したジョブ
+
+    Raises:
+        ValueError: 種類が不明な場合、またはCSVをUTF-8として読めない場合
+    """
+    job = new_job(kind, user_id, params, filename=secure_filename(file.filename or '') or UPLOAD_FILENAME)
+
+    directory = job_dir(job.id)
+    upload_path = os.path.join(directory, UPLOAD_FILENAME)
+    file.save(upload_path)
+
+    try:
+        job.total = count_csv_rows(upload_path)
+    except ValueError:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+    return submit_job(job)
+
+
+@contextmanager
+def open_upload(job):
+    """
+    インポートジョブでアップロードされたCSVを開く（読み終えたらファイルを削除する）
+
+    Args:
+        job: BackgroundJob
+
+    Yields:
+        アップロードされたCSVのテキストストリーム
+
+    Raises:
+        FileNotFoundError: アップロードされたファイルが見つからない場合
+    """
+    upload_path = os.path.join(job_dir(job.id), UPLOAD_FILENAME)
+    if not os.path.exists(upload_path):
+        # Webプロセスとワーカーでアップロードフォルダを共有していない場合など
+        raise FileNotFoundError(
+            'アップロードされたファイルが見つかりません。ファイルの保存先をワーカーから参照できるか確認してください'
+        )
+
+    try:
+        with open(upload_path, encoding='utf-8-sig', newline='') as source:
+            yield source
+    finally:
+        os.remove(upload_path)
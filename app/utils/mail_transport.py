@@ -0,0 +1,265 @@
+# app/utils/mail_transport.py
+"""
+SMTPによるメール送信の共通の窓口
+
+メールの送信はすべて SMTPTransport を通す（確認メール・パスワードリセット・招待・日次レポート）。
+- プロセスで1つの接続を共有し、STARTTLSとログインは接続時だけ行う（メールごとに接続し直さない）
+- 接続が切れていた場合（SMTPServerDisconnected、421応答、ソケットのエラー）は接続し直して1回だけ再送する
+- 一定時間使わなかった接続（SMTP_IDLE_TIMEOUT）や、SMTP_MAX_MESSAGES_PER_CONNECTION 通送った接続は接続し直す
+- 送信の間隔を空け、1分あたりの送信数を SMTP_MAX_PER_MINUTE 以下にする（プロセスごとの制限）
+
+接続先と認証情報は設定（未設定の場合は環境変数）の SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASSWORD,
+差出人は SENDER_EMAIL（未設定の場合は SMTP_USER）。SMTP_USE_TLS を無効にするとSTARTTLSを使わない
+（ローカルのテスト用SMTPサーバーなど）。
+"""
+import logging
+import os
+import smtplib
+import ssl
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from flask import current_app, has_app_context
+
+# 設定がない場合の値
+DEFAULT_SETTINGS = {
+    'SMTP_SERVER': 'smtp.gmail.com',
+    'SMTP_PORT': 587,
+    'SMTP_USE_TLS': True,
+    'SMTP_TIMEOUT': 30.0,  # 接続・応答を待つ時間（秒）
+    'SMTP_MAX_PER_MINUTE': 60,  # 1分あたりの送信数（0は無制限）
+    'SMTP_MAX_MESSAGES_PER_CONNECTION': 100,  # 1つの接続で送る数（0は無制限）
+    'SMTP_IDLE_TIMEOUT': 60.0,  # これより長く使わなかった接続は接続し直す（秒）
+}
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def _config(name, default=None):
+    if has_app_context() and current_app.config.get(name) not in (None, ''):
+        return current_app.config[name]
+    value = os.getenv(name)
+    return default if value in (None, '') else value
+
+
+def _setting(name):
+    default = DEFAULT_SETTINGS[name]
+    value = _config(name, default)
+    if isinstance(default, bool) and isinstance(value, str):
+        return value.lower() in ('true', '1', 'yes', 'on')
+    return type(default)(value)
+
+
+def _should_reconnect(error):
+    """接続し直せば送れる可能性があるエラーかどうか"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 421: サーバーが接続を閉じる（混雑・タイムアウトなど）
+        return error.smtp_code == 421
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class SMTPTransport:
+    """認証済みのSMTP接続を使い回してメールを送る（スレッド間で共有できる）"""
+
+    def __init__(self, host, port=587, user=None, password=None, use_tls=True,
+                 timeout=30.0, max_per_minute=0, max_messages_per_connection=0, idle_timeout=60.0):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.interval = 60.0 / max_per_minute if max_per_minute else 0
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_timeout = idle_timeout
+        self.connections_opened = 0
+
+        self._lock = threading.RLock()
+        self._connection = None
+        self._sent_on_connection = 0
+        self._last_used = 0.0
+        self._next_time = time.monotonic()
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.ehlo()
+            if self.use_tls:
+                connection.starttls(context=ssl.create_default_context())
+                connection.ehlo()
+            if self.user:
+                connection.login(self.user, self.password)
+        except Exception:
+            connection.close()
+            raise
+        self._connection = connection
+        self._sent_on_connection = 0
+        self._last_used = time.monotonic()
+        self.connections_opened += 1
+        return connection
+
+    def _disconnect(self):
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    def _current_connection(self):
+        """送信に使う接続（古くなった接続は接続し直す）"""
+        if self._connection is not None:
+            idle = time.monotonic() - self._last_used
+            exhausted = (self.max_messages_per_connection
+                         and self._sent_on_connection >= self.max_messages_per_connection)
+            if exhausted or (self.idle_timeout and idle > self.idle_timeout):
+                self._disconnect()
+        return self._connection or self._connect()
+
+    def _wait_for_rate_limit(self):
+        """次に送信してよい時刻まで待つ"""
+        if not self.interval:
+            return
+        now = time.monotonic()
+        delay = self._next_time - now
+        self._next_time = max(now, self._next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+    def _send(self, message):
+        self._wait_for_rate_limit()
+        for attempt in range(2):
+            try:
+                self._current_connection().send_message(message)
+            except Exception as e:
+                if not _should_reconnect(e):
+                    raise
+                self._disconnect()
+                if attempt:
+                    raise
+                logging.warning(f"SMTPの接続が切れたため接続し直して再送します: {e}")
+                continue
+            self._sent_on_connection += 1
+            self._last_used = time.monotonic()
+            return
+
+    def send(self, message):
+        """
+        1通送る
+
+        Args:
+            message: email.message.Message（From, To などのヘッダーを設定したもの）
+
+        Raises:
+            smtplib.SMTPException, OSError: 接続し直しても送れなかった場合
+        """
+        with self._lock:
+            self._send(message)
+
+    def send_many(self, messages):
+        """
+        同じ接続で複数のメールを順に送る（1通の失敗で残りの送信を止めない）
+
+        Returns:
+            list: メールごとの (成功したかどうか, エラーメッセージまたはNone)
+        """
+        results = []
+        with self._lock:
+            for message in messages:
+                try:
+                    self._send(message)
+                    results.append((True, None))
+                except (smtplib.SMTPException, OSError) as e:
+                    results.append((False, str(e)))
+        return results
+
+    def close(self):
+        """接続を閉じる"""
+        with self._lock:
+            self._disconnect()
+
+
+def is_configured():
+    """SMTPのログイン情報が設定されているかどうか"""
+    return bool(_config('SMTP_USER') and _config('SMTP_PASSWORD'))
+
+
+def sender_address():
+    """差出人のメールアドレス"""
+    return _config('SENDER_EMAIL') or _config('SMTP_USER')
+
+
+def build_message(recipients, subject, body, subtype='html', sender=None):
+    """
+    送信するメールを作成する
+
+    Args:
+        recipients: 宛先のメールアドレスのリスト（文字列の場合は1件）
+        subject: 件名
+        body: 本文
+        subtype: 本文の形式（'html' または 'plain'）
+        sender: 差出人（省略時は sender_address()）
+
+    Returns:
+        MIMEMultipart: メール
+    """
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    message = MIMEMultipart('alternative')
+    message['Subject'] = subject
+    message['From'] = sender or sender_address()
+    message['To'] = ', '.join(recipients)
+    message.attach(MIMEText(body, subtype, 'utf-8'))
+    return message
+
+
+def get_transport():
+    """
+    プロセスで共有する SMTPTransport
+
+    最初に呼び出したときの設定で作成する（設定を変更した場合は reset_transport で作り直す）。
+    """
+    global _transport
+    if _transport is not None:
+        return _transport
+
+    with _transport_lock:
+        if _transport is None:
+            _transport = SMTPTransport(
+                host=_setting('SMTP_SERVER'),
+                port=_setting('SMTP_PORT'),
+                user=_config('SMTP_USER'),
+                password=_config('SMTP_PASSWORD'),
+                use_tls=_setting('SMTP_USE_TLS'),
+                timeout=_setting('SMTP_TIMEOUT'),
+                max_per_minute=_setting('SMTP_MAX_PER_MINUTE'),
+                max_messages_per_connection=_setting('SMTP_MAX_MESSAGES_PER_CONNECTION'),
+                idle_timeout=_setting('SMTP_IDLE_TIMEOUT'),
+            )
+    return _transport
+
+
+def reset_transport():
+    """共有の接続を閉じて作り直す（設定を変更した場合やテスト用）"""
+    global _transport
+    with _transport_lock:
+        if _transport is not None:
+            _transport.close()
+        _transport = None
+
+
+def _forget_transport_in_child():
+    # fork した子プロセス（Celeryのワーカーなど）は親プロセスの接続を使わない
+    global _transport, _transport_lock
+    _transport = None
+    _transport_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_transport_in_child)
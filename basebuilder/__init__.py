@@ -5,7 +5,11 @@ def init_app(app):
     # Blueprintの登録 - ここでBlueprintを登録します
     from basebuilder.routes import basebuilder_module
     app.register_blueprint(basebuilder_module)
-    
+
+    # 管理コマンド（flask basebuilder ...）の登録
+    from basebuilder.cli import basebuilder_cli
+    app.cli.add_command(basebuilder_cli)
+
     # 管理画面へのモデル追加（Flask-Adminが利用可能な場合のみ）
     with app.app_context():
         try:
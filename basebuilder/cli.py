@@ -0,0 +1,98 @@
+# basebuilder/cli.py
+"""
+BaseBuilderの管理コマンド
+
+使用方法:
+    flask basebuilder verify-aggregates [--student-id ID]
+    flask basebuilder rebuild-aggregates [--student-id ID]
+    flask basebuilder set-scheduler --school-id ID {ladder|sm2|default}
+    flask basebuilder simulate-scheduler [--since YYYY-MM-DD] [--until YYYY-MM-DD] [--scheduler NAME]
+"""
+import sys
+
+import click
+from flask.cli import AppGroup
+
+basebuilder_cli = AppGroup('basebuilder', help='BaseBuilderの管理コマンド')
+
+SCOPE_LABELS = {
+    'category': 'カテゴリ熟練度',
+    'text': 'テキスト定着度',
+}
+
+
+@basebuilder_cli.command('verify-aggregates')
+@click.option('--student-id', type=int, default=None, help='対象の学生ID（省略時は全学生）')
+@click.option('--show', type=int, default=20, help='表示するずれの最大件数')
+def verify_aggregates_command(student_id, show):
+    """集計値（カテゴリ熟練度・テキスト定着度）のずれを検出する"""
+    from basebuilder import proficiency
+
+    total_drift = 0
+    for scope, label in SCOPE_LABELS.items():
+        drift = proficiency.verify_aggregates(scope, student_id)
+        total_drift += len(drift)
+        click.echo(f"{label}: {len(drift)}件のずれ")
+        for sid, scope_id, stored, expected in drift[:show]:
+            click.echo(f"  student={sid} {scope}={scope_id} 保存値={stored} 計算値={expected}")
+
+    if total_drift:
+        click.echo("rebuild-aggregates を実行して修正してください。")
+        sys.exit(1)
+    click.echo("集計値は単語熟練度と一致しています。")
+
+
+@basebuilder_cli.command('rebuild-aggregates')
+@click.option('--student-id', type=int, default=None, help='対象の学生ID（省略時は全学生）')
+def rebuild_aggregates_command(student_id):
+    """集計値を単語熟練度から再構築する"""
+    from basebuilder import proficiency
+
+    for scope, label in SCOPE_LABELS.items():
+        changed = proficiency.rebuild_aggregates(scope, student_id)
+        click.echo(f"{label}: {changed}件を更新しました")
+
+
+@basebuilder_cli.command('set-scheduler')
+@click.option('--school-id', type=int, required=True, help='対象の学校ID')
+@click.argument('name', type=click.Choice(['ladder', 'sm2', 'default']))
+def set_scheduler_command(school_id, name):
+    """学校の復習スケジューラを設定する（default で設定を解除）"""
+    from extensions import db
+    from app.models import School
+
+    school = db.session.get(School, school_id)
+    if not school:
+        click.echo(f"学校ID {school_id} が見つかりません。")
+        sys.exit(1)
+
+    school.review_scheduler = None if name == 'default' else name
+    db.session.commit()
+    click.echo(f"{school.name}: 復習スケジューラを {name} に設定しました")
+
+
+@basebuilder_cli.command('simulate-scheduler')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='対象期間の開始日')
+@click.option('--until', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='対象期間の終了日（この日を含まない）')
+@click.option('--scheduler', 'names', multiple=True, type=click.Choice(['ladder', 'sm2']),
+              help='比較するスケジューラ（省略時はすべて）')
+def simulate_scheduler_command(since, until, names):
+    """解答履歴を再生して復習スケジューラの復習負荷と定着率を比較する"""
+    import time
+    from basebuilder import scheduler, simulator
+
+    start = time.perf_counter()
+    history = simulator.load_answer_history(since=since, until=until)
+    click.echo(f"解答履歴 {len(history['day'])}件を読み込みました（{time.perf_counter() - start:.1f}秒）")
+
+    targets = [scheduler.SCHEDULERS[name] for name in (names or scheduler.SCHEDULERS)]
+    for target in targets:
+        start = time.perf_counter()
+        result = simulator.replay(history, target)
+        click.echo(
+            f"{target.name}: 定着率={result['retention']:.1%} "
+            f"復習負荷={result['daily_load']:.2f}語/人日 "
+            f"平均間隔={result['mean_interval']:.1f}日 "
+            f"期限後の解答={result['due_answers']} 期限前の解答={result['early_answers']} "
+            f"（{time.perf_counter() - start:.1f}秒）"
+        )
@@ -0,0 +1,190 @@
+# basebuilder/deletion.py
+"""
+テキスト・カテゴリの一括削除サービス
+
+問題ごとにDELETEを発行する代わりに、問題IDを DELETE_CHUNK_SIZE 件ずつ取り出し、
+関連テーブル（単語熟練度・解答記録・テーマ関連付け）と問題を
+`DELETE ... WHERE problem_id IN (...)` でまとめて削除する。
+チャンクごとにコミットしてロックの保持時間を短くする。
+
+途中で失敗した場合も削除済みのチャンクは戻らないが、残りは同じ操作の再実行で削除できる。
+ASYNC_THRESHOLD 語を超える削除はバックグラウンドジョブ（app/utils/background_jobs.py）で行い、
+削除を実行した教師だけが進捗を確認できる。
+"""
+from sqlalchemy import select
+
+from extensions import db
+from basebuilder.proficiency import refresh_aggregates
+from basebuilder.models import (
+    AnswerRecord, BasicKnowledgeItem, KnowledgeThemeRelation, ProblemCategory,
+    ProficiencyRecord, TextDelivery, TextProficiencyRecord, TextSet, WordProficiency
+)
+
+# 1回のDELETEで対象にする問題数
+DELETE_CHUNK_SIZE = 1000
+
+# これを超える単語数の削除はバックグラウンドジョブで行う
+ASYNC_THRESHOLD = 2000
+
+# 削除のジョブの種類（app/utils/background_jobs.py の JOB_HANDLERS のキー）
+DELETION_JOB_KINDS = ('basebuilder_delete_text_sets', 'basebuilder_delete_category')
+
+# 問題に紐づくテーブル（問題本体より先に削除する）
+PROBLEM_CHILD_MODELS = (WordProficiency, AnswerRecord, KnowledgeThemeRelation)
+
+
+def _problem_criteria(text_set_ids=None, category_id=None):
+    """削除対象の問題の絞り込み条件"""
+    if category_id is not None:
+        # カテゴリ直下の問題と、カテゴリ内のテキストに含まれる問題
+        return (BasicKnowledgeItem.category_id == category_id) | BasicKnowledgeItem.text_set_id.in_(
+            select(TextSet.id).where(TextSet.category_id == category_id)
+        )
+    return BasicKnowledgeItem.text_set_id.in_(list(text_set_ids))
+
+
+def count_problems(text_set_ids=None, category_id=None):
+    """削除対象の問題数"""
+    return db.session.query(db.func.count(BasicKnowledgeItem.id)).filter(
+        _problem_criteria(text_set_ids, category_id)
+    ).scalar() or 0
+
+
+def _delete_problems(criteria, progress=None):
+    """
+    条件に一致する問題と関連レコードをチャンクごとに削除する
+
+    Args:
+        criteria: 問題の絞り込み条件
+        progress: 進捗通知のコールバック progress(削除済み問題数, 対象問題数)
+
+    Returns:
+        int: 削除した問題数
+    """
+    total = db.session.query(db.func.count(BasicKnowledgeItem.id)).filter(criteria).scalar() or 0
+    deleted = 0
+
+    while True:
+        problem_ids = [row[0] for row in db.session.query(BasicKnowledgeItem.id).filter(
+            criteria
+        ).order_by(BasicKnowledgeItem.id).limit(DELETE_CHUNK_SIZE).all()]
+        if not problem_ids:
+            break
+
+        for model in PROBLEM_CHILD_MODELS:
+            db.session.query(model).filter(
+                model.problem_id.in_(problem_ids)
+            ).delete(synchronize_session=False)
+        db.session.query(BasicKnowledgeItem).filter(
+            BasicKnowledgeItem.id.in_(problem_ids)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+        deleted += len(problem_ids)
+        if progress:
+            progress(deleted, total)
+
+    return deleted
+
+
+def delete_text_sets(text_set_ids, progress=None):
+    """
+    テキストとそれに含まれる問題・学習記録を削除する
+
+    Args:
+        text_set_ids: 削除するテキストIDのリスト（権限チェックは呼び出し側で行う）
+        progress: 進捗通知のコールバック progress(削除済み問題数, 対象問題数)
+
+    Returns:
+        dict: {'text_sets': 削除したテキスト数, 'problems': 削除した問題数}
+    """
+    text_set_ids = list(text_set_ids)
+    if not text_set_ids:
+        return {'text_sets': 0, 'problems': 0}
+
+    category_ids = {row[0] for row in db.session.query(TextSet.category_id).filter(
+        TextSet.id.in_(text_set_ids)
+    ).all()}
+
+    problems = _delete_problems(_problem_criteria(text_set_ids=text_set_ids), progress)
+
+    TextProficiencyRecord.query.filter(
+        TextProficiencyRecord.text_set_id.in_(text_set_ids)
+    ).delete(synchronize_session=False)
+    TextDelivery.query.filter(
+        TextDelivery.text_set_id.in_(text_set_ids)
+    ).delete(synchronize_session=False)
+    text_sets = TextSet.query.filter(
+        TextSet.id.in_(text_set_ids)
+    ).delete(synchronize_session=False)
+    # 単語が減ったカテゴリの集計値を再計算する
+    refresh_aggregates(category_ids=category_ids)
+    db.session.commit()
+
+    return {'text_sets': text_sets, 'problems': problems}
+
+
+def delete_category(category_id, progress=None):
+    """
+    カテゴリとそれに含まれるテキスト・問題・学習記録を削除する
+
+    Args:
+        category_id: 削除するカテゴリID
+        progress: 進捗通知のコールバック progress(削除済み問題数, 対象問題数)
+
+    Returns:
+        dict: {'text_sets': 削除したテキスト数, 'problems': 削除した問題数}
+    """
+    text_set_ids = [row[0] for row in db.session.query(TextSet.id).filter_by(
+        category_id=category_id
+    ).all()]
+
+    problems = _delete_problems(_problem_criteria(category_id=category_id), progress)
+
+    text_sets = 0
+    if text_set_ids:
+        TextProficiencyRecord.query.filter(
+            TextProficiencyRecord.text_set_id.in_(text_set_ids)
+        ).delete(synchronize_session=False)
+        TextDelivery.query.filter(
+            TextDelivery.text_set_id.in_(text_set_ids)
+        ).delete(synchronize_session=False)
+        text_sets = TextSet.query.filter(
+            TextSet.id.in_(text_set_ids)
+        ).delete(synchronize_session=False)
+
+    ProficiencyRecord.query.filter_by(category_id=category_id).delete(synchronize_session=False)
+    ProblemCategory.query.filter_by(id=category_id).delete(synchronize_session=False)
+    db.session.commit()
+
+    return {'text_sets': text_sets, 'problems': problems}
+
+
+def enqueue_if_large(kind, problem_count, user_id, params):
+    """
+    削除対象が大きい場合にバックグラウンドジョブとして登録する
+
+    Args:
+        kind: 'basebuilder_delete_text_sets' または 'basebuilder_delete_category'
+        problem_count: 削除対象の問題数
+        user_id: 削除を実行した教師のID（進捗はこのユーザーだけが確認できる）
+        params: ハンドラに渡す値（{'text_set_ids': [...]} または {'category_id': ...}）
+
+    Returns:
+        BackgroundJob: 登録したジョブ。同期的に削除すべき場合はNone
+    """
+    if problem_count <= ASYNC_THRESHOLD:
+        return None
+
+    from app.utils.background_jobs import create_job
+    return create_job(kind, user_id, params, total=problem_count)
+
+
+def run_text_sets_deletion(job, progress):
+    """テキストの一括削除ジョブのハンドラ（app/utils/background_jobs.py から呼ばれる）"""
+    return delete_text_sets(job.params['text_set_ids'], progress=lambda deleted, total: progress(deleted))
+
+
+def run_category_deletion(job, progress):
+    """カテゴリ削除ジョブのハンドラ（app/utils/background_jobs.py から呼ばれる）"""
+    return delete_category(job.params['category_id'], progress=lambda deleted, total: progress(deleted))
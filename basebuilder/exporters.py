@@ -1,6 +1,14 @@
 # basebuilder/exporters.py
 import csv
 import io
+import json
+
+# インポート・エクスポート共通のCSV列
+PROBLEM_CSV_HEADERS = [
+    'title', 'category', 'question', 'answer_type', 'correct_answer',
+    'choice_1', 'choice_2', 'choice_3', 'choice_4',
+    'explanation', 'difficulty'
+]
 
 def generate_problem_csv_template():
     """
@@ -10,11 +18,7 @@ def generate_problem_csv_template():
         str: CSVテンプレート文字列
     """
     # テンプレート用のヘッダーと例を定義
-    headers = [
-        'title', 'category', 'question', 'answer_type', 'correct_answer',
-        'choice_1', 'choice_2', 'choice_3', 'choice_4',
-        'explanation', 'difficulty'
-    ]
+    headers = PROBLEM_CSV_HEADERS
     
     # 例データ - 単語学習向けにカスタマイズ
     examples = [
@@ -89,15 +93,36 @@ def generate_problem_csv_empty_template():
         str: 空のCSVテンプレート文字列
     """
     # テンプレート用のヘッダーを定義
-    headers = [
-        'title', 'category', 'question', 'answer_type', 'correct_answer',
-        'choice_1', 'choice_2', 'choice_3', 'choice_4',
-        'explanation', 'difficulty'
-    ]
+    headers = PROBLEM_CSV_HEADERS
     
     # CSVファイルを生成（ヘッダーのみ）
     output = io.StringIO()
     writer = csv.writer(output)
     writer.writerow(headers)
     
-    return output.getvalue()
\ No newline at end of file
+    return output.getvalue()
+
+def problem_csv_row(title, category, question, answer_type, correct_answer,
+                    choices, explanation, difficulty):
+    """
+    問題1件をインポートと同じ形式のCSVの行に変換
+    
+    Args:
+        choices: 選択肢（例文）のJSON文字列
+    
+    Returns:
+        list: PROBLEM_CSV_HEADERS の順に並んだ値
+    """
+    try:
+        parsed = json.loads(choices) if choices else []
+    except (TypeError, ValueError):
+        parsed = []
+    
+    choice_texts = [
+        choice.get('text', '') if isinstance(choice, dict) else str(choice)
+        for choice in parsed
+    ]
+    choice_texts = (choice_texts + [''] * 4)[:4]
+    
+    return [title, category, question, answer_type, correct_answer,
+            *choice_texts, explanation, difficulty]
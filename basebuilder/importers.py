@@ -4,6 +4,178 @@ import json
 from io import StringIO
 from datetime import datetime, timedelta, date
 
+from sqlalchemy import insert
+
+from basebuilder.proficiency import refresh_aggregates
+
+# 一括INSERT・検証の1チャンクあたりの行数
+IMPORT_CHUNK_SIZE = 1000
+
+# 自動分割モードで1つのテキストに入れる問題数
+AUTO_SPLIT_SIZE = 10
+
+# エラーメッセージとして保持する最大件数（それ以上は件数のみ数える）
+MAX_REPORTED_ERRORS = 100
+
+REQUIRED_HEADERS = ['title', 'category', 'question', 'answer_type', 'correct_answer']
+
+
+class ImportErrors(list):
+    """
+    インポート時のエラーメッセージのリスト
+
+    MAX_REPORTED_ERRORS 件を超えたメッセージは保持せず件数だけ数える。
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.count = len(self)
+
+    def append(self, message):
+        self.count += 1
+        if len(self) < MAX_REPORTED_ERRORS:
+            super().append(message)
+        elif len(self) == MAX_REPORTED_ERRORS:
+            super().append("エラーが多いため、以降のエラーは省略しました。")
+
+
+def _open_csv(source):
+    """文字列またはテキストストリームからcsv.readerを作る"""
+    if isinstance(source, str):
+        source = StringIO(source)
+    return csv.reader(source)
+
+
+def validate_problem_row(row, current_user_id):
+    """
+    CSVの1行（ヘッダー名→値のdict）を検証する
+
+    Args:
+        row: ヘッダー名をキーにした行データ
+        current_user_id: インポート実行ユーザーのID
+
+    Returns:
+        tuple: (problem_data, row_errors)
+            - problem_data: 有効な場合は問題データ、無効な場合はNone
+            - row_errors: 検出されたエラーのリスト
+    """
+    # 必須フィールドの検証
+    row_errors = []
+    for field in REQUIRED_HEADERS:
+        if not row.get(field):
+            row_errors.append(f"{field} は必須項目です。")
+
+    # answer_typeの検証
+    answer_type = row.get('answer_type', '').strip().lower()
+    if answer_type not in ['multiple_choice', 'text', 'true_false']:
+        row_errors.append("answer_type は 'multiple_choice', 'text', 'true_false' のいずれかである必要があります。")
+
+    # 選択肢の検証（multiple_choiceの場合）
+    choices = []
+    if answer_type == 'multiple_choice':
+        # 選択肢カラムの取得（choices_1, choices_2, ...）
+        choice_columns = [key for key in row.keys() if key.startswith('choice_')]
+
+        if not choice_columns:
+            row_errors.append("選択問題には少なくとも1つの選択肢（choice_1, choice_2, ...）が必要です。")
+        else:
+            # 選択肢をJSONに変換
+            for i, col in enumerate(sorted(choice_columns)):
+                choice_text = row.get(col, '').strip()
+                if choice_text:
+                    is_correct = (row.get('correct_answer', '').strip() == col or
+                                  row.get('correct_answer', '').strip() == choice_text)
+                    choices.append({
+                        'id': f'choice_{i}',
+                        'text': choice_text,
+                        'value': f'choice_{i}',
+                        'isCorrect': is_correct
+                    })
+
+        if not any(choice.get('isCorrect') for choice in choices):
+            row_errors.append("正解となる選択肢が指定されていません。correct_answerは選択肢のIDまたはテキストと一致する必要があります。")
+
+    # 難易度の検証
+    difficulty = 2  # デフォルト値
+    if 'difficulty' in row and row['difficulty']:
+        try:
+            difficulty = int(row['difficulty'])
+            if difficulty < 1 or difficulty > 5:
+                row_errors.append("難易度は1〜5の整数である必要があります。")
+        except ValueError:
+            row_errors.append("難易度は整数値である必要があります。")
+
+    if row_errors:
+        return None, row_errors
+
+    return {
+        'title': row['title'].strip(),
+        'category': row['category'].strip(),
+        'question': row['question'].strip(),
+        'answer_type': answer_type,
+        'correct_answer': row['correct_answer'].strip(),
+        'explanation': row.get('explanation', '').strip(),
+        'difficulty': difficulty,
+        'created_by': current_user_id,
+        'choices': json.dumps(choices) if choices else None
+    }, []
+
+
+def iter_problem_chunks(source, current_user_id, errors, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    CSVを1行ずつ読みながら検証し、有効な問題データをチャンクごとに返す
+
+    ファイル全体を読み込まないため、行数に関係なくメモリ使用量は chunk_size 行分に収まる。
+
+    Args:
+        source: CSVの内容（文字列）またはテキストストリーム
+        current_user_id: インポート実行ユーザーのID
+        errors: 検出したエラーを追加するリスト
+        chunk_size: 1チャンクの行数
+
+    Yields:
+        list: 有効な問題データのリスト（最大 chunk_size 件）
+    """
+    reader = _open_csv(source)
+
+    # 必須ヘッダーの確認
+    headers = next(reader, None)
+    if not headers:
+        errors.append("CSVファイルが空であるか、ヘッダーが見つかりません。")
+        return
+    headers = [header.strip() for header in headers]
+
+    for header in REQUIRED_HEADERS:
+        if header not in headers:
+            errors.append(f"必須ヘッダー '{header}' がCSVファイルに見つかりません。")
+            return
+
+    chunk = []
+    line_count = 0
+    for values in reader:
+        line_count += 1
+
+        # 空行をスキップ
+        if not any(values):
+            continue
+
+        row = dict(zip(headers, values))
+        problem_data, row_errors = validate_problem_row(row, current_user_id)
+
+        # エラーがある場合はスキップ
+        if row_errors:
+            errors.append(f"行 {line_count}: " + ", ".join(row_errors))
+            continue
+
+        chunk.append(problem_data)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
 def validate_problem_csv(csv_content, current_user_id):
     """
     問題CSVデータを検証し、有効なデータと問題点を返す
@@ -19,107 +191,39 @@ def validate_problem_csv(csv_content, current_user_id):
             - errors: 検出されたエラーのリスト
     """
     valid_problems = []
-    errors = []
-    line_count = 0
-    
+    errors = ImportErrors()
+
     try:
-        # CSVを読み込む
-        csv_file = StringIO(csv_content)
-        reader = csv.DictReader(csv_file)
-        
-        # 必須ヘッダーの確認
-        required_headers = ['title', 'category', 'question', 'answer_type', 'correct_answer']
-        headers = reader.fieldnames
-        
-        if not headers:
-            return [], ["CSVファイルが空であるか、ヘッダーが見つかりません。"]
-        
-        for header in required_headers:
-            if header not in headers:
-                return [], [f"必須ヘッダー '{header}' がCSVファイルに見つかりません。"]
-        
-        # 各行を処理
-        for row in reader:
-            line_count += 1
-            
-            # 空行をスキップ
-            if not any(row.values()):
-                continue
-            
-            # 必須フィールドの検証
-            row_errors = []
-            for field in required_headers:
-                if not row.get(field):
-                    row_errors.append(f"{field} は必須項目です。")
-            
-            # answer_typeの検証
-            answer_type = row.get('answer_type', '').strip().lower()
-            if answer_type not in ['multiple_choice', 'text', 'true_false']:
-                row_errors.append("answer_type は 'multiple_choice', 'text', 'true_false' のいずれかである必要があります。")
-            
-            # 選択肢の検証（multiple_choiceの場合）
-            choices = []
-            if answer_type == 'multiple_choice':
-                # 選択肢カラムの取得（choices_1, choices_2, ...）
-                choice_columns = [key for key in row.keys() if key.startswith('choice_')]
-                
-                if not choice_columns:
-                    row_errors.append("選択問題には少なくとも1つの選択肢（choice_1, choice_2, ...）が必要です。")
-                else:
-                    # 選択肢をJSONに変換
-                    for i, col in enumerate(sorted(choice_columns)):
-                        choice_text = row.get(col, '').strip()
-                        if choice_text:
-                            is_correct = (row.get('correct_answer', '').strip() == col or 
-                                          row.get('correct_answer', '').strip() == choice_text)
-                            choices.append({
-                                'id': f'choice_{i}',
-                                'text': choice_text,
-                                'value': f'choice_{i}',
-                                'isCorrect': is_correct
-                            })
-                
-                if not any(choice.get('isCorrect') for choice in choices):
-                    row_errors.append("正解となる選択肢が指定されていません。correct_answerは選択肢のIDまたはテキストと一致する必要があります。")
-            
-            # 難易度の検証
-            difficulty = 2  # デフォルト値
-            if 'difficulty' in row and row['difficulty']:
-                try:
-                    difficulty = int(row['difficulty'])
-                    if difficulty < 1 or difficulty > 5:
-                        row_errors.append("難易度は1〜5の整数である必要があります。")
-                except ValueError:
-                    row_errors.append("難易度は整数値である必要があります。")
-            
-            # エラーがある場合はスキップ
-            if row_errors:
-                errors.append(f"行 {line_count}: " + ", ".join(row_errors))
-                continue
-            
-            # 有効なデータを追加
-            problem_data = {
-                'title': row['title'].strip(),
-                'category': row['category'].strip(),
-                'question': row['question'].strip(),
-                'answer_type': answer_type,
-                'correct_answer': row['correct_answer'].strip(),
-                'explanation': row.get('explanation', '').strip(),
-                'difficulty': difficulty,
-                'created_by': current_user_id,
-                'choices': json.dumps(choices) if choices else None
-            }
-            
-            valid_problems.append(problem_data)
-        
+        for chunk in iter_problem_chunks(csv_content, current_user_id, errors):
+            valid_problems.extend(chunk)
+
         if not valid_problems and not errors:
             errors.append("有効な問題データが見つかりませんでした。")
-            
+
         return valid_problems, errors
-    
+
     except Exception as e:
         return [], [f"CSVファイル処理中にエラーが発生しました: {str(e)}"]
 
+
+def _problem_mapping(problem_data, category_id, current_user_id, school_id):
+    """一括INSERT用の問題データ（basic_knowledge_itemsの列名→値）"""
+    return {
+        'category_id': category_id,
+        'title': problem_data['title'],
+        'question': problem_data['question'],
+        'answer_type': problem_data['answer_type'],
+        'correct_answer': problem_data['correct_answer'],
+        'explanation': problem_data.get('explanation', ''),
+        'difficulty': problem_data.get('difficulty', 2),
+        'choices': problem_data.get('choices'),
+        'created_by': current_user_id,
+        'school_id': school_id,
+        'text_set_id': None,
+        'order_in_text': None,
+    }
+
+
 # basebuilder/routes.py に追加
 def update_category_proficiency(student_id, category_id):
     """
@@ -176,12 +280,15 @@ def update_category_proficiency(student_id, category_id):
     
     return proficiency
 
-def import_text_from_csv(csv_content, title, description, category_id, db, TextSet, BasicKnowledgeItem, current_user_id, school_id=None):
+def import_text_from_csv(csv_content, title, description, category_id, db, TextSet, BasicKnowledgeItem, current_user_id, school_id=None, progress=None):
     """
     CSVファイルから問題をインポートし、テキストセットとして保存する
+
+    CSVを1行ずつ検証し、IMPORT_CHUNK_SIZE 行ごとにCoreの一括INSERTで保存する。
+    すべての行を1つのトランザクションで保存し、失敗した場合は何も保存しない。
     
     Args:
-        csv_content: CSVファイルの内容（文字列）
+        csv_content: CSVファイルの内容（文字列またはテキストストリーム）
         title: テキストセットのタイトル（空の場合は自動生成）
         description: テキストセットの説明
         category_id: カテゴリID
@@ -190,23 +297,19 @@ def import_text_from_csv(csv_content, title, description, category_id, db, TextS
         BasicKnowledgeItem: BasicKnowledgeItemモデルクラス
         current_user_id: インポート実行ユーザーのID
         school_id: 学校ID（オプション）
+        progress: 進捗通知のコールバック progress(保存済み問題数)（オプション）
         
     Returns:
         tuple: (success_count, error_count, errors)
     """
-    # CSVデータの検証
-    valid_problems, errors = validate_problem_csv(csv_content, current_user_id)
-    
+    from basebuilder.models import ProblemCategory
+
+    errors = ImportErrors()
     success_count = 0
-    error_count = len(errors)
-    
-    # 有効なデータがない場合は終了
-    if not valid_problems:
-        return success_count, error_count, errors
-    
+
     try:
         # カテゴリ情報を取得
-        category = ProblemCategory.query.get(category_id)
+        category = db.session.get(ProblemCategory, category_id)
         if not category:
             errors.append("指定されたカテゴリが見つかりません。")
             return 0, 1, errors
@@ -215,182 +318,209 @@ def import_text_from_csv(csv_content, title, description, category_id, db, TextS
         if school_id and category.school_id != school_id:
             errors.append("指定されたカテゴリはこの学校に属していません。")
             return 0, 1, errors
-            
-        category_name = category.name
-        
-        # タイトルが空の場合は自動生成
-        if not title.strip():
-            # 同じカテゴリの既存テキスト数を取得
-            text_set_query = TextSet.query.filter_by(category_id=category_id)
-            if school_id:
-                text_set_query = text_set_query.filter_by(school_id=school_id)
-            existing_count = text_set_query.count()
-            title = f"【{category_name}】No.{existing_count + 1}"
-        
-        # 新しいテキストセットを作成（学校IDも設定）
-        new_text_set = TextSet(
-            title=title,
-            description=description,
-            category_id=category_id,
-            created_by=current_user_id,
-            school_id=school_id
-        )
-        db.session.add(new_text_set)
-        db.session.flush()  # IDを取得するためにフラッシュ
-        
-        # 各問題をテキストセットに追加
-        for i, problem_data in enumerate(valid_problems):
-            try:
-                # 問題の作成（学校IDも設定）
-                new_problem = BasicKnowledgeItem(
+
+        new_text_set = None
+        for chunk in iter_problem_chunks(csv_content, current_user_id, errors):
+            # 最初の有効なチャンクでテキストセットを作成
+            if new_text_set is None:
+                # タイトルが空の場合は自動生成
+                if not title.strip():
+                    # 同じカテゴリの既存テキスト数を取得
+                    text_set_query = TextSet.query.filter_by(category_id=category_id)
+                    if school_id:
+                        text_set_query = text_set_query.filter_by(school_id=school_id)
+                    existing_count = text_set_query.count()
+                    title = f"【{category.name}】No.{existing_count + 1}"
+
+                # 新しいテキストセットを作成（学校IDも設定）
+                new_text_set = TextSet(
+                    title=title,
+                    description=description,
                     category_id=category_id,
-                    title=problem_data['title'],
-                    question=problem_data['question'],
-                    answer_type=problem_data['answer_type'],
-                    correct_answer=problem_data['correct_answer'],
-                    explanation=problem_data.get('explanation', ''),
-                    difficulty=problem_data.get('difficulty', 2),
-                    choices=problem_data.get('choices'),
                     created_by=current_user_id,
-                    text_set_id=new_text_set.id,
-                    order_in_text=i+1,
                     school_id=school_id
                 )
-                
-                db.session.add(new_problem)
-                success_count += 1
-                
-            except Exception as e:
-                errors.append(f"問題 '{problem_data['title']}' の追加中にエラーが発生しました: {str(e)}")
-                error_count += 1
-        
+                db.session.add(new_text_set)
+                db.session.flush()  # IDを取得するためにフラッシュ
+
+            # テキスト内の順序を付けて一括INSERT
+            mappings = []
+            for problem_data in chunk:
+                mapping = _problem_mapping(problem_data, category_id, current_user_id, school_id)
+                mapping['text_set_id'] = new_text_set.id
+                mapping['order_in_text'] = success_count + len(mappings) + 1
+                mappings.append(mapping)
+
+            db.session.execute(insert(BasicKnowledgeItem), mappings)
+            success_count += len(mappings)
+            if progress:
+                progress(success_count)
+
+        if new_text_set is None and not errors:
+            errors.append("有効な問題データが見つかりませんでした。")
+
+        # カテゴリの単語数が変わるため集計値を再計算する
+        if new_text_set is not None:
+            refresh_aggregates(category_ids=[category_id])
+
         # 変更をコミット
         db.session.commit()
         
     except Exception as e:
         db.session.rollback()
         errors.append(f"テキストセットの作成中にエラーが発生しました: {str(e)}")
-        return 0, len(valid_problems), errors
+        return 0, success_count + errors.count, errors
     
-    return success_count, error_count, errors
+    return success_count, errors.count, errors
 
-def import_problems_from_csv(csv_content, db, ProblemCategory, BasicKnowledgeItem, current_user_id, school_id=None, TextSet=None):
+def run_text_import(job, progress):
+    """テキストインポートジョブのハンドラ（app/utils/background_jobs.py から呼ばれる）"""
+    from extensions import db
+    from basebuilder.models import TextSet, BasicKnowledgeItem
+    from app.utils.import_jobs import open_upload
+
+    params = job.params or {}
+    with open_upload(job) as source:
+        success_count, error_count, errors = import_text_from_csv(
+            source, params.get('title', ''), params.get('description', ''), params['category_id'],
+            db, TextSet, BasicKnowledgeItem, job.user_id,
+            school_id=params.get('school_id'), progress=progress
+        )
+    return {'imported': success_count, 'error_count': error_count, 'errors': list(errors)}
+
+def run_problem_import(job, progress):
+    """問題インポートジョブのハンドラ（app/utils/background_jobs.py から呼ばれる）"""
+    from extensions import db
+    from basebuilder.models import ProblemCategory, TextSet, BasicKnowledgeItem
+    from app.utils.import_jobs import open_upload
+
+    params = job.params or {}
+    with open_upload(job) as source:
+        success_count, error_count, errors = import_problems_from_csv(
+            source, db, ProblemCategory, BasicKnowledgeItem, job.user_id,
+            school_id=params.get('school_id'),
+            TextSet=TextSet if params.get('auto_split') else None,
+            progress=progress
+        )
+    return {'imported': success_count, 'error_count': error_count, 'errors': list(errors)}
+
+def import_problems_from_csv(csv_content, db, ProblemCategory, BasicKnowledgeItem, current_user_id, school_id=None, TextSet=None, progress=None):
     """
     CSVファイルから問題をインポートする
+
+    CSVを1行ずつ検証し、IMPORT_CHUNK_SIZE 行ごとにCoreの一括INSERTで保存する。
+    カテゴリは最初に名前→IDの対応表を1回だけ作り、新しいカテゴリのみ追加する。
     
     Args:
-        csv_content: CSVファイルの内容（文字列）
+        csv_content: CSVファイルの内容（文字列またはテキストストリーム）
         db: SQLAlchemyのdbオブジェクト
         ProblemCategory: ProblemCategoryモデルクラス
         BasicKnowledgeItem: BasicKnowledgeItemモデルクラス
         current_user_id: インポート実行ユーザーのID
         school_id: 学校ID（オプション）
         TextSet: テキストセットモデル（Noneでなければ自動分割モード）
+        progress: 進捗通知のコールバック progress(保存済み問題数)（オプション）
         
     Returns:
         tuple: (success_count, error_count, errors)
     """
-    # CSVデータの検証
-    valid_problems, errors = validate_problem_csv(csv_content, current_user_id)
-    
+    errors = ImportErrors()
     success_count = 0
-    error_count = len(errors)
-    
-    # 有効なデータがない場合は終了
-    if not valid_problems:
-        return success_count, error_count, errors
-    
-    # カテゴリのキャッシュを作成
-    categories = {}
-    # 同じ学校のカテゴリのみを対象に
-    category_query = ProblemCategory.query
-    if school_id:
-        category_query = category_query.filter_by(school_id=school_id)
-    
-    for category_obj in category_query.all():
-        categories[category_obj.name.lower()] = category_obj
-    
-    # 自動分割モードかどうか確認
-    auto_split_mode = TextSet is not None
-    text_sets = []
-    current_text_set = None
-    problems_in_current_text = 0
-    
-    # 各問題をデータベースに追加
-    for i, problem in enumerate(valid_problems):
-        try:
-            # カテゴリを検索または作成
-            category_name = problem['category']
-            category_key = category_name.lower()
-            
-            if category_key in categories:
-                category = categories[category_key]
-            else:
-                # 新しいカテゴリを作成（学校IDも設定）
-                category = ProblemCategory(
-                    name=category_name,
-                    created_by=current_user_id,
-                    school_id=school_id
-                )
-                db.session.add(category)
-                db.session.flush()  # IDを取得するためにフラッシュ
-                categories[category_key] = category
-            
-            # 自動分割モードの場合、10問ごとに新しいテキストセットを作成
-            if auto_split_mode:
-                if i % 10 == 0 or current_text_set is None:
-                    # 同じカテゴリの既存テキスト数を取得
-                    text_set_query = TextSet.query.filter_by(category_id=category.id)
-                    if school_id:
-                        text_set_query = text_set_query.filter_by(school_id=school_id)
-                    existing_count = text_set_query.count()
-                    
-                    # 新しいテキストセットを作成（学校IDも設定）
-                    current_text_set = TextSet(
-                        title=f"【{category_name}】No.{existing_count + 1}",
-                        description=f"{category_name}の単語集",
-                        category_id=category.id,
+
+    try:
+        # カテゴリ名（小文字）→IDの対応表（同じ学校のカテゴリのみを対象に）
+        category_query = db.session.query(ProblemCategory.id, ProblemCategory.name)
+        if school_id:
+            category_query = category_query.filter(ProblemCategory.school_id == school_id)
+        category_ids = {name.lower(): category_id for category_id, name in category_query.all()}
+
+        # 自動分割モードかどうか確認
+        auto_split_mode = TextSet is not None
+        text_set_counts = {}
+        if auto_split_mode:
+            # カテゴリごとの既存テキスト数（テキスト作成のたびに数え直さない）
+            count_query = db.session.query(TextSet.category_id, db.func.count(TextSet.id))
+            if school_id:
+                count_query = count_query.filter(TextSet.school_id == school_id)
+            text_set_counts = dict(count_query.group_by(TextSet.category_id).all())
+        current_text_set_id = None
+        problems_in_current_text = 0
+        imported_category_ids = set()
+
+        for chunk in iter_problem_chunks(csv_content, current_user_id, errors):
+            # チャンク内の新しいカテゴリをまとめて作成（学校IDも設定）
+            new_categories = {}
+            for problem_data in chunk:
+                category_key = problem_data['category'].lower()
+                if category_key not in category_ids and category_key not in new_categories:
+                    new_categories[category_key] = ProblemCategory(
+                        name=problem_data['category'],
                         created_by=current_user_id,
                         school_id=school_id
                     )
-                    db.session.add(current_text_set)
+
+            if new_categories:
+                db.session.add_all(new_categories.values())
+                db.session.flush()  # IDを取得するためにフラッシュ
+                category_ids.update({key: category.id for key, category in new_categories.items()})
+
+            # 自動分割モードの場合、AUTO_SPLIT_SIZE 問ごとに新しいテキストセットを作成
+            chunk_text_sets = []
+            if auto_split_mode:
+                for i, problem_data in enumerate(chunk):
+                    if (success_count + i) % AUTO_SPLIT_SIZE == 0:
+                        category_name = problem_data['category']
+                        category_id = category_ids[category_name.lower()]
+                        existing_count = text_set_counts.get(category_id, 0)
+                        text_set_counts[category_id] = existing_count + 1
+                        chunk_text_sets.append(TextSet(
+                            title=f"【{category_name}】No.{existing_count + 1}",
+                            description=f"{category_name}の単語集",
+                            category_id=category_id,
+                            created_by=current_user_id,
+                            school_id=school_id
+                        ))
+                if chunk_text_sets:
+                    db.session.add_all(chunk_text_sets)
                     db.session.flush()  # IDを取得するためにフラッシュ
-                    text_sets.append(current_text_set)
-                    problems_in_current_text = 0
-            
-            # 問題の作成（学校IDも設定）
-            new_problem = BasicKnowledgeItem(
-                category_id=category.id,
-                title=problem['title'],
-                question=problem['question'],
-                answer_type=problem['answer_type'],
-                correct_answer=problem['correct_answer'],
-                explanation=problem.get('explanation', ''),
-                difficulty=problem.get('difficulty', 2),
-                choices=problem.get('choices'),
-                created_by=current_user_id,
-                school_id=school_id
-            )
-            
-            # 自動分割モードの場合はテキストセットに関連付け
-            if auto_split_mode and current_text_set:
-                new_problem.text_set_id = current_text_set.id
-                new_problem.order_in_text = problems_in_current_text + 1
-                problems_in_current_text += 1
-            
-            db.session.add(new_problem)
-            success_count += 1
-            
-        except Exception as e:
-            errors.append(f"問題 '{problem['title']}' のインポート中にエラーが発生しました: {str(e)}")
-            error_count += 1
-    
-    # 変更をコミット
-    try:
+
+            mappings = []
+            text_set_iter = iter(chunk_text_sets)
+            for i, problem_data in enumerate(chunk):
+                mapping = _problem_mapping(
+                    problem_data, category_ids[problem_data['category'].lower()],
+                    current_user_id, school_id
+                )
+
+                # 自動分割モードの場合はテキストセットに関連付け
+                if auto_split_mode:
+                    if (success_count + i) % AUTO_SPLIT_SIZE == 0:
+                        current_text_set_id = next(text_set_iter).id
+                        problems_in_current_text = 0
+                    mapping['text_set_id'] = current_text_set_id
+                    mapping['order_in_text'] = problems_in_current_text + 1
+                    problems_in_current_text += 1
+
+                mappings.append(mapping)
+                imported_category_ids.add(mapping['category_id'])
+
+            db.session.execute(insert(BasicKnowledgeItem), mappings)
+            success_count += len(mappings)
+            if progress:
+                progress(success_count)
+
+        if not success_count and not errors:
+            errors.append("有効な問題データが見つかりませんでした。")
+
+        # 問題を追加したカテゴリの単語数が変わるため集計値を再計算する
+        refresh_aggregates(category_ids=imported_category_ids)
+
+        # 変更をコミット
         db.session.commit()
+
     except Exception as e:
         db.session.rollback()
         errors.append(f"データベースへの保存中にエラーが発生しました: {str(e)}")
-        return 0, len(valid_problems), errors
+        return 0, success_count + errors.count, errors
     
-    return success_count, error_count, errors
\ No newline at end of file
+    return success_count, errors.count, errors
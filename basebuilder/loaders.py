@@ -0,0 +1,285 @@
+# basebuilder/loaders.py
+"""
+学生ごとの学習状況を問題IDのリストに対してまとめて取得するローダー
+
+どの関数も問題数に関係なく一定回数のクエリで結果を返す。
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from basebuilder.models import AnswerRecord, BasicKnowledgeItem, ProblemCategory, WordProficiency
+
+# 解答履歴の1ページあたりの件数
+HISTORY_PAGE_SIZE = 50
+
+
+def load_word_proficiencies(student_id, problem_ids):
+    """
+    単語の熟練度を1回のクエリで取得する
+
+    Returns:
+        dict: {問題ID: WordProficiency}（記録がない問題は含まない）
+    """
+    if not problem_ids:
+        return {}
+
+    records = WordProficiency.query.filter(
+        WordProficiency.student_id == student_id,
+        WordProficiency.problem_id.in_(list(problem_ids))
+    ).all()
+
+    return {wp.problem_id: wp for wp in records}
+
+
+def load_latest_answers(student_id, problem_ids, since=None):
+    """
+    問題ごとの最新の解答記録を1回のクエリで取得する
+
+    問題ごとの MAX(timestamp) を求めるサブクエリと結合して取得する。
+    サブクエリは (student_id, problem_id, timestamp) の複合インデックスのみで解決される。
+    同じ時刻の解答が複数ある場合はIDが大きいものを採用する。
+
+    Args:
+        student_id: 学生ID
+        problem_ids: 問題IDのリスト
+        since: 指定した場合、この日時以降の解答のみを対象にする
+
+    Returns:
+        dict: {問題ID: AnswerRecord}（解答がない問題は含まない）
+    """
+    if not problem_ids:
+        return {}
+
+    problem_ids = list(problem_ids)
+
+    latest = db.session.query(
+        AnswerRecord.problem_id.label('problem_id'),
+        func.max(AnswerRecord.timestamp).label('latest_timestamp')
+    ).filter(
+        AnswerRecord.student_id == student_id,
+        AnswerRecord.problem_id.in_(problem_ids)
+    )
+    if since is not None:
+        latest = latest.filter(AnswerRecord.timestamp >= since)
+    latest = latest.group_by(AnswerRecord.problem_id).subquery()
+
+    records = AnswerRecord.query.join(
+        latest,
+        and_(
+            AnswerRecord.problem_id == latest.c.problem_id,
+            AnswerRecord.timestamp == latest.c.latest_timestamp
+        )
+    ).filter(
+        AnswerRecord.student_id == student_id
+    ).all()
+
+    answers = {}
+    for record in records:
+        current = answers.get(record.problem_id)
+        if current is None or record.id > current.id:
+            answers[record.problem_id] = record
+
+    return answers
+
+
+def load_recent_answers(student_id, problem_ids, limit):
+    """
+    問題ごとに新しい順の解答記録を最大limit件ずつ1回のクエリで取得する
+
+    ROW_NUMBER() で問題ごとに順位を付け、上位limit件のみを返す。
+
+    Args:
+        student_id: 学生ID
+        problem_ids: 問題IDのリスト
+        limit: 問題ごとの最大件数
+
+    Returns:
+        dict: {問題ID: [AnswerRecord, ...]}（新しい順、解答がない問題は含まない）
+    """
+    if not problem_ids:
+        return {}
+
+    ranked = db.session.query(
+        AnswerRecord.id.label('id'),
+        func.row_number().over(
+            partition_by=AnswerRecord.problem_id,
+            order_by=(AnswerRecord.timestamp.desc(), AnswerRecord.id.desc())
+        ).label('rank')
+    ).filter(
+        AnswerRecord.student_id == student_id,
+        AnswerRecord.problem_id.in_(list(problem_ids))
+    ).subquery()
+
+    records = AnswerRecord.query.join(
+        ranked, AnswerRecord.id == ranked.c.id
+    ).filter(
+        ranked.c.rank <= limit
+    ).order_by(
+        AnswerRecord.problem_id, ranked.c.rank
+    ).all()
+
+    answers = {}
+    for record in records:
+        answers.setdefault(record.problem_id, []).append(record)
+
+    return answers
+
+
+def count_answered_problems_by_text(student_id, text_set_ids):
+    """
+    テキストごとに解答済みの問題数を1回のクエリで数える
+
+    Returns:
+        dict: {テキストID: 解答済み問題数}（解答がないテキストは含まない）
+    """
+    if not text_set_ids:
+        return {}
+
+    rows = db.session.query(
+        BasicKnowledgeItem.text_set_id,
+        func.count(func.distinct(AnswerRecord.problem_id))
+    ).join(
+        AnswerRecord, AnswerRecord.problem_id == BasicKnowledgeItem.id
+    ).filter(
+        AnswerRecord.student_id == student_id,
+        BasicKnowledgeItem.text_set_id.in_(list(text_set_ids))
+    ).group_by(BasicKnowledgeItem.text_set_id).all()
+
+    return {text_set_id: count for text_set_id, count in rows}
+
+
+def load_text_progress(student_id, problem_ids):
+    """
+    テキスト詳細ページ用に単語の熟練度と最新の解答をまとめて取得する（2クエリ）
+
+    Returns:
+        tuple: (word_proficiencies, answers)
+            - word_proficiencies: {問題ID: {'level': 熟練度, 'last_updated': 更新日時}}
+            - answers: {問題ID: 最新のAnswerRecordまたはNone}
+    """
+    proficiencies = load_word_proficiencies(student_id, problem_ids)
+    latest_answers = load_latest_answers(student_id, problem_ids)
+
+    word_proficiencies = {
+        pid: {'level': wp.level, 'last_updated': wp.last_updated}
+        for pid, wp in proficiencies.items()
+    }
+    answers = {pid: latest_answers.get(pid) for pid in problem_ids}
+
+    return word_proficiencies, answers
+
+
+def encode_history_cursor(record):
+    """解答記録から次ページ取得用のカーソル文字列（タイムスタンプ_ID）を作る"""
+    return f"{record.timestamp.isoformat()}_{record.id}"
+
+
+def decode_history_cursor(cursor):
+    """
+    カーソル文字列を (タイムスタンプ, ID) に戻す
+
+    Returns:
+        tuple: (datetime, int)。不正な文字列の場合はNone
+    """
+    if not cursor:
+        return None
+    try:
+        timestamp, record_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(record_id)
+    except ValueError:
+        return None
+
+
+def load_answer_page(student_id, cursor=None, per_page=HISTORY_PAGE_SIZE):
+    """
+    解答履歴を新しい順に1ページ分取得する（(timestamp, id) のキーセットページング）
+
+    OFFSETを使わず「前のページの最後の解答より古いもの」を検索するため、
+    履歴が増えてもページの位置に関係なく (student_id, timestamp) のインデックスで取得できる。
+
+    Args:
+        student_id: 学生ID
+        cursor: 前のページの next_cursor（省略時は最新から）
+        per_page: 1ページの件数
+
+    Returns:
+        tuple: (解答記録のリスト, 次ページのカーソルまたはNone)
+    """
+    query = AnswerRecord.query.options(
+        joinedload(AnswerRecord.problem).joinedload(BasicKnowledgeItem.category)
+    ).filter(
+        AnswerRecord.student_id == student_id
+    )
+
+    position = decode_history_cursor(cursor)
+    if position:
+        timestamp, record_id = position
+        query = query.filter(or_(
+            AnswerRecord.timestamp < timestamp,
+            and_(AnswerRecord.timestamp == timestamp, AnswerRecord.id < record_id)
+        ))
+
+    records = query.order_by(
+        AnswerRecord.timestamp.desc(),
+        AnswerRecord.id.desc()
+    ).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(records) > per_page:
+        records = records[:per_page]
+        next_cursor = encode_history_cursor(records[-1])
+
+    return records, next_cursor
+
+
+def count_answers(student_id):
+    """
+    解答数と正解数をSQLで集計する
+
+    Returns:
+        tuple: (解答数, 正解数)
+    """
+    total, correct = db.session.query(
+        func.count(AnswerRecord.id),
+        func.sum(case((AnswerRecord.is_correct == True, 1), else_=0))
+    ).filter(
+        AnswerRecord.student_id == student_id
+    ).one()
+
+    return total or 0, int(correct or 0)
+
+
+def answer_stats_by_category(student_id):
+    """
+    カテゴリ別の解答数・正解数・正解率をSQLで集計する
+
+    Returns:
+        dict: {カテゴリID: {'category', 'total', 'correct', 'incorrect', 'accuracy'}}
+    """
+    rows = db.session.query(
+        ProblemCategory,
+        func.count(AnswerRecord.id),
+        func.sum(case((AnswerRecord.is_correct == True, 1), else_=0))
+    ).join(
+        BasicKnowledgeItem, BasicKnowledgeItem.category_id == ProblemCategory.id
+    ).join(
+        AnswerRecord, AnswerRecord.problem_id == BasicKnowledgeItem.id
+    ).filter(
+        AnswerRecord.student_id == student_id
+    ).group_by(ProblemCategory.id).all()
+
+    category_stats = {}
+    for category, total, correct in rows:
+        correct = int(correct or 0)
+        category_stats[category.id] = {
+            'category': category,
+            'total': total,
+            'correct': correct,
+            'incorrect': total - correct,
+            'accuracy': (correct / total) * 100 if total > 0 else 0
+        }
+
+    return category_stats
@@ -36,6 +36,11 @@ class TextDelivery(db.Model):
     delivered_class = db.relationship('Class', backref='text_deliveries')
     text_set = db.relationship('TextSet', backref='deliveries')
 
+    # クラスへの配信テキスト検索用
+    __table_args__ = (
+        db.Index('ix_text_deliveries_class_text', 'class_id', 'text_set_id'),
+    )
+
 # 基礎知識問題モデル → 単語モデルに変更
 class BasicKnowledgeItem(db.Model):
     __tablename__ = 'basic_knowledge_items'
@@ -61,6 +66,11 @@ class BasicKnowledgeItem(db.Model):
     theme_relations = db.relationship('KnowledgeThemeRelation', backref='problem', lazy=True)
     # school_ref = db.relationship('School', back_populates='basic_knowledge_items', lazy=True)
 
+    # テキスト内の単語を順序どおりに取得するためのインデックス
+    __table_args__ = (
+        db.Index('ix_basic_knowledge_items_text_order', 'text_set_id', 'order_in_text'),
+    )
+
 # 問題と探究テーマの関連付けモデル
 class KnowledgeThemeRelation(db.Model):
     __tablename__ = 'knowledge_theme_relations'
@@ -90,6 +100,13 @@ class AnswerRecord(db.Model):
     # リレーションシップ
     student = db.relationship('User', backref=db.backref('answer_records', lazy=True, cascade='all, delete-orphan'))
 
+    # 学生×問題ごとの最新解答を索引だけで引けるようにする（basebuilder/loaders.py）
+    # 学生の解答履歴を新しい順に取得するためのインデックス
+    __table_args__ = (
+        db.Index('ix_answer_records_student_problem_time', 'student_id', 'problem_id', 'timestamp'),
+        db.Index('ix_answer_records_student_time', 'student_id', 'timestamp'),
+    )
+
 # 熟練度記録モデル → 単語熟練度記録モデルに変更
 class ProficiencyRecord(db.Model):
     __tablename__ = 'proficiency_records'
@@ -100,6 +117,9 @@ class ProficiencyRecord(db.Model):
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
     review_date = db.Column(db.Date)  # 次回復習日を追加
     last_reviewed = db.Column(db.DateTime, default=datetime.utcnow)  # 最後に復習した日時
+    # 集計値（解答ごとに差分で更新、rebuild-aggregatesで再構築）
+    level_sum = db.Column(db.Integer, default=0, nullable=False)  # カテゴリ内の単語熟練度の合計
+    item_count = db.Column(db.Integer, default=0, nullable=False)  # カテゴリ内の単語数
     
     # リレーションシップ
     student = db.relationship('User', backref=db.backref('proficiency_records', lazy=True, cascade='all, delete-orphan'))
@@ -133,6 +153,10 @@ class TextProficiencyRecord(db.Model):
     text_set_id = db.Column(db.Integer, db.ForeignKey('text_sets.id'), nullable=False)
     level = db.Column(db.Integer, default=0)  # 0-100のパーセント
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    # 集計値（解答ごとに差分で更新、rebuild-aggregatesで再構築）
+    level_sum = db.Column(db.Integer, default=0, nullable=False)  # テキスト内の単語熟練度の合計
+    item_count = db.Column(db.Integer, default=0, nullable=False)  # テキスト内の有効な単語数
+    review_date = db.Column(db.Date)  # 最も早い単語の復習日
     
     # リレーションシップ
     student = db.relationship('User', backref=db.backref('text_proficiency_records', lazy=True, cascade='all, delete-orphan'))
@@ -186,13 +210,21 @@ class WordProficiency(db.Model):
     level = db.Column(db.Integer, default=0)  # 0-5のスケール → ポイントとして使用
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
     review_date = db.Column(db.Date, default=datetime.now().date())  # 次回復習日
+    # SM-2スケジューラの状態（basebuilder/scheduler.py、固定間隔方式では未使用）
+    ease_factor = db.Column(db.Float, nullable=True)  # 易しさ係数
+    interval_days = db.Column(db.Integer, nullable=True)  # 前回の復習間隔（日）
+    repetitions = db.Column(db.Integer, default=0)  # 連続正解数
     
     # リレーションシップ
     student = db.relationship('User', backref=db.backref('word_proficiency_records', lazy=True, cascade='all, delete-orphan'))
     problem = db.relationship('BasicKnowledgeItem', backref=db.backref('word_proficiency_records', lazy=True))
     
     # ユニーク制約（学生+問題の組み合わせは一意）
-    __table_args__ = (db.UniqueConstraint('student_id', 'problem_id'),)
+    # 復習キュー（basebuilder/review_queue.py）の範囲検索用インデックス
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'problem_id', name='uq_word_proficiency_student_problem'),
+        db.Index('ix_word_proficiency_student_review', 'student_id', 'review_date'),
+    )
 
 # テキストセットモデル
 class TextSet(db.Model):
@@ -0,0 +1,486 @@
+# basebuilder/proficiency.py
+"""
+解答時の熟練度更新サービス
+
+1回の解答で発生する書き込み（AnswerRecord、WordProficiency、
+カテゴリ・テキストの熟練度）を1つのトランザクションで行う。
+
+ProficiencyRecord / TextProficiencyRecord は学生ごとの集計値
+（単語熟練度の合計 level_sum、単語数 item_count、最も早い復習日 review_date）
+を保持し、解答のたびに単語熟練度の変化量（delta）だけを反映する。
+集計値のずれは rebuild_aggregates / verify_aggregates
+（flask basebuilder rebuild-aggregates / verify-aggregates）で修正する。
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from basebuilder.models import (
+    BasicKnowledgeItem, AnswerRecord, ProficiencyRecord,
+    TextProficiencyRecord, WordProficiency
+)
+
+# 単語熟練度の最大値
+MAX_LEVEL = 5
+
+# 熟練度ごとの次回復習までの日数（0:今日, 1:1日後, 2:3日後, 3:1週間後, 4:2週間後, 5:1ヶ月後）
+REVIEW_INTERVALS = [0, 1, 3, 7, 14, 30]
+
+
+def next_review_date(level, today=None):
+    """熟練度に応じた次回復習日を返す"""
+    today = today or datetime.now().date()
+    level = max(0, min(MAX_LEVEL, level))
+    return today + timedelta(days=REVIEW_INTERVALS[level])
+
+
+def category_level(level_sum, item_count):
+    """カテゴリの熟練度（0-5、単語熟練度の平均を切り捨て、未学習の単語は0）"""
+    if not item_count:
+        return 0
+    return min(MAX_LEVEL, int(level_sum / item_count))
+
+
+def text_level(level_sum, item_count):
+    """テキストの定着度（0-100%）"""
+    if not item_count:
+        return 0
+    return int(level_sum / (item_count * MAX_LEVEL) * 100)
+
+
+# 集計範囲ごとの定義（集計レコードのモデル、範囲を表すキー列、問題の絞り込み条件、熟練度の計算式）
+SCOPES = {
+    'category': {
+        'model': ProficiencyRecord,
+        'key': 'category_id',
+        'column': BasicKnowledgeItem.category_id,
+        'criteria': (),
+        'level': category_level,
+    },
+    'text': {
+        'model': TextProficiencyRecord,
+        'key': 'text_set_id',
+        'column': BasicKnowledgeItem.text_set_id,
+        'criteria': (BasicKnowledgeItem.is_active == True,),
+        'level': text_level,
+    },
+}
+
+
+def create_word_proficiency(student_id, problem_id, review_date=None):
+    """
+    単語熟練度のレコードを作成する（コミットはしない）
+
+    同じ単語への最初の解答が同時に届くと、後からINSERTした側は一意制約
+    （uq_word_proficiency_student_problem）に違反する。INSERTをセーブポイント内で行い、
+    違反した場合は先に作成されたレコードを返す。
+
+    Args:
+        student_id: 学生ID
+        problem_id: 問題ID
+        review_date: 新しく作成する場合の復習日
+
+    Returns:
+        WordProficiency: 作成したレコード（先に作成されていた場合はそのレコード）
+    """
+    proficiency = WordProficiency(
+        student_id=student_id,
+        problem_id=problem_id,
+        level=0,
+        review_date=review_date
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(proficiency)
+    except IntegrityError:
+        # 他のトランザクションが確定したレコードを読むためロック付きで取得する
+        proficiency = WordProficiency.query.filter_by(
+            student_id=student_id,
+            problem_id=problem_id
+        ).with_for_update().one()
+    return proficiency
+
+
+def update_word_proficiency(student_id, problem_id, is_correct, scheduler=None):
+    """
+    単語の熟練度を更新する（コミットはしない）
+
+    Args:
+        student_id: 学生ID
+        problem_id: 問題ID
+        is_correct: 正解かどうか
+        scheduler: 復習日を決めるスケジューラ（省略時は学生の学校の設定）
+
+    Returns:
+        tuple: (熟練度レコード, 熟練度の変化量, 更新前の復習日)
+    """
+    proficiency = WordProficiency.query.filter_by(
+        student_id=student_id,
+        problem_id=problem_id
+    ).first()
+
+    if not proficiency:
+        proficiency = create_word_proficiency(student_id, problem_id)
+
+    old_level = proficiency.level or 0
+    old_review_date = proficiency.review_date
+
+    # 正解なら+1、不正解なら-1（0〜5の範囲）
+    if is_correct:
+        new_level = min(MAX_LEVEL, old_level + 1)
+    else:
+        new_level = max(0, old_level - 1)
+
+    if scheduler is None:
+        from basebuilder.scheduler import scheduler_for_student
+        scheduler = scheduler_for_student(student_id)
+
+    proficiency.level = new_level
+    proficiency.review_date = scheduler.schedule(proficiency, is_correct)
+    proficiency.last_updated = datetime.utcnow()
+
+    return proficiency, new_level - old_level, old_review_date
+
+
+def _aggregate_word_levels(student_id, scope, scope_id):
+    """
+    範囲内の問題数・単語熟練度の合計・最も早い復習日を1回のクエリで集計する
+
+    Returns:
+        tuple: (問題数, 熟練度の合計, 最も早い復習日)
+    """
+    spec = SCOPES[scope]
+    count, level_sum, earliest_review = db.session.query(
+        func.count(BasicKnowledgeItem.id),
+        func.coalesce(func.sum(WordProficiency.level), 0),
+        func.min(WordProficiency.review_date)
+    ).select_from(BasicKnowledgeItem).outerjoin(
+        WordProficiency,
+        and_(
+            WordProficiency.problem_id == BasicKnowledgeItem.id,
+            WordProficiency.student_id == student_id
+        )
+    ).filter(spec['column'] == scope_id, *spec['criteria']).one()
+
+    return count or 0, int(level_sum or 0), earliest_review
+
+
+def _earliest_review_date(student_id, scope, scope_id):
+    """範囲内で最も早い単語の復習日を取得する"""
+    spec = SCOPES[scope]
+    return db.session.query(func.min(WordProficiency.review_date)).join(
+        BasicKnowledgeItem, BasicKnowledgeItem.id == WordProficiency.problem_id
+    ).filter(
+        WordProficiency.student_id == student_id,
+        spec['column'] == scope_id,
+        *spec['criteria']
+    ).scalar()
+
+
+def _get_record(student_id, scope, scope_id):
+    spec = SCOPES[scope]
+    return spec['model'].query.filter_by(
+        student_id=student_id,
+        **{spec['key']: scope_id}
+    ).first()
+
+
+def refresh_proficiency(student_id, scope, scope_id):
+    """
+    範囲（カテゴリまたはテキスト）の集計値を単語の熟練度から再計算する（コミットはしない）
+
+    Returns:
+        集計レコード（範囲内に問題がない場合はNone）
+    """
+    spec = SCOPES[scope]
+    item_count, level_sum, earliest_review = _aggregate_word_levels(student_id, scope, scope_id)
+
+    if not item_count:
+        return None
+
+    record = _get_record(student_id, scope, scope_id)
+    if not record:
+        record = spec['model'](
+            student_id=student_id,
+            level=0,
+            **{spec['key']: scope_id}
+        )
+        if scope == 'category':
+            record.review_date = datetime.now().date()
+        db.session.add(record)
+
+    record.level_sum = level_sum
+    record.item_count = item_count
+    record.level = spec['level'](level_sum, item_count)
+    record.last_updated = datetime.utcnow()
+
+    # 次回復習日は最も早い単語の復習日
+    if earliest_review:
+        record.review_date = earliest_review
+
+    return record
+
+
+def refresh_category_proficiency(student_id, category_id):
+    """カテゴリの熟練度を再計算する（コミットはしない）"""
+    return refresh_proficiency(student_id, 'category', category_id)
+
+
+def refresh_text_proficiency(student_id, text_set_id):
+    """テキストの定着度を再計算する（コミットはしない）"""
+    return refresh_proficiency(student_id, 'text', text_set_id)
+
+
+def refresh_aggregates(category_ids=(), text_set_ids=()):
+    """
+    問題の追加・移動・無効化・削除で単語が変わった範囲の集計値を再計算する（コミットはしない）
+
+    単語数・熟練度の合計・熟練度（level）をすぐに更新し、一覧・分析画面が
+    変更前の熟練度を表示しないようにする。問題を変更する処理（作成・編集・削除・インポート）は
+    変更を反映した後でこの関数を呼び出す。
+
+    Args:
+        category_ids: 単語が変わったカテゴリIDのリスト
+        text_set_ids: 単語が変わったテキストIDのリスト
+    """
+    for scope, scope_ids in (('category', category_ids), ('text', text_set_ids)):
+        scope_ids = {scope_id for scope_id in scope_ids if scope_id is not None}
+        if not scope_ids:
+            continue
+        spec = SCOPES[scope]
+        model = spec['model']
+        aggregates = compute_aggregates(scope, scope_ids=scope_ids)
+
+        for record in model.query.filter(getattr(model, spec['key']).in_(scope_ids)).all():
+            level_sum, item_count, earliest_review = aggregates.get(
+                (record.student_id, getattr(record, spec['key'])), (0, 0, None)
+            )
+            record.level_sum = level_sum
+            record.item_count = item_count
+            record.level = spec['level'](level_sum, item_count)
+            if earliest_review is not None:
+                record.review_date = earliest_review
+            record.last_updated = datetime.utcnow()
+
+
+def apply_word_delta(student_id, scope, scope_id, delta, old_review_date, new_review_date):
+    """
+    単語熟練度の変化を範囲の集計値に差分で反映する（コミットはしない）
+
+    集計レコードがまだない（または集計値を追加する前のレコードで単語数が0の）場合だけ再計算する。
+    最も早い復習日は、その単語が最も早い復習日だった場合に限り再取得する。
+
+    Returns:
+        集計レコード（範囲内に問題がない場合はNone）
+    """
+    spec = SCOPES[scope]
+    record = _get_record(student_id, scope, scope_id)
+
+    if not record or not record.item_count:
+        return refresh_proficiency(student_id, scope, scope_id)
+
+    record.level_sum = max(0, (record.level_sum or 0) + delta)
+    record.level = spec['level'](record.level_sum, record.item_count)
+    record.last_updated = datetime.utcnow()
+
+    earliest = record.review_date
+    if new_review_date != old_review_date:
+        if earliest is None or (new_review_date and new_review_date < earliest):
+            record.review_date = new_review_date
+        elif old_review_date is not None and old_review_date <= earliest:
+            record.review_date = _earliest_review_date(student_id, scope, scope_id)
+
+    return record
+
+
+def record_answer(student_id, problem, student_answer, is_correct, answer_time=0):
+    """
+    解答を記録し、単語・カテゴリ・テキストの熟練度を1回のコミットで更新する
+
+    Args:
+        student_id: 学生ID
+        problem: 解答したBasicKnowledgeItem
+        student_answer: 学生の解答
+        is_correct: 正解かどうか
+        answer_time: 解答にかかった時間（秒）
+
+    Returns:
+        tuple: (単語熟練度, カテゴリ熟練度, テキスト定着度)
+    """
+    try:
+        db.session.add(AnswerRecord(
+            student_id=student_id,
+            problem_id=problem.id,
+            student_answer=student_answer,
+            is_correct=is_correct,
+            answer_time=answer_time
+        ))
+
+        word_proficiency, delta, old_review_date = update_word_proficiency(
+            student_id, problem.id, is_correct
+        )
+        new_review_date = word_proficiency.review_date
+
+        category_proficiency = apply_word_delta(
+            student_id, 'category', problem.category_id,
+            delta, old_review_date, new_review_date
+        )
+
+        text_proficiency = None
+        if problem.text_set_id:
+            if problem.is_active:
+                text_proficiency = apply_word_delta(
+                    student_id, 'text', problem.text_set_id,
+                    delta, old_review_date, new_review_date
+                )
+            else:
+                # 無効な単語はテキストの定着度に含めない
+                text_proficiency = _get_record(student_id, 'text', problem.text_set_id)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return word_proficiency, category_proficiency, text_proficiency
+
+
+def compute_aggregates(scope, student_id=None, scope_ids=None):
+    """
+    全学生（または指定した学生）の集計値を単語熟練度から一括計算する
+
+    Args:
+        scope: 'category' または 'text'
+        student_id: 対象の学生ID（省略時は全学生）
+        scope_ids: 対象の範囲ID（省略時はすべての範囲）
+
+    Returns:
+        dict: {(学生ID, 範囲ID): (熟練度の合計, 単語数, 最も早い復習日)}
+    """
+    spec = SCOPES[scope]
+
+    scope_criteria = [spec['column'].isnot(None), *spec['criteria']]
+    if scope_ids is not None:
+        scope_criteria.append(spec['column'].in_(list(scope_ids)))
+
+    # 範囲ごとの単語数
+    item_counts = dict(
+        db.session.query(spec['column'], func.count(BasicKnowledgeItem.id))
+        .filter(*scope_criteria)
+        .group_by(spec['column'])
+        .all()
+    )
+
+    # 学生・範囲ごとの熟練度の合計と最も早い復習日
+    query = db.session.query(
+        WordProficiency.student_id,
+        spec['column'],
+        func.coalesce(func.sum(WordProficiency.level), 0),
+        func.min(WordProficiency.review_date)
+    ).join(
+        BasicKnowledgeItem, BasicKnowledgeItem.id == WordProficiency.problem_id
+    ).filter(*scope_criteria)
+
+    if student_id is not None:
+        query = query.filter(WordProficiency.student_id == student_id)
+
+    aggregates = {}
+    for sid, scope_id, level_sum, earliest_review in query.group_by(
+        WordProficiency.student_id, spec['column']
+    ).all():
+        aggregates[(sid, scope_id)] = (int(level_sum or 0), item_counts.get(scope_id, 0), earliest_review)
+
+    # 既存レコードのうち単語熟練度がない範囲は合計0
+    records = spec['model'].query
+    if student_id is not None:
+        records = records.filter_by(student_id=student_id)
+    if scope_ids is not None:
+        records = records.filter(getattr(spec['model'], spec['key']).in_(list(scope_ids)))
+    for record in records.all():
+        key = (record.student_id, getattr(record, spec['key']))
+        if key not in aggregates:
+            aggregates[key] = (0, item_counts.get(key[1], 0), None)
+
+    return aggregates
+
+
+def verify_aggregates(scope, student_id=None):
+    """
+    保存されている集計値と単語熟練度からの計算値を比較する
+
+    Returns:
+        list: ずれのある項目 [(学生ID, 範囲ID, 保存値, 計算値)]
+              値は (熟練度の合計, 単語数, 最も早い復習日)
+    """
+    spec = SCOPES[scope]
+    expected = compute_aggregates(scope, student_id)
+
+    records = spec['model'].query
+    if student_id is not None:
+        records = records.filter_by(student_id=student_id)
+    stored = {
+        (r.student_id, getattr(r, spec['key'])): (r.level_sum or 0, r.item_count or 0, r.review_date)
+        for r in records.all()
+    }
+
+    drift = []
+    for key, values in expected.items():
+        actual = stored.get(key)
+        if actual is None:
+            if values[1]:
+                drift.append((key[0], key[1], None, values))
+            continue
+        # 復習日は単語熟練度がある場合のみ比較する
+        compare_review = values[2] is not None
+        if actual[:2] != values[:2] or (compare_review and actual[2] != values[2]):
+            drift.append((key[0], key[1], actual, values))
+
+    return drift
+
+
+def rebuild_aggregates(scope, student_id=None):
+    """
+    集計値を単語熟練度から再構築してコミットする
+
+    Returns:
+        int: 作成または更新したレコード数
+    """
+    spec = SCOPES[scope]
+    aggregates = compute_aggregates(scope, student_id)
+
+    records = spec['model'].query
+    if student_id is not None:
+        records = records.filter_by(student_id=student_id)
+    existing = {(r.student_id, getattr(r, spec['key'])): r for r in records.all()}
+
+    changed = 0
+    try:
+        for (sid, scope_id), (level_sum, item_count, earliest_review) in aggregates.items():
+            record = existing.get((sid, scope_id))
+            if record is None:
+                if not item_count:
+                    continue
+                record = spec['model'](student_id=sid, **{spec['key']: scope_id})
+                db.session.add(record)
+
+            level = spec['level'](level_sum, item_count)
+            if (record.level_sum, record.item_count, record.level) == (level_sum, item_count, level) \
+                    and (earliest_review is None or record.review_date == earliest_review):
+                continue
+
+            record.level_sum = level_sum
+            record.item_count = item_count
+            record.level = level
+            if earliest_review is not None:
+                record.review_date = earliest_review
+            record.last_updated = datetime.utcnow()
+            changed += 1
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return changed
@@ -0,0 +1,129 @@
+# basebuilder/review_queue.py
+"""
+間隔反復の復習キュー
+
+WordProficiency.review_date が今日以前の単語を「復習期限が来た単語」として扱い、
+(student_id, review_date) のインデックスを使った1回の範囲検索で取得する。
+対象は学生が在籍中（ClassEnrollment.is_active）のクラスに配信されているテキストの有効な単語に限る。
+配信を解除すると TextDelivery の行が削除されるため、解除したテキストの単語も対象から外れる。
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from extensions import db
+from app.models import ClassEnrollment
+from basebuilder.models import BasicKnowledgeItem, TextDelivery, WordProficiency
+
+# 復習セッションで一度に出題する単語数の上限
+REVIEW_SESSION_LIMIT = 50
+
+
+def delivered_text_ids_subquery(student_id):
+    """学生が在籍中のクラスに配信されているテキストIDのサブクエリ（退出したクラスの配信は含めない）"""
+    return db.session.query(TextDelivery.text_set_id).join(
+        ClassEnrollment, ClassEnrollment.class_id == TextDelivery.class_id
+    ).filter(
+        ClassEnrollment.student_id == student_id,
+        ClassEnrollment.is_active == True
+    )
+
+
+def _queue_query(student_id, until, text_set_id=None, category_id=None):
+    """
+    復習日が until 以前の単語熟練度を検索するクエリ
+
+    Args:
+        student_id: 学生ID
+        until: この日付までに復習日が来る単語を対象にする
+        text_set_id: 指定した場合、このテキストの単語に限る
+        category_id: 指定した場合、このカテゴリの単語に限る
+
+    Returns:
+        Query: WordProficiency と BasicKnowledgeItem を結合したクエリ
+    """
+    query = db.session.query(WordProficiency, BasicKnowledgeItem).join(
+        BasicKnowledgeItem, BasicKnowledgeItem.id == WordProficiency.problem_id
+    ).filter(
+        WordProficiency.student_id == student_id,
+        WordProficiency.review_date <= until,
+        BasicKnowledgeItem.is_active == True,
+        BasicKnowledgeItem.text_set_id.in_(delivered_text_ids_subquery(student_id))
+    )
+
+    if text_set_id:
+        query = query.filter(BasicKnowledgeItem.text_set_id == text_set_id)
+    if category_id:
+        query = query.filter(BasicKnowledgeItem.category_id == category_id)
+
+    return query
+
+
+def get_due_items(student_id, limit=20, offset=0, text_set_id=None, category_id=None, today=None):
+    """
+    復習期限が来た単語を期限切れの古い順に取得する
+
+    同じ復習日の単語は熟練度の低いものを優先する。
+
+    Args:
+        student_id: 学生ID
+        limit: 取得件数
+        offset: 取得開始位置（ページング用）
+        text_set_id: テキストで絞り込む場合のID
+        category_id: カテゴリで絞り込む場合のID
+        today: 基準日（省略時は今日）
+
+    Returns:
+        list: [(WordProficiency, BasicKnowledgeItem), ...]
+    """
+    today = today or datetime.now().date()
+
+    return _queue_query(student_id, today, text_set_id, category_id).order_by(
+        WordProficiency.review_date,
+        WordProficiency.level,
+        WordProficiency.problem_id
+    ).offset(offset).limit(limit).all()
+
+
+def get_due_problem_ids(student_id, limit=REVIEW_SESSION_LIMIT, text_set_id=None, category_id=None, today=None):
+    """復習期限が来た単語の問題IDを期限切れの古い順に返す"""
+    items = get_due_items(
+        student_id, limit=limit, text_set_id=text_set_id,
+        category_id=category_id, today=today
+    )
+    return [wp.problem_id for wp, problem in items]
+
+
+def count_due(student_id, text_set_id=None, category_id=None, today=None):
+    """復習期限が来た単語の件数"""
+    today = today or datetime.now().date()
+    query = _queue_query(student_id, today, text_set_id, category_id)
+    return query.with_entities(func.count(WordProficiency.id)).scalar() or 0
+
+
+def due_count_summary(student_id, days=7, text_set_id=None, category_id=None, today=None):
+    """
+    今日から days 日分の日ごとの復習予定件数を返す
+
+    期限切れの単語は今日の件数に含める。
+
+    Returns:
+        list: [{'date': 日付, 'count': 件数}, ...]（今日から順に days 件）
+    """
+    today = today or datetime.now().date()
+    last_day = today + timedelta(days=days - 1)
+
+    rows = _queue_query(student_id, last_day, text_set_id, category_id).with_entities(
+        WordProficiency.review_date,
+        func.count(WordProficiency.id)
+    ).group_by(WordProficiency.review_date).all()
+
+    counts = {}
+    for review_date, count in rows:
+        day = max(review_date, today)
+        counts[day] = counts.get(day, 0) + count
+
+    return [
+        {'date': today + timedelta(days=i), 'count': counts.get(today + timedelta(days=i), 0)}
+        for i in range(days)
+    ]
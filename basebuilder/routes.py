@@ -1,12 +1,14 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, session, current_app
 from flask_login import login_required, current_user
+import io
 import json
 import random
 import traceback
 from datetime import datetime, timedelta, date
 from extensions import db
-from app.models import User, InquiryTheme, Class
-from basebuilder import exporters
+from app.models import User, InquiryTheme, Class, BackgroundJob
+from basebuilder import deletion, exporters, loaders, proficiency, review_queue, selection
+from app.utils.csv_export import csv_response, stream_query
 from sqlalchemy import func
 
 from basebuilder.models import (
@@ -90,24 +92,20 @@ def index():
 
             # テキスト学習進捗状況を計算（解答済み問題数ベース）
             text_progress = {}
+            delivered_text_ids = [delivery.text_set_id for delivery in delivered_texts]
+
+            # テキストごとの問題総数と解答済みの問題数をまとめて取得
+            problem_totals = dict(db.session.query(
+                BasicKnowledgeItem.text_set_id,
+                func.count(BasicKnowledgeItem.id)
+            ).filter(
+                BasicKnowledgeItem.text_set_id.in_(delivered_text_ids)
+            ).group_by(BasicKnowledgeItem.text_set_id).all()) if delivered_text_ids else {}
+            answered_counts = loaders.count_answered_problems_by_text(current_user.id, delivered_text_ids)
+
             for delivery in delivered_texts:
-                # テキストの問題総数
-                problems = BasicKnowledgeItem.query.filter_by(
-                    text_set_id=delivery.text_set_id
-                ).all()
-    
-                total_problems = len(problems)
-    
-                # 解答済みの問題数
-                answered_count = 0
-                for problem in problems:
-                    answer = AnswerRecord.query.filter_by(
-                        student_id=current_user.id,
-                        problem_id=problem.id
-                    ).first()
-            
-                    if answer:
-                        answered_count += 1
+                total_problems = problem_totals.get(delivery.text_set_id, 0)
+                answered_count = answered_counts.get(delivery.text_set_id, 0)
     
                 # 進捗率を計算
                 if total_problems > 0:
@@ -334,64 +332,21 @@ def delete_category(category_id):
     
     # カテゴリを取得
     category = ProblemCategory.query.get_or_404(category_id)
+    category_name = category.name
     
     try:
-        # このカテゴリに関連するテキストセットを取得
-        text_sets = TextSet.query.filter_by(category_id=category_id).all()
-        
-        # 各テキストセットとその関連レコードを削除
-        for text_set in text_sets:
-            # テキストセットに含まれる問題を取得
-            text_problems = BasicKnowledgeItem.query.filter_by(text_set_id=text_set.id).all()
-            
-            # 各問題に関連するレコードを削除
-            for problem in text_problems:
-                # 単語の熟練度記録を削除
-                WordProficiency.query.filter_by(problem_id=problem.id).delete()
-                
-                # 解答記録の削除
-                AnswerRecord.query.filter_by(problem_id=problem.id).delete()
-                
-                # テーマとの関連付けを削除
-                KnowledgeThemeRelation.query.filter_by(problem_id=problem.id).delete()
-                
-                # 問題を削除
-                db.session.delete(problem)
-            
-            # テキストの熟練度記録を削除
-            TextProficiencyRecord.query.filter_by(text_set_id=text_set.id).delete()
-            
-            # テキスト配信を削除
-            TextDelivery.query.filter_by(text_set_id=text_set.id).delete()
-            
-            # テキストセットを削除
-            db.session.delete(text_set)
-        
-        # このカテゴリに直接関連する問題を取得
-        problems = BasicKnowledgeItem.query.filter_by(category_id=category_id).all()
-        
-        # 各問題に関連する解答記録・関連付けを削除
-        for problem in problems:
-            # 単語の熟練度記録を削除
-            WordProficiency.query.filter_by(problem_id=problem.id).delete()
-            
-            # 解答記録の削除
-            AnswerRecord.query.filter_by(problem_id=problem.id).delete()
-            
-            # テーマとの関連付けを削除
-            KnowledgeThemeRelation.query.filter_by(problem_id=problem.id).delete()
-            
-            # 問題を削除
-            db.session.delete(problem)
-        
-        # カテゴリの熟練度記録を削除
-        ProficiencyRecord.query.filter_by(category_id=category_id).delete()
-        
-        # カテゴリを削除
-        db.session.delete(category)
-        db.session.commit()
-        
-        flash(f'カテゴリ"{category.name}"とそれに含まれる全ての問題が削除されました。')
+        # 単語数が多い場合はバックグラウンドで削除
+        problem_count = deletion.count_problems(category_id=category_id)
+        job = deletion.enqueue_if_large('basebuilder_delete_category', problem_count, current_user.id,
+                                        {'category_id': category_id})
+        if job:
+            return _render_deletion_job(job, f'カテゴリ"{category_name}"の削除',
+                                        url_for('basebuilder_module.categories'))
+        
+        # カテゴリ内のテキスト・問題・学習記録をまとめて削除
+        deletion.delete_category(category_id)
+        
+        flash(f'カテゴリ"{category_name}"とそれに含まれる全ての問題が削除されました。')
     except Exception as e:
         db.session.rollback()
         flash(f'カテゴリの削除中にエラーが発生しました: {str(e)}')
@@ -605,14 +560,11 @@ def start_search_session():
     if 'proficiency' in search_params and search_params['proficiency']:
         proficiency = search_params['proficiency']
         
-        # 単語ごとの定着度を計算
+        # 単語ごとの定着度を計算（解答履歴は問題ごとに最新5件を一括取得）
+        recent_answers = loaders.load_recent_answers(current_user.id, problem_ids, 5)
         word_proficiency_records = {}
         for problem_id in problem_ids:
-            # 解答履歴を取得（最新5件）
-            answers = AnswerRecord.query.filter_by(
-                student_id=current_user.id,
-                problem_id=problem_id
-            ).order_by(AnswerRecord.timestamp.desc()).limit(5).all()
+            answers = recent_answers.get(problem_id)
             
             if answers:
                 # 解答があれば定着度を計算
@@ -739,6 +691,8 @@ def create_problem():
         )
         
         db.session.add(new_problem)
+        # カテゴリの単語数が変わるため集計値を再計算する
+        proficiency.refresh_aggregates(category_ids=[category_id])
         db.session.commit()
         
         flash('問題が作成されました。')
@@ -794,6 +748,10 @@ def edit_problem(problem_id):
                     categories=categories
                 )
         
+        # カテゴリの移動や有効・無効の切り替えで単語数が変わる範囲
+        changed_category_ids = [problem.category_id, category_id] if problem.category_id != category_id else []
+        changed_text_set_ids = [problem.text_set_id] if bool(problem.is_active) != is_active else []
+        
         # 問題を更新
         problem.category_id = category_id
         problem.title = title
@@ -805,6 +763,8 @@ def edit_problem(problem_id):
         problem.difficulty = difficulty
         problem.is_active = is_active
         
+        # 単語数が変わった範囲の集計値を再計算する
+        proficiency.refresh_aggregates(category_ids=changed_category_ids, text_set_ids=changed_text_set_ids)
         db.session.commit()
         
         flash('問題が更新されました。')
@@ -871,6 +831,41 @@ def category_texts(category_id):
         proficiency_record=proficiency_record
     )
 
+def _render_deletion_job(job, title, back_url):
+    """バックグラウンド削除ジョブの進捗ページ"""
+    return render_template('background_job.html', job=job, title=title, unit='語', back_url=back_url)
+
+def _delete_text_sets_or_enqueue(text_set_ids):
+    """
+    テキストをまとめて削除する（単語数が多い場合はバックグラウンドジョブに登録）
+    
+    Returns:
+        BackgroundJob: 登録したジョブ。その場で削除した場合はNone
+    """
+    if not text_set_ids:
+        return None
+    
+    problem_count = deletion.count_problems(text_set_ids=text_set_ids)
+    job = deletion.enqueue_if_large('basebuilder_delete_text_sets', problem_count, current_user.id,
+                                    {'text_set_ids': list(text_set_ids)})
+    if job:
+        return job
+    
+    result = deletion.delete_text_sets(text_set_ids)
+    flash(f'{result["text_sets"]} 件のテキストを削除しました。')
+    return None
+
+@basebuilder_module.route('/deletion/<job_id>/status')
+@login_required
+def deletion_status(job_id):
+    """バックグラウンド削除ジョブの進捗ページ（削除を実行した教師本人のみ）"""
+    job = BackgroundJob.query.filter(
+        BackgroundJob.id == job_id,
+        BackgroundJob.user_id == current_user.id,
+        BackgroundJob.kind.in_(deletion.DELETION_JOB_KINDS)
+    ).first_or_404()
+    return _render_deletion_job(job, 'テキスト・カテゴリの削除', url_for('basebuilder_module.text_sets'))
+
 @basebuilder_module.route('/text_sets/delete', methods=['POST'])
 @login_required
 def delete_text_sets():
@@ -886,59 +881,22 @@ def delete_text_sets():
         flash('削除するテキストが選択されていません。')
         return redirect(url_for('basebuilder_module.text_sets'))
     
-    deleted_count = 0
-    error_count = 0
-    
-    for text_id_str in text_ids:
-        try:
-            text_id = int(text_id_str)
-            text_set = TextSet.query.get(text_id)
-            
-            # 作成者本人のみ削除可能
-            if not text_set or text_set.created_by != current_user.id:
-                error_count += 1
-                continue
-            
-            # テキストに含まれる問題を取得
-            problems = BasicKnowledgeItem.query.filter_by(text_set_id=text_id).all()
-            
-            # 各問題に関連する記録を削除
-            for problem in problems:
-                # 単語の熟練度記録を削除
-                WordProficiency.query.filter_by(problem_id=problem.id).delete()
-                
-                # 解答記録を削除
-                AnswerRecord.query.filter_by(problem_id=problem.id).delete()
-                
-                # テーマとの関連付けを削除
-                KnowledgeThemeRelation.query.filter_by(problem_id=problem.id).delete()
-                
-                # 問題を削除
-                db.session.delete(problem)
-            
-            # テキストの熟練度記録を削除
-            TextProficiencyRecord.query.filter_by(text_set_id=text_id).delete()
-            
-            # テキスト配信を削除
-            TextDelivery.query.filter_by(text_set_id=text_id).delete()
-            
-            # テキストを削除
-            db.session.delete(text_set)
-            deleted_count += 1
-            
-        except Exception as e:
-            db.session.rollback()
-            error_count += 1
-            flash(f'テキストID {text_id_str} の削除中にエラーが発生しました: {str(e)}')
+    # 作成者本人のテキストのみ削除可能
+    requested_ids = {int(text_id) for text_id in text_ids if text_id.isdigit()}
+    deletable_ids = [row[0] for row in db.session.query(TextSet.id).filter(
+        TextSet.id.in_(requested_ids),
+        TextSet.created_by == current_user.id
+    ).all()] if requested_ids else []
+    error_count = len(text_ids) - len(deletable_ids)
     
-    # 成功したものをコミット
     try:
-        db.session.commit()
-        if deleted_count > 0:
-            flash(f'{deleted_count} 件のテキストを削除しました。')
+        job = _delete_text_sets_or_enqueue(deletable_ids)
         
         if error_count > 0:
             flash(f'{error_count} 件のテキストを削除できませんでした。', 'warning')
+        if job:
+            return _render_deletion_job(job, f'{len(deletable_ids)} 件のテキストの削除',
+                                        url_for('basebuilder_module.text_sets'))
     except Exception as e:
         db.session.rollback()
         flash(f'テキストの削除中にエラーが発生しました: {str(e)}', 'error')
@@ -953,15 +911,8 @@ def start_session():
         flash('この機能は学生のみ利用可能です。')
         return redirect(url_for('basebuilder_module.index'))
     
-    # 今日復習すべき問題を取得
-    today = datetime.now().date()
-    word_proficiencies = WordProficiency.query.filter(
-        WordProficiency.student_id == current_user.id,
-        WordProficiency.review_date <= today
-    ).all()
-    
-    # 復習すべき問題のIDを取得
-    problem_ids = [wp.problem_id for wp in word_proficiencies]
+    # 今日復習すべき問題を期限切れの古い順に取得（配信されたテキストの単語のみ）
+    problem_ids = review_queue.get_due_problem_ids(current_user.id)
     
     # 問題がなければ、熟練度が低い問題から取得
     if not problem_ids:
@@ -1089,23 +1040,6 @@ def next_problem():
         flash('学習セッションが終了しました。お疲れ様でした！')
         return redirect(url_for('basebuilder_module.session_summary'))
     
-    # すべての単語の熟練度がMAXになったかチェック
-    problem_ids = learning_session.get('problem_ids', [])
-    if problem_ids:
-        all_mastered = True
-        for pid in problem_ids:
-            prof = WordProficiency.query.filter_by(
-                student_id=current_user.id,
-                problem_id=pid
-            ).first()
-            if not prof or prof.level < 5:
-                all_mastered = False
-                break
-        
-        if all_mastered:
-            flash('すべての単語の熟練度が最大になりました。お疲れ様でした！')
-            return redirect(url_for('basebuilder_module.session_summary'))
-        
     # 利用可能な問題ID (problem_idsキーが存在しない場合の対応)
     available_problem_ids = learning_session.get('problem_ids', [])
     
@@ -1122,51 +1056,17 @@ def next_problem():
         flash('学習可能な問題がありません。問題を追加してください。')
         return redirect(url_for('basebuilder_module.index'))
     
-    # 問題が少ない場合、completed_problemsをリセット
-    if len(available_problem_ids) <= learning_session['total_problems'] and len(learning_session['completed_problems']) >= len(available_problem_ids):
-        learning_session['completed_problems'] = []
+    # セッション内の熟練度を取得（初回のみ1クエリ、以降はキャッシュを使用）
+    selection.ensure_session_levels(learning_session, current_user.id)
     
-    # まだ解いていない問題
-    unfinished_problems = [pid for pid in available_problem_ids if pid not in learning_session['completed_problems']]
+    # すべての単語の熟練度がMAXになったかチェック
+    if selection.all_mastered(learning_session):
+        session['learning_session'] = learning_session
+        flash('すべての単語の熟練度が最大になりました。お疲れ様でした！')
+        return redirect(url_for('basebuilder_module.session_summary'))
     
-    if unfinished_problems:
-        # 未解答問題の熟練度を確認して、低い順にソート
-        problem_proficiencies = {}
-        for pid in unfinished_problems:
-            prof = WordProficiency.query.filter_by(
-                student_id=current_user.id,
-                problem_id=pid
-            ).first()
-            problem_proficiencies[pid] = prof.level if prof else 0
-        
-                # 熟練度が低い問題を優先（20%の確率でランダム選択）
-        if random.random() < 0.8:  # 80%の確率で熟練度ベースの選択
-            sorted_problems = sorted(problem_proficiencies.items(), key=lambda x: x[1])
-            problem_id = sorted_problems[0][0]  # 最も熟練度が低い問題を選択
-        else:
-            # ランダム選択（完全にランダムに選ぶことで多様性を確保）
-            problem_id = random.choice(unfinished_problems)
-    else:
-        # すべての問題が終わった場合は、熟練度が低い順に再度出題
-        proficiencies = {}
-        for pid in available_problem_ids:
-            prof = WordProficiency.query.filter_by(
-                student_id=current_user.id,
-                problem_id=pid
-            ).first()
-            proficiencies[pid] = prof.level if prof else 0
-        
-        # 熟練度が最大（5）でない問題のみ選択
-        incomplete_problems = [pid for pid, level in proficiencies.items() if level < 5]
-        
-        if incomplete_problems:
-            # 熟練度が低い問題を優先
-            sorted_problems = sorted([(pid, proficiencies[pid]) for pid in incomplete_problems], 
-                                     key=lambda x: x[1])
-            problem_id = sorted_problems[0][0]
-        else:
-            # すべての問題が最大熟練度に達したか、または問題がない場合はランダムに選択
-            problem_id = random.choice(available_problem_ids)
+    # 熟練度が低い問題を優先して次の問題を選択
+    problem_id = selection.select_next_problem(learning_session)
     
     # 選択した問題をセッションに記録
     learning_session['current_problem_id'] = problem_id
@@ -1198,17 +1098,10 @@ def session_summary():
     # セッション開始時間を正しく変換
     session_start = datetime.fromisoformat(learning_session['session_start'])
     
-    # 解答履歴を取得 - セッション開始時間以降のみを取得
-    answer_records_list = AnswerRecord.query.filter(
-        AnswerRecord.student_id == current_user.id,
-        AnswerRecord.problem_id.in_(learning_session['completed_problems']),
-        AnswerRecord.timestamp >= session_start
-    ).order_by(AnswerRecord.timestamp).all()
-    
-    # 問題IDごとに最新の解答記録を取得
-    latest_records = {}
-    for record in answer_records_list:
-        latest_records[record.problem_id] = record
+    # 問題IDごとに最新の解答記録を取得 - セッション開始時間以降のみを対象
+    latest_records = loaders.load_latest_answers(
+        current_user.id, learning_session['completed_problems'], since=session_start
+    )
     
     # 正解数・不正解数をカウント
     correct_count = sum(1 for record in latest_records.values() if record.is_correct)
@@ -1307,134 +1200,6 @@ def update_proficiency(student_id, category_id, is_correct):
    
    return proficiency
 
-def update_word_proficiency(student_id, problem_id, is_correct):
-    """
-    単語ごとの熟練度を更新する関数
-    
-    Args:
-        student_id: 学生ID
-        problem_id: 問題ID
-        is_correct: 正解かどうか
-        
-    Returns:
-        更新された熟練度レコード
-    """
-    # 問題を取得
-    problem = BasicKnowledgeItem.query.get(problem_id)
-    
-    # 既存の熟練度レコードを取得
-    proficiency = WordProficiency.query.filter_by(
-        student_id=student_id,
-        problem_id=problem_id
-    ).first()
-    
-    # 熟練度レコードがなければ作成
-    if not proficiency:
-        proficiency = WordProficiency(
-            student_id=student_id,
-            problem_id=problem_id,
-            level=0
-        )
-        db.session.add(proficiency)
-    
-    # 現在の日付を取得
-    today = datetime.now().date()
-    
-    # 正解・不正解に応じてポイントを更新
-    if is_correct:
-        # 正解の場合は+1ポイント（最大5ポイント）
-        new_level = min(5, proficiency.level + 1)
-    else:
-        # 不正解の場合は-1ポイント（最小0ポイント）
-        new_level = max(0, proficiency.level - 1)
-    
-    # ポイントに応じて次回復習日を設定（既存ロジックと同様）
-    if new_level == 0:
-        next_review = today
-    elif new_level == 1:
-        next_review = today + timedelta(days=1)
-    elif new_level == 2:
-        next_review = today + timedelta(days=3)
-    elif new_level == 3:
-        next_review = today + timedelta(days=7)
-    elif new_level == 4:
-        next_review = today + timedelta(days=14)
-    else:  # 5ポイント
-        next_review = today + timedelta(days=30)
-    
-    # 熟練度と次回復習日を更新
-    proficiency.level = new_level
-    proficiency.review_date = next_review
-    proficiency.last_updated = datetime.utcnow()
-    
-    # 変更をコミット
-    db.session.commit()
-    
-    return proficiency
-
-# basebuilder/routes.py に追加
-def update_category_proficiency(student_id, category_id):
-    """
-    カテゴリの熟練度を単語の熟練度から計算して更新する
-    
-    Args:
-        student_id: 学生ID
-        category_id: カテゴリID
-        
-    Returns:
-        更新された熟練度レコード
-    """
-    # カテゴリに属する問題のIDを取得
-    problem_ids = [p.id for p in BasicKnowledgeItem.query.filter_by(category_id=category_id).all()]
-    
-    if not problem_ids:
-        return None
-    
-    # カテゴリ内の単語の熟練度を取得
-    word_proficiencies = WordProficiency.query.filter(
-        WordProficiency.student_id == student_id,
-        WordProficiency.problem_id.in_(problem_ids)
-    ).all()
-    
-    # 単語の熟練度レコードがない場合はデフォルト値0として計算
-    found_problems = len(word_proficiencies)
-    total_problems = len(problem_ids)
-    
-    # 合計熟練度計算
-    total_level = sum(wp.level for wp in word_proficiencies) if word_proficiencies else 0
-    
-    # 平均熟練度計算 (存在する単語の熟練度の合計 / 全単語数)
-    # 存在しない単語は熟練度0として計算
-    avg_level = total_level / total_problems if total_problems > 0 else 0
-    
-    # カテゴリの熟練度を更新または作成
-    proficiency = ProficiencyRecord.query.filter_by(
-        student_id=student_id,
-        category_id=category_id
-    ).first()
-    
-    if not proficiency:
-        proficiency = ProficiencyRecord(
-            student_id=student_id,
-            category_id=category_id,
-            level=0,
-            review_date=datetime.now().date()
-        )
-        db.session.add(proficiency)
-    
-    # 熟練度は平均値を整数に切り捨て (0-5の範囲)
-    proficiency.level = min(5, int(avg_level))
-    proficiency.last_updated = datetime.utcnow()
-    
-    # 次回復習日は最も早い単語の復習日
-    if word_proficiencies:
-        earliest_review = min(wp.review_date for wp in word_proficiencies)
-        proficiency.review_date = earliest_review
-    
-    db.session.commit()
-    
-    return proficiency
-
 # 熟練度の表示
 @basebuilder_module.route('/proficiency')
 @login_required
@@ -1485,37 +1250,23 @@ def view_history():
         flash('この機能は学生のみ利用可能です。')
         return redirect(url_for('basebuilder_module.index'))
     
-    # 学生の解答履歴を取得
-    answer_records = AnswerRecord.query.filter_by(
-        student_id=current_user.id
-    ).order_by(AnswerRecord.timestamp.desc()).all()
-    
-    # カテゴリ別の正解率を計算
-    category_stats = {}
-    for record in answer_records:
-        category_id = record.problem.category_id
-        
-        if category_id not in category_stats:
-            category_stats[category_id] = {
-                'category': record.problem.category,
-                'total': 0,
-                'correct': 0,
-                'incorrect': 0
-            }
-        
-        category_stats[category_id]['total'] += 1
-        if record.is_correct:
-            category_stats[category_id]['correct'] += 1
-        else:
-            category_stats[category_id]['incorrect'] += 1
+    # 学生の解答履歴を1ページ分取得（(timestamp, id) のキーセットページング）
+    answer_records, next_cursor = loaders.load_answer_page(
+        current_user.id,
+        cursor=request.args.get('cursor')
+    )
     
-    # 正解率を計算
-    for stats in category_stats.values():
-        stats['accuracy'] = (stats['correct'] / stats['total']) * 100 if stats['total'] > 0 else 0
+    # 全体とカテゴリ別の正解率をSQLで集計
+    total_count, correct_count = loaders.count_answers(current_user.id)
+    category_stats = loaders.answer_stats_by_category(current_user.id)
     
     return render_template(
         'basebuilder/history.html',
         answer_records=answer_records,
+        next_cursor=next_cursor,
+        is_first_page=not request.args.get('cursor'),
+        total_count=total_count,
+        correct_count=correct_count,
         category_stats=category_stats
     )
 
@@ -1622,66 +1373,72 @@ def student_analysis(student_id):
     total_words = 0
     mastered_words = 0
     
-    for text in text_sets:
-        # テキスト内の単語（問題）を取得
-        problems = BasicKnowledgeItem.query.filter_by(
-            text_set_id=text.id,
-            is_active=True
+    # テキストごとの有効な単語数を一括取得
+    text_word_counts = dict(db.session.query(
+        BasicKnowledgeItem.text_set_id,
+        func.count(BasicKnowledgeItem.id)
+    ).filter(
+        BasicKnowledgeItem.text_set_id.in_(delivered_text_ids),
+        BasicKnowledgeItem.is_active == True
+    ).group_by(BasicKnowledgeItem.text_set_id).all())
+    
+    # テキスト・熟練度ごとの単語数と最終更新日を一括取得
+    text_level_counts = {}
+    text_last_updated = {}
+    level_rows = db.session.query(
+        BasicKnowledgeItem.text_set_id,
+        WordProficiency.level,
+        func.count(WordProficiency.id),
+        func.max(WordProficiency.last_updated)
+    ).join(
+        WordProficiency, WordProficiency.problem_id == BasicKnowledgeItem.id
+    ).filter(
+        WordProficiency.student_id == student_id,
+        BasicKnowledgeItem.text_set_id.in_(delivered_text_ids),
+        BasicKnowledgeItem.is_active == True
+    ).group_by(BasicKnowledgeItem.text_set_id, WordProficiency.level).all()
+    
+    for text_set_id, level, count, last_updated in level_rows:
+        text_level_counts.setdefault(text_set_id, {})[level or 0] = count
+        if last_updated and (text_set_id not in text_last_updated or last_updated > text_last_updated[text_set_id]):
+            text_last_updated[text_set_id] = last_updated
+    
+    # テキストの定着度は解答ごとに更新される集計値を使用
+    text_records = {
+        record.text_set_id: record
+        for record in TextProficiencyRecord.query.filter(
+            TextProficiencyRecord.student_id == student_id,
+            TextProficiencyRecord.text_set_id.in_(delivered_text_ids)
         ).all()
-        
-        if not problems:
-            continue
-            
+    }
+    
+    for text in text_sets:
         # このテキストの単語数をカウント
-        text_words_count = len(problems)
+        text_words_count = text_word_counts.get(text.id, 0)
+        if not text_words_count:
+            continue
         total_words += text_words_count
         
-        # 単語IDのリストを作成
-        problem_ids = [p.id for p in problems]
-        
         # カテゴリ情報
         category_id = text.category_id
         
-        # 単語ごとの熟練度を取得
-        word_proficiencies = WordProficiency.query.filter(
-            WordProficiency.student_id == student_id,
-            WordProficiency.problem_id.in_(problem_ids)
-        ).all()
-        
-        # レベルごとの単語数をカウント
+        # レベルごとの単語数（記録のない単語は未学習）
         level_counts = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        
-        # 単語マップを作成（存在する単語の熟練度）
-        proficiency_map = {}
-        
-        for wp in word_proficiencies:
-            proficiency_map[wp.problem_id] = wp.level
-            level_counts[wp.level] += 1
-        
-        # 未学習の単語をカウント
-        for pid in problem_ids:
-            if pid not in proficiency_map:
-                level_counts[0] += 1
+        for level, count in text_level_counts.get(text.id, {}).items():
+            level_counts[level] = level_counts.get(level, 0) + count
+        level_counts[0] += text_words_count - sum(level_counts.values())
         
         # このカテゴリのマスター単語数
         text_mastered = level_counts[5]
         mastered_words += text_mastered
         
-        # テキストの定着度を計算
-        max_points = text_words_count * 5  # 最大ポイント
-        actual_points = sum(level * count for level, count in level_counts.items() if level > 0)
-        
-        # 最終更新日を取得
-        last_updated = None
-        if word_proficiencies:
-            last_updated = max(wp.last_updated for wp in word_proficiencies)
-        
-        # テキストの定着度をパーセントで計算
-        text_percentage = (actual_points / max_points * 100) if max_points > 0 else 0
+        # 最終更新日
+        last_updated = text_last_updated.get(text.id)
         
         # テキスト定着度データを保存
+        text_record = text_records.get(text.id)
         text_proficiency_data[text.id] = {
-            'level': round(text_percentage),
+            'level': text_record.level if text_record else 0,
             'last_updated': last_updated
         }
         
@@ -1739,10 +1496,8 @@ def student_analysis(student_id):
         student_id=student_id
     ).order_by(AnswerRecord.timestamp.desc()).limit(20).all()
     
-    # 解答数と正解率を計算
-    all_answers = AnswerRecord.query.filter_by(student_id=student_id).all()
-    answer_count = len(all_answers)
-    correct_count = sum(1 for answer in all_answers if answer.is_correct)
+    # 解答数と正解率を計算（SQLで集計）
+    answer_count, correct_count = loaders.count_answers(student_id)
     correct_rate = (correct_count / answer_count * 100) if answer_count > 0 else 0
     
     # 最後の活動日時
@@ -1897,14 +1652,19 @@ def delete_problem(problem_id):
         flash('この問題を削除する権限がありません。')
         return redirect(url_for('basebuilder_module.problems'))
     
-    # 問題に関連する解答記録を削除（外部キー制約がある場合）
+    # 問題に関連する解答記録・単語熟練度を削除（外部キー制約がある場合）
     AnswerRecord.query.filter_by(problem_id=problem_id).delete()
+    WordProficiency.query.filter_by(problem_id=problem_id).delete()
     
     # 問題に関連する関連付けを削除
     KnowledgeThemeRelation.query.filter_by(problem_id=problem_id).delete()
     
     # 問題を削除
+    category_id, text_set_id = problem.category_id, problem.text_set_id
     db.session.delete(problem)
+    
+    # カテゴリ・テキストの単語数が変わるため集計値を再計算する
+    proficiency.refresh_aggregates(category_ids=[category_id], text_set_ids=[text_set_id])
     db.session.commit()
     
     flash('問題が削除されました。')
@@ -2225,14 +1985,13 @@ def api_category_problems(category_id):
                         is_active=True
                     ).order_by(func.random()).offset(skip).limit(count).all()
                     
-                    # 解答済みの問題を確認
+                    # 解答済みの問題を確認（最新の解答を一括取得）
+                    latest_answers = loaders.load_latest_answers(
+                        current_user.id, [problem.id for problem in problems]
+                    )
                     completed = {}
                     for problem in problems:
-                        answer = AnswerRecord.query.filter_by(
-                            student_id=current_user.id,
-                            problem_id=problem.id
-                        ).order_by(AnswerRecord.timestamp.desc()).first()
-                        
+                        answer = latest_answers.get(problem.id)
                         completed[problem.id] = answer and answer.is_correct
                     
                     # 問題データを整形
@@ -2287,6 +2046,46 @@ def api_problems():
     
     return jsonify({'problems': problem_data})
 
+@basebuilder_module.route('/api/review_queue')
+@login_required
+def api_review_queue():
+    """復習期限が来た単語の一覧と日ごとの復習予定件数を提供するAPIエンドポイント"""
+    if current_user.role != 'student':
+        return jsonify({'error': '権限がありません'}), 403
+    
+    page = max(1, request.args.get('page', type=int, default=1))
+    per_page = min(100, max(1, request.args.get('per_page', type=int, default=20)))
+    text_id = request.args.get('text_id', type=int)
+    category_id = request.args.get('category_id', type=int)
+    
+    items = review_queue.get_due_items(
+        current_user.id,
+        limit=per_page,
+        offset=(page - 1) * per_page,
+        text_set_id=text_id,
+        category_id=category_id
+    )
+    total = review_queue.count_due(current_user.id, text_set_id=text_id, category_id=category_id)
+    summary = review_queue.due_count_summary(current_user.id, text_set_id=text_id, category_id=category_id)
+    
+    return jsonify({
+        'items': [{
+            'problem_id': problem.id,
+            'title': problem.title,
+            'text_id': problem.text_set_id,
+            'category_id': problem.category_id,
+            'level': wp.level,
+            'review_date': wp.review_date.isoformat()
+        } for wp, problem in items],
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'summary': [
+            {'date': day['date'].isoformat(), 'count': day['count']}
+            for day in summary
+        ]
+    })
+
 # 問題テンプレートのダウンロード用ルート
 @basebuilder_module.route('/problems/template/<template_type>')
 @login_required
@@ -2343,34 +2142,24 @@ def import_problems():
         
         if file and file.filename.endswith('.csv'):
             try:
-                # ファイルを読み込む
-                csv_content = file.read().decode('utf-8-sig')  # BOMを考慮
-                
-                # 問題をインポート (TextSetモデルも渡す)
-                from basebuilder import importers
-                from basebuilder.models import TextSet
-                
-                success_count, error_count, errors = importers.import_problems_from_csv(
-                    csv_content, db, ProblemCategory, BasicKnowledgeItem, 
-                    current_user.id, current_user.school_id,  # 学校IDを追加
-                    TextSet=TextSet if auto_split else None
-                )
-                
-                # 結果を表示
-                if auto_split:
-                    flash(f'{success_count}個の問題がインポートされ、10個ずつテキストに自動分割されました。')
-                else:
-                    flash(f'{success_count}個の問題がインポートされました。')
-                
-                if error_count > 0:
-                    for error in errors:
-                        flash(error, 'error')
-                
-                return redirect(url_for('basebuilder_module.problems'))
-            
+                # 問題のインポートはバックグラウンドジョブで行い、進捗を background_job.html で表示する
+                from app.utils.import_jobs import create_import_job
+                job = create_import_job('basebuilder_problems', file, current_user.id, {
+                    'auto_split': auto_split,  # 10問ずつテキストに自動分割する
+                    'school_id': current_user.school_id  # 学校IDを追加
+                })
             except Exception as e:
+                db.session.rollback()
                 flash(f'CSVファイルの処理中にエラーが発生しました: {str(e)}')
                 return redirect(request.url)
+            
+            return render_template(
+                'background_job.html',
+                job=job,
+                title='問題のインポート',
+                unit='行',
+                back_url=url_for('basebuilder_module.problems')
+            )
         else:
             flash('CSVファイルの形式が正しくありません。')
             return redirect(request.url)
@@ -2418,29 +2207,26 @@ def import_text_set():
         
         if file and file.filename.endswith('.csv'):
             try:
-                # ファイルを読み込む
-                csv_content = file.read().decode('utf-8-sig')  # BOMを考慮
-                
-                # 問題をインポート
-                from basebuilder import importers
-                success_count, error_count, errors = importers.import_text_from_csv(
-                    csv_content, title, description, category_id, db, TextSet, BasicKnowledgeItem, 
-                    current_user.id, school_id=current_user.school_id  # 学校IDを追加
-                )
-                
-                # 結果を表示
-                if success_count > 0:
-                    flash(f'{success_count}個の問題を含むテキストがインポートされました。')
-                
-                if error_count > 0:
-                    for error in errors:
-                        flash(error, 'error')
-                
-                return redirect(url_for('basebuilder_module.text_sets'))
-            
+                # 問題のインポートはバックグラウンドジョブで行う
+                from app.utils.import_jobs import create_import_job
+                job = create_import_job('basebuilder_text', file, current_user.id, {
+                    'title': title,
+                    'description': description,
+                    'category_id': category_id,
+                    'school_id': current_user.school_id  # 学校IDを追加
+                })
             except Exception as e:
+                db.session.rollback()
                 flash(f'CSVファイルの処理中にエラーが発生しました: {str(e)}')
                 return redirect(request.url)
+            
+            return render_template(
+                'background_job.html',
+                job=job,
+                title='テキストのインポート',
+                unit='行',
+                back_url=url_for('basebuilder_module.text_sets')
+            )
         else:
             flash('CSVファイルの形式が正しくありません。')
             return redirect(request.url)
@@ -2494,33 +2280,14 @@ def bulk_delete_text_sets():  # 関数名を変更
         return redirect(url_for('basebuilder_module.text_sets'))
     
     try:
-        deleted_count = 0
-        for text_id in text_ids:
-            # テキストを取得
-            text_set = TextSet.query.get(int(text_id))
-            
-            # 作成者チェック
-            if text_set and text_set.created_by == current_user.id:
-                # テキストに含まれる問題を取得
-                problems = BasicKnowledgeItem.query.filter_by(text_set_id=text_set.id).all()
-                
-                # 問題の解答記録を削除
-                for problem in problems:
-                    AnswerRecord.query.filter_by(problem_id=problem.id).delete()
-                    db.session.delete(problem)
-                
-                # テキストの配信記録を削除
-                TextDelivery.query.filter_by(text_set_id=text_set.id).delete()
-                
-                # テキストの熟練度記録を削除
-                TextProficiencyRecord.query.filter_by(text_set_id=text_set.id).delete()
-                
-                # テキストを削除
-                db.session.delete(text_set)
-                deleted_count += 1
+        # 作成者チェック
+        requested_ids = {int(text_id) for text_id in text_ids if text_id.isdigit()}
+        deletable_ids = [row[0] for row in db.session.query(TextSet.id).filter(
+            TextSet.id.in_(requested_ids),
+            TextSet.created_by == current_user.id
+        ).all()] if requested_ids else []
         
-        db.session.commit()
-        flash(f'{deleted_count}件のテキストを削除しました。')
+        _delete_text_sets_or_enqueue(deletable_ids)
     
     except Exception as e:
         db.session.rollback()
@@ -2573,28 +2340,11 @@ def view_text_set(text_id):
                 text_set_id=text_id
             ).first()
             
-            # 問題がある場合のみループ処理
+            # 単語の熟練度と最新の解答を問題数に関係なく一括取得
             if problems:
-                for problem in problems:
-                    # 単語の熟練度を取得
-                    wp = WordProficiency.query.filter_by(
-                        student_id=current_user.id,
-                        problem_id=problem.id
-                    ).first()
-                    
-                    if wp:
-                        word_proficiencies[problem.id] = {
-                            'level': wp.level,
-                            'last_updated': wp.last_updated
-                        }
-                    
-                    # 解答状況を取得
-                    answer = AnswerRecord.query.filter_by(
-                        student_id=current_user.id,
-                        problem_id=problem.id
-                    ).order_by(AnswerRecord.timestamp.desc()).first()
-                    
-                    answers[problem.id] = answer
+                word_proficiencies, answers = loaders.load_text_progress(
+                    current_user.id, [problem.id for problem in problems]
+                )
         
         return render_template(
             'basebuilder/View_text.html',
@@ -2675,6 +2425,38 @@ def calculate_text_proficiency(student_id, text_id, problems=None):
     
     return text_proficiency
 
+# テキストの問題をCSVでエクスポート（インポートと同じ形式）
+@basebuilder_module.route('/text_set/<int:text_id>/export')
+@login_required
+def export_text_set(text_id):
+    if current_user.role != 'teacher':
+        flash('この機能は教師のみ利用可能です。')
+        return redirect(url_for('basebuilder_module.index'))
+    
+    text_set = TextSet.query.get_or_404(text_id)
+    
+    if text_set.created_by != current_user.id:
+        flash('このテキストをエクスポートする権限がありません。')
+        return redirect(url_for('basebuilder_module.text_sets'))
+    
+    query = db.session.query(
+        BasicKnowledgeItem.title,
+        ProblemCategory.name,
+        BasicKnowledgeItem.question,
+        BasicKnowledgeItem.answer_type,
+        BasicKnowledgeItem.correct_answer,
+        BasicKnowledgeItem.choices,
+        BasicKnowledgeItem.explanation,
+        BasicKnowledgeItem.difficulty
+    ).outerjoin(
+        ProblemCategory, ProblemCategory.id == BasicKnowledgeItem.category_id
+    ).filter(
+        BasicKnowledgeItem.text_set_id == text_id
+    ).order_by(BasicKnowledgeItem.order_in_text, BasicKnowledgeItem.id)
+    
+    rows = (exporters.problem_csv_row(*row) for row in stream_query(query))
+    return csv_response(f'{text_set.title}.csv', exporters.PROBLEM_CSV_HEADERS, rows)
+
 # テキスト配信
 @basebuilder_module.route('/text_set/<int:text_id>/deliver', methods=['GET', 'POST'])
 @login_required
@@ -2782,7 +2564,7 @@ def my_texts():
         TextDelivery.class_id.in_(class_ids)
     ).order_by(TextDelivery.delivered_at.desc()).all()
     
-    # テキストごとの定着度を取得
+    # テキストごとの定着度を取得（解答ごとに更新される集計値を読むだけ、未学習は0%）
     text_proficiency = {}
     for record in TextProficiencyRecord.query.filter_by(
         student_id=current_user.id
@@ -2792,40 +2574,6 @@ def my_texts():
             'last_updated': record.last_updated
         }
     
-    # レコードがないテキストの定着度を計算
-    for delivery in deliveries:
-        if delivery.text_set_id not in text_proficiency:
-            # テキストに含まれる問題を取得
-            problems = BasicKnowledgeItem.query.filter_by(
-                text_set_id=delivery.text_set_id
-            ).all()
-            
-            if problems:
-                # 正解数をカウント
-                correct_count = 0
-                total_count = len(problems)
-                
-                for problem in problems:
-                    answer = AnswerRecord.query.filter_by(
-                        student_id=current_user.id,
-                        problem_id=problem.id,
-                        is_correct=True
-                    ).order_by(AnswerRecord.timestamp.desc()).first()
-                    
-                    if answer:
-                        correct_count += 1
-                
-                # 定着度を計算
-                if total_count > 0:
-                    level = int((correct_count / total_count) * 100)
-                else:
-                    level = 0
-                
-                text_proficiency[delivery.text_set_id] = {
-                    'level': level,
-                    'last_updated': datetime.now()
-                }
-    
     return render_template(
         'basebuilder/my_texts.html',
         deliveries=deliveries,
@@ -2877,13 +2625,9 @@ def solve_problem(problem_id):
         ).first()
         
         if not word_proficiency:
-            word_proficiency = WordProficiency(
-                student_id=current_user.id,
-                problem_id=problem_id,
-                level=0,
-                review_date=datetime.now().date()
+            word_proficiency = proficiency.create_word_proficiency(
+                current_user.id, problem_id, review_date=datetime.now().date()
             )
-            db.session.add(word_proficiency)
             db.session.commit()
         
         # 単語の熟練度に応じて問題形式を決定（0-2: 選択式、3-5: 入力式）
@@ -2943,8 +2687,9 @@ def solve_problem(problem_id):
         ).first()
         
         if not category_proficiency:
-            # カテゴリの熟練度がなければ更新または作成する
-            category_proficiency = update_category_proficiency(current_user.id, problem.category_id)
+            # カテゴリの熟練度がなければ作成する
+            category_proficiency = proficiency.refresh_category_proficiency(current_user.id, problem.category_id)
+            db.session.commit()
 
         return render_template(
             'basebuilder/solve_problem.html',
@@ -3027,30 +2772,11 @@ def submit_answer(problem_id):
         correct_answers = [ans.strip().lower() for ans in correct_answer.split(',')]
         is_correct = (student_answer in correct_answers or student_answer == problem.title.strip().lower())
     
-    # 解答レコードを作成
-    answer_record = AnswerRecord(
-        student_id=current_user.id,
-        problem_id=problem_id,
-        student_answer=answer,
-        is_correct=is_correct,
-        answer_time=answer_time
+    # 解答を記録し、単語・カテゴリ・テキストの熟練度を1回のコミットで更新
+    word_proficiency, category_proficiency, text_proficiency = proficiency.record_answer(
+        current_user.id, problem, answer, is_correct, answer_time
     )
     
-    db.session.add(answer_record)
-    
-    # 単語ごとの熟練度を更新
-    word_proficiency = update_word_proficiency(current_user.id, problem_id, is_correct)
-    
-    # カテゴリの熟練度を更新（単語の熟練度から計算）
-    category_proficiency = update_category_proficiency(current_user.id, problem.category_id)
-    
-    # テキストの定着度も更新（単語の熟練度の平均から）
-    text_proficiency = None
-    if problem.text_set_id:
-        text_proficiency = update_text_proficiency(current_user.id, problem.text_set_id)
-    
-    db.session.commit()
-    
     # セッション情報を更新
     next_url = None
     
@@ -3069,7 +2795,11 @@ def submit_answer(problem_id):
     # 学習セッションの更新
     if 'learning_session' in session:
         learning_session = session['learning_session']
-        
+
+        # セッションの熟練度キャッシュを更新（次の問題選択でDBを参照しないため）
+        if selection.update_session_level(learning_session, problem_id, word_proficiency.level):
+            session['learning_session'] = learning_session
+
         # 現在の問題がセッションの問題と一致する場合
         if learning_session.get('current_problem_id') == problem_id:
             # 解答回数をカウントアップ
@@ -3151,145 +2881,6 @@ def solve_text(text_id):
     # 問題解答ページにリダイレクト
     return redirect(url_for('basebuilder_module.solve_problem', problem_id=first_problem.id))
 
-# 単語熟練度を更新する関数
-def update_word_proficiency(student_id, problem_id, is_correct):
-    """
-    単語の熟練度を更新する関数
-    
-    Args:
-        student_id: 学生ID
-        problem_id: 問題ID
-        is_correct: 正解かどうか
-        
-    Returns:
-        更新された熟練度レコード
-    """
-    # 既存の熟練度レコードを取得
-    proficiency = WordProficiency.query.filter_by(
-        student_id=student_id,
-        problem_id=problem_id
-    ).first()
-    
-    # 熟練度レコードがなければ作成
-    if not proficiency:
-        proficiency = WordProficiency(
-            student_id=student_id,
-            problem_id=problem_id,
-            level=0
-        )
-        db.session.add(proficiency)
-    
-    # 現在の日付を取得
-    today = datetime.now().date()
-    
-    # 正解・不正解に応じてポイントを更新
-    if is_correct:
-        # 正解の場合は+1ポイント（最大5ポイント）
-        new_level = min(5, proficiency.level + 1)
-    else:
-        # 不正解の場合は-1ポイント（最小0ポイント）
-        new_level = max(0, proficiency.level - 1)
-    
-    # ポイントに応じて次回復習日を設定
-    if new_level == 0:
-        # 0ポイント：今日
-        next_review = today
-    elif new_level == 1:
-        # 1ポイント：1日後
-        next_review = today + timedelta(days=1)
-    elif new_level == 2:
-        # 2ポイント：3日後
-        next_review = today + timedelta(days=3)
-    elif new_level == 3:
-        # 3ポイント：1週間後
-        next_review = today + timedelta(days=7)
-    elif new_level == 4:
-        # 4ポイント：2週間後
-        next_review = today + timedelta(days=14)
-    else:  # 5ポイント
-        # 5ポイント：1ヶ月後
-        next_review = today + timedelta(days=30)
-    
-    # 熟練度と次回復習日を更新
-    proficiency.level = new_level
-    proficiency.review_date = next_review
-    proficiency.last_updated = datetime.utcnow()
-    
-    return proficiency
-
-# テキスト熟練度を更新する関数
-def update_text_proficiency(student_id, text_set_id):
-    """
-    テキストセットの定着度を単語の熟練度から計算して更新する
-    
-    Args:
-        student_id: 学生ID
-        text_set_id: テキストセットID
-        
-    Returns:
-        更新された熟練度レコード
-    """
-    # テキストセットを取得
-    text_set = TextSet.query.get(text_set_id)
-    if not text_set:
-        return None
-    
-    # テキストに含まれる問題を取得
-    problems = BasicKnowledgeItem.query.filter_by(
-        text_set_id=text_set_id,
-        is_active=True
-    ).all()
-    
-    if not problems:
-        return None
-    
-    # 問題IDのリストを作成
-    problem_ids = [p.id for p in problems]
-    
-    # 単語の熟練度レコードを取得
-    word_proficiencies = WordProficiency.query.filter(
-        WordProficiency.student_id == student_id,
-        WordProficiency.problem_id.in_(problem_ids)
-    ).all()
-    
-    # 熟練度マップを作成（検索効率化のため）
-    proficiency_map = {wp.problem_id: wp.level for wp in word_proficiencies}
-    
-    # 各問題の熟練度を集計（存在しない場合は0）
-    total_level = 0
-    for problem_id in problem_ids:
-        total_level += proficiency_map.get(problem_id, 0)
-    
-    # 最大可能レベル（各問題が熟練度5の場合）
-    max_possible_level = len(problems) * 5
-    
-    # テキスト全体の定着度を計算（0-100%）
-    if max_possible_level > 0:
-        overall_percentage = (total_level / max_possible_level) * 100
-    else:
-        overall_percentage = 0
-    
-    # テキストの定着度レコードを取得または作成
-    text_proficiency = TextProficiencyRecord.query.filter_by(
-        student_id=student_id,
-        text_set_id=text_set_id
-    ).first()
-    
-    if text_proficiency:
-        text_proficiency.level = int(overall_percentage)
-        text_proficiency.last_updated = datetime.utcnow()
-    else:
-        text_proficiency = TextProficiencyRecord(
-            student_id=student_id,
-            text_set_id=text_set_id,
-            level=int(overall_percentage)
-        )
-        db.session.add(text_proficiency)
-    
-    db.session.commit()
-    
-    return text_proficiency
-
 # テキスト配信情報を取得するAPI
 @basebuilder_module.route('/api/text_set/<int:text_id>/deliveries')
 @login_required
@@ -3379,35 +2970,19 @@ def delete_single_text(text_id):
         flash('このテキストを削除する権限がありません。')
         return redirect(url_for('basebuilder_module.text_sets'))
     
+    text_title = text_set.title
+    
     try:
-        # テキストに含まれる問題を取得
-        problems = BasicKnowledgeItem.query.filter_by(text_set_id=text_id).all()
-        
-        # 各問題に関連する解答記録・熟練度・関連付けを削除
-        for problem in problems:
-            # 単語の熟練度記録を削除
-            WordProficiency.query.filter_by(problem_id=problem.id).delete()
-            
-            # 解答記録を削除
-            AnswerRecord.query.filter_by(problem_id=problem.id).delete()
-            
-            # テーマとの関連付けを削除
-            KnowledgeThemeRelation.query.filter_by(problem_id=problem.id).delete()
-            
-            # 問題を削除
-            db.session.delete(problem)
-        
-        # テキストの熟練度記録を削除
-        TextProficiencyRecord.query.filter_by(text_set_id=text_id).delete()
-        
-        # テキスト配信を削除
-        TextDelivery.query.filter_by(text_set_id=text_id).delete()
-        
-        # テキストを削除
-        db.session.delete(text_set)
-        db.session.commit()
-        
-        flash(f'テキスト「{text_set.title}」を削除しました。')
+        problem_count = deletion.count_problems(text_set_ids=[text_id])
+        job = deletion.enqueue_if_large('basebuilder_delete_text_sets', problem_count, current_user.id,
+                                        {'text_set_ids': [text_id]})
+        if job:
+            return _render_deletion_job(job, f'テキスト「{text_title}」の削除',
+                                        url_for('basebuilder_module.text_sets'))
+        
+        # テキスト内の問題・学習記録をまとめて削除
+        deletion.delete_text_sets([text_id])
+        flash(f'テキスト「{text_title}」を削除しました。')
     except Exception as e:
         db.session.rollback()
         flash(f'テキストの削除中にエラーが発生しました: {str(e)}')
@@ -0,0 +1,170 @@
+# basebuilder/scheduler.py
+"""
+単語の復習日を決めるスケジューラ
+
+- ladder: 熟練度ごとに固定の間隔（0/1/3/7/14/30日）で復習する従来方式（既定）
+- sm2: SuperMemo-2 方式。単語ごとの易しさ係数（ease_factor）に応じて間隔を伸ばす
+
+学校ごとに School.review_scheduler で選択し、未設定の場合は
+設定 BASEBUILDER_SCHEDULER（既定は 'ladder'）を使う。
+
+各スケジューラは解答時に1件ずつ使う schedule と、
+シミュレータ（basebuilder/simulator.py）用に numpy 配列をまとめて処理する schedule_batch を持つ。
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from extensions import db
+from basebuilder.proficiency import MAX_LEVEL, REVIEW_INTERVALS, next_review_date
+
+DEFAULT_SCHEDULER = 'ladder'
+
+
+class LadderScheduler:
+    """熟練度ごとに固定の間隔で復習する従来方式"""
+
+    name = 'ladder'
+    label = '固定間隔（0/1/3/7/14/30日）'
+
+    def schedule(self, proficiency, is_correct, today=None):
+        """
+        更新後の熟練度から次回復習日を決める
+
+        Args:
+            proficiency: 熟練度を更新済みの WordProficiency
+            is_correct: 正解かどうか
+            today: 基準日（省略時は今日）
+
+        Returns:
+            date: 次回復習日
+        """
+        return next_review_date(proficiency.level or 0, today)
+
+    def schedule_batch(self, state, is_correct):
+        """
+        複数の単語の復習間隔をまとめて計算する
+
+        Args:
+            state: 'level', 'ease_factor', 'interval_days', 'repetitions' の numpy 配列を持つdict
+                   （level は更新済み。必要に応じてその場で更新する）
+            is_correct: 正解かどうかの bool 配列
+
+        Returns:
+            ndarray: 次回復習までの日数
+        """
+        import numpy as np
+
+        return np.asarray(REVIEW_INTERVALS)[np.clip(state['level'], 0, MAX_LEVEL)]
+
+
+class SM2Scheduler:
+    """
+    SuperMemo-2 方式
+
+    正解を品質4、不正解を品質1として扱う。
+    連続正解1回目は1日後、2回目は6日後、以降は前回の間隔×易しさ係数。
+    不正解の場合は連続正解数を0に戻し、1日後に復習する。
+    """
+
+    name = 'sm2'
+    label = 'SM-2（単語ごとに間隔を調整）'
+
+    INITIAL_EASE = 2.5
+    MIN_EASE = 1.3
+    CORRECT_QUALITY = 4
+    INCORRECT_QUALITY = 1
+
+    @classmethod
+    def _ease_delta(cls, quality):
+        return 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+
+    def schedule(self, proficiency, is_correct, today=None):
+        """
+        易しさ係数・間隔・連続正解数を更新して次回復習日を決める
+
+        Args:
+            proficiency: WordProficiency（ease_factor, interval_days, repetitions を更新する）
+            is_correct: 正解かどうか
+            today: 基準日（省略時は今日）
+
+        Returns:
+            date: 次回復習日
+        """
+        today = today or datetime.now().date()
+        ease = proficiency.ease_factor or self.INITIAL_EASE
+        interval = proficiency.interval_days or 0
+        repetitions = proficiency.repetitions or 0
+
+        if is_correct:
+            if repetitions == 0:
+                interval = 1
+            elif repetitions == 1:
+                interval = 6
+            else:
+                interval = max(1, int(round(interval * ease)))
+            repetitions += 1
+            quality = self.CORRECT_QUALITY
+        else:
+            interval = 1
+            repetitions = 0
+            quality = self.INCORRECT_QUALITY
+
+        proficiency.ease_factor = max(self.MIN_EASE, ease + self._ease_delta(quality))
+        proficiency.interval_days = interval
+        proficiency.repetitions = repetitions
+
+        return today + timedelta(days=interval)
+
+    def schedule_batch(self, state, is_correct):
+        """
+        複数の単語の易しさ係数・間隔・連続正解数をまとめて更新する
+
+        Args:
+            state: 'level', 'ease_factor', 'interval_days', 'repetitions' の numpy 配列を持つdict
+            is_correct: 正解かどうかの bool 配列
+
+        Returns:
+            ndarray: 次回復習までの日数
+        """
+        import numpy as np
+
+        ease = state['ease_factor']
+        repetitions = state['repetitions']
+        grown = np.maximum(1, np.rint(state['interval_days'] * ease)).astype(np.int64)
+
+        interval = np.where(repetitions == 0, 1, np.where(repetitions == 1, 6, grown))
+        interval = np.where(is_correct, interval, 1)
+
+        quality = np.where(is_correct, self.CORRECT_QUALITY, self.INCORRECT_QUALITY)
+        state['ease_factor'] = np.maximum(self.MIN_EASE, ease + self._ease_delta(quality))
+        state['interval_days'] = interval
+        state['repetitions'] = np.where(is_correct, repetitions + 1, 0)
+
+        return interval
+
+
+SCHEDULERS = {
+    LadderScheduler.name: LadderScheduler(),
+    SM2Scheduler.name: SM2Scheduler(),
+}
+
+
+def get_scheduler(name=None):
+    """名前からスケジューラを返す（未指定・不明な名前の場合は設定の既定値）"""
+    if name in SCHEDULERS:
+        return SCHEDULERS[name]
+
+    default_name = current_app.config.get('BASEBUILDER_SCHEDULER', DEFAULT_SCHEDULER)
+    return SCHEDULERS.get(default_name, SCHEDULERS[DEFAULT_SCHEDULER])
+
+
+def scheduler_for_student(student_id):
+    """学生の所属学校で設定されたスケジューラを返す"""
+    from app.models import School, User
+
+    name = db.session.query(School.review_scheduler).join(
+        User, User.school_id == School.id
+    ).filter(User.id == student_id).scalar()
+
+    return get_scheduler(name)
@@ -0,0 +1,132 @@
+# basebuilder/selection.py
+"""
+学習セッションの出題選択
+
+セッション内の単語の熟練度を1回のクエリでまとめて取得し、
+session['learning_session'] の 'proficiency_levels' にキャッシュする。
+キャッシュは problem_ids と同じ順序のリストで、submit_answer から
+その場で更新されるため、次の問題の選択ではDBにアクセスしない。
+"""
+import random
+
+from extensions import db
+from basebuilder.models import WordProficiency
+
+# 単語熟練度の最大値
+MAX_LEVEL = 5
+
+# 熟練度ベースで選択する確率（残りはランダム選択）
+PROFICIENCY_PICK_RATE = 0.8
+
+
+def load_word_levels(student_id, problem_ids):
+    """
+    問題IDごとの単語熟練度を1回のクエリで取得する
+
+    Args:
+        student_id: 学生ID
+        problem_ids: 問題IDのリスト
+
+    Returns:
+        dict: {問題ID: 熟練度}（記録がない問題は0）
+    """
+    levels = {pid: 0 for pid in problem_ids}
+    if not levels:
+        return levels
+
+    rows = db.session.query(
+        WordProficiency.problem_id,
+        WordProficiency.level
+    ).filter(
+        WordProficiency.student_id == student_id,
+        WordProficiency.problem_id.in_(list(levels))
+    ).all()
+
+    for problem_id, level in rows:
+        levels[problem_id] = level or 0
+
+    return levels
+
+
+def ensure_session_levels(learning_session, student_id):
+    """
+    学習セッションに熟練度キャッシュがなければ読み込む
+
+    problem_ids が変わっていた場合（件数が一致しない場合）も読み込み直す。
+
+    Returns:
+        list: problem_ids と同じ順序の熟練度リスト
+    """
+    problem_ids = learning_session.get('problem_ids', [])
+    cached = learning_session.get('proficiency_levels')
+
+    if cached is None or len(cached) != len(problem_ids):
+        levels = load_word_levels(student_id, problem_ids)
+        learning_session['proficiency_levels'] = [levels[pid] for pid in problem_ids]
+
+    return learning_session['proficiency_levels']
+
+
+def update_session_level(learning_session, problem_id, level):
+    """
+    解答後の熟練度をセッションのキャッシュに反映する
+
+    Returns:
+        bool: キャッシュを更新した場合True
+    """
+    problem_ids = learning_session.get('problem_ids', [])
+    cached = learning_session.get('proficiency_levels')
+
+    if cached is None or len(cached) != len(problem_ids) or problem_id not in problem_ids:
+        return False
+
+    cached[problem_ids.index(problem_id)] = level
+    return True
+
+
+def all_mastered(learning_session):
+    """セッション内のすべての単語の熟練度が最大かどうか"""
+    levels = learning_session.get('proficiency_levels') or []
+    return bool(levels) and all(level >= MAX_LEVEL for level in levels)
+
+
+def select_next_problem(learning_session):
+    """
+    キャッシュ済みの熟練度から次の問題を選択する（DBアクセスなし）
+
+    - 未解答の問題があれば、80%の確率で熟練度が最も低い問題、
+      20%の確率でランダムに選択
+    - すべて解答済みなら熟練度が最大でない問題のうち最も低いもの、
+      それもなければランダムに選択
+
+    Returns:
+        int: 選択した問題ID（問題がない場合はNone）
+    """
+    problem_ids = learning_session.get('problem_ids', [])
+    if not problem_ids:
+        return None
+
+    levels = dict(zip(problem_ids, learning_session.get('proficiency_levels') or []))
+    completed = set(learning_session.get('completed_problems', []))
+
+    # 問題が少ない場合、completed_problemsをリセット
+    if len(problem_ids) <= learning_session.get('total_problems', 0) and len(completed) >= len(problem_ids):
+        learning_session['completed_problems'] = []
+        completed = set()
+
+    # まだ解いていない問題
+    unfinished = [pid for pid in problem_ids if pid not in completed]
+
+    if unfinished:
+        if random.random() < PROFICIENCY_PICK_RATE:
+            # 熟練度が低い問題を優先
+            return min(unfinished, key=lambda pid: levels.get(pid, 0))
+        # ランダム選択（多様性を確保）
+        return random.choice(unfinished)
+
+    # すべての問題が終わった場合は、熟練度が最大でない問題から低い順に出題
+    incomplete = [pid for pid in problem_ids if levels.get(pid, 0) < MAX_LEVEL]
+    if incomplete:
+        return min(incomplete, key=lambda pid: levels.get(pid, 0))
+
+    return random.choice(problem_ids)
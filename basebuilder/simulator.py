@@ -0,0 +1,201 @@
+# basebuilder/simulator.py
+"""
+復習スケジューラのオフラインシミュレータ
+
+AnswerRecord の解答履歴をスケジューラごとに再生し、
+復習負荷（1人1日あたりに復習日が来る単語数）と定着率（復習日以降の解答の正解率）を比較する。
+
+学生×単語の組ごとに「k回目の解答」をまとめて numpy 配列で処理するため、
+ループ回数は1つの単語への最大解答回数だけで済み、学生数には比例しない。
+
+numpy が必要（pip install numpy）。
+"""
+from datetime import date
+
+from sqlalchemy import select
+
+from extensions import db
+from basebuilder.models import AnswerRecord
+from basebuilder.proficiency import MAX_LEVEL
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# 解答履歴を読み込む際の1回あたりの取得件数
+FETCH_CHUNK_SIZE = 50000
+
+EPOCH = date(1970, 1, 1)
+
+
+def _require_numpy():
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError('シミュレータには numpy が必要です（pip install numpy）')
+
+
+def load_answer_history(since=None, until=None, student_ids=None):
+    """
+    解答履歴を numpy 配列として読み込む
+
+    Args:
+        since: この日時以降の解答のみ（省略時は全期間）
+        until: この日時より前の解答のみ（省略時は全期間）
+        student_ids: 対象の学生IDのリスト（省略時は全学生）
+
+    Returns:
+        dict: 'student_id', 'problem_id', 'day'（1970-01-01からの日数）, 'is_correct' の配列
+    """
+    _require_numpy()
+
+    stmt = select(
+        AnswerRecord.student_id,
+        AnswerRecord.problem_id,
+        AnswerRecord.timestamp,
+        AnswerRecord.is_correct
+    ).where(AnswerRecord.timestamp.isnot(None)).order_by(AnswerRecord.id)
+    if since is not None:
+        stmt = stmt.where(AnswerRecord.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(AnswerRecord.timestamp < until)
+    if student_ids:
+        stmt = stmt.where(AnswerRecord.student_id.in_(student_ids))
+
+    students, problems, days, correct = [], [], [], []
+    result = db.session.execute(stmt.execution_options(yield_per=FETCH_CHUNK_SIZE))
+    for student_id, problem_id, timestamp, is_correct in result:
+        students.append(student_id)
+        problems.append(problem_id)
+        days.append((timestamp.date() - EPOCH).days)
+        correct.append(bool(is_correct))
+
+    return {
+        'student_id': np.asarray(students, dtype=np.int64),
+        'problem_id': np.asarray(problems, dtype=np.int64),
+        'day': np.asarray(days, dtype=np.int64),
+        'is_correct': np.asarray(correct, dtype=bool),
+    }
+
+
+def replay(history, scheduler):
+    """
+    解答履歴を指定したスケジューラで再生する
+
+    解答の正誤は実際の履歴をそのまま使い、スケジューラが決めた復習日と
+    実際の解答日を比べて、復習日以降の解答（期限後の解答）の正解率を定着率とする。
+
+    Args:
+        history: load_answer_history が返す形式の配列のdict
+        scheduler: basebuilder.scheduler のスケジューラ
+
+    Returns:
+        dict: 集計結果
+            - answers: 解答数
+            - students: 学生数
+            - days: 対象期間の日数
+            - due_answers: 復習日以降に行われた解答数
+            - early_answers: 復習日より前に行われた解答数
+            - retention: 期限後の解答の正解率（0-1）
+            - mean_interval: 平均の復習間隔（日）
+            - daily_load: 1人1日あたりに復習日が来る単語数
+    """
+    _require_numpy()
+
+    total = len(history['day'])
+    if total == 0:
+        return {
+            'answers': 0, 'students': 0, 'days': 0, 'due_answers': 0, 'early_answers': 0,
+            'retention': 0.0, 'mean_interval': 0.0, 'daily_load': 0.0,
+        }
+
+    student_ids = history['student_id']
+    problem_ids = history['problem_id']
+    days = history['day']
+    is_correct = history['is_correct']
+
+    # 学生×単語の組ごとに時系列順へ並べ、組の番号と組内での解答順（k回目）を求める
+    # （組, 日付）を1つの整数キーにして1回のソートで並べる（同じ日の解答は読み込み順を保つ）
+    pair_keys = student_ids * (int(problem_ids.max()) + 1) + problem_ids
+    day_offset = days - days.min()
+    order = np.argsort(pair_keys * (int(day_offset.max()) + 1) + day_offset, kind='stable')
+    pair_keys = pair_keys[order]
+    is_new_pair = np.ones(total, dtype=bool)
+    is_new_pair[1:] = pair_keys[1:] != pair_keys[:-1]
+    pair_index = np.cumsum(is_new_pair) - 1
+    pair_start = np.flatnonzero(is_new_pair)
+    rank = np.arange(total) - pair_start[pair_index]
+    pair_count = len(pair_start)
+
+    days = days[order]
+    is_correct = is_correct[order]
+
+    # 組ごとの状態
+    state = {
+        'level': np.zeros(pair_count, dtype=np.int64),
+        'ease_factor': np.full(pair_count, 2.5),
+        'interval_days': np.zeros(pair_count, dtype=np.int64),
+        'repetitions': np.zeros(pair_count, dtype=np.int64),
+    }
+    due_day = np.full(pair_count, -1, dtype=np.int64)
+
+    first_day = int(days.min())
+    last_day = int(days.max())
+    due_answers = 0
+    due_correct = 0
+    early_answers = 0
+    interval_sum = 0
+    scheduled_in_period = 0
+
+    # k回目の解答をまとめて処理する（同じ組の解答は各ステップに1件だけ含まれる）
+    by_rank = np.argsort(rank, kind='stable')
+    rank_bounds = np.concatenate([[0], np.cumsum(np.bincount(rank))])
+
+    for k in range(len(rank_bounds) - 1):
+        step = by_rank[rank_bounds[k]:rank_bounds[k + 1]]
+        pairs = pair_index[step]
+        answer_day = days[step]
+        correct = is_correct[step]
+
+        previous_due = due_day[pairs]
+        scheduled = previous_due >= 0
+        on_time = scheduled & (answer_day >= previous_due)
+        due_answers += int(on_time.sum())
+        due_correct += int((on_time & correct).sum())
+        early_answers += int((scheduled & ~on_time).sum())
+
+        # 熟練度は全方式共通で正解+1・不正解-1
+        step_state = {key: values[pairs] for key, values in state.items()}
+        step_state['level'] = np.clip(step_state['level'] + np.where(correct, 1, -1), 0, MAX_LEVEL)
+        interval = np.asarray(scheduler.schedule_batch(step_state, correct), dtype=np.int64)
+        for key, values in step_state.items():
+            state[key][pairs] = values
+
+        due_day[pairs] = answer_day + interval
+        interval_sum += int(interval.sum())
+        scheduled_in_period += int((due_day[pairs] <= last_day).sum())
+
+    student_count = len(np.unique(student_ids))
+    day_count = last_day - first_day + 1
+
+    return {
+        'answers': total,
+        'students': student_count,
+        'days': day_count,
+        'due_answers': due_answers,
+        'early_answers': early_answers,
+        'retention': due_correct / due_answers if due_answers else 0.0,
+        'mean_interval': interval_sum / total,
+        'daily_load': scheduled_in_period / (student_count * day_count),
+    }
+
+
+def compare_schedulers(history, schedulers):
+    """
+    複数のスケジューラで同じ解答履歴を再生する
+
+    Returns:
+        dict: {スケジューラ名: replay の結果}
+    """
+    return {scheduler.name: replay(history, scheduler) for scheduler in schedulers}
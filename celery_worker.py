@@ -18,6 +18,8 @@ def create_celery_app():
     
     # タスクをインポート
     from app.tasks import daily_report
+    from app.tasks import background_jobs
+    from app.tasks import email_outbox
     
     return celery
 
@@ -48,6 +48,62 @@ class Config:
     DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
     TESTING = False
     
+    # 基礎学力の復習スケジューラ（学校ごとの設定がない場合の既定値: ladder / sm2）
+    BASEBUILDER_SCHEDULER = os.getenv('BASEBUILDER_SCHEDULER', 'ladder')
+    
+    # バックグラウンドジョブ（CSV一括インポート、活動報告PDFなど）の実行方法（celery / thread / sync）
+    BACKGROUND_JOB_BACKEND = os.getenv('BACKGROUND_JOB_BACKEND', 'celery')
+    BACKGROUND_JOB_THREADS = 2  # thread の場合のスレッド数
+    BACKGROUND_JOB_RESULTS_TTL = 24 * 3600  # 結果ファイル（生成したパスワードを含む）の保存期間（秒）
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '0'))  # 0はCPU数
+    
+    # 活動報告PDF
+    REPORT_PDF_WORKERS = int(os.getenv('REPORT_PDF_WORKERS', '0'))  # PDF生成のプロセス数（0はCPU数）
+    REPORT_AI_CONCURRENCY = int(os.getenv('REPORT_AI_CONCURRENCY', '4'))  # AI要約を同時に作成する数
+    REPORT_CACHE_TTL = 7 * 24 * 3600  # 生成したPDFのキャッシュの保存期間（秒）
+    
+    # OpenAI APIの呼び出し（app/ai/gateway.py）
+    OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '30'))  # 応答を待つ時間（秒）
+    OPENAI_CONNECT_TIMEOUT = float(os.getenv('OPENAI_CONNECT_TIMEOUT', '5'))  # 接続を待つ時間（秒）
+    OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '2'))  # 一時的なエラーの再試行回数
+    OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '20'))  # コネクションプールの接続数
+    
+    # チャットの会話コンテキスト（app/ai/context.py）
+    CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', '1500'))  # 会話履歴に使うトークン数
+    CHAT_SUMMARY_MAX_TOKENS = int(os.getenv('CHAT_SUMMARY_MAX_TOKENS', '300'))  # 古い発言の要約の長さ
+    CHAT_SUMMARY_ENABLED = os.getenv('CHAT_SUMMARY_ENABLED', 'True').lower() == 'true'  # 要約をバックグラウンドで更新する
+    
+    # AI応答のキャッシュ（app/ai/cache.py）
+    AI_CACHE_ENABLED = os.getenv('AI_CACHE_ENABLED', 'True').lower() == 'true'
+    AI_CACHE_FEATURES = os.getenv('AI_CACHE_FEATURES', 'curriculum,daily_summary')  # キャッシュする機能（カンマ区切り）
+    AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', str(7 * 24 * 3600)))  # 保存期間（秒）
+    AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', '10000'))  # 保存する件数の上限
+    AI_CACHE_REDIS_URL = os.getenv('AI_CACHE_REDIS_URL')  # 未設定の場合は REDIS_URL、Redisがなければ AI_CACHE_PATH のSQLite
+    AI_CACHE_PATH = os.getenv('AI_CACHE_PATH')  # 未設定の場合は instance フォルダの ai_cache.sqlite3
+    
+    # AIによる生徒評価の一括作成
+    EVALUATION_AI_CONCURRENCY = int(os.getenv('EVALUATION_AI_CONCURRENCY', '4'))  # 同時に呼び出す数
+    EVALUATION_AI_RATE_LIMIT = int(os.getenv('EVALUATION_AI_RATE_LIMIT', '60'))  # 1分あたりの呼び出し回数（0は無制限）
+    
+    # 日次レポート（app/tasks/daily_report.py）
+    DAILY_REPORT_CHUNK_SIZE = int(os.getenv('DAILY_REPORT_CHUNK_SIZE', '100'))  # 1タスクで送信するレポートの数
+    DAILY_REPORT_MAX_ATTEMPTS = int(os.getenv('DAILY_REPORT_MAX_ATTEMPTS', '3'))  # 1件のレポートの送信を試みる回数
+    DAILY_REPORT_SUMMARY_MIN_QUESTIONS = int(os.getenv('DAILY_REPORT_SUMMARY_MIN_QUESTIONS', '3'))  # これ未満の質問数はAIを使わずに要約
+    DAILY_REPORT_SUMMARY_BATCH_SIZE = int(os.getenv('DAILY_REPORT_SUMMARY_BATCH_SIZE', '12'))  # 1回のAPI呼び出しで要約する生徒・教科の数
+    DAILY_REPORT_SUMMARY_CONCURRENCY = int(os.getenv('DAILY_REPORT_SUMMARY_CONCURRENCY', '4'))  # 同時に呼び出す数
+    
+    # メール送信（app/utils/mail_transport.py、接続先と認証情報は環境変数 SMTP_SERVER, SMTP_USER など）
+    SMTP_MAX_PER_MINUTE = int(os.getenv('SMTP_MAX_PER_MINUTE', '60'))  # 1分あたりの送信数（0は無制限、プロセスごと）
+    SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv('SMTP_MAX_MESSAGES_PER_CONNECTION', '100'))  # 1つの接続で送る数
+    SMTP_IDLE_TIMEOUT = float(os.getenv('SMTP_IDLE_TIMEOUT', '60'))  # これより長く使わなかった接続は接続し直す（秒）
+    
+    # メールの送信キュー（app/utils/email_outbox.py）
+    EMAIL_OUTBOX_BACKEND = os.getenv('EMAIL_OUTBOX_BACKEND', 'celery')  # celery/thread/sync/none
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', '50'))  # 1回に取り出して送信する数
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', '5'))  # 1通の送信を試みる回数
+    EMAIL_OUTBOX_RETRY_BASE_DELAY = int(os.getenv('EMAIL_OUTBOX_RETRY_BASE_DELAY', '60'))  # 最初の再試行までの時間（秒、再試行ごとに倍にする）
+    EMAIL_OUTBOX_RETRY_MAX_DELAY = int(os.getenv('EMAIL_OUTBOX_RETRY_MAX_DELAY', '3600'))  # 再試行までの時間の上限（秒）
+    
     # Celery configuration
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
     CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
@@ -59,6 +115,11 @@ class Config:
             'schedule': crontab(hour=17, minute=0),  # 毎日17:00に実行（日本時間）
             'options': {'queue': 'default'}
         },
+        'email-outbox': {
+            'task': 'app.tasks.email_outbox.drain_email_outbox',
+            'schedule': 60.0,  # 再試行待ちのメールを1分ごとに送信
+            'options': {'queue': 'default'}
+        },
     }
     CELERY_TIMEZONE = 'Asia/Tokyo'
     CELERY_ENABLE_UTC = True
@@ -71,6 +132,9 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    AI_CACHE_ENABLED = False
+    CHAT_SUMMARY_ENABLED = False
+    EMAIL_OUTBOX_BACKEND = 'none'
     
 class ProductionConfig(Config):
     DEBUG = False
@@ -9,7 +9,9 @@ import io
 import random
 import string
 from datetime import datetime
-from utils.email import send_invitation_email
+from core.utils.email import send_invitation_email
+from app.utils.background_jobs import append_results
+from app.utils.import_jobs import PASSWORD_RESULTS_MESSAGE, create_import_job, hash_passwords, open_upload
 
 enrollment_bp = Blueprint('enrollment', __name__, url_prefix='/admin/enrollment')
 
@@ -134,6 +136,171 @@ def add_student(class_id):
     
     return render_template('admin/add_student.html', class_group=class_group)
 
+# パスワードハッシュをまとめて計算する単位（チャンクごとにコミットして進捗を通知する）
+ENROLLMENT_IMPORT_CHUNK_SIZE = 100
+
+def _create_enrolled_students(pending, class_group, school_year, results):
+    """検証済みの新規生徒をまとめて作成し、クラスに登録して招待メールを送る"""
+    password_hashes = hash_passwords([entry['password'] for entry in pending])
+    
+    new_users = [
+        User(
+            username=entry['email'].split('@')[0],  # メールアドレスのユーザー部分をユーザー名に
+            email=entry['email'],
+            password=password_hash,
+            role='student',
+            school_id=school_year.school_id,
+            # メール認証関連フィールド
+            email_confirmed=True,  # 教師による登録なので確認済み
+            is_approved=True,      # 教師による登録なので承認済み
+            email_token=None,
+            token_created_at=None
+        )
+        for entry, password_hash in zip(pending, password_hashes)
+    ]
+    db.session.add_all(new_users)
+    db.session.flush()  # IDを取得するためにフラッシュ
+    
+    for entry, new_user in zip(pending, new_users):
+        # クラスに登録
+        db.session.add(StudentEnrollment(
+            student_id=new_user.id,
+            class_group_id=class_group.id,
+            school_year_id=school_year.id,
+            student_number=entry['student_number']
+        ))
+        
+        # 招待メールを送信
+        try:
+            send_invitation_email(
+                name=entry['name'],
+                email=entry['email'],
+                username=new_user.username,
+                password=entry['password'],
+                school_name=school_year.school.name,
+                class_name=class_group.name
+            )
+        except Exception as e:
+            results['errors'].append(f"{entry['email']}: 招待メールの送信に失敗しました: {str(e)}")
+        
+        results['rows'].append({
+            'name': entry['name'],
+            'email': entry['email'],
+            'username': new_user.username,
+            'password': entry['password']
+        })
+    
+    results['created'] += len(new_users)
+
+def import_enrollment_csv(source, class_group, school_year, progress=None, write_rows=None):
+    """
+    CSVから生徒をクラスグループに登録する（未登録のメールアドレスは新規ユーザーを作成）
+    
+    Args:
+        source: CSVのテキストストリーム（name, email, student_number 列）
+        class_group: 登録先のクラスグループ
+        school_year: クラスグループの年度
+        progress: 進捗通知のコールバック progress(処理済み行数)（オプション）
+        write_rows: チャンクのコミット後に、そのチャンクで作成した生徒のパスワードの行を受け取るコールバック（オプション）
+    
+    Returns:
+        dict: {'created', 'enrolled', 'updated', 'errors', 'rows'}
+    """
+    csv_reader = csv.DictReader(source)
+    
+    results = {'created': 0, 'enrolled': 0, 'updated': 0, 'errors': [], 'rows': []}
+    pending = []
+    seen_emails = set()
+    row_count = 0
+    
+    def flush_chunk():
+        written = len(results['rows'])
+        if pending:
+            _create_enrolled_students(pending, class_group, school_year, results)
+            pending.clear()
+        db.session.commit()
+        # コミットした生徒のパスワードは後のチャンクが失敗しても失われないようにすぐ渡す
+        if write_rows and len(results['rows']) > written:
+            write_rows(results['rows'][written:])
+        if progress:
+            progress(row_count)
+    
+    for row in csv_reader:
+        row_count += 1
+        try:
+            # 必須項目の確認
+            if not row.get('name') or not row.get('email'):
+                results['errors'].append(f"行: {csv_reader.line_num} - 名前とメールアドレスは必須です。")
+                continue
+            
+            name = row.get('name')
+            email = row.get('email')
+            student_number = row.get('student_number', '')
+            
+            # 出席番号を整数に変換
+            try:
+                student_number = int(student_number) if student_number else None
+            except ValueError:
+                student_number = None
+            
+            if email in seen_emails:
+                results['errors'].append(f"行: {csv_reader.line_num} - {email} がファイル内で重複しています。")
+                continue
+            seen_emails.add(email)
+            
+            # 既存のユーザーを確認
+            existing_user = User.query.filter_by(email=email).first()
+            
+            if existing_user:
+                # すでにこのクラスに登録されているか確認
+                existing_enrollment = StudentEnrollment.query.filter_by(
+                    student_id=existing_user.id,
+                    class_group_id=class_group.id,
+                    school_year_id=school_year.id
+                ).first()
+                
+                if existing_enrollment:
+                    # 出席番号のみ更新
+                    if student_number:
+                        existing_enrollment.student_number = student_number
+                    results['updated'] += 1
+                else:
+                    # 既存のユーザーの場合、クラスに登録するだけ
+                    db.session.add(StudentEnrollment(
+                        student_id=existing_user.id,
+                        class_group_id=class_group.id,
+                        school_year_id=school_year.id,
+                        student_number=student_number
+                    ))
+                    results['enrolled'] += 1
+            else:
+                # ランダムなパスワードを生成（ハッシュはチャンクごとにまとめて計算）
+                pending.append({
+                    'name': name,
+                    'email': email,
+                    'student_number': student_number,
+                    'password': generate_random_password()
+                })
+                
+        except Exception as e:
+            results['errors'].append(f"行: {csv_reader.line_num} - エラー: {str(e)}")
+        
+        if row_count % ENROLLMENT_IMPORT_CHUNK_SIZE == 0:
+            flush_chunk()
+    
+    flush_chunk()
+    return results
+
+def run_enrollment_import(job, progress):
+    """クラスグループへの生徒インポートジョブのハンドラ（app/utils/background_jobs.py から呼ばれる）"""
+    class_group = ClassGroup.query.get(job.params['class_id'])
+    school_year = SchoolYear.query.get(class_group.school_year_id)
+    with open_upload(job) as source:
+        results = import_enrollment_csv(source, class_group, school_year, progress,
+                                        write_rows=lambda rows: append_results(job.id, rows))
+    del results['rows']
+    return results
+
 @enrollment_bp.route('/students/import/<int:class_id>', methods=['GET', 'POST'])
 @login_required
 def import_students(class_id):
@@ -142,7 +309,6 @@ def import_students(class_id):
         return redirect(url_for('index'))
     
     class_group = ClassGroup.query.get_or_404(class_id)
-    school_year = SchoolYear.query.get(class_group.school_year_id)
     
     # 教師の場合、自分の担当クラスかチェック
     if current_user.role == 'teacher' and class_group.teacher_id != current_user.id:
@@ -161,114 +327,19 @@ def import_students(class_id):
         
         if file and file.filename.endswith('.csv'):
             try:
-                # CSVファイルを読み込む
-                stream = io.StringIO(file.stream.read().decode('utf-8-sig'))  # BOMを考慮
-                csv_reader = csv.DictReader(stream)
-                
-                # 成功と失敗のカウンター
-                success_count = 0
-                error_count = 0
-                
-                # CSVの各行を処理
-                for row in csv_reader:
-                    try:
-                        # 必須項目の確認
-                        if not row.get('name') or not row.get('email'):
-                            error_count += 1
-                            flash(f"行: {csv_reader.line_num} - 名前とメールアドレスは必須です。", 'error')
-                            continue
-                        
-                        name = row.get('name')
-                        email = row.get('email')
-                        student_number = row.get('student_number', '')
-                        
-                        # 出席番号を整数に変換
-                        try:
-                            student_number = int(student_number) if student_number else None
-                        except ValueError:
-                            student_number = None
-                        
-                        # 既存のユーザーを確認
-                        existing_user = User.query.filter_by(email=email).first()
-                        
-                        if existing_user:
-                            # 既存のユーザーの場合、クラスに登録するだけ
-                            user_id = existing_user.id
-                            
-                            # すでにこのクラスに登録されているか確認
-                            existing_enrollment = StudentEnrollment.query.filter_by(
-                                student_id=user_id,
-                                class_group_id=class_id,
-                                school_year_id=school_year.id
-                            ).first()
-                            
-                            if existing_enrollment:
-                                # 出席番号のみ更新
-                                if student_number:
-                                    existing_enrollment.student_number = student_number
-                                    db.session.commit()
-                                    
-                                success_count += 1
-                                continue
-                        else:
-                            # ランダムなパスワードを生成
-                            password = generate_random_password()
-                            
-                            # 新規ユーザーを作成
-                            new_user = User(
-                                username=email.split('@')[0],  # メールアドレスのユーザー部分をユーザー名に
-                                email=email,
-                                password=generate_password_hash(password),
-                                role='student',
-                                school_id=school_year.school_id,
-                                # メール認証関連フィールド
-                                email_confirmed=True,  # 教師による登録なので確認済み
-                                is_approved=True,      # 教師による登録なので承認済み
-                                email_token=None,
-                                token_created_at=None
-                            )
-                            
-                            db.session.add(new_user)
-                            db.session.flush()  # IDを取得するためにフラッシュ
-                            
-                            user_id = new_user.id
-                            
-                            # 招待メールを送信
-                            try:
-                                send_invitation_email(
-                                    name=name,
-                                    email=email,
-                                    username=new_user.username,
-                                    password=password,
-                                    school_name=school_year.school.name,
-                                    class_name=class_group.name
-                                )
-                            except Exception as e:
-                                flash(f"招待メールの送信に失敗しました: {str(e)}", 'warning')
-                        
-                        # クラスに登録
-                        enrollment = StudentEnrollment(
-                            student_id=user_id,
-                            class_group_id=class_id,
-                            school_year_id=school_year.id,
-                            student_number=student_number
-                        )
-                        
-                        db.session.add(enrollment)
-                        success_count += 1
-                        
-                    except Exception as e:
-                        error_count += 1
-                        flash(f"行: {csv_reader.line_num} - エラー: {str(e)}", 'error')
-                
-                db.session.commit()
-                
-                flash(f'{success_count}人の生徒をインポートしました。{error_count}件のエラーが発生しました。')
-                return redirect(url_for('enrollment.list_students', class_id=class_id))
-                
+                # CSVの処理はバックグラウンドジョブで行う
+                job = create_import_job('enrollment_students', file, current_user.id, {'class_id': class_id})
             except Exception as e:
+                db.session.rollback()
                 flash(f'CSVファイルの処理中にエラーが発生しました: {str(e)}')
                 return redirect(request.url)
+            
+            return render_template('background_job.html',
+                                 job=job,
+                                 title=f'{class_group.name} - 生徒一括登録',
+                                 unit='行',
+                                 results_message=PASSWORD_RESULTS_MESSAGE,
+                                 back_url=url_for('enrollment.list_students', class_id=class_id))
         else:
             flash('CSVファイルの形式が正しくありません。')
             return redirect(request.url)
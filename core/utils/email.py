@@ -1,12 +1,12 @@
 # utils/email.py
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import os
 import secrets
 from datetime import datetime, timedelta
 from flask import url_for
 
+from app.utils import mail_transport
+from app.utils.email_outbox import enqueue_email
+
 def send_confirmation_email(user_email, user_id, token, username):
     """
     確認メールを送信する関数
@@ -20,14 +20,8 @@ def send_confirmation_email(user_email, user_id, token, username):
     Returns:
         bool: 送信成功したかどうか
     """
-    # 環境変数からSMTP設定を取得
-    smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-    smtp_port = int(os.getenv('SMTP_PORT', 587))
-    smtp_user = os.getenv('SMTP_USER')
-    smtp_password = os.getenv('SMTP_PASSWORD')
-    sender_email = os.getenv('SENDER_EMAIL', smtp_user)
-    
-    if not all([smtp_server, smtp_user, smtp_password]):
+    # SMTP設定（app/utils/mail_transport.py）が揃っていない場合
+    if not mail_transport.is_configured():
         # 開発環境ではコンソールに出力
         if os.getenv('FLASK_ENV') == 'development':
             confirm_url = url_for(
@@ -60,12 +54,6 @@ def send_confirmation_email(user_email, user_id, token, username):
         _external=True
     )
     
-    # メールの構成
-    message = MIMEMultipart()
-    message["From"] = sender_email
-    message["To"] = user_email
-    message["Subject"] = "QuestEd - メールアドレスの確認"
-    
     # メール本文
     body = f"""
     {username} 様
@@ -82,21 +70,9 @@ def send_confirmation_email(user_email, user_id, token, username):
     QuestEd運営チーム
     """
     
-    message.attach(MIMEText(body, "plain"))
-    
-    try:
-        # SMTPサーバーに接続
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.ehlo()  # サーバーと対話を開始
-        server.starttls()  # TLS暗号化を有効化
-        server.ehlo()  # TLS開始後に再度ehlo
-        server.login(smtp_user, smtp_password)
-        server.sendmail(sender_email, user_email, message.as_string())
-        server.quit()
-        return True
-    except Exception as e:
-        print(f"メール送信エラー: {str(e)}")
-        return False
+    # 送信キューに登録し、リクエストの外で送信する（app/utils/email_outbox.py）
+    enqueue_email(user_email, "QuestEd - メールアドレスの確認", body, subtype="plain", category="confirmation")
+    return True
 
 def send_reset_password_email(user_email, user_id, token, username):
     """
@@ -111,14 +87,8 @@ def send_reset_password_email(user_email, user_id, token, username):
     Returns:
         bool: 送信成功したかどうか
     """
-    # 環境変数からSMTP設定を取得
-    smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-    smtp_port = int(os.getenv('SMTP_PORT', 587))
-    smtp_user = os.getenv('SMTP_USER')
-    smtp_password = os.getenv('SMTP_PASSWORD')
-    sender_email = os.getenv('SENDER_EMAIL', smtp_user)
-    
-    if not all([smtp_server, smtp_user, smtp_password]):
+    # SMTP設定（app/utils/mail_transport.py）が揃っていない場合
+    if not mail_transport.is_configured():
         # 開発環境ではコンソールに出力
         if os.getenv('FLASK_ENV') == 'development':
             reset_url = url_for(
@@ -152,12 +122,6 @@ def send_reset_password_email(user_email, user_id, token, username):
         _external=True
     )
     
-    # メールの構成
-    message = MIMEMultipart()
-    message["From"] = sender_email
-    message["To"] = user_email
-    message["Subject"] = "QuestEd - パスワードリセット"
-    
     # メール本文
     body = f"""
     {username} 様
@@ -175,21 +139,9 @@ def send_reset_password_email(user_email, user_id, token, username):
     QuestEd運営チーム
     """
     
-    message.attach(MIMEText(body, "plain"))
-    
-    try:
-        # SMTPサーバーに接続
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.ehlo()  # サーバーと対話を開始
-        server.starttls()  # TLS暗号化を有効化
-        server.ehlo()  # TLS開始後に再度ehlo
-        server.login(smtp_user, smtp_password)
-        server.sendmail(sender_email, user_email, message.as_string())
-        server.quit()
-        return True
-    except Exception as e:
-        print(f"メール送信エラー: {str(e)}")
-        return False
+    # 送信キューに登録し、リクエストの外で送信する（app/utils/email_outbox.py）
+    enqueue_email(user_email, "QuestEd - パスワードリセット", body, subtype="plain", category="reset_password")
+    return True
 
 def send_invitation_email(name, email, username, password, school_name, class_name):
     """
@@ -206,14 +158,8 @@ def send_invitation_email(name, email, username, password, school_name, class_na
     Returns:
         None: 送信に失敗した場合は例外を発生
     """
-    # 環境変数からSMTP設定を取得
-    smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-    smtp_port = int(os.getenv('SMTP_PORT', 587))
-    smtp_user = os.getenv('SMTP_USER')
-    smtp_password = os.getenv('SMTP_PASSWORD')
-    sender_email = os.getenv('SENDER_EMAIL', smtp_user)
-    
-    if not all([smtp_server, smtp_user, smtp_password]):
+    # SMTP設定（app/utils/mail_transport.py）が揃っていない場合
+    if not mail_transport.is_configured():
         # 開発環境ではコンソールに出力
         if os.getenv('FLASK_ENV') == 'development':
             print("\n=== 招待メール ===")
@@ -262,25 +208,6 @@ def send_invitation_email(name, email, username, password, school_name, class_na
     {school_name}
     """
     
-    # メールの構築
-    message = MIMEMultipart()
-    message["Subject"] = subject
-    message["From"] = sender_email
-    message["To"] = email
-    
-    # メール本文を添付
-    message.attach(MIMEText(body, "plain"))
-    
-    # メール送信
-    try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.ehlo()  # サーバーと対話を開始
-        server.starttls()  # TLS暗号化を有効化
-        server.ehlo()  # TLS開始後に再度ehlo
-        server.login(smtp_user, smtp_password)
-        server.send_message(message)
-        server.quit()
-        return True
-    except Exception as e:
-        print(f"メール送信エラー: {str(e)}")
-        return False
\ No newline at end of file
+    # 送信キューに登録し、リクエストの外で送信する（app/utils/email_outbox.py）
+    enqueue_email(email, subject, body, subtype="plain", category="invitation")
+    return True
\ No newline at end of file
@@ -0,0 +1,28 @@
+"""Add composite index for latest answer lookups
+
+Revision ID: add_answer_latest_index
+Revises: add_proficiency_aggregates
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_answer_latest_index'
+down_revision = 'add_proficiency_aggregates'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 学生×問題ごとの最新解答（MAX(timestamp)）を索引のみで求める
+    op.create_index(
+        'ix_answer_records_student_problem_time',
+        'answer_records',
+        ['student_id', 'problem_id', 'timestamp']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_answer_records_student_problem_time', table_name='answer_records')
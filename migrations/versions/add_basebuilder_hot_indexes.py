@@ -0,0 +1,106 @@
+"""Add composite indexes for basebuilder hot tables
+
+Revision ID: add_basebuilder_hot_indexes
+Revises: add_answer_latest_index
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_basebuilder_hot_indexes'
+down_revision = 'add_answer_latest_index'
+branch_labels = None
+depends_on = None
+
+
+# (インデックス名, テーブル名, カラム)
+# answer_records の (student_id, problem_id) は ix_answer_records_student_problem_time の先頭列で兼ねる
+INDEXES = [
+    ('ix_answer_records_student_time', 'answer_records', ['student_id', 'timestamp']),
+    ('ix_text_deliveries_class_text', 'text_deliveries', ['class_id', 'text_set_id']),
+    ('ix_basic_knowledge_items_text_order', 'basic_knowledge_items', ['text_set_id', 'order_in_text']),
+]
+
+WORD_PROFICIENCY_UNIQUE = 'uq_word_proficiency_student_problem'
+
+# 重複削除時に1回のDELETEで指定するIDの件数
+DELETE_CHUNK_SIZE = 500
+
+
+def _has_unique_on(inspector, table, columns):
+    """指定カラムの組に対する一意制約（または一意インデックス）が既にあるか"""
+    columns = set(columns)
+    for constraint in inspector.get_unique_constraints(table):
+        if set(constraint['column_names']) == columns:
+            return True
+    for index in inspector.get_indexes(table):
+        if index.get('unique') and set(index['column_names']) == columns:
+            return True
+    return False
+
+
+def _deduplicate_word_proficiency(bind):
+    """
+    word_proficiency_records の (student_id, problem_id) の重複行を削除する
+
+    最後に更新された行（同時刻ならIDが大きい行）を残す。
+    """
+    duplicated = bind.execute(sa.text("""
+        SELECT student_id, problem_id
+        FROM word_proficiency_records
+        GROUP BY student_id, problem_id
+        HAVING COUNT(*) > 1
+    """)).fetchall()
+    if not duplicated:
+        return
+
+    delete_ids = []
+    for student_id, problem_id in duplicated:
+        rows = bind.execute(sa.text("""
+            SELECT id FROM word_proficiency_records
+            WHERE student_id = :student_id AND problem_id = :problem_id
+            ORDER BY (last_updated IS NULL), last_updated DESC, id DESC
+        """), {'student_id': student_id, 'problem_id': problem_id}).fetchall()
+        delete_ids.extend(row[0] for row in rows[1:])
+
+    for start in range(0, len(delete_ids), DELETE_CHUNK_SIZE):
+        chunk = delete_ids[start:start + DELETE_CHUNK_SIZE]
+        bind.execute(
+            sa.text("DELETE FROM word_proficiency_records WHERE id IN :ids").bindparams(
+                sa.bindparam('ids', expanding=True)
+            ),
+            {'ids': chunk}
+        )
+
+    print(f"word_proficiency_records: {len(delete_ids)}件の重複行を削除しました")
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    for name, table, columns in INDEXES:
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns)
+
+    # 一意制約を追加する前に重複行を整理する
+    if not _has_unique_on(inspector, 'word_proficiency_records', ['student_id', 'problem_id']):
+        _deduplicate_word_proficiency(bind)
+        with op.batch_alter_table('word_proficiency_records') as batch_op:
+            batch_op.create_unique_constraint(WORD_PROFICIENCY_UNIQUE, ['student_id', 'problem_id'])
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    unique_names = {c['name'] for c in inspector.get_unique_constraints('word_proficiency_records')}
+    if WORD_PROFICIENCY_UNIQUE in unique_names:
+        with op.batch_alter_table('word_proficiency_records') as batch_op:
+            batch_op.drop_constraint(WORD_PROFICIENCY_UNIQUE, type_='unique')
+
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,33 @@
+"""Add chat_summaries table for rolling chat context summaries
+
+Revision ID: add_chat_summaries
+Revises: add_import_jobs
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_chat_summaries'
+down_revision = 'add_import_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'chat_summaries',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('class_id', sa.Integer(), sa.ForeignKey('classes.id', ondelete='CASCADE'), nullable=True),
+        sa.Column('summary', sa.Text(), nullable=True),
+        sa.Column('last_message_id', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('user_id', 'class_id', name='uq_chat_summaries_user_class'),
+    )
+
+
+def downgrade():
+    op.drop_table('chat_summaries')
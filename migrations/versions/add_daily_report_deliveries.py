@@ -0,0 +1,49 @@
+"""Add daily report delivery records and run summaries
+
+Revision ID: add_daily_report_deliveries
+Revises: add_chat_summaries
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_daily_report_deliveries'
+down_revision = 'add_chat_summaries'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'daily_report_deliveries',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('report_date', sa.Date(), nullable=False),
+        sa.Column('report_key', sa.String(50), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='sending'),
+        sa.Column('attempts', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('user_id', 'report_date', 'report_key', name='uq_daily_report_deliveries'),
+    )
+    op.create_table(
+        'daily_report_runs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('report_date', sa.Date(), nullable=False),
+        sa.Column('chunks', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('sent', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('skipped', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('failed', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_daily_report_runs_report_date', 'daily_report_runs', ['report_date'])
+
+
+def downgrade():
+    op.drop_index('ix_daily_report_runs_report_date', table_name='daily_report_runs')
+    op.drop_table('daily_report_runs')
+    op.drop_table('daily_report_deliveries')
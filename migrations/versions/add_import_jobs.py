@@ -0,0 +1,42 @@
+"""Add import_jobs table for background CSV imports
+
+Revision ID: add_import_jobs
+Revises: add_review_scheduler
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_import_jobs'
+down_revision = 'add_review_scheduler'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'import_jobs',
+        sa.Column('id', sa.String(36), primary_key=True),
+        sa.Column('kind', sa.String(50), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('filename', sa.String(255), nullable=True),
+        sa.Column('params', sa.JSON(), nullable=True),
+        sa.Column('total', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('processed', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('has_results_file', sa.Boolean(), nullable=True, server_default=sa.false()),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_import_jobs_user_id', 'import_jobs', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_import_jobs_user_id', table_name='import_jobs')
+    op.drop_table('import_jobs')
@@ -0,0 +1,38 @@
+"""Add aggregate columns to proficiency records
+
+Revision ID: add_proficiency_aggregates
+Revises: be00c907d1fb, add_full_name_v1
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_proficiency_aggregates'
+down_revision = ('be00c907d1fb', 'add_full_name_v1')
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # カテゴリ熟練度の集計値（単語熟練度の合計と単語数）
+    op.add_column('proficiency_records', sa.Column('level_sum', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('proficiency_records', sa.Column('item_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # テキスト定着度の集計値（単語熟練度の合計・単語数・最も早い復習日）
+    op.add_column('text_proficiency_records', sa.Column('level_sum', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('text_proficiency_records', sa.Column('item_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('text_proficiency_records', sa.Column('review_date', sa.Date(), nullable=True))
+
+    # 既存データの集計値は item_count=0 のまま残し、
+    # 次回の解答時または `flask basebuilder rebuild-aggregates` で構築する
+
+
+def downgrade():
+    op.drop_column('text_proficiency_records', 'review_date')
+    op.drop_column('text_proficiency_records', 'item_count')
+    op.drop_column('text_proficiency_records', 'level_sum')
+    op.drop_column('proficiency_records', 'item_count')
+    op.drop_column('proficiency_records', 'level_sum')
@@ -0,0 +1,33 @@
+"""Add review scheduler settings and SM-2 state
+
+Revision ID: add_review_scheduler
+Revises: add_word_review_index
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_review_scheduler'
+down_revision = 'add_word_review_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 学校ごとの復習スケジューラ（NULLは既定の固定間隔方式）
+    op.add_column('schools', sa.Column('review_scheduler', sa.String(20), nullable=True))
+
+    # SM-2スケジューラの単語ごとの状態
+    op.add_column('word_proficiency_records', sa.Column('ease_factor', sa.Float(), nullable=True))
+    op.add_column('word_proficiency_records', sa.Column('interval_days', sa.Integer(), nullable=True))
+    op.add_column('word_proficiency_records', sa.Column('repetitions', sa.Integer(), nullable=True, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('word_proficiency_records', 'repetitions')
+    op.drop_column('word_proficiency_records', 'interval_days')
+    op.drop_column('word_proficiency_records', 'ease_factor')
+    op.drop_column('schools', 'review_scheduler')
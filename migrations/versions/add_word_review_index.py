@@ -0,0 +1,28 @@
+"""Add review queue index to word proficiency records
+
+Revision ID: add_word_review_index
+Revises: add_basebuilder_hot_indexes
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_word_review_index'
+down_revision = 'add_basebuilder_hot_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 復習期限が来た単語を (student_id, review_date) の範囲検索で取得する
+    op.create_index(
+        'ix_word_proficiency_student_review',
+        'word_proficiency_records',
+        ['student_id', 'review_date']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_word_proficiency_student_review', table_name='word_proficiency_records')
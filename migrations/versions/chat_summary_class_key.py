@@ -0,0 +1,47 @@
+"""Make chat_summaries unique per (user, class) including chats without a class
+
+Revision ID: chat_summary_class_key
+Revises: add_email_outbox
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'chat_summary_class_key'
+down_revision = 'add_email_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # class_id が NULL の行は一意制約で重複を防げないため、NULLを0にしたキー列で一意にする
+    with op.batch_alter_table('chat_summaries') as batch_op:
+        batch_op.add_column(sa.Column('class_key', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute("UPDATE chat_summaries SET class_key = class_id WHERE class_id IS NOT NULL")
+
+    # 同時に作成された重複行は、最も新しい要約を残して削除する
+    connection = op.get_bind()
+    duplicates = connection.execute(sa.text(
+        "SELECT user_id, class_key, MAX(id) FROM chat_summaries "
+        "GROUP BY user_id, class_key HAVING COUNT(*) > 1"
+    )).fetchall()
+    for user_id, class_key, keep_id in duplicates:
+        connection.execute(sa.text(
+            "DELETE FROM chat_summaries WHERE user_id = :user_id AND class_key = :class_key AND id <> :keep_id"
+        ), {'user_id': user_id, 'class_key': class_key, 'keep_id': keep_id})
+
+    # MySQLでは user_id の外部キーに使う索引が必要なため、新しい一意制約を先に作成する
+    with op.batch_alter_table('chat_summaries') as batch_op:
+        batch_op.create_unique_constraint('uq_chat_summaries_user_class_key', ['user_id', 'class_key'])
+        batch_op.drop_constraint('uq_chat_summaries_user_class', type_='unique')
+
+
+def downgrade():
+    with op.batch_alter_table('chat_summaries') as batch_op:
+        batch_op.create_unique_constraint('uq_chat_summaries_user_class', ['user_id', 'class_id'])
+        batch_op.drop_constraint('uq_chat_summaries_user_class_key', type_='unique')
+        batch_op.drop_column('class_key')
@@ -0,0 +1,28 @@
+"""Rename import_jobs to background_jobs (the table also holds PDF and evaluation jobs)
+
+Revision ID: rename_import_jobs
+Revises: chat_summary_class_key
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'rename_import_jobs'
+down_revision = 'chat_summary_class_key'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_import_jobs_user_id', table_name='import_jobs')
+    op.rename_table('import_jobs', 'background_jobs')
+    op.create_index('ix_background_jobs_user_id', 'background_jobs', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_background_jobs_user_id', table_name='background_jobs')
+    op.rename_table('background_jobs', 'import_jobs')
+    op.create_index('ix_import_jobs_user_id', 'import_jobs', ['user_id'])
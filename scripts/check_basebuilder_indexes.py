@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+BaseBuilderの主要クエリが複合インデックスを使っているかをEXPLAINで確認するスクリプト
+MySQLでのマイグレーション適用後に実行する
+
+使用方法:
+    python scripts/check_basebuilder_indexes.py
+"""
+import sys
+import os
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app import create_app
+from extensions import db
+
+# (説明, SQL, 使われるべきインデックス名の候補)
+HOT_QUERIES = [
+    (
+        '単語ごとの最新解答',
+        """SELECT problem_id, MAX(timestamp) FROM answer_records
+           WHERE student_id = :student_id AND problem_id IN (:problem_id)
+           GROUP BY problem_id""",
+        {'ix_answer_records_student_problem_time'},
+    ),
+    (
+        '学生の解答履歴（新しい順）',
+        """SELECT * FROM answer_records
+           WHERE student_id = :student_id
+           ORDER BY timestamp DESC LIMIT 20""",
+        {'ix_answer_records_student_time'},
+    ),
+    (
+        '単語の熟練度',
+        """SELECT * FROM word_proficiency_records
+           WHERE student_id = :student_id AND problem_id = :problem_id""",
+        {'uq_word_proficiency_student_problem'},
+    ),
+    (
+        '復習期限が来た単語',
+        """SELECT * FROM word_proficiency_records
+           WHERE student_id = :student_id AND review_date <= CURDATE()
+           ORDER BY review_date LIMIT 50""",
+        {'ix_word_proficiency_student_review'},
+    ),
+    (
+        'クラスへの配信テキスト',
+        """SELECT * FROM text_deliveries
+           WHERE class_id = :class_id AND text_set_id = :text_set_id""",
+        {'ix_text_deliveries_class_text'},
+    ),
+    (
+        'テキスト内の単語（順序どおり）',
+        """SELECT * FROM basic_knowledge_items
+           WHERE text_set_id = :text_set_id
+           ORDER BY order_in_text""",
+        {'ix_basic_knowledge_items_text_order'},
+    ),
+]
+
+
+def sample_params():
+    """EXPLAINに渡す代表的なID（データがなければ1）"""
+    def first_id(sql):
+        value = db.session.execute(text(sql)).scalar()
+        return value if value is not None else 1
+
+    return {
+        'student_id': first_id('SELECT MIN(student_id) FROM answer_records'),
+        'problem_id': first_id('SELECT MIN(problem_id) FROM answer_records'),
+        'class_id': first_id('SELECT MIN(class_id) FROM text_deliveries'),
+        'text_set_id': first_id('SELECT MIN(text_set_id) FROM basic_knowledge_items'),
+    }
+
+
+def check_indexes():
+    """
+    各クエリのEXPLAIN結果を確認する
+
+    Returns:
+        bool: すべてのクエリが想定したインデックスを使っていればTrue
+    """
+    if db.engine.dialect.name != 'mysql':
+        print(f"このスクリプトはMySQL専用です（現在: {db.engine.dialect.name}）")
+        return False
+
+    params = sample_params()
+    all_ok = True
+
+    for label, sql, expected in HOT_QUERIES:
+        rows = db.session.execute(text('EXPLAIN ' + sql), params).mappings().all()
+        used_keys = {row['key'] for row in rows if row['key']}
+        ok = bool(used_keys & expected)
+        all_ok = all_ok and ok
+
+        status = 'OK' if ok else 'NG'
+        print(f"[{status}] {label}: 使用インデックス={', '.join(sorted(used_keys)) or 'なし'}")
+        if not ok:
+            print(f"       想定インデックス: {', '.join(sorted(expected))}")
+            for row in rows:
+                print(f"       type={row['type']} rows={row['rows']} Extra={row['Extra']}")
+
+    return all_ok
+
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        sys.exit(0 if check_indexes() else 1)
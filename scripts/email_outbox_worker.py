@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+メールの送信キュー（email_outbox）を処理するワーカー
+Celeryを使わない環境で、EMAIL_OUTBOX_BACKEND=none と組み合わせて常駐させる
+
+使用方法:
+    python scripts/email_outbox_worker.py            # 一定間隔で送信キューを処理し続ける
+    python scripts/email_outbox_worker.py --once     # 1回だけ処理して終了する（cron用）
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.utils.email_outbox import drain_outbox
+
+
+def main():
+    parser = argparse.ArgumentParser(description='メールの送信キューを処理する')
+    parser.add_argument('--once', action='store_true', help='1回だけ処理して終了する')
+    parser.add_argument('--interval', type=float, default=10.0, help='送信キューを確認する間隔（秒）')
+    args = parser.parse_args()
+
+    app = create_app()
+    while True:
+        try:
+            with app.app_context():
+                counts = drain_outbox()
+            if counts['sent'] or counts['failed']:
+                print(f"[{datetime.now()}] sent={counts['sent']} failed={counts['failed']}")
+        except Exception as e:
+            logging.error(f"メールの送信キューの処理エラー: {e}")
+
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
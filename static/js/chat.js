@@ -113,20 +113,36 @@ document.addEventListener('DOMContentLoaded', function() {
         const urlParams = new URLSearchParams(window.location.search);
         const classId = urlParams.get('class_id');
         
-        // APIリクエストを送信
+        const payload = {
+            message: message,
+            step: selectedStepField.value,
+            function: selectedFunctionField.value,
+            class_id: classId ? parseInt(classId) : null
+        };
+        
+        // ストリーミングに対応していないブラウザでは応答全体をまとめて受け取る
+        const send = (window.ReadableStream && window.TextDecoder) ? sendStreaming : sendMessage;
+        send(payload, loadingId);
+        
+        // 入力フィールドをクリア
+        messageInput.value = '';
+    });
+    
+    // APIリクエストのヘッダー
+    function requestHeaders() {
+        return {
+            'Content-Type': 'application/json',
+            'X-Requested-With': 'XMLHttpRequest', // AJAXリクエストであることを明示
+            'X-CSRFToken': csrfToken
+        };
+    }
+    
+    // 応答全体をまとめて受け取る（/api/chat）
+    function sendMessage(payload, loadingId) {
         fetch('/api/chat', {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'X-Requested-With': 'XMLHttpRequest', // AJAXリクエストであることを明示
-                'X-CSRFToken': csrfToken
-            },
-            body: JSON.stringify({
-                message: message,
-                step: selectedStepField.value,
-                function: selectedFunctionField.value,
-                class_id: classId ? parseInt(classId) : null
-            })
+            headers: requestHeaders(),
+            body: JSON.stringify(payload)
         })
         .then(response => {
             if (!response.ok) {
@@ -139,9 +155,8 @@ document.addEventListener('DOMContentLoaded', function() {
             removeLoadingMessage(loadingId);
             
             // AIの応答を表示
-            if (data.response) {
-                addMessage(data.response, false);
-                handleMessageSent(); // メッセージ送信後の処理
+            if (data.message) {
+                addMessage(data.message, false);
             } else if (data.error) {
                 addMessage('エラーが発生しました: ' + data.error, false, true);
             }
@@ -154,10 +169,86 @@ document.addEventListener('DOMContentLoaded', function() {
             addMessage('通信エラーが発生しました。再度お試しください。', false, true);
             console.error('Error:', error);
         });
+    }
+    
+    // 応答を生成された順に表示する（/api/chat/stream、Server-Sent Events）
+    function sendStreaming(payload, loadingId) {
+        let contentDiv = null;
+        let text = '';
         
-        // 入力フィールドをクリア
-        messageInput.value = '';
-    });
+        // 受け取った断片をAIのメッセージに追加
+        function appendText(delta) {
+            if (!contentDiv) {
+                removeLoadingMessage(loadingId);
+                addMessage('', false);
+                contentDiv = chatContainer.lastElementChild.querySelector('.message-content');
+            }
+            text += delta;
+            contentDiv.textContent = text;
+            contentDiv.innerHTML = contentDiv.innerHTML.replace(/\n/g, '<br>');
+            chatContainer.scrollTop = chatContainer.scrollHeight;
+        }
+        
+        // 1件分のイベントを処理
+        function handleEvent(block) {
+            let event = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            if (!data) return;
+            
+            const parsed = JSON.parse(data);
+            if (event === 'error') {
+                removeLoadingMessage(loadingId);
+                addMessage('エラーが発生しました: ' + parsed.error, false, true);
+            } else if (parsed.delta) {
+                appendText(parsed.delta);
+            }
+        }
+        
+        fetch('/api/chat/stream', {
+            method: 'POST',
+            headers: requestHeaders(),
+            body: JSON.stringify(payload)
+        })
+        .then(response => {
+            if (!response.ok || !response.body) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            
+            function read() {
+                return reader.read().then(({ done, value }) => {
+                    if (done) {
+                        removeLoadingMessage(loadingId);
+                        return;
+                    }
+                    buffer += decoder.decode(value, { stream: true });
+                    const blocks = buffer.split('\n\n');
+                    buffer = blocks.pop();
+                    blocks.forEach(handleEvent);
+                    return read();
+                });
+            }
+            return read();
+        })
+        .catch(error => {
+            // ローディングメッセージを削除
+            removeLoadingMessage(loadingId);
+            
+            // エラーメッセージを表示
+            addMessage('通信エラーが発生しました。再度お試しください。', false, true);
+            console.error('Error:', error);
+        });
+    }
     
     // メッセージをチャット領域に追加する関数
     function addMessage(content, isUser, isError = false, autoScroll = true) {
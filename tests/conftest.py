@@ -3,10 +3,20 @@ from app import create_app, db
 from app.models import User, School
 from config import TestingConfig
 
+@pytest.fixture(scope='session')
+def _application():
+    """
+    create_app で作成したアプリ（テストセッションで1回だけ作成する）
+
+    app.admin パッケージを読み込むと管理画面の拡張 admin の名前が置き換わるため、
+    create_app は1つのプロセスで2回呼び出せない。
+    """
+    return create_app(TestingConfig)
+
 @pytest.fixture
-def app():
-    """テスト用アプリケーションインスタンス"""
-    app = create_app(TestingConfig)
+def app(_application):
+    """テスト用アプリケーションインスタンス（テストごとにテーブルを作り直す）"""
+    app = _application
     
     with app.app_context():
         db.create_all()
@@ -94,4 +104,98 @@ def sample_users(sample_school):
         db.session.add(user)
     
     db.session.commit()
-    return users
\ No newline at end of file
+    return users
+
+@pytest.fixture
+def model_app():
+    """モデル層のみを初期化したテスト用アプリ（Blueprintや管理画面は登録しない）"""
+    from flask import Flask
+    import basebuilder.models  # noqa: F401 - テーブル定義を登録
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def query_counter(model_app):
+    """実行されたSQL文を記録するリスト"""
+    from sqlalchemy import event
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@pytest.fixture
+def teacher(model_app):
+    """教師のユーザー（学校なし）"""
+    user = User(username='teacher1', password='x', email='teacher1@test.com', role='teacher')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def job_app(model_app, tmp_path):
+    """バックグラウンドジョブをその場で実行し、ファイルを一時ディレクトリに保存するアプリ"""
+    model_app.config['SECURE_UPLOAD_FOLDER'] = str(tmp_path)
+    model_app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    model_app.config['BACKGROUND_JOB_BACKEND'] = 'sync'
+    return model_app
+
+
+@pytest.fixture
+def teacher_class(job_app):
+    """学校・教師・クラスを作成し、(教師, クラス) を返す"""
+    from app.models import Class
+
+    school = School(name='テスト学校', code='TEST001')
+    db.session.add(school)
+    db.session.flush()
+
+    teacher = User(username='teacher', email='teacher@test.com', password='x',
+                   role='teacher', school_id=school.id)
+    db.session.add(teacher)
+    db.session.flush()
+
+    class_obj = Class(name='1年A組', teacher_id=teacher.id, school_id=school.id)
+    db.session.add(class_obj)
+    db.session.commit()
+    return teacher, class_obj
+
+
+@pytest.fixture
+def enroll_students(teacher_class):
+    """teacher_class のクラスに生徒を登録する関数
+
+    Returns:
+        生徒数を受け取り、登録した生徒のリストを返す関数
+    """
+    from app.models import ClassEnrollment
+
+    teacher, class_obj = teacher_class
+
+    def enroll(count):
+        students = [User(username=f'student{i}', email=f'student{i}@test.com', password='x',
+                         role='student', school_id=teacher.school_id) for i in range(count)]
+        db.session.add_all(students)
+        db.session.flush()
+        for student in students:
+            db.session.add(ClassEnrollment(class_id=class_obj.id, student_id=student.id))
+        db.session.commit()
+        return students
+
+    return enroll
@@ -0,0 +1,71 @@
+import pytest
+
+from app.ai import cache as ai_cache
+from app.ai import gateway
+
+
+@pytest.fixture
+def sqlite_cache(tmp_path):
+    backend = ai_cache.SqliteCacheBackend(str(tmp_path / 'cache.sqlite3'), ttl=60, max_entries=2)
+    return ai_cache.ResponseCache(backend, ['curriculum'])
+
+
+def _params(content, model='gpt-4'):
+    return {'model': model, 'messages': [{'role': 'user', 'content': content}], 'temperature': 0.7}
+
+
+def test_cache_key_ignores_whitespace_differences():
+    assert ai_cache.make_cache_key(_params('単元を\n  作成して')) == ai_cache.make_cache_key(_params('単元を 作成して'))
+    assert ai_cache.make_cache_key(_params('x')) != ai_cache.make_cache_key(_params('x', model='gpt-3.5-turbo'))
+
+
+def test_sqlite_cache_records_hits_and_misses(sqlite_cache):
+    assert sqlite_cache.get('curriculum', _params('a')) is None
+    sqlite_cache.set(_params('a'), '応答A')
+
+    assert sqlite_cache.get('curriculum', _params('a')) == '応答A'
+    stats = sqlite_cache.stats()['curriculum']
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+
+def test_sqlite_cache_evicts_least_recently_used(sqlite_cache, monkeypatch):
+    clock = iter(range(100, 200))
+    monkeypatch.setattr(ai_cache.time, 'time', lambda: next(clock))
+
+    sqlite_cache.set(_params('a'), 'A')
+    sqlite_cache.set(_params('b'), 'B')
+    assert sqlite_cache.get('curriculum', _params('a')) == 'A'
+    sqlite_cache.set(_params('c'), 'C')
+
+    assert sqlite_cache.get('curriculum', _params('b')) is None
+    assert sqlite_cache.get('curriculum', _params('a')) == 'A'
+    assert sqlite_cache.get('curriculum', _params('c')) == 'C'
+
+
+def test_sqlite_cache_expires_entries(sqlite_cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ai_cache.time, 'time', lambda: now[0])
+    sqlite_cache.set(_params('a'), 'A')
+
+    now[0] += 61
+    assert sqlite_cache.get('curriculum', _params('a')) is None
+
+
+def test_chat_completion_uses_cache_for_enabled_features(sqlite_cache, monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+    monkeypatch.setattr(gateway, 'OPENAI_AVAILABLE', True)
+    monkeypatch.setattr(gateway, 'get_response_cache', lambda: sqlite_cache)
+    calls = []
+
+    def fake_create(params, api_key=None, timeout=None):
+        calls.append(params)
+        return f'応答{len(calls)}'
+
+    monkeypatch.setattr(gateway, '_create', fake_create)
+    messages = [{'role': 'user', 'content': 'カリキュラムを作成'}]
+
+    assert gateway.chat_completion(messages, cache_feature='curriculum') == '応答1'
+    assert gateway.chat_completion(messages, cache_feature='curriculum') == '応答1'
+    assert gateway.chat_completion(messages, cache_feature='personal_themes') == '応答2'
+    assert gateway.chat_completion(messages) == '応答3'
+    assert len(calls) == 3
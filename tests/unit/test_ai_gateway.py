@@ -0,0 +1,111 @@
+import pytest
+
+from app.ai import gateway
+
+
+@pytest.fixture
+def api_key(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+    monkeypatch.setattr(gateway, 'OPENAI_AVAILABLE', True)
+
+
+def test_chat_completion_retries_transient_errors_with_jitter(api_key, monkeypatch):
+    calls = []
+    sleeps = []
+
+    def fake_create(params, api_key=None, timeout=None):
+        calls.append(params)
+        if len(calls) < 3:
+            raise TimeoutError('timed out')
+        return '応答'
+
+    monkeypatch.setattr(gateway, 'RETRYABLE_ERRORS', (TimeoutError,))
+    monkeypatch.setattr(gateway, '_create', fake_create)
+    monkeypatch.setattr(gateway.time, 'sleep', sleeps.append)
+
+    result = gateway.chat_completion([{'role': 'user', 'content': 'こんにちは'}], max_retries=2)
+
+    assert result == '応答'
+    assert len(calls) == 3
+    assert 'max_tokens' not in calls[0]
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= gateway.DEFAULT_SETTINGS['OPENAI_RETRY_BASE_DELAY']
+
+
+def test_chat_completion_does_not_retry_other_errors(api_key, monkeypatch):
+    calls = []
+
+    def fake_create(params, api_key=None, timeout=None):
+        calls.append(params)
+        raise ValueError('bad request')
+
+    monkeypatch.setattr(gateway, 'RETRYABLE_ERRORS', (TimeoutError,))
+    monkeypatch.setattr(gateway, '_create', fake_create)
+
+    with pytest.raises(ValueError):
+        gateway.chat_completion([{'role': 'user', 'content': 'x'}], max_retries=2)
+    assert len(calls) == 1
+
+
+def test_chat_completion_requires_api_key(monkeypatch):
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+
+    with pytest.raises(gateway.AIGatewayError):
+        gateway.chat_completion([{'role': 'user', 'content': 'x'}])
+
+
+def test_retry_delay_is_capped(monkeypatch):
+    monkeypatch.setattr(gateway.random, 'uniform', lambda low, high: high)
+
+    assert gateway.retry_delay(0) == gateway.DEFAULT_SETTINGS['OPENAI_RETRY_BASE_DELAY']
+    assert gateway.retry_delay(20) == gateway.DEFAULT_SETTINGS['OPENAI_RETRY_MAX_DELAY']
+
+
+@pytest.mark.skipif(not gateway.OPENAI_AVAILABLE or gateway.is_legacy_api(),
+                    reason='openai>=1.0 が必要です')
+def test_client_is_shared(api_key):
+    gateway.reset_client()
+    try:
+        assert gateway.get_client() is gateway.get_client()
+    finally:
+        gateway.reset_client()
+
+
+def test_stream_chat_completion_retries_only_before_first_chunk(api_key, monkeypatch):
+    attempts = []
+
+    def fake_create_stream(params, api_key=None, timeout=None):
+        attempts.append(params)
+        if len(attempts) == 1:
+            raise TimeoutError('timed out')
+
+        def chunks():
+            yield 'こんに'
+            yield None
+            yield 'ちは'
+            raise TimeoutError('connection lost')
+        return chunks()
+
+    monkeypatch.setattr(gateway, 'RETRYABLE_ERRORS', (TimeoutError,))
+    monkeypatch.setattr(gateway, '_create_stream', fake_create_stream)
+    monkeypatch.setattr(gateway.time, 'sleep', lambda delay: None)
+
+    received = []
+    with pytest.raises(TimeoutError):
+        for content in gateway.stream_chat_completion([{'role': 'user', 'content': 'x'}], max_retries=2):
+            received.append(content)
+
+    assert received == ['こんに', 'ちは']
+    assert len(attempts) == 2
+
+
+def test_stream_chat_response_falls_back_to_error_message(monkeypatch):
+    import app.ai as ai
+
+    def failing_stream(messages, **kwargs):
+        raise gateway.AIGatewayError('APIキーが設定されていません')
+        yield
+
+    monkeypatch.setattr(ai, 'stream_chat_completion', failing_stream)
+
+    assert list(ai.stream_chat_response('質問')) == [ai.CHAT_ERROR_MESSAGE]
@@ -0,0 +1,179 @@
+import pytest
+from flask import g
+from werkzeug.security import generate_password_hash
+from app import db
+from app.models import BackgroundJob, User
+from basebuilder.models import (
+    ProblemCategory, TextSet, TextDelivery, BasicKnowledgeItem, AnswerRecord,
+    WordProficiency, KnowledgeThemeRelation, ProficiencyRecord, TextProficiencyRecord
+)
+from basebuilder import deletion
+
+
+def create_text(user, category, size, title='テキスト'):
+    """学習記録付きのテキストを作成"""
+    text_set = TextSet(title=title, category_id=category.id, created_by=user.id)
+    db.session.add(text_set)
+    db.session.flush()
+    db.session.add(TextDelivery(text_set_id=text_set.id, class_id=1, delivered_by=user.id))
+    db.session.add(TextProficiencyRecord(student_id=user.id, text_set_id=text_set.id, level=50))
+
+    for i in range(size):
+        problem = BasicKnowledgeItem(
+            category_id=category.id, title=f'{title}{i}', question='意味',
+            correct_answer='answer', created_by=user.id, text_set_id=text_set.id
+        )
+        db.session.add(problem)
+        db.session.flush()
+        db.session.add(WordProficiency(student_id=user.id, problem_id=problem.id, level=3))
+        db.session.add(AnswerRecord(student_id=user.id, problem_id=problem.id,
+                                    student_answer='answer', is_correct=True))
+        db.session.add(KnowledgeThemeRelation(problem_id=problem.id, theme_id=1, created_by=user.id))
+
+    db.session.commit()
+    return text_set
+
+
+def create_category(user, name='英単語'):
+    category = ProblemCategory(name=name, created_by=user.id)
+    db.session.add(category)
+    db.session.flush()
+    db.session.add(ProficiencyRecord(student_id=user.id, category_id=category.id,
+                                     level=3, level_sum=30, item_count=10))
+    db.session.commit()
+    return category
+
+
+class TestDeletionService:
+    """一括削除サービスのテスト"""
+
+    def test_delete_text_sets_keeps_other_texts(self, teacher):
+        """指定したテキストの問題と学習記録だけが削除されること"""
+        category = create_category(teacher)
+        target = create_text(teacher, category, 5, title='A')
+        other = create_text(teacher, category, 3, title='B')
+
+        result = deletion.delete_text_sets([target.id])
+
+        assert result == {'text_sets': 1, 'problems': 5}
+        assert TextSet.query.count() == 1
+        assert BasicKnowledgeItem.query.count() == 3
+        for model in (WordProficiency, AnswerRecord, KnowledgeThemeRelation):
+            assert model.query.count() == 3
+        assert TextDelivery.query.filter_by(text_set_id=other.id).count() == 1
+        assert TextProficiencyRecord.query.count() == 1
+        # カテゴリの集計値は残った単語で再計算される
+        record = ProficiencyRecord.query.one()
+        assert (record.level_sum, record.item_count, record.level) == (9, 3, 3)
+
+    def test_delete_category(self, teacher):
+        """カテゴリとそのテキスト・直下の問題がすべて削除されること"""
+        category = create_category(teacher)
+        create_text(teacher, category, 4)
+        db.session.add(BasicKnowledgeItem(category_id=category.id, title='単独', question='意味',
+                                          correct_answer='answer', created_by=teacher.id))
+        other_category = create_category(teacher, name='理科')
+        create_text(teacher, other_category, 2, title='C')
+
+        result = deletion.delete_category(category.id)
+
+        assert result == {'text_sets': 1, 'problems': 5}
+        assert ProblemCategory.query.count() == 1
+        assert BasicKnowledgeItem.query.count() == 2
+        assert ProficiencyRecord.query.count() == 1
+
+    def test_statement_count_is_per_chunk(self, teacher, query_counter, monkeypatch):
+        """問題数ではなくチャンク数に比例したSQL文で削除されること"""
+        monkeypatch.setattr(deletion, 'DELETE_CHUNK_SIZE', 50)
+        category = create_category(teacher)
+        small = create_text(teacher, category, 10, title='S')
+        large = create_text(teacher, category, 100, title='L')
+        small_id, large_id = small.id, large.id
+
+        query_counter.clear()
+        deletion.delete_text_sets([small_id])
+        small_statements = len(query_counter)
+
+        query_counter.clear()
+        progress = []
+        deletion.delete_text_sets([large_id], progress=lambda done, total: progress.append((done, total)))
+
+        # 1チャンク増えるごとにSELECT 1回 + DELETE 4回
+        assert len(query_counter) == small_statements + 5
+        assert progress == [(50, 100), (100, 100)]
+        assert BasicKnowledgeItem.query.count() == 0
+
+    def test_small_deletions_are_not_enqueued(self, teacher):
+        """しきい値以下の削除はジョブに登録しないこと"""
+        assert deletion.enqueue_if_large('basebuilder_delete_text_sets', deletion.ASYNC_THRESHOLD,
+                                         teacher.id, {'text_set_ids': [1]}) is None
+
+    def test_large_deletion_runs_as_job_of_requesting_user(self, job_app, teacher, monkeypatch):
+        """しきい値を超える削除は実行した教師のジョブとして登録され、進捗が記録されること"""
+        monkeypatch.setattr(deletion, 'ASYNC_THRESHOLD', 3)
+        category = create_category(teacher)
+        create_text(teacher, category, 4)
+
+        job = deletion.enqueue_if_large('basebuilder_delete_category', 4, teacher.id,
+                                        {'category_id': category.id})
+
+        job = db.session.get(BackgroundJob, job.id)
+        assert job.user_id == teacher.id
+        assert job.status == 'completed', job.error
+        assert (job.result['text_sets'], job.result['problems']) == (1, 4)
+        assert job.processed == job.total == 4
+        assert ProblemCategory.query.count() == 0
+
+
+@pytest.fixture
+def deletion_clients(app, tmp_path, monkeypatch):
+    """削除を実行する教師と別の教師のログイン済みクライアント"""
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['RATELIMIT_ENABLED'] = False
+    app.config['SECURE_UPLOAD_FOLDER'] = str(tmp_path)
+    app.config['BACKGROUND_JOB_BACKEND'] = 'sync'
+    monkeypatch.setattr(deletion, 'ASYNC_THRESHOLD', 3)
+
+    clients = []
+    for name in ('owner', 'other'):
+        user = User(username=name, password=generate_password_hash('pw'), email=f'{name}@test.com',
+                    role='teacher', email_confirmed=True)
+        db.session.add(user)
+        db.session.commit()
+        client = app.test_client()
+        client.post('/login', data={'username': name, 'password': 'pw'})
+        clients.append((client, user))
+    return clients
+
+
+def request_as(client, method, url):
+    """
+    クライアントのログインユーザーでリクエストする
+
+    テスト中はアプリケーションコンテキストが1つのままなので、
+    別のクライアントで読み込んだログインユーザーを g から取り除く。
+    """
+    g.pop('_login_user', None)
+    return client.open(url, method=method)
+
+
+class TestDeletionJobRoutes:
+    """大量削除の進捗ページのテスト"""
+
+    def test_progress_is_shown_only_to_requesting_teacher(self, deletion_clients):
+        (owner_client, owner), (other_client, _) = deletion_clients
+        text_set = create_text(owner, create_category(owner), 4)
+
+        response = request_as(owner_client, 'POST', f'/basebuilder/text_sets/{text_set.id}/delete')
+
+        assert response.status_code == 200
+        job = BackgroundJob.query.one()
+        assert job.user_id == owner.id
+        assert job.status == 'completed', job.error
+        assert f'/api/jobs/{job.id}'.encode() in response.data
+        assert TextSet.query.count() == 0
+
+        assert request_as(owner_client, 'GET', f'/basebuilder/deletion/{job.id}/status').status_code == 200
+        assert request_as(other_client, 'GET', f'/basebuilder/deletion/{job.id}/status').status_code == 404
+        assert request_as(owner_client, 'GET', f'/api/jobs/{job.id}').status_code == 200
+        assert request_as(other_client, 'GET', f'/api/jobs/{job.id}').status_code == 404
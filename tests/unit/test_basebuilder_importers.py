@@ -0,0 +1,112 @@
+import io
+import time
+import pytest
+from app import db
+from basebuilder.models import ProblemCategory, TextSet, BasicKnowledgeItem
+from basebuilder import importers
+
+HEADER = 'title,category,question,answer_type,correct_answer,difficulty\n'
+
+
+def make_csv(rows, category='英単語'):
+    lines = [HEADER]
+    for i in range(rows):
+        lines.append(f'word{i},{category},意味{i},text,word{i},2\n')
+    return ''.join(lines)
+
+
+class TestProblemImport:
+    """問題CSVインポートのテスト"""
+
+    def test_invalid_rows_are_reported(self, teacher):
+        """不正な行はエラーとして報告され、有効な行だけが保存されること"""
+        csv_content = HEADER + 'apple,英単語,りんご,text,apple,2\n' + 'bad,英単語,,text,bad,9\n'
+
+        success, error_count, errors = importers.import_problems_from_csv(
+            csv_content, db, ProblemCategory, BasicKnowledgeItem, teacher.id
+        )
+
+        assert (success, error_count) == (1, 1)
+        assert errors[0].startswith('行 2:')
+        assert BasicKnowledgeItem.query.one().title == 'apple'
+
+    def test_missing_header(self, teacher):
+        """必須ヘッダーがない場合は何も保存しないこと"""
+        success, error_count, errors = importers.import_problems_from_csv(
+            'title,category\napple,英単語\n', db, ProblemCategory, BasicKnowledgeItem, teacher.id
+        )
+
+        assert success == 0
+        assert 'question' in errors[0]
+        assert BasicKnowledgeItem.query.count() == 0
+
+    def test_auto_split_and_category_reuse(self, teacher):
+        """既存カテゴリを再利用し、10問ごとにテキストへ分割されること"""
+        existing = ProblemCategory(name='英単語', created_by=teacher.id)
+        db.session.add(existing)
+        db.session.flush()
+        db.session.add(TextSet(title='既存', category_id=existing.id, created_by=teacher.id))
+        db.session.commit()
+
+        csv_content = make_csv(20) + make_csv(5, category='理科').split('\n', 1)[1]
+        progress = []
+        success, error_count, _ = importers.import_problems_from_csv(
+            io.StringIO(csv_content), db, ProblemCategory, BasicKnowledgeItem, teacher.id,
+            TextSet=TextSet, progress=progress.append
+        )
+
+        assert (success, error_count) == (25, 0)
+        assert progress == [25]
+        assert ProblemCategory.query.count() == 2
+        titles = [t.title for t in TextSet.query.order_by(TextSet.id).all()]
+        assert titles == ['既存', '【英単語】No.2', '【英単語】No.3', '【理科】No.1']
+        last_text = TextSet.query.filter_by(title='【理科】No.1').one()
+        orders = [p.order_in_text for p in BasicKnowledgeItem.query.filter_by(text_set_id=last_text.id)]
+        assert sorted(orders) == list(range(1, 6))
+        assert BasicKnowledgeItem.query.filter(BasicKnowledgeItem.is_active == True).count() == 25
+
+    def test_problem_import_job_reports_progress(self, job_app, teacher):
+        """バックグラウンドジョブのハンドラが進捗を通知し、自動分割の指定を引き継ぐこと"""
+        import os
+        from types import SimpleNamespace
+        from app.utils.background_jobs import job_dir
+        from app.utils.import_jobs import UPLOAD_FILENAME
+
+        job = SimpleNamespace(id='problem-import', user_id=teacher.id,
+                              params={'auto_split': True, 'school_id': None})
+        upload_path = os.path.join(job_dir(job.id), UPLOAD_FILENAME)
+        os.makedirs(os.path.dirname(upload_path))
+        with open(upload_path, 'w', encoding='utf-8') as f:
+            f.write(make_csv(12))
+
+        progress = []
+        result = importers.run_problem_import(job, progress.append)
+
+        assert result == {'imported': 12, 'error_count': 0, 'errors': []}
+        assert progress == [12]
+        assert TextSet.query.count() == 2
+        assert not os.path.exists(upload_path)
+
+    def test_large_text_import(self, teacher, query_counter):
+        """5万語のテキストがチャンクごとの一括INSERTで短時間に保存されること"""
+        category = ProblemCategory(name='英単語', created_by=teacher.id)
+        db.session.add(category)
+        db.session.commit()
+        category_id, teacher_id = category.id, teacher.id
+        query_counter.clear()
+
+        start = time.perf_counter()
+        success, error_count, _ = importers.import_text_from_csv(
+            io.StringIO(make_csv(50000)), '', '', category_id, db, TextSet,
+            BasicKnowledgeItem, teacher_id
+        )
+        elapsed = time.perf_counter() - start
+
+        assert (success, error_count) == (50000, 0)
+        assert elapsed < 30
+        # 1,000行ずつの一括INSERT（executemany）なので文の数は行数に比例しない
+        assert len(query_counter) < 200
+        text_set = TextSet.query.one()
+        assert text_set.title == '【英単語】No.1'
+        last = BasicKnowledgeItem.query.filter_by(order_in_text=50000).one()
+        assert last.title == 'word49999'
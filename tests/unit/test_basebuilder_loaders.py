@@ -0,0 +1,231 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app import db
+from app.models import User, Class, ClassEnrollment, School
+from basebuilder.models import (
+    ProblemCategory, TextSet, TextDelivery, BasicKnowledgeItem, AnswerRecord, WordProficiency
+)
+from basebuilder import loaders
+
+
+def create_text(student, size):
+    """指定した単語数のテキストと、全単語分の熟練度・解答記録を作成"""
+    category = ProblemCategory(name=f'カテゴリ{size}', created_by=student.id)
+    db.session.add(category)
+    db.session.flush()
+
+    text_set = TextSet(title=f'テキスト{size}', category_id=category.id, created_by=student.id)
+    db.session.add(text_set)
+    db.session.flush()
+
+    problems = []
+    for i in range(size):
+        problem = BasicKnowledgeItem(
+            category_id=category.id,
+            title=f'word{i}',
+            question='意味',
+            correct_answer='answer',
+            created_by=student.id,
+            text_set_id=text_set.id,
+            order_in_text=i + 1
+        )
+        problems.append(problem)
+    db.session.add_all(problems)
+    db.session.flush()
+
+    base_time = datetime(2025, 4, 1, 9, 0, 0)
+    for i, problem in enumerate(problems):
+        db.session.add(WordProficiency(student_id=student.id, problem_id=problem.id, level=i % 6))
+        # 古い不正解と新しい正解を1件ずつ
+        db.session.add(AnswerRecord(
+            student_id=student.id, problem_id=problem.id, student_answer='x',
+            is_correct=False, timestamp=base_time
+        ))
+        db.session.add(AnswerRecord(
+            student_id=student.id, problem_id=problem.id, student_answer='answer',
+            is_correct=True, timestamp=base_time + timedelta(minutes=i + 1)
+        ))
+    db.session.commit()
+
+    return [problem.id for problem in problems]
+
+
+@pytest.fixture
+def student(model_app):
+    user = User(username='student1', password='x', email='student1@test.com', role='student')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+class TestTextProgressLoaders:
+    """テキスト詳細ページ用ローダーのテスト"""
+
+    def test_latest_answer_per_problem(self, student):
+        """問題ごとに最新の解答が返ること"""
+        problem_ids = create_text(student, 3)
+
+        answers = loaders.load_latest_answers(student.id, problem_ids)
+
+        assert set(answers) == set(problem_ids)
+        assert all(answer.is_correct for answer in answers.values())
+
+    def test_missing_records_are_omitted(self, student):
+        """記録がない問題は熟練度・解答ともにNone扱いになること"""
+        problem_ids = create_text(student, 2)
+        unknown_id = max(problem_ids) + 100
+
+        word_proficiencies, answers = loaders.load_text_progress(student.id, problem_ids + [unknown_id])
+
+        assert unknown_id not in word_proficiencies
+        assert answers[unknown_id] is None
+
+    @pytest.mark.parametrize('size', [5, 200])
+    def test_query_count_does_not_depend_on_text_size(self, student, query_counter, size):
+        """単語数に関係なく2クエリで取得できること"""
+        problem_ids = create_text(student, size)
+        student_id = student.id
+        db.session.expire_all()
+        query_counter.clear()
+
+        word_proficiencies, answers = loaders.load_text_progress(student_id, problem_ids)
+
+        assert len(query_counter) == 2
+        assert len(word_proficiencies) == size
+        assert len(answers) == size
+
+    def test_latest_answers_since(self, student):
+        """since以降に解答がない問題は含まれないこと"""
+        problem_ids = create_text(student, 3)
+
+        # 2問目以降の正解のみが対象になる時刻
+        since = datetime(2025, 4, 1, 9, 2, 0)
+        answers = loaders.load_latest_answers(student.id, problem_ids, since=since)
+
+        assert set(answers) == set(problem_ids[1:])
+
+    def test_recent_answers_limit(self, student, query_counter):
+        """問題ごとに新しい順でlimit件まで1クエリで取得できること"""
+        problem_ids = create_text(student, 4)
+        student_id = student.id
+        query_counter.clear()
+
+        recent = loaders.load_recent_answers(student_id, problem_ids, 1)
+
+        assert len(query_counter) == 1
+        assert set(recent) == set(problem_ids)
+        assert all(len(records) == 1 and records[0].is_correct for records in recent.values())
+
+        recent = loaders.load_recent_answers(student_id, problem_ids, 5)
+        assert all([r.is_correct for r in records] == [True, False] for records in recent.values())
+
+    def test_answered_counts_by_text(self, student):
+        """テキストごとに解答済みの問題数（重複なし）が返ること"""
+        problem_ids = create_text(student, 3)
+        text_set_id = BasicKnowledgeItem.query.get(problem_ids[0]).text_set_id
+
+        counts = loaders.count_answered_problems_by_text(student.id, [text_set_id, text_set_id + 100])
+
+        assert counts == {text_set_id: 3}
+
+
+class TestAnswerHistoryLoaders:
+    """解答履歴のページングと集計のテスト"""
+
+    def test_keyset_pages_cover_history(self, student):
+        """同じ時刻の解答を含めて、重複や欠落なく新しい順にページングできること"""
+        create_text(student, 7)
+
+        seen = []
+        records, cursor = loaders.load_answer_page(student.id, per_page=4)
+        seen.extend(records)
+        while cursor:
+            records, cursor = loaders.load_answer_page(student.id, cursor=cursor, per_page=4)
+            seen.extend(records)
+
+        assert len(seen) == 14
+        assert len({record.id for record in seen}) == 14
+        keys = [(record.timestamp, record.id) for record in seen]
+        assert keys == sorted(keys, reverse=True)
+
+    def test_invalid_cursor_starts_from_latest(self, student):
+        """不正なカーソルは最新のページとして扱うこと"""
+        create_text(student, 2)
+
+        records, cursor = loaders.load_answer_page(student.id, cursor='broken', per_page=10)
+
+        assert len(records) == 4
+        assert cursor is None
+
+    def test_counts_and_category_stats(self, student):
+        """解答数・正解数とカテゴリ別の集計がSQLで求められること"""
+        create_text(student, 3)
+        create_text(student, 2)
+
+        assert loaders.count_answers(student.id) == (10, 5)
+
+        stats = loaders.answer_stats_by_category(student.id)
+        assert sorted(s['total'] for s in stats.values()) == [4, 6]
+        assert all(s['correct'] == s['incorrect'] and s['accuracy'] == 50 for s in stats.values())
+
+
+@pytest.fixture
+def student_client(app):
+    """テキストを配信したクラスの生徒としてログインしたクライアント"""
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['RATELIMIT_ENABLED'] = False
+    school = School(name='テスト学校', code='TEST001')
+    db.session.add(school)
+    db.session.flush()
+    teacher = User(username='teacher1', password='x', email='teacher1@test.com', role='teacher',
+                   school_id=school.id)
+    student = User(username='student1', password=generate_password_hash('pw'), email='student1@test.com',
+                   role='student', school_id=school.id, email_confirmed=True, is_approved=True)
+    db.session.add_all([teacher, student])
+    db.session.flush()
+    class_obj = Class(name='1年A組', teacher_id=teacher.id, school_id=school.id)
+    db.session.add(class_obj)
+    db.session.flush()
+    db.session.add(ClassEnrollment(class_id=class_obj.id, student_id=student.id))
+    db.session.commit()
+
+    def deliver(size):
+        problem_ids = create_text(student, size)
+        text_set_id = db.session.get(BasicKnowledgeItem, problem_ids[0]).text_set_id
+        db.session.add(TextDelivery(text_set_id=text_set_id, class_id=class_obj.id, delivered_by=teacher.id))
+        db.session.commit()
+        return text_set_id
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'student1', 'password': 'pw'})
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    yield client, deliver, statements
+    event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+class TestViewTextSetRoute:
+    """テキスト詳細ページのテスト"""
+
+    def test_query_count_does_not_depend_on_text_size(self, student_client):
+        """ページの表示（テンプレートの描画を含む）のクエリ数が単語数に比例しないこと"""
+        client, deliver, statements = student_client
+        counts = {}
+        for size in (5, 200):
+            text_set_id = deliver(size)
+            db.session.expire_all()
+            statements.clear()
+
+            response = client.get(f'/basebuilder/text_set/{text_set_id}')
+
+            assert response.status_code == 200
+            assert f'word{size - 1}' in response.get_data(as_text=True)
+            counts[size] = len(statements)
+
+        assert counts[5] == counts[200]
@@ -0,0 +1,257 @@
+import pytest
+from sqlalchemy import event, insert
+from werkzeug.security import generate_password_hash
+from app import db
+from app.models import User, School
+from basebuilder.models import (
+    ProblemCategory, TextSet, BasicKnowledgeItem, WordProficiency,
+    ProficiencyRecord, TextProficiencyRecord
+)
+from basebuilder import proficiency
+from basebuilder.importers import import_problems_from_csv
+
+
+def create_users(school_id=None):
+    teacher = User(username='teacher1', password=generate_password_hash('pw'), email='teacher1@test.com',
+                   role='teacher', school_id=school_id)
+    student = User(username='student1', password=generate_password_hash('pw'), email='student1@test.com',
+                   role='student', school_id=school_id)
+    db.session.add_all([teacher, student])
+    db.session.commit()
+    return teacher, student
+
+
+def create_problem(teacher, category, text_set=None, title='word'):
+    problem = BasicKnowledgeItem(
+        category_id=category.id, title=title, question='意味', correct_answer='answer',
+        created_by=teacher.id, school_id=teacher.school_id,
+        text_set_id=text_set.id if text_set else None
+    )
+    db.session.add(problem)
+    db.session.commit()
+    return problem
+
+
+def create_text(teacher, size=2, name='英単語'):
+    """カテゴリとテキスト（size 語）を作成"""
+    category = ProblemCategory(name=name, created_by=teacher.id, school_id=teacher.school_id)
+    db.session.add(category)
+    db.session.flush()
+    text_set = TextSet(title='テキスト', category_id=category.id, created_by=teacher.id,
+                       school_id=teacher.school_id)
+    db.session.add(text_set)
+    db.session.commit()
+    problems = [create_problem(teacher, category, text_set, title=f'word{i}') for i in range(size)]
+    return category, text_set, problems
+
+
+def answer(student, problem, is_correct=True, times=1):
+    for _ in range(times):
+        proficiency.record_answer(student.id, problem, 'answer', is_correct)
+
+
+def assert_consistent():
+    assert proficiency.verify_aggregates('category') == []
+    assert proficiency.verify_aggregates('text') == []
+    # 保存されている熟練度が集計値と一致する（変更前の熟練度が残っていない）
+    for scope, spec in proficiency.SCOPES.items():
+        for record in spec['model'].query.all():
+            assert record.level == spec['level'](record.level_sum, record.item_count), (scope, record.id)
+
+
+@pytest.fixture
+def users(model_app):
+    return create_users()
+
+
+class TestAggregates:
+    """集計値の差分更新と無効化のテスト"""
+
+    def test_answers_update_aggregates_by_delta(self, users):
+        """解答のたびに変化量だけが集計値に反映されること"""
+        teacher, student = users
+        category, text_set, problems = create_text(teacher, size=2)
+
+        answer(student, problems[0], times=3)
+        answer(student, problems[1], times=2)
+        answer(student, problems[1], is_correct=False)
+
+        record = ProficiencyRecord.query.one()
+        assert (record.level_sum, record.item_count, record.level) == (4, 2, 2)
+        text_record = TextProficiencyRecord.query.one()
+        assert (text_record.level_sum, text_record.item_count, text_record.level) == (4, 2, 40)
+        assert_consistent()
+
+    def test_verify_reports_drift_and_rebuild_fixes_it(self, users):
+        """無効化せずに問題を追加するとずれが検出され、再構築で修正されること"""
+        teacher, student = users
+        category, text_set, problems = create_text(teacher, size=2)
+        answer(student, problems[0], times=2)
+
+        create_problem(teacher, category, title='added')
+
+        drift = proficiency.verify_aggregates('category')
+        assert [(sid, scope_id, stored[:2], expected[:2]) for sid, scope_id, stored, expected in drift] == [
+            (student.id, category.id, (2, 2), (2, 3))
+        ]
+
+        proficiency.rebuild_aggregates('category')
+        assert_consistent()
+
+    def test_refreshed_aggregate_reflects_added_problem(self, users):
+        """問題を追加した範囲を再計算すると、次の解答を待たずに単語数と熟練度が更新されること"""
+        teacher, student = users
+        category, text_set, problems = create_text(teacher, size=2)
+        answer(student, problems[0], times=2)
+        assert ProficiencyRecord.query.one().level == 1
+
+        create_problem(teacher, category, text_set, title='added')
+        proficiency.refresh_aggregates(category_ids=[category.id], text_set_ids=[text_set.id])
+        db.session.commit()
+
+        record = ProficiencyRecord.query.one()
+        assert (record.level_sum, record.item_count, record.level) == (2, 3, 0)
+        text_record = TextProficiencyRecord.query.one()
+        assert (text_record.level_sum, text_record.item_count, text_record.level) == (2, 3, 13)
+        assert_consistent()
+
+        answer(student, problems[1])
+
+        assert ProficiencyRecord.query.one().item_count == 3
+        assert TextProficiencyRecord.query.one().item_count == 3
+        assert_consistent()
+
+    def test_deactivated_word_does_not_push_text_level_over_100(self, users):
+        """単語を無効にした後もテキストの定着度が100%を超えないこと"""
+        teacher, student = users
+        category, text_set, problems = create_text(teacher, size=2)
+        answer(student, problems[0], times=5)
+        answer(student, problems[1], times=4)
+
+        problems[1].is_active = False
+        proficiency.refresh_aggregates(text_set_ids=[text_set.id])
+        db.session.commit()
+        answer(student, problems[0])
+        answer(student, problems[0], is_correct=False)
+
+        text_record = TextProficiencyRecord.query.one()
+        assert (text_record.level_sum, text_record.item_count, text_record.level) == (4, 1, 80)
+        assert_consistent()
+
+    def test_problem_import_refreshes_categories(self, users):
+        """既存のカテゴリに問題をインポートすると集計値が再計算されること"""
+        teacher, student = users
+        category, text_set, problems = create_text(teacher, size=2)
+        answer(student, problems[0])
+
+        csv_content = ('title,category,question,answer_type,correct_answer,difficulty\n'
+                       f'new,{category.name},意味,text,answer,2\n')
+        success_count, error_count, errors = import_problems_from_csv(
+            csv_content, db, ProblemCategory, BasicKnowledgeItem, teacher.id
+        )
+
+        assert (success_count, error_count) == (1, 0)
+        assert ProficiencyRecord.query.one().item_count == 3
+        assert_consistent()
+        answer(student, problems[0])
+        assert ProficiencyRecord.query.one().item_count == 3
+        assert_consistent()
+
+
+class TestUpdateWordProficiency:
+    """単語熟練度の更新のテスト"""
+
+    def test_concurrent_first_answer_updates_existing_record(self, users):
+        """検索後に別のリクエストがレコードを作成していた場合は、そのレコードを更新すること"""
+        teacher, student = users
+        category, text_set, problems = create_text(teacher, size=1)
+        problem_id = problems[0].id
+        competed = []
+
+        def insert_after_lookup(orm_execute_state):
+            # 最初の検索の直後に、同じ単語への解答で作成されたレコードを追加する
+            if competed or not orm_execute_state.is_select:
+                return None
+            if WordProficiency not in [mapper.class_ for mapper in orm_execute_state.all_mappers]:
+                return None
+            result = orm_execute_state.invoke_statement()
+            orm_execute_state.session.connection().execute(
+                insert(WordProficiency).values(student_id=student.id, problem_id=problem_id, level=3)
+            )
+            competed.append(True)
+            return result
+
+        event.listen(db.session, 'do_orm_execute', insert_after_lookup)
+        try:
+            answer(student, problems[0])
+        finally:
+            event.remove(db.session, 'do_orm_execute', insert_after_lookup)
+
+        assert competed
+        assert [(wp.level, wp.review_date is not None) for wp in WordProficiency.query.all()] == [(4, True)]
+
+
+@pytest.fixture
+def teacher_client(app):
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['RATELIMIT_ENABLED'] = False
+    school = School(name='テスト学校', code='TEST001')
+    db.session.add(school)
+    db.session.commit()
+    teacher, student = create_users(school.id)
+    teacher.email_confirmed = True
+    db.session.commit()
+    client = app.test_client()
+    client.post('/login', data={'username': 'teacher1', 'password': 'pw'})
+    return client, teacher, student
+
+
+class TestProblemRoutes:
+    """問題の作成・編集・削除で集計値が再計算されることのテスト"""
+
+    def _stored(self):
+        """範囲ごとの (単語数, 熟練度)"""
+        return (
+            {r.category_id: (r.item_count, r.level) for r in ProficiencyRecord.query.all()},
+            {r.text_set_id: (r.item_count, r.level) for r in TextProficiencyRecord.query.all()},
+        )
+
+    def _form(self, category_id, **overrides):
+        form = {'category_id': category_id, 'title': 'word', 'question': '意味',
+                'answer_type': 'text', 'correct_answer': 'answer', 'is_active': 'y'}
+        form.update(overrides)
+        return form
+
+    def test_create_edit_delete_refresh_aggregates(self, teacher_client):
+        """単語数が変わったカテゴリ・テキストの単語数と熟練度が、次の解答を待たずに更新されること"""
+        client, teacher, student = teacher_client
+        category, text_set, problems = create_text(teacher, size=2, name='英単語')
+        other, other_text, other_problems = create_text(teacher, size=1, name='古文')
+        for problem in problems + other_problems:
+            answer(student, problem)
+        assert self._stored() == ({category.id: (2, 1), other.id: (1, 1)},
+                                  {text_set.id: (2, 20), other_text.id: (1, 20)})
+
+        # 追加
+        client.post('/basebuilder/problem/create', data=self._form(category.id))
+        assert self._stored()[0] == {category.id: (3, 0), other.id: (1, 1)}
+        assert_consistent()
+
+        # 別のカテゴリへの移動
+        client.post(f'/basebuilder/problem/{problems[1].id}/edit', data=self._form(other.id))
+        assert self._stored()[0] == {category.id: (2, 0), other.id: (2, 1)}
+        assert_consistent()
+
+        # 無効化
+        form = self._form(other.id)
+        del form['is_active']
+        client.post(f'/basebuilder/problem/{problems[1].id}/edit', data=form)
+        assert self._stored()[1] == {text_set.id: (1, 20), other_text.id: (1, 20)}
+        assert_consistent()
+
+        # 削除
+        client.post(f'/basebuilder/problem/{problems[0].id}/delete')
+        assert db.session.get(BasicKnowledgeItem, problems[0].id) is None
+        assert self._stored() == ({category.id: (1, 0), other.id: (2, 1)},
+                                  {text_set.id: (0, 0), other_text.id: (1, 20)})
+        assert_consistent()
@@ -0,0 +1,104 @@
+import pytest
+from datetime import date, timedelta
+from app import db
+from app.models import User, ClassEnrollment
+from basebuilder.models import (
+    ProblemCategory, TextSet, TextDelivery, BasicKnowledgeItem, WordProficiency
+)
+from basebuilder import review_queue
+
+TODAY = date(2025, 4, 10)
+CLASS_ID = 1
+
+
+@pytest.fixture
+def student(model_app):
+    user = User(username='student1', password='x', email='student1@test.com', role='student')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(ClassEnrollment(class_id=CLASS_ID, student_id=user.id))
+    db.session.commit()
+    return user
+
+
+def create_text(student, review_offsets, delivered=True, title='テキスト'):
+    """単語ごとに今日からの日数で復習日を指定してテキストを作成"""
+    category = ProblemCategory(name=f'{title}カテゴリ', created_by=student.id)
+    db.session.add(category)
+    db.session.flush()
+
+    text_set = TextSet(title=title, category_id=category.id, created_by=student.id)
+    db.session.add(text_set)
+    db.session.flush()
+
+    if delivered:
+        db.session.add(TextDelivery(text_set_id=text_set.id, class_id=CLASS_ID, delivered_by=student.id))
+
+    problem_ids = []
+    for i, offset in enumerate(review_offsets):
+        problem = BasicKnowledgeItem(
+            category_id=category.id, title=f'{title}{i}', question='意味',
+            correct_answer='answer', created_by=student.id,
+            text_set_id=text_set.id, order_in_text=i + 1
+        )
+        db.session.add(problem)
+        db.session.flush()
+        db.session.add(WordProficiency(
+            student_id=student.id, problem_id=problem.id, level=1,
+            review_date=TODAY + timedelta(days=offset)
+        ))
+        problem_ids.append(problem.id)
+
+    db.session.commit()
+    return text_set, problem_ids
+
+
+class TestReviewQueue:
+    """復習キューのテスト"""
+
+    def test_most_overdue_first_and_delivered_only(self, student):
+        """期限切れの古い順に、配信済みテキストの単語だけが返ること"""
+        _, problem_ids = create_text(student, [0, -3, 2, -1])
+        create_text(student, [-10], delivered=False, title='未配信')
+
+        due = review_queue.get_due_problem_ids(student.id, today=TODAY)
+
+        assert due == [problem_ids[1], problem_ids[3], problem_ids[0]]
+
+    def test_left_class_and_withdrawn_delivery_are_excluded(self, student):
+        """退出したクラスの配信や、配信を解除したテキストの単語は返らないこと"""
+        _, kept_ids = create_text(student, [-2], title='A')
+        withdrawn, _ = create_text(student, [-3], title='B')
+        left_class, _ = create_text(student, [-4], delivered=False, title='C')
+        db.session.add(ClassEnrollment(class_id=CLASS_ID + 1, student_id=student.id, is_active=False))
+        db.session.add(TextDelivery(text_set_id=left_class.id, class_id=CLASS_ID + 1, delivered_by=student.id))
+        TextDelivery.query.filter_by(text_set_id=withdrawn.id).delete()
+        db.session.commit()
+
+        assert review_queue.get_due_problem_ids(student.id, today=TODAY) == kept_ids
+        assert review_queue.count_due(student.id, today=TODAY) == 1
+
+    def test_paging_and_filters(self, student):
+        """ページングとテキスト・カテゴリでの絞り込みができること"""
+        text_a, ids_a = create_text(student, [-5, -4, -3], title='A')
+        text_b, ids_b = create_text(student, [-6], title='B')
+
+        first = review_queue.get_due_items(student.id, limit=2, offset=0, today=TODAY)
+        second = review_queue.get_due_items(student.id, limit=2, offset=2, today=TODAY)
+        assert [wp.problem_id for wp, _ in first] == [ids_b[0], ids_a[0]]
+        assert [wp.problem_id for wp, _ in second] == [ids_a[1], ids_a[2]]
+
+        assert review_queue.get_due_problem_ids(student.id, text_set_id=text_b.id, today=TODAY) == ids_b
+        assert review_queue.count_due(student.id, category_id=text_a.category_id, today=TODAY) == 3
+
+    def test_due_count_summary(self, student):
+        """期限切れは今日に含め、日ごとの復習予定件数を返すこと"""
+        create_text(student, [-2, 0, 1, 1, 9])
+
+        summary = review_queue.due_count_summary(student.id, days=3, today=TODAY)
+
+        assert summary == [
+            {'date': TODAY, 'count': 2},
+            {'date': TODAY + timedelta(days=1), 'count': 2},
+            {'date': TODAY + timedelta(days=2), 'count': 0},
+        ]
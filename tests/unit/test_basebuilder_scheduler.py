@@ -0,0 +1,111 @@
+import pytest
+from datetime import date, timedelta
+from app import db
+from app.models import User, School
+from basebuilder.models import ProblemCategory, BasicKnowledgeItem, WordProficiency
+from basebuilder import proficiency, scheduler
+
+TODAY = date(2025, 4, 10)
+
+
+class TestSchedulers:
+    """復習スケジューラのテスト"""
+
+    def test_ladder_intervals(self):
+        """固定間隔方式は熟練度ごとの間隔を返すこと"""
+        ladder = scheduler.SCHEDULERS['ladder']
+        for level, days in enumerate([0, 1, 3, 7, 14, 30]):
+            wp = WordProficiency(level=level)
+            assert ladder.schedule(wp, True, TODAY) == TODAY + timedelta(days=days)
+
+    def test_sm2_sequence(self):
+        """SM-2は1日→6日→間隔×易しさ係数と伸び、不正解で1日に戻ること"""
+        sm2 = scheduler.SCHEDULERS['sm2']
+        wp = WordProficiency(level=0)
+
+        intervals = [(sm2.schedule(wp, correct, TODAY) - TODAY).days
+                     for correct in [True, True, True, False, True]]
+
+        assert intervals == [1, 6, 15, 1, 1]
+        assert wp.repetitions == 1
+        assert wp.ease_factor == pytest.approx(2.5 - 0.54)
+
+    def test_batch_matches_single(self):
+        """schedule_batch は schedule を1件ずつ適用した結果と一致すること"""
+        np = pytest.importorskip('numpy')
+        answers = [True, True, False, True, True, True, False, False, True]
+
+        for target in scheduler.SCHEDULERS.values():
+            wp = WordProficiency(level=0)
+            state = {
+                'level': np.zeros(1, dtype=np.int64),
+                'ease_factor': np.full(1, 2.5),
+                'interval_days': np.zeros(1, dtype=np.int64),
+                'repetitions': np.zeros(1, dtype=np.int64),
+            }
+            for correct in answers:
+                wp.level = max(0, min(5, wp.level + (1 if correct else -1)))
+                expected = (target.schedule(wp, correct, TODAY) - TODAY).days
+
+                state['level'] = np.clip(state['level'] + (1 if correct else -1), 0, 5)
+                interval = target.schedule_batch(state, np.array([correct]))
+                assert int(interval[0]) == expected
+
+
+class TestSchoolScheduler:
+    """学校ごとのスケジューラ設定のテスト"""
+
+    def test_update_uses_school_setting(self, model_app):
+        """学校で sm2 を設定すると解答時にSM-2の状態が更新されること"""
+        school = School(name='テスト学校', review_scheduler='sm2')
+        db.session.add(school)
+        db.session.flush()
+        student = User(username='student1', password='x', email='s1@test.com',
+                       role='student', school_id=school.id)
+        db.session.add(student)
+        db.session.flush()
+        category = ProblemCategory(name='英単語', created_by=student.id)
+        db.session.add(category)
+        db.session.flush()
+        problem = BasicKnowledgeItem(category_id=category.id, title='apple', question='りんご',
+                                     correct_answer='apple', created_by=student.id)
+        db.session.add(problem)
+        db.session.commit()
+
+        wp, delta, _ = proficiency.update_word_proficiency(student.id, problem.id, True)
+
+        assert delta == 1
+        assert wp.repetitions == 1
+        assert wp.interval_days == 1
+
+    def test_default_from_config(self, model_app):
+        """学校の設定がなければアプリ設定の既定値を使うこと"""
+        model_app.config['BASEBUILDER_SCHEDULER'] = 'sm2'
+        assert scheduler.get_scheduler(None).name == 'sm2'
+        assert scheduler.get_scheduler('ladder').name == 'ladder'
+
+
+class TestSimulator:
+    """解答履歴シミュレータのテスト"""
+
+    def test_replay_counts_due_answers(self):
+        """復習日以降の解答だけが定着率の計算に使われること"""
+        np = pytest.importorskip('numpy')
+        from basebuilder import simulator
+
+        # 学生1: 単語10を0日目に正解（次回1日後）→ 0日目に再び正解（期限前、次回3日後）→ 4日目に不正解（期限後）
+        # 学生2: 単語10を0日目に不正解（次回0日後）→ 1日目に正解（期限後）
+        history = {
+            'student_id': np.array([1, 2, 1, 2, 1]),
+            'problem_id': np.array([10, 10, 10, 10, 10]),
+            'day': np.array([0, 0, 0, 1, 4]),
+            'is_correct': np.array([True, False, True, True, False]),
+        }
+
+        result = simulator.replay(history, scheduler.SCHEDULERS['ladder'])
+
+        assert result['answers'] == 5
+        assert result['students'] == 2
+        assert result['early_answers'] == 1
+        assert result['due_answers'] == 2
+        assert result['retention'] == pytest.approx(0.5)
@@ -0,0 +1,132 @@
+import pytest
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.ai import build_chat_messages, context
+from app.models import ChatHistory, ChatSummary, School, User
+
+
+@pytest.fixture
+def chat_user(model_app):
+    model_app.config['CHAT_CONTEXT_TOKEN_BUDGET'] = 100
+    model_app.config['CHAT_SUMMARY_ENABLED'] = False
+
+    school = School(name='テスト学校', code='TEST001')
+    db.session.add(school)
+    db.session.flush()
+    user = User(username='student', email='student@test.com', password='x',
+                role='student', school_id=school.id)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def _add_turns(user, messages):
+    for index, message in enumerate(messages):
+        db.session.add(ChatHistory(user_id=user.id, message=message, is_user=index % 2 == 0))
+    db.session.commit()
+
+
+def test_count_tokens_estimates_without_tokenizer(monkeypatch):
+    monkeypatch.setattr(context, 'TIKTOKEN_AVAILABLE', False)
+
+    assert context.count_tokens('') == 0
+    assert context.count_tokens('abcdefgh') == 2
+    assert context.count_tokens('探究学習') == 4
+
+
+def test_pack_turns_keeps_newest_turns_within_budget(monkeypatch):
+    monkeypatch.setattr(context, 'TIKTOKEN_AVAILABLE', False)
+    turns = [{'is_user': True, 'message': 'あ' * 50},
+             {'is_user': False, 'message': 'い' * 20},
+             {'is_user': True, 'message': 'う' * 20}]
+
+    packed = context.pack_turns(turns, budget=50)
+
+    assert [turn['message'] for turn in packed] == ['い' * 20, 'う' * 20]
+
+
+def test_build_chat_context_schedules_summary_for_dropped_turns(chat_user, monkeypatch):
+    monkeypatch.setattr(context, 'TIKTOKEN_AVAILABLE', False)
+    scheduled = []
+    monkeypatch.setattr(context, 'schedule_summary_refresh', lambda *key: scheduled.append(key))
+    _add_turns(chat_user, ['長い質問' * 40, '長い回答' * 40, '質問2' * 40, '回答2' * 40, '質問3', '回答3'])
+
+    turns, summary = context.build_chat_context(chat_user.id, None)
+
+    assert [turn['message'] for turn in turns] == ['質問3', '回答3']
+    assert summary is None
+    assert scheduled == [(chat_user.id, None)]
+
+
+def test_refresh_chat_summary_folds_dropped_turns(chat_user, monkeypatch):
+    monkeypatch.setattr(context, 'TIKTOKEN_AVAILABLE', False)
+    prompts = []
+
+    def fake_completion(messages, **kwargs):
+        prompts.append(messages[0]['content'])
+        return '自由研究のテーマを相談している'
+
+    monkeypatch.setattr(context, 'chat_completion', fake_completion)
+    _add_turns(chat_user, ['長い質問' * 40, '長い回答' * 40, '質問2' * 40, '回答2' * 40, '質問3', '回答3'])
+
+    assert context.refresh_chat_summary(chat_user.id, None) is True
+
+    saved = ChatSummary.query.filter_by(user_id=chat_user.id, class_id=None).one()
+    assert saved.summary == '自由研究のテーマを相談している'
+    assert '長い質問' in prompts[0] and '質問3' not in prompts[0]
+
+    turns, summary = context.build_chat_context(chat_user.id, None)
+    assert summary == saved.summary
+    assert turns[-1]['message'] == '回答3'
+
+    # 要約に入っていない予算外の発言がなければ更新しない
+    assert context.refresh_chat_summary(chat_user.id, None) is False
+
+
+def test_refresh_chat_summary_pages_forward_without_skipping_turns(chat_user, monkeypatch):
+    monkeypatch.setattr(context, 'TIKTOKEN_AVAILABLE', False)
+    monkeypatch.setattr(context, 'SUMMARY_INPUT_TOKENS', 60)
+    current_app.config['CHAT_HISTORY_LIMIT'] = 5
+    prompts = []
+
+    def fake_completion(messages, **kwargs):
+        prompts.append(messages[0]['content'])
+        return f'要約{len(prompts)}'
+
+    monkeypatch.setattr(context, 'chat_completion', fake_completion)
+    # 予算に入るのは最後の2つだけで、要約に入っていない発言が CHAT_HISTORY_LIMIT より多い
+    messages = [f'発言{i:02d}' + 'あ' * 15 for i in range(20)]
+    _add_turns(chat_user, messages)
+
+    while context.refresh_chat_summary(chat_user.id, None):
+        pass
+
+    # 最も古い発言から順に、読み飛ばさずに要約している
+    summarized = [message for message in messages if any(message in prompt for prompt in prompts)]
+    assert len(prompts) > 1
+    assert summarized == messages[:len(summarized)]
+    assert len(summarized) > current_app.config['CHAT_HISTORY_LIMIT'] * 2
+    last_summarized = ChatHistory.query.filter_by(message=summarized[-1]).one()
+    assert ChatSummary.query.one().last_message_id == last_summarized.id
+
+
+def test_chat_summary_is_unique_without_class(chat_user):
+    db.session.add(ChatSummary(user_id=chat_user.id, class_id=None, class_key=ChatSummary.key_for(None)))
+    db.session.commit()
+    db.session.add(ChatSummary(user_id=chat_user.id, class_id=None, class_key=ChatSummary.key_for(None)))
+
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_build_chat_messages_includes_summary_and_packs_context():
+    context_data = [{'is_user': True, 'message': 'あ' * 3000},
+                    {'is_user': False, 'message': '最近の回答'}]
+
+    messages = build_chat_messages('次の質問', context_data, summary='これまでの要約')
+
+    assert messages[1] == {'role': 'system', 'content': '【これまでの会話の要約】\nこれまでの要約'}
+    assert [message['content'] for message in messages[2:]] == ['最近の回答', '次の質問']
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from app import ai, db
+from app.api import api_bp
+from app.models import ChatHistory, School, User
+from extensions import limiter, login_manager
+
+
+@pytest.fixture
+def student_client(model_app):
+    """チャットAPIだけを登録したアプリに生徒としてログインしたクライアント"""
+    model_app.config['SECRET_KEY'] = 'test'
+    model_app.config['RATELIMIT_ENABLED'] = False
+    login_manager.init_app(model_app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    limiter.init_app(model_app)
+    model_app.register_blueprint(api_bp)
+
+    school = School(name='テスト学校', code='TEST001')
+    db.session.add(school)
+    db.session.flush()
+    student = User(username='student1', password='x', email='student1@test.com',
+                   role='student', school_id=school.id)
+    db.session.add(student)
+    db.session.commit()
+    client = model_app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(student.id)
+    return client
+
+
+def _events(response):
+    """SSEの応答を (イベント名, データ) のリストにする"""
+    events = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        if not block:
+            continue
+        event = 'message'
+        data = None
+        for line in block.split('\n'):
+            if line.startswith('event: '):
+                event = line[len('event: '):]
+            elif line.startswith('data: '):
+                data = json.loads(line[len('data: '):])
+        events.append((event, data))
+    return events
+
+
+def test_stream_saves_completed_answer(student_client, monkeypatch):
+    monkeypatch.setattr(ai, 'stream_chat_completion', lambda *args, **kwargs: iter(['探究の', 'テーマ']))
+
+    response = student_client.post('/api/chat/stream', json={'message': '質問'})
+
+    assert _events(response) == [('message', {'delta': '探究の'}), ('message', {'delta': 'テーマ'}),
+                                 ('done', {'message': '探究のテーマ'})]
+    assert [history.message for history in ChatHistory.query.order_by(ChatHistory.id)] == ['質問', '探究のテーマ']
+
+
+def test_stream_failure_after_first_chunk_reports_error_without_saving(student_client, monkeypatch):
+    def failing_stream(*args, **kwargs):
+        yield '探究の'
+        raise ai.AIGatewayError('connection reset')
+
+    monkeypatch.setattr(ai, 'stream_chat_completion', failing_stream)
+
+    response = student_client.post('/api/chat/stream', json={'message': '質問'})
+
+    events = _events(response)
+    assert events[0] == ('message', {'delta': '探究の'})
+    assert [event for event, _ in events[1:]] == ['error']
+    # 途中までの応答は通常の返答として保存しない
+    assert ChatHistory.query.count() == 0
+
+
+def test_stream_closed_by_browser_does_not_save_partial_answer(student_client, monkeypatch):
+    monkeypatch.setattr(ai, 'stream_chat_completion', lambda *args, **kwargs: iter(['探究の', 'テーマ']))
+
+    response = student_client.post('/api/chat/stream', json={'message': '質問'}, buffered=False)
+    first = next(iter(response.response))
+    # 最初の断片を受け取った後にブラウザが切断した
+    response.close()
+
+    assert '探究の' in (first.decode() if isinstance(first, bytes) else first)
+    assert ChatHistory.query.count() == 0
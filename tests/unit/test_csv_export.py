@@ -0,0 +1,41 @@
+import csv
+import io
+import json
+
+from basebuilder import exporters
+from app.utils import csv_export
+
+
+def test_iter_csv_starts_with_bom_and_flushes_in_chunks(monkeypatch):
+    monkeypatch.setattr(csv_export, 'FLUSH_SIZE', 100)
+    rows = ([i, f'名前{i}', None] for i in range(50))
+
+    chunks = list(csv_export.iter_csv(['id', 'name', 'memo'], rows))
+
+    assert len(chunks) > 1
+    body = ''.join(chunks)
+    assert body.startswith(csv_export.UTF8_BOM)
+    parsed = list(csv.reader(io.StringIO(body[len(csv_export.UTF8_BOM):])))
+    assert parsed[0] == ['id', 'name', 'memo']
+    assert parsed[1] == ['0', '名前0', '']
+    assert len(parsed) == 51
+
+
+def test_csv_response_sets_japanese_filename(model_app):
+    with model_app.test_request_context():
+        response = csv_export.csv_response('活動記録.csv', ['a'], iter([[1]]))
+
+    assert response.mimetype == 'text/csv'
+    disposition = response.headers['Content-Disposition']
+    assert 'filename="' in disposition
+    assert "filename*=UTF-8''" in disposition
+
+
+def test_problem_csv_row_matches_import_headers():
+    choices = json.dumps([{'id': 'choice_0', 'text': 'She is a beautiful woman.'}])
+
+    row = exporters.problem_csv_row('beautiful', '形容詞', '美しい', 'text', 'ビューティフル',
+                                    choices, None, 2)
+
+    assert len(row) == len(exporters.PROBLEM_CSV_HEADERS)
+    assert row[5:9] == ['She is a beautiful woman.', '', '', '']
@@ -0,0 +1,199 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import (
+    ActivityLog, ChatHistory, Class, ClassEnrollment, DailyReportDelivery, DailyReportRun,
+    Goal, School, Todo, User
+)
+from app.models.subject import Subject
+
+daily_report = pytest.importorskip('app.tasks.daily_report')
+if not daily_report.CELERY_AVAILABLE:
+    pytest.skip('Celery が必要です', allow_module_level=True)
+
+
+@pytest.fixture
+def report_data(model_app):
+    today = date(2026, 10, 16)
+    noon = datetime(2026, 10, 16, 12, 0)
+
+    school = School(name='テスト学校', code='TEST001')
+    db.session.add(school)
+    db.session.flush()
+
+    teacher = User(username='teacher', email='teacher@test.com', password='x',
+                   role='teacher', school_id=school.id, is_approved=True)
+    students = [User(username=f'student{i}', email=f'student{i}@test.com', password='x',
+                     role='student', school_id=school.id, is_approved=True) for i in range(4)]
+    subject = Subject(name='理科', code='SCI')
+    db.session.add_all([teacher, subject] + students)
+    db.session.flush()
+
+    class_obj = Class(name='1年A組', teacher_id=teacher.id, school_id=school.id, subject_id=subject.id)
+    db.session.add(class_obj)
+    db.session.flush()
+
+    for student in students:
+        db.session.add(ClassEnrollment(class_id=class_obj.id, student_id=student.id))
+        db.session.add(Goal(student_id=student.id, title='調査を進める', progress=30))
+
+    # student0: 理科の質問7件と一般の質問1件、student1: 活動記録と完了したTODOのみ
+    for i in range(7):
+        db.session.add(ChatHistory(user_id=students[0].id, class_id=class_obj.id, subject_id=subject.id,
+                                   message=f'質問{i}', is_user=True, timestamp=noon + timedelta(minutes=i)))
+        db.session.add(ChatHistory(user_id=students[0].id, class_id=class_obj.id, subject_id=subject.id,
+                                   message=f'回答{i}', is_user=False, timestamp=noon + timedelta(minutes=i)))
+    db.session.add(ChatHistory(user_id=students[0].id, message='一般の質問', is_user=True, timestamp=noon))
+    db.session.add(ChatHistory(user_id=students[2].id, class_id=class_obj.id, message='前日の質問',
+                               is_user=True, timestamp=noon - timedelta(days=1)))
+    db.session.add(ActivityLog(student_id=students[1].id, class_id=class_obj.id, title='観察', date=today))
+    db.session.add(Todo(student_id=students[1].id, title='まとめる', is_completed=True, updated_at=noon))
+    db.session.commit()
+
+    service = daily_report.DailyReportService(app=model_app)
+    service.today = today
+    return service, teacher, class_obj, subject, students
+
+
+def test_student_data_is_collected_with_grouped_queries(report_data, query_counter):
+    service, teacher, class_obj, subject, students = report_data
+    student_list = User.query.filter_by(role='student').all()
+    student_ids = daily_report.select(User.id).where(User.role == 'student')
+    del query_counter[:]
+
+    reports = service._collect_all_student_data(student_list, student_ids)
+
+    assert len(query_counter) <= 5
+    first = reports[students[0].id]
+    assert first['total_questions'] == 8
+    assert first['subject_data'][subject.id]['count'] == 7
+    assert [q['question'] for q in first['subject_data'][subject.id]['questions']] == \
+        [f'質問{i}' for i in range(daily_report.MAX_SUMMARY_QUESTIONS)]
+    assert first['subject_data'][subject.id]['subject'].name == '理科'
+    assert first['subject_data'][0]['count'] == 1
+    assert len(first['goals']) == 1
+
+    second = reports[students[1].id]
+    assert second['total_questions'] == 0
+    assert [a.title for a in second['activities']] == ['観察']
+    assert [t.title for t in second['completed_todos']] == ['まとめる']
+
+    assert reports[students[2].id]['total_questions'] == 0
+    assert reports[students[3].id]['goals'] == []
+
+
+def test_class_data_counts_questions_per_student(report_data, query_counter):
+    service, teacher, class_obj, subject, students = report_data
+    class_obj = db.session.get(Class, class_obj.id)
+    del query_counter[:]
+
+    reports = service._collect_all_class_data([class_obj])
+
+    assert len(query_counter) == 2
+    data = reports[class_obj.id]
+    assert data['total_students'] == 4
+    assert data['active_students'] == 1
+    assert data['total_questions'] == 7
+    assert [student.username for student in data['active_student_list']] == ['student0']
+
+
+def test_reports_are_sent_to_active_students_and_teachers(report_data, monkeypatch):
+    service, teacher, class_obj, subject, students = report_data
+    batches = []
+    sent = []
+    monkeypatch.setattr(service, '_summarize_batch', lambda entries: batches.append(entries) or {})
+    monkeypatch.setattr(service, '_send_student_report', lambda student, data: sent.append(student.username) or True)
+    monkeypatch.setattr(service, '_send_teacher_report', lambda teacher, class_obj, data: True)
+
+    assert service.generate_student_reports() == 2
+    assert sorted(sent) == ['student0', 'student1']
+    assert [[(name, data['count']) for _, name, data in entries] for entries in batches] == [[('理科', 7)]]
+    assert service.generate_teacher_reports() == 1
+
+
+def test_retried_reports_skip_already_sent_deliveries(report_data, monkeypatch):
+    service, teacher, class_obj, subject, students = report_data
+    summarized = []
+    monkeypatch.setattr(service, '_summarize_batch', lambda entries: summarized.extend(entries) or {})
+    results = iter([True, False])
+    monkeypatch.setattr(service, '_send_student_report', lambda student, data: next(results))
+
+    student_ids = [student.id for student in students]
+    assert service.send_student_reports(student_ids) == {'sent': 1, 'skipped': 0, 'failed': 1}
+
+    # 失敗した送信だけをやり直す
+    monkeypatch.setattr(service, '_send_student_report', lambda student, data: True)
+    assert service.send_student_reports(student_ids) == {'sent': 1, 'skipped': 1, 'failed': 0}
+
+    deliveries = DailyReportDelivery.query.order_by(DailyReportDelivery.user_id).all()
+    assert [(d.status, d.attempts) for d in deliveries] == [('sent', 1), ('sent', 2)]
+    # 送信済みの生徒の要約は作り直さない
+    assert len(summarized) == 1
+
+
+def test_claim_delivery_skips_reports_in_progress(report_data):
+    service, teacher, class_obj, subject, students = report_data
+
+    assert daily_report.claim_delivery(students[0].id, service.today, 'student') is not None
+    assert daily_report.claim_delivery(students[0].id, service.today, 'student') is None
+
+    delivery = DailyReportDelivery.query.one()
+    delivery.updated_at = datetime.utcnow() - timedelta(seconds=daily_report.DELIVERY_CLAIM_TIMEOUT + 1)
+    db.session.commit()
+    assert daily_report.claim_delivery(students[0].id, service.today, 'student') is not None
+
+
+def test_planner_fans_out_chunks_and_summary_records_throughput(report_data, monkeypatch):
+    service, teacher, class_obj, subject, students = report_data
+    service.app.config['DAILY_REPORT_CHUNK_SIZE'] = 3
+    scheduled = []
+    monkeypatch.setattr(daily_report, 'chord', lambda header: scheduled.append(header) or (lambda callback: None))
+
+    result = daily_report._plan_daily_reports(service.today.isoformat())
+
+    assert result['chunks'] == 3
+    tasks = scheduled[0].tasks
+    assert [task.task.rsplit('.', 1)[-1] for task in tasks] == \
+        ['send_student_report_chunk', 'send_student_report_chunk', 'send_class_report_chunk']
+    assert [len(task.args[0]) for task in tasks] == [3, 1, 1]
+
+    summary = daily_report._record_summary(
+        [{'sent': 2, 'skipped': 1, 'failed': 0}, {'sent': 1, 'skipped': 0, 'failed': 1}], result['run_id']
+    )
+    run = db.session.get(DailyReportRun, result['run_id'])
+    assert (run.sent, run.skipped, run.failed) == (3, 1, 1)
+    assert run.finished_at is not None
+    assert summary['sent'] == 3
+
+
+def test_summaries_are_batched_and_small_subjects_use_template(report_data, monkeypatch):
+    service, teacher, class_obj, subject, students = report_data
+    service.app.config.update(DAILY_REPORT_SUMMARY_MIN_QUESTIONS=3, DAILY_REPORT_SUMMARY_BATCH_SIZE=2,
+                              DAILY_REPORT_SUMMARY_CONCURRENCY=2)
+    prompts = []
+
+    def fake_completion(messages, **kwargs):
+        prompts.append(messages[-1]['content'])
+        return '結果: {"summaries": [{"id": "1", "summary": "<b>要約1</b>"}]}'
+
+    monkeypatch.setattr(daily_report, 'chat_completion', fake_completion)
+
+    def subject_data(count):
+        return {'subject': None, 'count': count,
+                'questions': [{'question': f'質問{i}', 'timestamp': None} for i in range(min(count, 5))]}
+
+    reports = [{'subject_data': {1: subject_data(5), 2: subject_data(1)}},
+               {'subject_data': {1: subject_data(4)}},
+               {'subject_data': {1: subject_data(3)}}]
+
+    service._add_ai_summaries(reports)
+
+    assert len(prompts) == 2
+    assert '"question_count": 5' in prompts[0] and '"question_count": 4' in prompts[0]
+    assert str(reports[0]['subject_data'][1]['summary']) == '&lt;b&gt;要約1&lt;/b&gt;'
+    assert str(reports[2]['subject_data'][1]['summary']) == '&lt;b&gt;要約1&lt;/b&gt;'
+    # 応答に含まれなかったエントリと、質問が少ない教科
+    assert str(reports[1]['subject_data'][1]['summary']) == service._fallback_summary('一般', 4)
+    assert str(reports[0]['subject_data'][2]['summary']).startswith('一般で1件の質問がありました（「質問0」）')
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import EmailOutbox
+from app.utils import email_outbox
+from app.utils.email_sender import EmailSender
+from extensions import db
+
+
+@pytest.fixture
+def outbox_app(model_app):
+    model_app.config['EMAIL_OUTBOX_BACKEND'] = 'none'
+    model_app.config['EMAIL_OUTBOX_MAX_ATTEMPTS'] = 3
+    return model_app
+
+
+class SentMessages(list):
+    """送信したメールのリスト（failures に入れた宛先への送信は失敗させる）"""
+
+    def __init__(self):
+        super().__init__()
+        self.failures = set()
+
+
+@pytest.fixture
+def sent_messages(monkeypatch):
+    """EmailSender.send_many の代わりに送信内容を記録する"""
+    sent = SentMessages()
+
+    def fake_send_many(self, messages):
+        results = []
+        for message in messages:
+            if set(message['recipients']) & sent.failures:
+                results.append((False, 'SMTP Error: 421 try again later'))
+            else:
+                sent.append(message)
+                results.append((True, 'Email sent successfully'))
+        return results
+
+    monkeypatch.setattr(EmailSender, 'send_many', fake_send_many)
+    return sent
+
+
+def test_enqueue_only_stores_the_email(outbox_app, sent_messages):
+    email = email_outbox.enqueue_email('student@example.com', '件名', '<p>本文</p>', category='confirmation')
+
+    assert email.status == 'pending'
+    assert email.recipients == 'student@example.com'
+    assert sent_messages == []
+
+
+def test_enqueue_uses_callers_transaction_and_dispatches_once(outbox_app, sent_messages, monkeypatch):
+    dispatched = []
+    monkeypatch.setattr(email_outbox, 'dispatch_outbox', lambda: dispatched.append(True))
+
+    for i in range(3):
+        email_outbox.enqueue_email(f'user{i}@example.com', '件名', '本文')
+    assert dispatched == []
+
+    db.session.commit()
+    assert dispatched == [True]
+    assert EmailOutbox.query.count() == 3
+
+    # ロールバックした処理のメールは登録されない
+    email_outbox.enqueue_email('rollback@example.com', '件名', '本文')
+    db.session.rollback()
+    assert EmailOutbox.query.filter_by(recipients='rollback@example.com').count() == 0
+
+
+def test_drain_sends_in_batches_and_clears_body(outbox_app, sent_messages):
+    outbox_app.config['EMAIL_OUTBOX_BATCH_SIZE'] = 2
+    for i in range(5):
+        email_outbox.enqueue_email(f'user{i}@example.com', '件名', 'パスワード: secret', subtype='plain')
+
+    assert email_outbox.drain_outbox() == {'sent': 5, 'failed': 0}
+    assert [message['recipients'] for message in sent_messages] == [[f'user{i}@example.com'] for i in range(5)]
+    assert sent_messages[0]['subtype'] == 'plain'
+    assert {(email.status, email.body) for email in EmailOutbox.query.all()} == {('sent', '')}
+
+
+def test_failed_sends_are_retried_with_exponential_backoff(outbox_app, sent_messages):
+    sent_messages.failures.add('bounce@example.com')
+    email_id = email_outbox.enqueue_email('bounce@example.com', '件名', '本文').id
+
+    delays = []
+    for _ in range(3):
+        EmailOutbox.query.filter_by(id=email_id).update({'next_attempt_at': datetime.utcnow()})
+        db.session.commit()
+        started = datetime.utcnow()
+        email_outbox.drain_outbox()
+        email = db.session.get(EmailOutbox, email_id)
+        if email.status == 'pending':
+            delays.append(round((email.next_attempt_at - started).total_seconds() / 60))
+            # 再試行の時刻まで取り出さない
+            assert email_outbox.claim_batch() == []
+
+    assert delays == [1, 2]
+    assert (email.status, email.attempts) == ('failed', 3)
+    assert '421' in email.last_error
+    # 送信を中止したメールの本文も残さない
+    assert email.body == ''
+
+
+def test_claimed_emails_are_not_claimed_again(outbox_app, sent_messages):
+    email_outbox.enqueue_email('a@example.com', '件名', '本文')
+
+    assert len(email_outbox.claim_batch()) == 1
+    assert email_outbox.claim_batch() == []
+
+    # 送信中のまま止まったメールは時間がたてば取り出し直す
+    EmailOutbox.query.update({'updated_at': datetime.utcnow() - timedelta(seconds=email_outbox.CLAIM_TIMEOUT + 1)})
+    db.session.commit()
+    assert len(email_outbox.claim_batch()) == 1
+
+
+def test_outbox_stats_reports_depth_and_failure_rate(outbox_app, sent_messages):
+    sent_messages.failures.add('bounce@example.com')
+    outbox_app.config['EMAIL_OUTBOX_MAX_ATTEMPTS'] = 1
+    for address in ('a@example.com', 'b@example.com', 'c@example.com', 'bounce@example.com'):
+        email_outbox.enqueue_email(address, '件名', '本文')
+    email_outbox.drain_outbox()
+    email_outbox.enqueue_email('d@example.com', '件名', '本文')
+
+    stats = email_outbox.outbox_stats()
+
+    assert stats['counts'] == {'pending': 1, 'sending': 0, 'sent': 3, 'failed': 1}
+    assert stats['queue_depth'] == 1
+    assert stats['failure_rate'] == 0.25
+    assert [email.recipients for email in stats['recent_failures']] == ['bounce@example.com']
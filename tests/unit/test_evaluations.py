@@ -0,0 +1,106 @@
+import threading
+from datetime import date
+
+import pytest
+
+from app import db
+from app.models import ActivityLog, BackgroundJob, Goal, StudentEvaluation
+from app.teacher import evaluations
+from app.utils import background_jobs
+
+
+@pytest.fixture
+def evaluation_class(job_app, teacher_class, enroll_students, monkeypatch):
+    monkeypatch.setattr(evaluations, 'is_available', lambda: True)
+    job_app.config['EVALUATION_AI_CONCURRENCY'] = 4
+    job_app.config['EVALUATION_AI_RATE_LIMIT'] = 0
+
+    teacher, class_obj = teacher_class
+    students = enroll_students(6)
+    for student in students:
+        db.session.add(Goal(student_id=student.id, title='調査を進める', progress=50))
+        for day in range(1, 8):
+            db.session.add(ActivityLog(student_id=student.id, class_id=class_obj.id,
+                                       title=f'{day}日目', content='活動', date=date(2026, 4, day)))
+    db.session.commit()
+    return teacher, class_obj, students
+
+
+def test_load_evaluation_inputs_keeps_latest_activities(evaluation_class, query_counter):
+    teacher, class_obj, students = evaluation_class
+    class_id = class_obj.id
+    student_ids = [student.id for student in students]
+    del query_counter[:]
+
+    loaded, themes, goals, activity_logs = evaluations.load_evaluation_inputs(class_id, student_ids)
+
+    assert len(loaded) == len(student_ids)
+    assert len(query_counter) == 4
+    logs = activity_logs[student_ids[0]]
+    assert [log.title for log in logs] == ['7日目', '6日目', '5日目', '4日目', '3日目']
+    assert len(goals[student_ids[0]]) == 1
+
+
+def test_evaluation_job_calls_ai_concurrently_and_saves_results(evaluation_class, monkeypatch):
+    teacher, class_obj, students = evaluation_class
+    db.session.add(StudentEvaluation(student_id=students[0].id, class_id=class_obj.id,
+                                     evaluation_text='古い評価'))
+    db.session.commit()
+
+    threads = set()
+
+    def fake_request(prompt):
+        threads.add(threading.get_ident())
+        if 'student5' in prompt:
+            raise ValueError('API error')
+        return 'よく取り組んでいます'
+
+    monkeypatch.setattr(evaluations, 'request_student_evaluation', fake_request)
+    student_ids = [student.id for student in students]
+
+    job = background_jobs.create_job('class_evaluations', teacher.id,
+                                     {'class_id': class_obj.id, 'student_ids': student_ids},
+                                     total=len(student_ids))
+
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.status == 'completed'
+    assert job.result['evaluated'] == 5
+    assert job.result['error_count'] == 1
+    assert 'student5' in job.result['errors'][0]
+    assert threading.get_ident() not in threads
+
+    saved = {e.student_id: e.evaluation_text
+             for e in StudentEvaluation.query.filter_by(class_id=class_obj.id)}
+    assert len(saved) == 5
+    assert saved[students[0].id] == 'よく取り組んでいます'
+    assert students[5].id not in saved
+
+
+def test_evaluation_job_fails_once_when_ai_is_unavailable(evaluation_class, monkeypatch):
+    teacher, class_obj, students = evaluation_class
+    calls = []
+    monkeypatch.setattr(evaluations, 'is_available', lambda: False)
+    monkeypatch.setattr(evaluations, 'request_student_evaluation', calls.append)
+    student_ids = [student.id for student in students]
+
+    job = background_jobs.create_job('class_evaluations', teacher.id,
+                                     {'class_id': class_obj.id, 'student_ids': student_ids},
+                                     total=len(student_ids))
+
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.status == 'failed'
+    assert 'OpenAI APIが利用できない' in job.error
+    assert calls == []
+    assert StudentEvaluation.query.count() == 0
+
+
+def test_rate_limiter_spaces_calls(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(evaluations.time, 'sleep', sleeps.append)
+    limiter = evaluations.RateLimiter(per_minute=120)
+
+    for _ in range(3):
+        limiter.wait()
+
+    assert len(sleeps) == 2
+    assert all(0 < delay <= 1.0 for delay in sleeps)
@@ -0,0 +1,253 @@
+import csv
+import io
+import os
+
+import pytest
+from werkzeug.datastructures import FileStorage
+from werkzeug.security import check_password_hash
+
+from app import db
+from app.models import BackgroundJob, ClassEnrollment, User
+from app.utils import background_jobs, import_jobs
+
+
+@pytest.fixture
+def existing_student(teacher_class):
+    teacher, _ = teacher_class
+    student = User(username='existing', email='existing@test.com', password='x',
+                   role='student', school_id=teacher.school_id)
+    db.session.add(student)
+    db.session.commit()
+    return student
+
+
+def upload(content, filename='students.csv'):
+    return FileStorage(stream=io.BytesIO(content.encode('utf-8')), filename=filename)
+
+
+def test_hash_passwords_in_process_pool_keeps_order():
+    passwords = [f'password-{i}' for i in range(import_jobs.PARALLEL_HASH_MIN)]
+
+    hashes = import_jobs.hash_passwords(passwords, workers=2)
+
+    assert len(hashes) == len(passwords)
+    assert all(check_password_hash(h, p) for h, p in zip(hashes, passwords))
+
+
+def test_hash_passwords_uses_threads_in_daemon_process(monkeypatch):
+    class DaemonProcess:
+        daemon = True
+
+    def no_process_pool(*args, **kwargs):
+        raise AssertionError('デーモンプロセスでプロセスプールを使用しました')
+
+    monkeypatch.setattr(import_jobs.multiprocessing, 'current_process', lambda: DaemonProcess())
+    monkeypatch.setattr(import_jobs, 'ProcessPoolExecutor', no_process_pool)
+    passwords = [f'password-{i}' for i in range(import_jobs.PARALLEL_HASH_MIN)]
+
+    hashes = import_jobs.hash_passwords(passwords, workers=2)
+
+    assert all(check_password_hash(h, p) for h, p in zip(hashes, passwords))
+
+
+def test_hash_passwords_does_not_fork_under_gevent(monkeypatch):
+    def no_process_pool(*args, **kwargs):
+        raise AssertionError('gevent のパッチを適用したプロセスでプロセスプールを使用しました')
+
+    monkeypatch.setattr(import_jobs, 'gevent_patched', lambda: True)
+    monkeypatch.setattr(import_jobs, 'ProcessPoolExecutor', no_process_pool)
+    passwords = [f'password-{i}' for i in range(import_jobs.PARALLEL_HASH_MIN)]
+
+    hashes = import_jobs.hash_passwords(passwords, workers=2)
+
+    assert all(check_password_hash(h, p) for h, p in zip(hashes, passwords))
+
+
+@pytest.mark.parametrize('backend', ['sync', 'thread'])
+def test_in_process_backend_is_refused_under_gevent(job_app, teacher_class, monkeypatch, backend):
+    teacher, class_obj = teacher_class
+    job_app.config['BACKGROUND_JOB_BACKEND'] = backend
+    monkeypatch.setattr(background_jobs, 'gevent_patched', lambda: True)
+    monkeypatch.setattr(background_jobs, '_get_executor', lambda app: pytest.fail('スレッドで実行しました'))
+
+    job = background_jobs.create_job('class_reports', teacher.id, {'class_id': class_obj.id})
+
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.status == 'failed'
+    assert 'Celeryワーカー' in job.error
+
+
+def test_student_import_job_reports_progress_and_results(teacher_class, existing_student):
+    teacher, class_obj = teacher_class
+    content = (
+        'username,email,student_number\n'
+        'new1,new1@test.com,1\n'
+        'new2,new2@test.com,2\n'
+        'existing,existing@test.com,3\n'
+        'new1,dup@test.com,4\n'
+        ',missing@test.com,5\n'
+    )
+
+    job = import_jobs.create_import_job('teacher_students', upload(content), teacher.id,
+                                        {'class_id': class_obj.id})
+
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.status == 'completed'
+    assert job.total == 5
+    assert job.processed == 5
+    assert job.result['created'] == 2
+    assert job.result['enrolled'] == 1
+    assert job.result['error_count'] == 2
+    assert ClassEnrollment.query.filter_by(class_id=class_obj.id).count() == 3
+
+    # 生成したパスワードはDBの結果には含めず、結果ファイルにだけ書き出す
+    assert 'password' not in str(job.result)
+    assert job.has_results_file
+    with open(background_jobs.results_path(job.id), encoding='utf-8-sig') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['username'] for row in rows] == ['new1', 'new2']
+    for row in rows:
+        user = User.query.filter_by(username=row['username']).one()
+        assert check_password_hash(user.password, row['password'])
+
+    # アップロードされたファイルは処理後に削除する
+    assert not os.path.exists(os.path.join(background_jobs.job_dir(job.id), import_jobs.UPLOAD_FILENAME))
+
+
+def test_failed_import_job_records_error(teacher_class):
+    teacher, class_obj = teacher_class
+
+    job = import_jobs.create_import_job('teacher_students', upload('username,email\na,a@test.com\n'),
+                                        teacher.id, {})
+
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.status == 'failed'
+    assert 'class_id' in job.error
+    assert not job.has_results_file
+
+
+def test_failed_import_job_keeps_passwords_of_committed_chunks(teacher_class, monkeypatch):
+    import app.teacher
+    from sqlalchemy import insert
+
+    teacher, class_obj = teacher_class
+    existing_count = import_jobs.ROW_CHUNK_SIZE - 2
+    db.session.execute(insert(User), [
+        {'username': f'student{i}', 'email': f'student{i}@test.com', 'password': 'x',
+         'role': 'student', 'school_id': teacher.school_id}
+        for i in range(existing_count)
+    ])
+    db.session.commit()
+
+    # 1チャンク目で new1, new2 を作成し、2チャンク目の new3 の作成で失敗させる
+    lines = ['username,email'] + [f'student{i},student{i}@test.com' for i in range(existing_count)]
+    lines += ['new1,new1@test.com', 'new2,new2@test.com', 'new3,new3@test.com']
+    original_insert_users = app.teacher.insert_users
+    calls = []
+
+    def failing_insert_users(mappings):
+        calls.append(mappings)
+        if len(calls) > 1:
+            raise RuntimeError('データベースの接続が切れました')
+        return original_insert_users(mappings)
+
+    monkeypatch.setattr(app.teacher, 'insert_users', failing_insert_users)
+
+    job = import_jobs.create_import_job('teacher_students', upload('\n'.join(lines) + '\n'), teacher.id,
+                                        {'class_id': class_obj.id})
+
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.status == 'failed'
+    assert job.has_results_file
+    with open(background_jobs.results_path(job.id), encoding='utf-8-sig') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['username'] for row in rows] == ['new1', 'new2']
+    for row in rows:
+        user = User.query.filter_by(username=row['username']).one()
+        assert check_password_hash(user.password, row['password'])
+    assert User.query.filter_by(username='new3').count() == 0
+
+
+def test_import_job_fails_when_upload_is_missing(teacher_class):
+    teacher, class_obj = teacher_class
+    # ワーカーからアップロードフォルダが見えない場合と同じ状態
+    job = BackgroundJob(id='missing-upload', kind='teacher_students', user_id=teacher.id,
+                    status='pending', params={'class_id': class_obj.id}, total=1)
+    db.session.add(job)
+    db.session.commit()
+
+    background_jobs.run_job(job.id)
+
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.status == 'failed'
+    assert 'アップロードされたファイルが見つかりません' in job.error
+    assert ClassEnrollment.query.count() == 0
+
+
+@pytest.mark.parametrize('kind', sorted(background_jobs.JOB_HANDLERS))
+def test_every_job_handler_can_be_loaded(kind):
+    assert callable(background_jobs.get_job_handler(kind))
+
+
+def test_enrollment_import_job_creates_and_enrolls_students(teacher_class, existing_student, monkeypatch):
+    import core.enrollment
+    from app.models import ClassGroup, SchoolYear, StudentEnrollment
+
+    teacher, _ = teacher_class
+    invited = []
+    monkeypatch.setattr(core.enrollment, 'send_invitation_email', lambda **kwargs: invited.append(kwargs['email']))
+    school_year = SchoolYear(school_id=teacher.school_id, year='2026-2027', is_current=True)
+    db.session.add(school_year)
+    db.session.flush()
+    class_group = ClassGroup(school_year_id=school_year.id, teacher_id=teacher.id, name='1年A組')
+    db.session.add(class_group)
+    db.session.commit()
+    content = 'name,email,student_number\n新入生,new@test.com,1\n既存,existing@test.com,2\n'
+
+    job = import_jobs.create_import_job('enrollment_students', upload(content), teacher.id,
+                                        {'class_id': class_group.id})
+
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.status == 'completed', job.error
+    assert (job.result['created'], job.result['enrolled']) == (1, 1)
+    assert StudentEnrollment.query.filter_by(class_group_id=class_group.id).count() == 2
+    assert invited == ['new@test.com']
+    with open(background_jobs.results_path(job.id), encoding='utf-8-sig') as f:
+        assert [row['email'] for row in csv.DictReader(f)] == ['new@test.com']
+
+
+def test_create_import_job_rejects_non_utf8(teacher_class):
+    teacher, class_obj = teacher_class
+    file = FileStorage(stream=io.BytesIO('username\n山田'.encode('shift_jis')), filename='students.csv')
+
+    with pytest.raises(ValueError):
+        import_jobs.create_import_job('teacher_students', file, teacher.id, {'class_id': class_obj.id})
+
+    assert BackgroundJob.query.count() == 0
+
+
+def test_student_import_queries_per_chunk_not_per_row(teacher_class, query_counter):
+    from sqlalchemy import insert
+    from app.teacher import process_student_csv
+
+    teacher, class_obj = teacher_class
+    row_count = import_jobs.ROW_CHUNK_SIZE * 2
+    db.session.execute(insert(User), [
+        {'username': f'student{i}', 'email': f'student{i}@test.com', 'password': 'x',
+         'role': 'student', 'school_id': teacher.school_id}
+        for i in range(row_count)
+    ])
+    db.session.commit()
+
+    lines = ['username,email'] + [f'student{i},student{i}@test.com' for i in range(row_count)]
+    lines += ['new1,new1@test.com', 'STUDENT0,other@test.com']
+    del query_counter[:]
+
+    results = process_student_csv(io.StringIO('\n'.join(lines) + '\n'), class_obj.id, teacher.school_id)
+
+    assert len(results['enrolled']) == row_count
+    assert [created['username'] for created in results['created']] == ['new1']
+    assert len(results['errors']) == 1
+    assert ClassEnrollment.query.filter_by(class_id=class_obj.id).count() == row_count + 1
+    # 3チャンク分のクエリのみ（行数に比例しない）
+    assert len(query_counter) <= 3 * 6
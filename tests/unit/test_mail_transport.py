@@ -0,0 +1,141 @@
+import smtplib
+import socket
+
+import pytest
+
+from app.utils import mail_transport
+
+
+class FakeSMTP:
+    """smtplib.SMTP の代わりに送信内容と接続・ログインの回数を記録する"""
+
+    instances = []
+    fail_next_send = []
+
+    def __init__(self, host, port, timeout=None):
+        self.logins = 0
+        self.sent = []
+        self.closed = False
+        FakeSMTP.instances.append(self)
+
+    def ehlo(self):
+        pass
+
+    def starttls(self, context=None):
+        pass
+
+    def login(self, user, password):
+        self.logins += 1
+
+    def send_message(self, message):
+        if FakeSMTP.fail_next_send:
+            raise FakeSMTP.fail_next_send.pop(0)
+        self.sent.append(message['To'])
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_smtp(monkeypatch):
+    FakeSMTP.instances = []
+    FakeSMTP.fail_next_send = []
+    monkeypatch.setattr(mail_transport.smtplib, 'SMTP', FakeSMTP)
+    return FakeSMTP
+
+
+def _messages(count):
+    return [mail_transport.build_message(f'user{i}@example.com', '件名', '<p>本文</p>', sender='info@example.com')
+            for i in range(count)]
+
+
+def test_transport_reuses_authenticated_connection(fake_smtp):
+    transport = mail_transport.SMTPTransport('smtp.example.com', user='user', password='pw')
+
+    for message in _messages(3):
+        transport.send(message)
+
+    assert len(fake_smtp.instances) == 1
+    assert fake_smtp.instances[0].logins == 1
+    assert fake_smtp.instances[0].sent == ['user0@example.com', 'user1@example.com', 'user2@example.com']
+
+
+def test_transport_reconnects_and_resends_after_disconnect(fake_smtp):
+    transport = mail_transport.SMTPTransport('smtp.example.com', user='user', password='pw')
+    transport.send(_messages(1)[0])
+    fake_smtp.fail_next_send.append(smtplib.SMTPServerDisconnected('connection closed'))
+
+    transport.send(_messages(2)[1])
+
+    assert len(fake_smtp.instances) == 2
+    assert fake_smtp.instances[0].closed
+    assert fake_smtp.instances[1].sent == ['user1@example.com']
+
+
+def test_send_many_reports_failures_without_stopping(fake_smtp):
+    transport = mail_transport.SMTPTransport('smtp.example.com', max_messages_per_connection=2)
+    fake_smtp.fail_next_send.append(smtplib.SMTPRecipientsRefused({'user0@example.com': (550, b'no such user')}))
+
+    results = transport.send_many(_messages(4))
+
+    assert [success for success, _ in results] == [False, True, True, True]
+    # 1つの接続で2通まで送り、3通目から接続し直す
+    assert [instance.sent for instance in fake_smtp.instances] == [
+        ['user1@example.com', 'user2@example.com'], ['user3@example.com']
+    ]
+
+
+def test_transport_throttles_to_rate_limit(fake_smtp, monkeypatch):
+    now = [100.0]
+    sleeps = []
+
+    def fake_sleep(delay):
+        sleeps.append(delay)
+        now[0] += delay
+
+    monkeypatch.setattr(mail_transport.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(mail_transport.time, 'sleep', fake_sleep)
+    transport = mail_transport.SMTPTransport('smtp.example.com', max_per_minute=120)
+
+    transport.send_many(_messages(3))
+
+    assert sleeps == [0.5, 0.5]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_transport_sends_batch_over_one_session_to_local_server():
+    controller_module = pytest.importorskip('aiosmtpd.controller')
+
+    class Handler:
+        def __init__(self):
+            self.sessions = []
+            self.recipients = []
+
+        async def handle_DATA(self, server, session, envelope):
+            self.sessions.append(id(session))
+            self.recipients.extend(envelope.rcpt_tos)
+            return '250 OK'
+
+    handler = Handler()
+    port = _free_port()
+    controller = controller_module.Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    try:
+        transport = mail_transport.SMTPTransport('127.0.0.1', port, use_tls=False, timeout=5)
+        results = transport.send_many(_messages(5))
+        transport.close()
+    finally:
+        controller.stop()
+
+    assert all(success for success, _ in results)
+    assert handler.recipients == [f'user{i}@example.com' for i in range(5)]
+    assert len(set(handler.sessions)) == 1
+    assert transport.connections_opened == 1
@@ -0,0 +1,139 @@
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import db
+from app.models import ActivityLog, BackgroundJob, User
+from app.teacher import reports
+from app.utils import background_jobs
+
+
+@pytest.fixture
+def report_class(job_app, teacher_class, enroll_students, monkeypatch):
+    job_app.config['REPORT_PDF_WORKERS'] = 1
+
+    summaries = []
+    monkeypatch.setattr(reports, 'generate_activity_summary',
+                        lambda activities, chats: summaries.append(activities) or '要約')
+
+    teacher, class_obj = teacher_class
+    students = enroll_students(3)
+    for student in students:
+        db.session.add(ActivityLog(student_id=student.id, class_id=class_obj.id,
+                                   title='調査', content=f'{student.username}の活動 <メモ>'))
+    db.session.commit()
+    return teacher, class_obj, students, summaries
+
+
+def test_render_reports_in_process_pool():
+    data = {
+        'student_name': 'student', 'class_name': '1年A組', 'theme_title': '未設定',
+        'created_date': '2026年01月01日', 'ai_summary': '要約',
+        'activities': [{'date': '2026/01/01 10:00', 'content': '活動 & 調査', 'reflection': None}],
+        'chats': [{'is_user': True, 'message': '質問'}],
+    }
+
+    pdfs = reports.render_reports([data, data], workers=2)
+
+    assert len(pdfs) == 2
+    assert all(pdf.startswith(b'%PDF') for pdf in pdfs)
+
+
+def test_report_cache_key_includes_created_date():
+    data = {'student_name': 'student', 'created_date': '2026年01月01日', 'ai_summary': '要約'}
+    next_day = dict(data, created_date='2026年01月02日')
+    other_summary = dict(data, ai_summary='別の要約')
+
+    key = reports.report_cache_key(data, ['活動'], ['質問'])
+
+    assert reports.report_cache_key(next_day, ['活動'], ['質問']) != key
+    assert reports.report_cache_key(other_summary, ['活動'], ['質問']) == key
+
+
+def test_class_report_job_builds_zip_and_reuses_cache(report_class):
+    teacher, class_obj, students, summaries = report_class
+
+    job = background_jobs.create_job('class_reports', teacher.id, {'class_id': class_obj.id},
+                                     total=len(students))
+
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.status == 'completed'
+    assert job.result['generated'] == 3
+    assert job.result['cached'] == 0
+    assert job.has_results_file
+    with zipfile.ZipFile(background_jobs.results_path(job.id, job.result['results_file'])) as archive:
+        assert sorted(archive.namelist()) == ['student0.pdf', 'student1.pdf', 'student2.pdf']
+        assert archive.read('student0.pdf').startswith(b'%PDF')
+    assert len(summaries) == 3
+
+    # 入力が変わった生徒だけ作り直す
+    db.session.add(ActivityLog(student_id=students[0].id, class_id=class_obj.id,
+                               title='追加', content='新しい活動'))
+    db.session.commit()
+
+    job = background_jobs.create_job('class_reports', teacher.id, {'class_id': class_obj.id},
+                                     total=len(students))
+
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.result['generated'] == 1
+    assert job.result['cached'] == 2
+    assert len(summaries) == 4
+
+
+def test_class_report_job_rejects_other_teachers_class(report_class):
+    teacher, class_obj, students, summaries = report_class
+    other = User(username='other', email='other@test.com', password='x', role='teacher')
+    db.session.add(other)
+    db.session.commit()
+
+    job = background_jobs.create_job('class_reports', other.id, {'class_id': class_obj.id})
+
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.status == 'failed'
+    assert not job.has_results_file
+
+
+def test_class_report_job_uses_one_pdf_pool_for_all_students(job_app, teacher_class, enroll_students, monkeypatch):
+    job_app.config['REPORT_PDF_WORKERS'] = 2
+    job_app.config['REPORT_AI_CONCURRENCY'] = 4
+    teacher, class_obj = teacher_class
+    students = enroll_students(10)
+
+    pools = []
+
+    class CountingPool(ThreadPoolExecutor):
+        def __init__(self, max_workers):
+            pools.append(max_workers)
+            super().__init__(max_workers=max_workers)
+
+    summary_threads = set()
+
+    def fake_summary(activities, chats):
+        summary_threads.add(threading.get_ident())
+        return '要約'
+
+    monkeypatch.setattr(reports, 'ProcessPoolExecutor', CountingPool)
+    monkeypatch.setattr(reports, 'generate_activity_summary', fake_summary)
+
+    job = background_jobs.create_job('class_reports', teacher.id, {'class_id': class_obj.id},
+                                     total=len(students))
+
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.status == 'completed', job.error
+    assert job.result['generated'] == 10
+    assert pools == [2]
+    assert summary_threads and threading.get_ident() not in summary_threads
+
+
+def test_class_report_job_requires_celery_under_gevent(report_class, monkeypatch):
+    teacher, class_obj, students, summaries = report_class
+    monkeypatch.setattr(reports, 'gevent_patched', lambda: True)
+
+    job = background_jobs.create_job('class_reports', teacher.id, {'class_id': class_obj.id})
+
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.status == 'failed'
+    assert 'Celery' in job.error
+    assert summaries == []
@@ -1,9 +1,7 @@
-import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from flask import url_for
 
+from app.utils.email_outbox import enqueue_email
+
 def send_confirmation_email(user_email, user_id, token, username):
     """
     確認メールを送信する関数
@@ -17,9 +15,6 @@ def send_confirmation_email(user_email, user_id, token, username):
     Returns:
         bool: 送信成功したかどうか
     """
-    sender_email = "info@quested.jp"
-    password = os.getenv('EMAIL_PASSWORD', '')
-    
     # 確認URLを構築
     confirm_url = url_for(
         'confirm_email', 
@@ -28,12 +23,6 @@ def send_confirmation_email(user_email, user_id, token, username):
         _external=True
     )
     
-    # メールの構成
-    message = MIMEMultipart()
-    message["From"] = sender_email
-    message["To"] = user_email
-    message["Subject"] = "QuestEd - メールアドレスの確認"
-    
     # メール本文
     body = f"""
     {username} 様
@@ -50,21 +39,9 @@ def send_confirmation_email(user_email, user_id, token, username):
     QuestEd運営チーム
     """
     
-    message.attach(MIMEText(body, "plain"))
-    
-    try:
-        # SMTPサーバーに接続
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.ehlo()  # サーバーと対話を開始
-        server.starttls()  # TLS暗号化を有効化
-        server.ehlo()  # TLS開始後に再度ehlo
-        server.login(sender_email, password)
-        server.sendmail(sender_email, user_email, message.as_string())
-        server.quit()
-        return True
-    except Exception as e:
-        print(f"メール送信エラー: {str(e)}")
-        return False
+    # 送信キューに登録し、リクエストの外で送信する（app/utils/email_outbox.py）
+    enqueue_email(user_email, "QuestEd - メールアドレスの確認", body, subtype="plain", category="confirmation")
+    return True
 
 def send_reset_password_email(user_email, user_id, token, username):
     """
@@ -79,9 +56,6 @@ def send_reset_password_email(user_email, user_id, token, username):
     Returns:
         bool: 送信成功したかどうか
     """
-    sender_email = "info@quested.jp"
-    password = os.getenv('EMAIL_PASSWORD', '')
-    
     # リセットURLを構築
     reset_url = url_for(
         'reset_password', 
@@ -90,12 +64,6 @@ def send_reset_password_email(user_email, user_id, token, username):
         _external=True
     )
     
-    # メールの構成
-    message = MIMEMultipart()
-    message["From"] = sender_email
-    message["To"] = user_email
-    message["Subject"] = "QuestEd - パスワードリセット"
-    
     # メール本文
     body = f"""
     {username} 様
@@ -113,18 +81,6 @@ def send_reset_password_email(user_email, user_id, token, username):
     QuestEd運営チーム
     """
     
-    message.attach(MIMEText(body, "plain"))
-    
-    try:
-        # SMTPサーバーに接続
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.ehlo()  # サーバーと対話を開始
-        server.starttls()  # TLS暗号化を有効化
-        server.ehlo()  # TLS開始後に再度ehlo
-        server.login(sender_email, password)
-        server.sendmail(sender_email, user_email, message.as_string())
-        server.quit()
-        return True
-    except Exception as e:
-        print(f"メール送信エラー: {str(e)}")
-        return False
\ No newline at end of file
+    # 送信キューに登録し、リクエストの外で送信する（app/utils/email_outbox.py）
+    enqueue_email(user_email, "QuestEd - パスワードリセット", body, subtype="plain", category="reset_password")
+    return True
\ No newline at end of file